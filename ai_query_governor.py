@@ -0,0 +1,311 @@
+# ai_query_governor.py
+# ------------------------------------------------------------
+# Ochrana DB pred SQL, ktoré generuje AI (gemini_agent, services.ai_tasks):
+#  - run_select()      -> EXPLAIN kontrola odhadu (full scan / join), potom
+#                         SELECT s limitom MAX_EXECUTION_TIME v read-only
+#                         transakcii (konzistentný snapshot), voliteľne na replike
+#  - cache výsledkov    -> (SQL + params) -> výsledok, v procese s TTL
+#  - compiled_sql()     -> otázka -> overené SQL (tabuľka ai_sql_cache), aby
+#    remember_sql()        opakované a plánované otázky nevolali LLM stále dokola
+#    forget_sql()
+#
+# Replika: ak je nastavené AI_DB_HOST, AI dotazy idú na samostatný pool
+# (AI_DB_PORT / AI_DB_USER / AI_DB_PASSWORD / AI_DB_DATABASE, inak hodnoty
+# z DB_CONFIG). Bez repliky sa použije primárny pool, ale vždy v transakcii
+# START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY.
+# ------------------------------------------------------------
+from __future__ import annotations
+import os, re, json, time, hashlib, threading, datetime, decimal, unicodedata
+from typing import Any, Dict, List, Optional, Sequence
+
+import db_connector
+
+MAX_EXEC_MS        = int(os.getenv("AI_SQL_MAX_EXEC_MS", "8000"))
+MAX_SCAN_ROWS      = int(os.getenv("AI_SQL_MAX_SCAN_ROWS", "500000"))
+MAX_JOIN_ROWS      = int(os.getenv("AI_SQL_MAX_JOIN_ROWS", "50000000"))
+RESULT_TTL_S       = int(os.getenv("AI_SQL_RESULT_TTL_S", "120"))
+RESULT_CACHE_MAX   = int(os.getenv("AI_SQL_RESULT_CACHE_MAX", "256"))
+COMPILED_TTL_DAYS  = int(os.getenv("AI_SQL_COMPILED_TTL_DAYS", "30"))
+
+
+class QueryRejected(Exception):
+    """Dotaz neprešiel kontrolou plánu (EXPLAIN)."""
+
+
+def _jsonify_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def conv(v):
+        if isinstance(v, (datetime.datetime, datetime.date)):
+            return v.isoformat()
+        if isinstance(v, decimal.Decimal):
+            return float(v)
+        return v
+    return [{k: conv(v) for k, v in (r or {}).items()} for r in (rows or [])]
+
+
+# ------------- Spojenie (replika / read-only snapshot) --------------------------
+_replica_pool = None
+_replica_lock = threading.Lock()
+_timeout_var: Optional[str] = None   # 'max_execution_time' (MySQL) / 'max_statement_time' (MariaDB) / '' = nepodporované
+_ER_UNKNOWN_SYSTEM_VARIABLE = 1193
+
+
+def _replica_connection():
+    global _replica_pool
+    host = os.getenv("AI_DB_HOST")
+    if not host:
+        return None
+    with _replica_lock:
+        if _replica_pool is None:
+            from mysql.connector import pooling
+            cfg = dict(db_connector.DB_CONFIG)
+            cfg.update({
+                "host": host,
+                "port": int(os.getenv("AI_DB_PORT", cfg["port"])),
+                "user": os.getenv("AI_DB_USER", cfg["user"]),
+                "password": os.getenv("AI_DB_PASSWORD", cfg["password"]),
+                "database": os.getenv("AI_DB_DATABASE", cfg["database"]),
+            })
+            _replica_pool = pooling.MySQLConnectionPool(
+                pool_name="ai_replica_pool",
+                pool_size=int(os.getenv("AI_DB_POOL_SIZE", "2")),
+                **cfg,
+            )
+    conn = _replica_pool.get_connection()
+    db_connector._init_session(conn)
+    return conn
+
+
+def _set_timeout(cur, ms: int) -> None:
+    """
+    Limit behu jedného SELECT-u; zistí sa raz, ktorú premennú server pozná.
+    Za nepodporované ('') sa berie len to, čo server odmietne ako neznámu
+    premennú – iná chyba (spojenie, práva) limit natrvalo nevypne.
+    """
+    global _timeout_var
+    candidates = [_timeout_var] if _timeout_var is not None else ["max_execution_time", "max_statement_time"]
+    unknown = 0
+    for var in candidates:
+        if not var:
+            return
+        value = ms if var == "max_execution_time" else ms / 1000.0
+        try:
+            cur.execute(f"SET SESSION {var} = %s", (value,))
+            _timeout_var = var
+            return
+        except Exception as e:
+            if getattr(e, "errno", None) == _ER_UNKNOWN_SYSTEM_VARIABLE:
+                unknown += 1
+    if unknown == len(candidates):
+        _timeout_var = ""
+
+
+def _reset_timeout(cur) -> None:
+    if _timeout_var:
+        try:
+            cur.execute(f"SET SESSION {_timeout_var} = 0")
+        except Exception:
+            pass
+
+
+# ------------- EXPLAIN kontrola ------------------------------------------------
+def _check_plan(cur, sql: str, params: Sequence[Any]) -> None:
+    cur.execute(f"EXPLAIN {sql}", tuple(params))
+    plan = cur.fetchall() or []
+    per_select: Dict[Any, float] = {}
+    for row in plan:
+        rows = float(row.get("rows") or 0)
+        filtered = float(row.get("filtered") or 100) / 100.0
+        if str(row.get("type") or "").upper() == "ALL" and rows > MAX_SCAN_ROWS:
+            raise QueryRejected(
+                f"Dotaz by prečítal celú tabuľku {row.get('table')} (~{int(rows)} riadkov). "
+                "Pridaj filter na indexovaný stĺpec (dátum, id, EAN) alebo zúž obdobie."
+            )
+        key = row.get("id")
+        per_select[key] = per_select.get(key, 1.0) * max(rows * filtered, 1.0)
+    worst = max(per_select.values(), default=0.0)
+    if worst > MAX_JOIN_ROWS:
+        raise QueryRejected(
+            f"Odhad spojenia je príliš veľký (~{int(worst)} kombinácií riadkov). "
+            "Spájaj cez kľúče a obmedz obdobie."
+        )
+
+
+# ------------- Cache výsledkov --------------------------------------------------
+_result_cache: Dict[str, tuple] = {}
+_result_lock = threading.Lock()
+
+
+def _result_key(sql: str, params: Sequence[Any]) -> str:
+    raw = sql + "\x00" + json.dumps(list(params), default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cached_result(key: str) -> Optional[Dict[str, Any]]:
+    with _result_lock:
+        hit = _result_cache.get(key)
+        if hit and hit[0] > time.time():
+            return hit[1]
+        _result_cache.pop(key, None)
+    return None
+
+
+def _store_result(key: str, result: Dict[str, Any]) -> None:
+    now = time.time()
+    with _result_lock:
+        if len(_result_cache) >= RESULT_CACHE_MAX:
+            for k in [k for k, v in _result_cache.items() if v[0] <= now]:
+                del _result_cache[k]
+            while len(_result_cache) >= RESULT_CACHE_MAX:
+                del _result_cache[next(iter(_result_cache))]
+        _result_cache[key] = (now + RESULT_TTL_S, result)
+
+
+def run_select(sql: str, params: Optional[Sequence[Any]] = None, *, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Vykoná už zvalidovaný SELECT. Vráti {"columns","rows","row_count"} alebo {"error"}.
+    Chyby (aj odmietnutie plánu) sa vracajú textom, aby ich AI vedela opraviť.
+    """
+    params = tuple(params or ())
+    key = _result_key(sql, params)
+    if use_cache and RESULT_TTL_S > 0:
+        hit = _cached_result(key)
+        if hit is not None:
+            return dict(hit, cached=True)
+
+    conn = None
+    cur = None
+    try:
+        conn = _replica_connection() or db_connector.get_connection()
+        cur = conn.cursor(dictionary=True, buffered=True)
+        _set_timeout(cur, MAX_EXEC_MS)
+        cur.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+        _check_plan(cur, sql, params)
+        cur.execute(sql, params)
+        rows = _jsonify_rows(cur.fetchall() or [])
+        conn.rollback()
+    except QueryRejected as e:
+        return {"error": str(e), "rejected": True}
+    except Exception as e:
+        msg = str(e)
+        if "max_execution_time" in msg.lower() or "max_statement_time" in msg.lower() or "3024" in msg:
+            msg = f"Dotaz prekročil časový limit {MAX_EXEC_MS} ms – zúž obdobie alebo pridaj filter."
+        return {"error": msg}
+    finally:
+        if cur is not None:
+            try:
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                pass
+            _reset_timeout(cur)
+            try:
+                cur.close()
+            except Exception:
+                pass
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    result = {"columns": list(rows[0].keys()) if rows else [], "rows": rows, "row_count": len(rows)}
+    if use_cache and RESULT_TTL_S > 0:
+        _store_result(key, result)
+    return result
+
+
+# ------------- Otázka -> SQL (ai_sql_cache) -------------------------------------
+_schema_ready = False
+
+
+def ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS ai_sql_cache (
+            qkey         CHAR(64) PRIMARY KEY,
+            question     TEXT NOT NULL,
+            sql_text     MEDIUMTEXT NOT NULL,
+            hits         INT NOT NULL DEFAULT 0,
+            created_at   DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_used_at DATETIME NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch="none")
+    _schema_ready = True
+
+
+def _question_key(question: str, context: str = "") -> str:
+    norm = " ".join((question or "").lower().split())
+    ctx = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{norm}\x00{ctx}".encode("utf-8")).hexdigest()
+
+
+# dátum, rok alebo YYYYMM(DD) natvrdo v SQL: '2026-10-19', YEAR(d) = 2026, BETWEEN 20261001 AND 20261031
+_DATE_LITERAL_RE = re.compile(r"(?<![\d.])(?:19|20)\d{2}(?:-?\d{2}){0,2}(?![\d.])")
+# relatívne obdobie v otázke („tento mesiac“, „včera“, „posledných 7 dní“...) – bez diakritiky
+_RELATIVE_TIME_RE = re.compile(
+    r"\b(?:dnes\w*|vcera\w*|predvcera\w*|zajtra\w*|tent[oa]|toht[oa]|tomto|tejto|tuto|teraz\w*|"
+    r"aktualn\w*|minul\w*|buduc\w*|posledn\w*|predchadzaj\w*|ytd|mtd)\b")
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _time_bound(question: str, sql: str) -> bool:
+    """
+    Výsledok závisí od dnešného dátumu (LLM ho dostáva v prompte a odvodzuje
+    z neho „tento mesiac“, „minulý rok“...) – také SQL sa necachuje.
+    """
+    if _DATE_LITERAL_RE.search(sql or ""):
+        return True
+    return bool(_RELATIVE_TIME_RE.search(_strip_accents((question or "").lower())))
+
+
+def compiled_sql(question: str, context: str = "") -> Optional[str]:
+    """Overené SQL pre otázku (context = text schémy; pri zmene schémy sa cache minie)."""
+    if not (question or "").strip():
+        return None
+    if _time_bound(question, ""):
+        return None
+    ensure_schema()
+    qkey = _question_key(question, context)
+    row = db_connector.execute_query(
+        "SELECT sql_text FROM ai_sql_cache WHERE qkey=%s AND created_at >= NOW() - INTERVAL %s DAY",
+        (qkey, COMPILED_TTL_DAYS), fetch="one",
+    )
+    if not row:
+        return None
+    if _time_bound(question, row["sql_text"]):
+        # uložené skôr, než sa SQL viazané na dátum prestali ukladať
+        forget_sql(question, context)
+        return None
+    db_connector.execute_query(
+        "UPDATE ai_sql_cache SET hits = hits + 1, last_used_at = NOW() WHERE qkey=%s", (qkey,), fetch="none"
+    )
+    return row["sql_text"]
+
+
+def remember_sql(question: str, sql: str, context: str = "") -> None:
+    """
+    Uloží SQL, ktoré prešlo. Otázka s relatívnym obdobím alebo SQL s dátumom
+    či rokom natvrdo by o deň (mesiac) vrátili zlé dáta – také sa neukladá.
+    """
+    if not (question or "").strip() or not (sql or "").strip():
+        return
+    if _time_bound(question, sql):
+        return
+    ensure_schema()
+    db_connector.execute_query("""
+        INSERT INTO ai_sql_cache (qkey, question, sql_text, hits, created_at, last_used_at)
+        VALUES (%s, %s, %s, 0, NOW(), NOW())
+        ON DUPLICATE KEY UPDATE sql_text = VALUES(sql_text), created_at = NOW(), last_used_at = NOW()
+    """, (_question_key(question, context), question.strip(), sql.strip()), fetch="none")
+
+
+def forget_sql(question: str, context: str = "") -> None:
+    ensure_schema()
+    db_connector.execute_query(
+        "DELETE FROM ai_sql_cache WHERE qkey=%s", (_question_key(question, context),), fetch="none"
+    )
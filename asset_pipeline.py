@@ -0,0 +1,228 @@
+# =================================================================
+# === STATICKÉ ASSETY: FINGERPRINT + MINIFIKÁCIA + PREDKOMPRESIA ===
+# =================================================================
+#
+# Build (pri deployi, po git pull):
+#     python asset_pipeline.py            # static/js + static/css -> static/dist
+#     python asset_pipeline.py --no-minify
+#
+# Pre každý .js/.css vznikne static/dist/<cesta>.<hash>.<ext> (hash z obsahu)
+# plus .gz a .br variant a static/dist/manifest.json {"js/b2c.js": "js/b2c.1a2b3c4d5e.js"}.
+# app.py ich servíruje cez /assets/<súbor> s immutable cache hlavičkami a
+# predkomprimovaným variantom podľa Accept-Encoding; šablóny volajú
+# {{ asset_url('js/b2c.js') }}. Bez buildu (vývoj) asset_url vráti bežnú
+# /static/ URL s ?v=<mtime>, takže stránky fungujú aj bez manifestu.
+#
+# JS minifikuje externý nástroj (esbuild / terser na PATH), ak je dostupný;
+# inak sa JS len predkomprimuje. CSS sa minifikuje konzervatívne v Pythone.
+# =================================================================
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from typing import Any, Dict, Optional
+
+try:
+    import brotli  # Brotli je v requirements.txt; bez neho ostane len gzip
+except ImportError:  # pragma: no cover
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+SOURCE_DIRS = ("js", "css")
+EXTENSIONS = (".js", ".css")
+URL_PREFIX = "/assets/"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+COMPRESS_MIN_BYTES = 1024
+
+
+# --- BUILD --------------------------------------------------------------------
+def _minify_css(text: str) -> str:
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip()
+
+
+def _js_minifier() -> Optional[list]:
+    if shutil.which("esbuild"):
+        return ["esbuild", "--minify", "--log-level=error"]
+    if shutil.which("terser"):
+        return ["terser", "--compress", "--mangle"]
+    return None
+
+
+def _minify_js(text: str, cmd: Optional[list]) -> str:
+    if not cmd:
+        return text
+    try:
+        res = subprocess.run(cmd, input=text.encode("utf-8"), capture_output=True, timeout=120)
+        if res.returncode == 0 and res.stdout.strip():
+            return res.stdout.decode("utf-8")
+        print(f"[ASSETS] minifikácia zlyhala ({cmd[0]}): {res.stderr.decode('utf-8', 'replace')[:300]}")
+    except Exception as e:
+        print(f"[ASSETS] minifikácia zlyhala ({cmd[0]}): {e}")
+    return text
+
+
+def _fingerprinted(rel: str, digest: str) -> str:
+    root, ext = os.path.splitext(rel)
+    return f"{root}.{digest}{ext}"
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_manifest() -> Dict[str, Any]:
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def build(minify: bool = True) -> Dict[str, Any]:
+    """Spracuje static/js a static/css do static/dist a zapíše manifest."""
+    js_cmd = _js_minifier() if minify else None
+    previous = _read_manifest()
+    assets: Dict[str, str] = {}
+    bytes_in = bytes_out = 0
+
+    for sub in SOURCE_DIRS:
+        for root, _, files in os.walk(os.path.join(STATIC_DIR, sub)):
+            for name in sorted(files):
+                if not name.endswith(EXTENSIONS):
+                    continue
+                src = os.path.join(root, name)
+                rel = os.path.relpath(src, STATIC_DIR).replace(os.sep, "/")
+                with open(src, "r", encoding="utf-8", errors="surrogateescape") as f:
+                    text = f.read()
+                if minify and name.endswith(".css"):
+                    text = _minify_css(text)
+                elif minify and not name.endswith(".min.js"):
+                    text = _minify_js(text, js_cmd)
+                data = text.encode("utf-8", errors="surrogateescape")
+                out_rel = _fingerprinted(rel, hashlib.sha256(data).hexdigest()[:10])
+                out = os.path.join(DIST_DIR, out_rel)
+                if not os.path.exists(out):
+                    _write(out, data)
+                    if len(data) >= COMPRESS_MIN_BYTES:
+                        _write(out + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+                        if brotli is not None:
+                            _write(out + ".br", brotli.compress(data, quality=11))
+                assets[rel] = out_rel
+                bytes_in += os.path.getsize(src)
+                bytes_out += len(data)
+
+    manifest = {
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "assets": assets,
+        # predchádzajúci build necháme na disku – otvorené stránky ho ešte môžu načítať
+        "previous": sorted(set((previous.get("assets") or {}).values()) - set(assets.values())),
+    }
+    _prune(set(assets.values()) | set(manifest["previous"]))
+    _write(MANIFEST_PATH, json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"))
+    return {"files": len(assets), "bytes_in": bytes_in, "bytes_out": bytes_out,
+            "js_minifier": js_cmd[0] if js_cmd else None, "brotli": brotli is not None}
+
+
+def _prune(keep: set) -> None:
+    for root, _, files in os.walk(DIST_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, DIST_DIR).replace(os.sep, "/")
+            base = rel[:-3] if rel.endswith((".gz", ".br")) else rel
+            if base != "manifest.json" and base not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+# --- RUNTIME (Flask) ----------------------------------------------------------
+_manifest_lock = threading.Lock()
+_manifest: Dict[str, str] = {}
+_manifest_mtime: Optional[float] = None
+_manifest_checked = 0.0
+
+
+def _assets() -> Dict[str, str]:
+    """Manifest z disku; znovu sa načíta, keď ho nový build prepíše (stat max raz za 5 s)."""
+    global _manifest, _manifest_mtime, _manifest_checked
+    now = time.monotonic()
+    if now - _manifest_checked < 5:
+        return _manifest
+    with _manifest_lock:
+        _manifest_checked = now
+        try:
+            mtime = os.path.getmtime(MANIFEST_PATH)
+        except OSError:
+            _manifest, _manifest_mtime = {}, None
+            return _manifest
+        if mtime != _manifest_mtime:
+            _manifest = _read_manifest().get("assets") or {}
+            _manifest_mtime = mtime
+    return _manifest
+
+
+def asset_url(filename: str) -> str:
+    """Template helper: fingerprintovaná URL, bez buildu /static/<súbor>?v=<mtime>."""
+    hashed = _assets().get(filename)
+    if hashed:
+        return URL_PREFIX + hashed
+    from flask import url_for
+    try:
+        v = int(os.path.getmtime(os.path.join(STATIC_DIR, filename)))
+    except OSError:
+        v = None
+    return url_for("static", filename=filename, v=v) if v else url_for("static", filename=filename)
+
+
+def send_asset(filename: str):
+    """Odpoveď pre /assets/<filename>: .br / .gz variant podľa Accept-Encoding, immutable cache."""
+    from flask import abort, request, send_from_directory
+
+    path = os.path.normpath(os.path.join(DIST_DIR, filename))
+    if not path.startswith(DIST_DIR + os.sep) or filename.endswith((".gz", ".br", "manifest.json")) \
+            or not os.path.isfile(path):
+        abort(404)
+
+    accept = request.headers.get("Accept-Encoding", "")
+    encoding = None
+    if "br" in accept and os.path.isfile(path + ".br"):
+        encoding = "br"
+    elif "gzip" in accept and os.path.isfile(path + ".gz"):
+        encoding = "gzip"
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if encoding:
+        resp = send_from_directory(DIST_DIR, filename + (".br" if encoding == "br" else ".gz"),
+                                   mimetype=mimetype)
+        resp.headers["Content-Encoding"] = encoding
+    else:
+        resp = send_from_directory(DIST_DIR, filename, mimetype=mimetype)
+    resp.headers["Cache-Control"] = IMMUTABLE_CACHE
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fingerprint + minifikácia + gzip/brotli statických assetov")
+    ap.add_argument("--no-minify", action="store_true", help="bez minifikácie (len hash + kompresia)")
+    args = ap.parse_args()
+    print(json.dumps(build(minify=not args.no_minify), ensure_ascii=False))
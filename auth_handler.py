@@ -1,10 +1,9 @@
 # auth_handler.py
-import hashlib
-import hmac
-import os
 from functools import wraps
 from flask import session, request, redirect, url_for, jsonify
 
+import auth_service
+
 # =================================================================
 # === HESLÁ (interní používatelia)
 # =================================================================
@@ -12,33 +11,29 @@ from flask import session, request, redirect, url_for, jsonify
 def generate_password_hash(password: str):
     """
     Vytvorí salt + hash (PBKDF2-HMAC-SHA256, 250k iterácií) a vracia ich v HEX.
+    Výpočet beží v process poole auth_service (mimo web workera).
     """
-    salt = os.urandom(32)
-    key = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 250000)
-    return salt.hex(), key.hex()
+    return auth_service.hash_password(password, salt_len=32,
+                                      iterations=auth_service.LEGACY_ITERATIONS)
 
 
 def _to_bytes_hex_or_raw(value) -> bytes:
     """
     Prijme hex-string / ascii-bytes-of-hex / raw-bytes a vráti raw bytes.
     """
-    if isinstance(value, (bytes, bytearray)):
-        try:
-            return bytes.fromhex(value.decode('ascii'))
-        except Exception:
-            return bytes(value)
-    return bytes.fromhex(str(value))
+    return auth_service.to_bytes(value)
 
 
-def verify_password(password: str, salt_in, hash_in) -> bool:
+def verify_password(password: str, salt_in, hash_in, iterations: int = None) -> bool:
     """
     Overí heslo. Funguje pre HEX aj RAW hodnoty v DB.
+    iterations=None -> pôvodných 250k (viď auth_service.stored_iterations).
+    Pri plnom fronte hashovania vyhodí auth_service.AuthBusy.
     """
     try:
-        salt = _to_bytes_hex_or_raw(salt_in)
-        stored_key = _to_bytes_hex_or_raw(hash_in)
-        new_key = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 250000)
-        return hmac.compare_digest(new_key, stored_key)
+        return auth_service.verify(password, salt_in, hash_in, iterations)
+    except auth_service.AuthBusy:
+        raise
     except Exception:
         return False
 
@@ -0,0 +1,319 @@
+# =================================================================
+# === AUTH SERVICE: PBKDF2 MIMO WEB WORKERA + RATE LIMIT + CACHE ===
+# =================================================================
+#
+#  - Overovanie/hashovanie hesiel (PBKDF2-SHA256) beží v obmedzenom
+#    process poole (AUTH_HASH_WORKERS, front AUTH_HASH_QUEUE) – ranná špička
+#    prihlásení tak nevyhladuje ostatné requesty workera.
+#  - Rate limit pokusov o prihlásenie per účet a per IP (posuvné okno).
+#  - Transparentný rehash: ak sa zmení AUTH_PBKDF2_ITERATIONS, pri
+#    najbližšom úspešnom prihlásení sa heslo prepočíta. Počet iterácií
+#    sa drží v auth_pw_params viazaný na odtlačok hashu – akýkoľvek iný
+#    zápis hesla (reset, registrácia) ho automaticky zneplatní a platí
+#    pôvodných 250 000 iterácií.
+#  - Krátkodobá cache odvodenej identity/payloadu pre session.
+#
+# Modul závisí len na štandardnej knižnici (+ db_connector lenivo),
+# aby ho mohol importovať auth_handler aj spawnutý pracovný proces.
+# =================================================================
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+LEGACY_ITERATIONS = 250000
+PBKDF2_ITERATIONS = int(os.getenv("AUTH_PBKDF2_ITERATIONS", str(LEGACY_ITERATIONS)))
+HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", "16"))
+HASH_TIMEOUT = float(os.getenv("AUTH_HASH_TIMEOUT", "10"))
+
+ACCOUNT_MAX_FAILS = int(os.getenv("AUTH_ACCOUNT_MAX_FAILS", "5"))
+ACCOUNT_WINDOW_S = int(os.getenv("AUTH_ACCOUNT_WINDOW_S", "900"))
+IP_MAX_ATTEMPTS = int(os.getenv("AUTH_IP_MAX_ATTEMPTS", "30"))
+IP_WINDOW_S = int(os.getenv("AUTH_IP_WINDOW_S", "300"))
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+
+IDENTITY_TTL_S = int(os.getenv("AUTH_IDENTITY_TTL_S", "120"))
+
+
+class AuthBusy(Exception):
+    """Front na hashovanie je plný – klient má skúsiť o chvíľu znova."""
+
+
+# --- PBKDF2 v process poole ---------------------------------------------------
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    # top-level kvôli picklovaniu do pracovného procesu
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, int(iterations))
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_slots = threading.BoundedSemaphore(max(1, HASH_QUEUE))
+
+
+def _executor() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if HASH_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            try:
+                import multiprocessing
+                # spawn – gunicorn worker má vlákna (scheduler, generátor), fork by ich zdedil
+                _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+            except Exception as e:
+                print(f"[AUTH] Process pool sa nepodarilo vytvoriť, hashujem v procese: {e}")
+                return None
+        return _pool
+
+
+def pbkdf2(password: str, salt: bytes, iterations: int = LEGACY_ITERATIONS) -> bytes:
+    """PBKDF2-SHA256 – v process poole, ak je k dispozícii. Pri plnom fronte AuthBusy."""
+    if not _slots.acquire(timeout=HASH_TIMEOUT):
+        raise AuthBusy("Príliš veľa súčasných prihlásení, skúste o chvíľu.")
+    try:
+        ex = _executor()
+        if ex is None:
+            return _pbkdf2(password, salt, iterations)
+        try:
+            return ex.submit(_pbkdf2, password, salt, iterations).result(timeout=HASH_TIMEOUT)
+        except AuthBusy:
+            raise
+        except Exception as e:
+            # BrokenProcessPool / timeout – nech prihlásenie nespadne
+            print(f"[AUTH] Process pool zlyhal ({e}), hashujem v procese.")
+            _reset_pool()
+            return _pbkdf2(password, salt, iterations)
+    finally:
+        _slots.release()
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        p, _pool = _pool, None
+    if p is not None:
+        try:
+            p.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+
+
+def to_bytes(value) -> bytes:
+    """Prijme hex-string / ascii-bytes-of-hex / raw-bytes a vráti raw bytes."""
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            return bytes.fromhex(value.decode("ascii"))
+        except Exception:
+            return bytes(value)
+    return bytes.fromhex(str(value or ""))
+
+
+def verify(password: str, salt_in, hash_in, iterations: Optional[int] = None) -> bool:
+    try:
+        salt = to_bytes(salt_in)
+        stored = to_bytes(hash_in)
+    except Exception:
+        return False
+    if not salt or not stored:
+        return False
+    new_key = pbkdf2(password, salt, iterations or LEGACY_ITERATIONS)
+    return hmac.compare_digest(new_key, stored)
+
+
+def hash_password(password: str, salt_len: int = 32,
+                  iterations: Optional[int] = None) -> Tuple[str, str]:
+    salt = os.urandom(salt_len)
+    return salt.hex(), pbkdf2(password, salt, iterations or PBKDF2_ITERATIONS).hex()
+
+
+# --- Iterácie viazané na odtlačok hashu --------------------------------------
+_params_ready = False
+
+
+def _fingerprint(hash_in) -> str:
+    try:
+        raw = to_bytes(hash_in)
+    except Exception:
+        raw = str(hash_in or "").encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
+def _ensure_params_table() -> None:
+    global _params_ready
+    if _params_ready:
+        return
+    import db_connector
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS auth_pw_params (
+            scope       VARCHAR(32)  NOT NULL,
+            account_id  VARCHAR(64)  NOT NULL,
+            hash_fp     CHAR(32)     NOT NULL,
+            iterations  INT          NOT NULL,
+            updated_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (scope, account_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch="none")
+    _params_ready = True
+
+
+def stored_iterations(scope: str, account_id, hash_in) -> int:
+    """Počet iterácií pre aktuálny hash účtu (inak legacy 250 000)."""
+    import db_connector
+    _ensure_params_table()
+    row = db_connector.execute_query(
+        "SELECT hash_fp, iterations FROM auth_pw_params WHERE scope=%s AND account_id=%s",
+        (scope, str(account_id)), fetch="one"
+    )
+    if row and row.get("hash_fp") == _fingerprint(hash_in):
+        return int(row["iterations"])
+    return LEGACY_ITERATIONS
+
+
+def rehash_if_needed(scope: str, account_id, password: str, salt_in, current_iterations: int,
+                     table: str, id_col: str, salt_col: str, hash_col: str) -> bool:
+    """
+    Po úspešnom overení: ak sa líši počet iterácií od konfigurácie,
+    prepočíta hash a v jednej transakcii zapíše účet aj auth_pw_params.
+    """
+    if current_iterations == PBKDF2_ITERATIONS:
+        return False
+    import db_connector
+    _ensure_params_table()
+    try:
+        salt_len = len(to_bytes(salt_in)) or 32
+    except Exception:
+        salt_len = 32
+    try:
+        salt_hex, hash_hex = hash_password(password, salt_len=salt_len)
+    except AuthBusy:
+        return False  # skúsime pri ďalšom prihlásení
+
+    def work(conn):
+        cur = conn.cursor()
+        cur.execute(f"UPDATE {table} SET {salt_col}=%s, {hash_col}=%s WHERE {id_col}=%s",
+                    (salt_hex, hash_hex, account_id))
+        cur.execute("""
+            INSERT INTO auth_pw_params (scope, account_id, hash_fp, iterations)
+            VALUES (%s,%s,%s,%s)
+            ON DUPLICATE KEY UPDATE hash_fp=VALUES(hash_fp), iterations=VALUES(iterations)
+        """, (scope, str(account_id), _fingerprint(hash_hex), PBKDF2_ITERATIONS))
+        cur.close()
+
+    try:
+        db_connector.with_transaction(work)
+        return True
+    except Exception as e:
+        print(f"[AUTH] Rehash {scope}:{account_id} zlyhal: {e}")
+        return False
+
+
+# --- Rate limit ---------------------------------------------------------------
+class _SlidingWindow:
+    def __init__(self, limit: int, window_s: int):
+        self.limit = limit
+        self.window_s = window_s
+        self._hits: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def _trim(self, key: str, now: float) -> deque:
+        q = self._hits.get(key)
+        if q is None:
+            q = self._hits[key] = deque()
+        while q and now - q[0] > self.window_s:
+            q.popleft()
+        return q
+
+    def exceeded(self, key: str) -> bool:
+        if not key or self.limit <= 0:
+            return False
+        with self._lock:
+            return len(self._trim(key, time.time())) >= self.limit
+
+    def hit(self, key: str) -> None:
+        if not key:
+            return
+        now = time.time()
+        with self._lock:
+            self._trim(key, now).append(now)
+            if len(self._hits) > 10000:
+                for k in [k for k, q in self._hits.items() if not q]:
+                    del self._hits[k]
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+_account_fails = _SlidingWindow(ACCOUNT_MAX_FAILS, ACCOUNT_WINDOW_S)
+_ip_attempts = _SlidingWindow(IP_MAX_ATTEMPTS, IP_WINDOW_S)
+
+
+def client_ip(req=None) -> str:
+    """
+    IP klienta pre limity prihlásenia. Prvú položku X-Forwarded-For si klient
+    podvrhne sám – berieme tú, ktorú pridal posledný dôveryhodný proxy
+    (TRUSTED_PROXY_HOPS-tá sprava). Bez proxy (0) len remote_addr.
+    """
+    try:
+        if req is None:
+            from flask import request as req  # type: ignore
+        if TRUSTED_PROXY_HOPS > 0:
+            hops = [h.strip() for h in (req.headers.get("X-Forwarded-For") or "").split(",") if h.strip()]
+            if len(hops) >= TRUSTED_PROXY_HOPS:
+                return hops[-TRUSTED_PROXY_HOPS]
+        return req.remote_addr or ""
+    except Exception:
+        return ""
+
+
+def check_login_allowed(account_key: str, ip: str) -> Optional[str]:
+    """Vráti chybovú hlášku, ak je účet/IP dočasne zablokovaný, inak None."""
+    if _ip_attempts.exceeded(ip):
+        return "Príliš veľa pokusov o prihlásenie z tejto adresy. Skúste to o niekoľko minút."
+    if _account_fails.exceeded(account_key):
+        return "Príliš veľa neúspešných pokusov pre tento účet. Skúste to o niekoľko minút."
+    return None
+
+
+def record_login_result(account_key: str, ip: str, ok: bool) -> None:
+    _ip_attempts.hit(ip)
+    if ok:
+        _account_fails.reset(account_key)
+    else:
+        _account_fails.hit(account_key)
+
+
+# --- Cache identity / payloadu ------------------------------------------------
+_identity_lock = threading.Lock()
+_identity_cache: Dict[str, Tuple[float, Any]] = {}
+
+
+def cached_identity(key: str, builder: Callable[[], Any], ttl: int = IDENTITY_TTL_S) -> Any:
+    now = time.time()
+    with _identity_lock:
+        hit = _identity_cache.get(key)
+        if hit and now - hit[0] < ttl:
+            return hit[1]
+    value = builder()
+    with _identity_lock:
+        _identity_cache[key] = (now, value)
+        if len(_identity_cache) > 5000:
+            for k, (ts, _) in list(_identity_cache.items()):
+                if now - ts >= ttl:
+                    del _identity_cache[k]
+    return value
+
+
+def invalidate_identity(prefix: str = "") -> None:
+    with _identity_lock:
+        if not prefix:
+            _identity_cache.clear()
+            return
+        for k in [k for k in _identity_cache if k.startswith(prefix)]:
+            del _identity_cache[k]
@@ -7,6 +7,13 @@ from typing import Any, Dict, List, Tuple
 from flask import request
 
 import db_connector
+import auth_service
+import dashboard_snapshots
+import http_cache
+import search_index
+import sales_fact
+import order_events
+import order_history
 import pdf_generator
 import notification_handler
 
@@ -35,6 +42,7 @@ def _exec_ddl(sql: str) -> None:
         db_connector.execute_query(sql, fetch="none")
     except Exception:
         pass
+    _columns_cache.clear()
 
 def _ensure_system_settings() -> None:
     _exec_ddl("""
@@ -101,7 +109,14 @@ def _ensure_comm_table() -> None:
       FOREIGN KEY (customer_id) REFERENCES b2b_zakaznici(id) ON DELETE SET NULL
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_slovak_ci
     """)
+_COLUMNS_TTL_S = 300
+_columns_cache: Dict[str, Tuple[float, set]] = {}
+
 def _existing_columns(table_name: str) -> set[str]:
+    # information_schema je pomalý a schéma sa mení zriedka -> krátka cache
+    hit = _columns_cache.get(table_name)
+    if hit and time.time() - hit[0] < _COLUMNS_TTL_S:
+        return hit[1]
     try:
         rows = db_connector.execute_query(
             """
@@ -112,7 +127,10 @@ def _existing_columns(table_name: str) -> set[str]:
             (table_name,),
             fetch="all",
         ) or []
-        return {r.get("COLUMN_NAME") for r in rows}
+        cols = {r.get("COLUMN_NAME") for r in rows}
+        if cols:
+            _columns_cache[table_name] = (time.time(), cols)
+        return cols
     except Exception:
         traceback.print_exc()
         return set()
@@ -197,12 +215,12 @@ def _hash_password(password: str) -> Tuple[str, str]:
     key = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, 250000)
     return salt.hex(), key.hex()
 
-def _verify_password(password: str, salt_hex: str, hash_hex: str) -> bool:
+def _verify_password(password: str, salt_hex: str, hash_hex: str, iterations: int = None) -> bool:
+    # PBKDF2 beží v process poole auth_service; AuthBusy necháme prebublať
     try:
-        salt = bytes.fromhex(salt_hex or "")
-        stored = bytes.fromhex(hash_hex or "")
-        new = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, 250000)
-        return secrets.compare_digest(new, stored)
+        return auth_service.verify(password, salt_hex, hash_hex, iterations)
+    except auth_service.AuthBusy:
+        raise
     except Exception:
         return False
 
@@ -256,7 +274,17 @@ def get_products_for_pricelist(pricelist_id):
         out.setdefault(r.get("predajna_kategoria") or "Nezaradené", []).append(r)
     return {"productsByCategory": out}
 
+def _invalidate_portal_cache() -> None:
+    """Zmena cenníkov / priradení / oznamu -> zahodiť cachovaný payload portálu a ETag cenníkov."""
+    auth_service.invalidate_identity("b2b:")
+    http_cache.bump("pricelists")
+
 def _portal_customer_payload(login_id: str):
+    return auth_service.cached_identity(
+        f"b2b:payload:{login_id}", lambda: _build_portal_customer_payload(login_id)
+    )
+
+def _build_portal_customer_payload(login_id: str):
     _ensure_system_settings()
     pricelists = db_connector.execute_query(
         """
@@ -322,16 +350,34 @@ def process_b2b_login(data: dict):
     if "typ" in cols_in_db:
         where += " AND typ='B2B'"
 
+    rl_key = f"b2b:{str(zakaznik_id).strip().lower()}"
+    ip = auth_service.client_ip(request)
+    blocked = auth_service.check_login_allowed(rl_key, ip)
+    if blocked:
+        return {"error": blocked}
+
     q = f"SELECT {', '.join(select_parts)} FROM b2b_zakaznici {where} LIMIT 1"
     user = db_connector.execute_query(q, (zakaznik_id,), fetch="one")
 
-    ok = user and _verify_password(
-        password,
-        user.get("password_salt_hex"),
-        user.get("password_hash_hex"),
-    )
+    iterations = (auth_service.stored_iterations("b2b", user["id"], user.get("password_hash_hex"))
+                  if user else None)
+    try:
+        ok = bool(user) and _verify_password(
+            password,
+            user.get("password_salt_hex"),
+            user.get("password_hash_hex"),
+            iterations,
+        )
+    except auth_service.AuthBusy as e:
+        return {"error": str(e)}
+    auth_service.record_login_result(rl_key, ip, ok)
     if not ok:
         return {"error": "Nesprávne meno alebo heslo."}
+    auth_service.rehash_if_needed(
+        "b2b", user["id"], password, user.get("password_salt_hex"), iterations, "b2b_zakaznici", "id",
+        "password_salt_hex" if "password_salt_hex" in cols_in_db else "heslo_salt",
+        "password_hash_hex" if "password_hash_hex" in cols_in_db else "heslo_hash",
+    )
     if (not user.get("je_admin")) and str(user.get("je_schvaleny")) in ("0", "False", "false"):
         return {"error": "Účet zatiaľ nebol schválený administrátorom."}
 
@@ -370,7 +416,7 @@ def process_b2b_login(data: dict):
     # Ak má sub-účty, cenníky sa načítajú až po výbere pobočky (frontend zavolá reload).
     if resp["role"] == "zakaznik":
         resp |= _portal_customer_payload(user["zakaznik_id"])
-        
+
     return {"message": "Prihlásenie úspešné.", "userData": resp}
 # ───────────────── Registrácia / Reset ─────────────────
 def process_b2b_registration(data: dict):
@@ -465,6 +511,8 @@ def process_b2b_registration(data: dict):
     except Exception as e:
         traceback.print_exc()
         return {"error": f"Registrácia zlyhala: {getattr(e, 'msg', str(e))}"}
+    dashboard_snapshots.invalidate("kancelaria_home", "b2c_dashboard")
+    search_index.invalidate("customers")
 
     # 10. Odoslanie notifikácií (Email zákazníkovi + Alert adminovi)
     try:
@@ -677,6 +725,11 @@ def approve_b2b_registration(data: dict):
     except Exception:
         traceback.print_exc()
 
+    _invalidate_portal_cache()
+    dashboard_snapshots.invalidate("kancelaria_home")
+    search_index.refresh("b2b", [reg_id])
+    if existing_manual:
+        search_index.refresh("manual", [existing_manual["id"]])
     return {"message": "Registrácia úspešne schválená a notifikácia odoslaná."}
 
 def reject_b2b_registration(data: dict):
@@ -688,6 +741,8 @@ def reject_b2b_registration(data: dict):
         fetch="one",
     )
     db_connector.execute_query("DELETE FROM b2b_zakaznici WHERE id=%s", (reg_id,), fetch="none")
+    dashboard_snapshots.invalidate("kancelaria_home")
+    search_index.refresh("b2b", [reg_id])
     if row:
         try:
             notification_handler.send_rejection_email(row["email"], row["nazov_firmy"], reason)
@@ -849,6 +904,8 @@ def update_customer_details(data: dict):
             cur2.close()
             conn2.close()
 
+    _invalidate_portal_cache()
+    search_index.refresh("manual" if is_manual else "b2b", [cid])
     return {"message": "Zákazník bol aktualizovaný a cenník sa úspešne aplikoval."}
 
 def delete_b2b_customer(data: dict):
@@ -867,6 +924,8 @@ def delete_b2b_customer(data: dict):
         try:
             db_connector.execute_query("DELETE FROM b2b_zakaznik_cennik WHERE zakaznik_id=%s", (cust['zakaznik_id'],), fetch="none")
             db_connector.execute_query("DELETE FROM b2b_manual_zakaznici WHERE id=%s", (cid,), fetch="none")
+            _invalidate_portal_cache()
+            search_index.refresh("manual", [cid])
             return {"message": f"Manuálny profil '{cust['nazov_firmy']}' bol odstránený."}
         except Exception as e:
             return {"error": f"Chyba pri mazaní: {str(e)}"}
@@ -875,6 +934,9 @@ def delete_b2b_customer(data: dict):
         cust = db_connector.execute_query("SELECT id, zakaznik_id, nazov_firmy FROM b2b_zakaznici WHERE id=%s", (cid,), fetch="one")
         if not cust: return {"error": "Zákazník už neexistuje."}
         login = cust["zakaznik_id"]
+        # id objednávok ešte pred zmazaním – rezervácie a fakty predaja sa musia prepočítať
+        order_ids = [r["id"] for r in (db_connector.execute_query(
+            "SELECT id FROM b2b_objednavky WHERE zakaznik_id=%s", (login,), fetch="all") or [])]
         try:
             db_connector.execute_query("DELETE FROM b2b_kosik WHERE zakaznik_id=%s", (login,), fetch="none")
             db_connector.execute_query("DELETE FROM b2b_objednavky_polozky WHERE objednavka_id IN (SELECT id FROM b2b_objednavky WHERE zakaznik_id = %s)", (login,), fetch="none")
@@ -882,6 +944,10 @@ def delete_b2b_customer(data: dict):
             db_connector.execute_query("DELETE FROM b2b_zakaznik_cennik WHERE zakaznik_id=%s", (login,), fetch="none")
             db_connector.execute_query("DELETE FROM b2b_messages WHERE customer_id=%s", (cid,), fetch="none")
             db_connector.execute_query("DELETE FROM b2b_zakaznici WHERE id=%s", (cid,), fetch="none")
+            if order_ids:
+                order_events.on_orders_changed("b2b", order_ids)
+            _invalidate_portal_cache()
+            search_index.refresh("b2b", [cid])
             return {"message": f"Testovací profil '{cust['nazov_firmy']}' bol odstránený."}
         except Exception as e:
             import traceback
@@ -1042,6 +1108,7 @@ def create_pricelist(data: dict):
         conn.commit()
         result = {"message": "Cenník vytvorený.", "id": pl_id, "count": len(batch)}
         if skipped: result["skipped_eans"] = skipped
+        _invalidate_portal_cache()
         return result
 
     except Exception as e:
@@ -1108,6 +1175,7 @@ def update_pricelist(data: dict):
 
         if not cleaned:
             conn.commit()
+            _invalidate_portal_cache()
             return {"message": "Cenník aktualizovaný (prázdny).", "count": 0}
 
         # 4) ukladáme riadok po riadku
@@ -1138,6 +1206,7 @@ def update_pricelist(data: dict):
                 pass
 
         conn.commit()
+        _invalidate_portal_cache()
         return {"message": "Cenník a názov boli aktualizované.", "count": inserted}
 
     except Exception as e:
@@ -1180,6 +1249,7 @@ def save_announcement(data: dict):
     else:
         db_connector.execute_query("INSERT INTO system_settings (kluc, hodnota) VALUES ('b2b_announcement_important', %s)", (is_important,), fetch='none')
         
+    _invalidate_portal_cache()
     return {"message": "Oznam uložený."}
 def _get_pricelist_price_map(login_id: str, eans: List[str]) -> Dict[str, float]:
     try:
@@ -1406,6 +1476,7 @@ def submit_b2b_order(data: dict):
         try:
             cur.close(); conn.close()
         except: pass
+    order_events.on_orders_changed("b2b", oid)
 
  # 7. Generovanie PDF/CSV a odoslanie e-mailov
     import copy
@@ -1588,6 +1659,8 @@ def create_b2b_branch(data: dict):
             )
         
         conn.commit()
+        _invalidate_portal_cache()
+        search_index.invalidate("customers")
         return {"message": f"Pobočka '{name}' vytvorená."}
     except Exception as e:
         conn.rollback()
@@ -1984,14 +2057,17 @@ def portal_message_send(req):
 
     return {"message":"Správa bola odoslaná."}
 
-def portal_my_messages(user_id: int, page:int=1, page_size:int=50):
+order_history.register_index("b2b_messages", "idx_msg_customer", ["customer_id", "created_at", "id"])
+
+def portal_my_messages(user_id: int, page_size: int = 50, cursor: str = None):
     _ensure_comm_table()
-    off = max(0, (int(page or 1)-1)*max(1,int(page_size or 50)))
-    rows = db_connector.execute_query(
-        "SELECT id, created_at, subject, body, direction, status, attachment_filename FROM b2b_messages WHERE customer_id=%s ORDER BY created_at DESC LIMIT %s OFFSET %s",
-        (user_id, max(1,int(page_size or 50)), off)
-    ) or []
-    return {"messages": rows}
+    page = order_history.keyset_page(
+        "b2b_messages",
+        "id, created_at, subject, body, direction, status, attachment_filename",
+        "customer_id=%s", (user_id,),
+        ts_col="created_at", ts_key="created_at", cursor=cursor, limit=page_size,
+    )
+    return {"messages": page["rows"], "next_cursor": page["next_cursor"]}
 
 def admin_messages_list(args):
     _ensure_comm_table()
@@ -2207,22 +2283,50 @@ def delete_pricelist(data: dict):
         (pl_id,), 
         fetch='none'
     )
+    _invalidate_portal_cache()
     return {"message": "Cenník bol úspešne vymazaný."}
 
 
-def get_order_history(user_id):
-    """Vráti históriu objednávok pre daného zákazníka."""
+order_history.register_index("b2b_objednavky", "idx_hist_customer", ["zakaznik_id", "datum_objednavky", "id"])
+
+
+def get_order_history(user_id, cursor=None, limit=None):
+    """
+    História objednávok zákazníka po stránkach (najnovšie prvé), len súhrnné riadky.
+    Ďalšiu stránku vráti `next_cursor`; položky načíta get_order_history_items().
+    """
     login = _login_from_user_id(user_id) or user_id
-    rows = db_connector.execute_query(
+    page = order_history.keyset_page(
+        "b2b_objednavky",
+        "id, cislo_objednavky, datum_objednavky AS datum_vytvorenia, stav, celkova_suma_s_dph, poznamka",
+        "zakaznik_id=%s", (login,),
+        ts_col="datum_objednavky", ts_key="datum_vytvorenia", cursor=cursor, limit=limit,
+    )
+    return {"orders": page["rows"], "next_cursor": page["next_cursor"]}
+
+
+def get_order_history_items(user_id, order_id):
+    """Položky jednej objednávky z histórie (len vlastnej)."""
+    login = _login_from_user_id(user_id) or user_id
+    if not order_id:
+        return {"error": "Chýba ID objednávky."}
+    order = db_connector.execute_query(
+        "SELECT id FROM b2b_objednavky WHERE id=%s AND zakaznik_id=%s",
+        (order_id, login), fetch="one",
+    )
+    if not order:
+        return {"error": "Objednávka neexistuje."}
+    items = db_connector.execute_query(
         """
-        SELECT id, cislo_objednavky, datum_objednavky AS datum_vytvorenia, stav, celkova_suma_s_dph, poznamka
-        FROM b2b_objednavky
-        WHERE zakaznik_id=%s
-        ORDER BY datum_objednavky DESC
+        SELECT ean_produktu AS ean, nazov_vyrobku AS name, mnozstvo AS quantity, dodane_mnozstvo AS delivered,
+               mj AS unit, cena_bez_dph AS price, dph, poznamka AS item_note
+        FROM b2b_objednavky_polozky
+        WHERE objednavka_id=%s
+        ORDER BY id
         """,
-        (login,),
+        (order_id,),
     ) or []
-    return {"orders": rows}
+    return {"id": order["id"], "items": items}
 
 
 def get_customer_360_view(data: dict):
@@ -2252,45 +2356,10 @@ def get_customer_360_view(data: dict):
 
     login = cust["zakaznik_id"]
 
-    # Generovanie časovej podmienky do SQL
-    date_sql = ""
-    if time_filter == "year":
-        date_sql = " AND YEAR(o.datum_objednavky) = YEAR(CURDATE())"
-    elif time_filter == "month":
-        date_sql = " AND YEAR(o.datum_objednavky) = YEAR(CURDATE()) AND MONTH(o.datum_objednavky) = MONTH(CURDATE())"
-    elif time_filter == "week":
-        date_sql = " AND YEARWEEK(o.datum_objednavky, 1) = YEARWEEK(CURDATE(), 1)"
-    elif time_filter == "day":
-        date_sql = " AND DATE(o.datum_objednavky) = CURDATE()"
-
-    # 2. Celkové štatistiky
-    stats_sql = f"""
-        SELECT 
-            COUNT(DISTINCT o.id) as total_orders,
-            COALESCE(SUM(op.mnozstvo * op.cena_bez_dph), 0) as total_revenue
-        FROM b2b_objednavky o
-        JOIN b2b_objednavky_polozky op ON o.id = op.objednavka_id
-        WHERE o.zakaznik_id = %s AND o.stav NOT IN ('Zrušená', 'Zrusena', 'Stornovaná'){date_sql}
-    """
-    stats = db_connector.execute_query(stats_sql, (login,), fetch="one") or {}
-    
-    # 3. Detailná agregácia nákupov
-    products_sql = f"""
-        SELECT 
-            op.ean_produktu as ean,
-            op.nazov_vyrobku as name,
-            op.mj as unit,
-            SUM(op.mnozstvo) as total_qty,
-            COALESCE(SUM(op.mnozstvo * op.cena_bez_dph), 0) as revenue,
-            MAX(COALESCE(p.nakupna_cena, 0)) as current_unit_cost
-        FROM b2b_objednavky o
-        JOIN b2b_objednavky_polozky op ON o.id = op.objednavka_id
-        LEFT JOIN produkty p ON p.ean = op.ean_produktu
-        WHERE o.zakaznik_id = %s AND o.stav NOT IN ('Zrušená', 'Zrusena', 'Stornovaná'){date_sql}
-        GROUP BY op.ean_produktu, op.nazov_vyrobku, op.mj
-        ORDER BY total_qty DESC
-    """
-    products = db_connector.execute_query(products_sql, (login,), fetch="all") or []
+    # 2. Celkové štatistiky a 3. agregácia nákupov – z udržiavaných faktov predaja
+    #    (mesiac/rok/všetko z mesačného rollupu, týždeň/deň z položkových faktov)
+    stats = sales_fact.customer_summary("b2b", str(login), time_filter)
+    products = sales_fact.customer_products("b2b", str(login), time_filter)
 
     # 4. Prepočty ziskov
     prod_list = []
@@ -16,6 +16,9 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 
 import db_connector
+import auth_service
+import order_events
+import order_history
 from auth_handler import generate_password_hash, verify_password
 import pdf_generator
 import notification_handler
@@ -51,10 +54,15 @@ def _save_password_store(d: dict):
 # ---------------------------------------------------------------------
 # Schema helpers
 # ---------------------------------------------------------------------
+_present_columns: Dict[str, set] = {}
+
 def _table_has_columns(table: str, columns: List[str]) -> bool:
     """True, ak tabuľka obsahuje VŠETKY zadané stĺpce."""
     if not columns:
         return True
+    # kladný výsledok si pamätáme (stĺpce sa nemažú), záporný sa overuje znova
+    if all(c in _present_columns.get(table, ()) for c in columns):
+        return True
     sql = """
         SELECT COLUMN_NAME AS col
         FROM information_schema.columns
@@ -65,6 +73,7 @@ def _table_has_columns(table: str, columns: List[str]) -> bool:
     params = tuple([table] + list(columns))
     rows = db_connector.execute_query(sql, params) or []
     present = {(r.get("col") if isinstance(r, dict) else list(r.values())[0]) for r in rows}
+    _present_columns.setdefault(table, set()).update(present)
     return all(c in present for c in columns)
 
 def _first_existing_col(table: str, candidates: List[str]) -> Optional[str]:
@@ -389,14 +398,28 @@ def process_b2c_login(data: Dict[str, Any]) -> Dict[str, Any]:
     if not email or not password:
         return {"error": "Musíte zadať e-mail aj heslo."}
 
+    rl_key = f"b2c:{email}"
+    ip = auth_service.client_ip()
+    blocked = auth_service.check_login_allowed(rl_key, ip)
+    if blocked:
+        return {"error": blocked}
+
     has_pw_cols = _table_has_columns("b2b_zakaznici", ["heslo_hash", "heslo_salt"])
 
     if has_pw_cols:
         q = ("SELECT id, nazov_firmy, email, typ, vernostne_body, heslo_hash, heslo_salt "
              "FROM b2b_zakaznici WHERE email = %s AND typ = 'B2C'")
         user = db_connector.execute_query(q, (email,), fetch="one")
-        if not user or not verify_password(password, user["heslo_salt"], user["heslo_hash"]):
+        iterations = auth_service.stored_iterations("b2c", user["id"], user["heslo_hash"]) if user else None
+        try:
+            ok = bool(user) and verify_password(password, user["heslo_salt"], user["heslo_hash"], iterations)
+        except auth_service.AuthBusy as e:
+            return {"error": str(e)}
+        auth_service.record_login_result(rl_key, ip, ok)
+        if not ok:
             return {"error": "Nesprávny e-mail alebo heslo."}
+        auth_service.rehash_if_needed("b2c", user["id"], password, user["heslo_salt"], iterations,
+                                      "b2b_zakaznici", "id", "heslo_salt", "heslo_hash")
     else:
         base_q = ("SELECT id, nazov_firmy, email, typ, vernostne_body "
                   "FROM b2b_zakaznici WHERE email = %s AND typ = 'B2C'")
@@ -955,6 +978,7 @@ def submit_b2c_order(user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
             _mark_reward_fulfilled(order_id, claimed["id"])
         
         conn.commit()
+        order_events.on_orders_changed("b2c", order_id)
 
         # -----------------------------------------------------
         # Post-processing (PDF, Email, Meta)
@@ -1078,151 +1102,221 @@ def submit_b2c_order(user_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
 # -------------------------------
 # História objednávok
 # -------------------------------
-def get_order_history(user_id: int) -> dict:
-    """História objednávok pre B2C – s položkami a cenami (z B2C cenníka)."""
-    if not user_id:
-        return {"orders": []}
+_history_cols: Optional[Dict[str, Optional[str]]] = None
 
-    tbl = "b2c_objednavky"
-    fk_col = _first_existing_col(tbl, ["zakaznik_id", "customer_id", "user_id"])
-    if not fk_col:
-        return {"orders": []}
 
-    # nájdi správnu hodnotu FK podľa schémy
-    if fk_col == "zakaznik_id":
+def _order_history_cols() -> Dict[str, Optional[str]]:
+    """Stĺpce b2c_objednavky pre históriu – zisťujú sa raz za proces."""
+    global _history_cols
+    if _history_cols is None:
+        tbl = "b2c_objednavky"
+        _history_cols = {
+            "fk":    _first_existing_col(tbl, ["zakaznik_id", "customer_id", "user_id"]),
+            "no":    _first_existing_col(tbl, ["cislo_objednavky", "objednavka_cislo", "order_number"]),
+            "del":   _first_existing_col(tbl, ["pozadovany_datum_dodania", "datum_dodania", "delivery_date"]),
+            "dat":   _first_existing_col(tbl, ["datum_objednavky", "created_at", "created", "datum"]),
+            # 🔴 TU JE DÔLEŽITÉ: doplnená "celkova_suma_s_dph" + fallbacky
+            "fin":   _first_existing_col(tbl, [
+                "celkova_suma_s_dph",      # kde ukladá kancelária finálku po vážení
+                "finalna_suma_s_dph",
+                "finalna_suma",
+                "final_total_s_dph",
+                "suma_s_dph",
+                "total_s_dph",
+            ]),
+            "pred":  _first_existing_col(tbl, ["predpokladana_suma_s_dph", "suma_s_dph", "total_s_dph", "total_gross"]),
+            "items": _first_existing_col(tbl, ["polozky", "polozky_json", "items"]),
+            "stav":  _first_existing_col(tbl, ["stav"]),
+        }
+        _history_cols["fk_numeric"] = bool(_history_cols["fk"]) and _is_numeric_col(tbl, _history_cols["fk"])
+    return _history_cols
+
+
+def _history_fk_value(user_id: int, cols: Dict[str, Any]):
+    """Hodnota FK zákazníka v b2c_objednavky podľa schémy (None = nenájdený)."""
+    if cols["fk"] == "zakaznik_id" and not cols["fk_numeric"]:
         cust = db_connector.execute_query(
             "SELECT zakaznik_id FROM b2b_zakaznici WHERE id = %s",
             (user_id,),
             fetch="one",
         )
-        if not cust or not cust.get("zakaznik_id"):
-            return {"orders": []}
-        fk_val = cust["zakaznik_id"]
-        if _is_numeric_col(tbl, fk_col):
-            fk_val = user_id
-    else:
-        fk_val = user_id
-
-    no_col    = _first_existing_col(tbl, ["cislo_objednavky", "objednavka_cislo", "order_number"])
-    del_col   = _first_existing_col(tbl, ["pozadovany_datum_dodania", "datum_dodania", "delivery_date"])
-    dat_col   = _first_existing_col(tbl, ["datum_objednavky", "created_at", "created", "datum"])
-
-    # 🔴 TU JE DÔLEŽITÉ: doplnená "celkova_suma_s_dph" + fallbacky
-    fin_col   = _first_existing_col(
-        tbl,
-        [
-            "celkova_suma_s_dph",      # kde ukladá kancelária finálku po vážení
-            "finalna_suma_s_dph",
-            "finalna_suma",
-            "final_total_s_dph",
-            "suma_s_dph",
-            "total_s_dph",
-        ],
-    )
+        return cust["zakaznik_id"] if cust and cust.get("zakaznik_id") else None
+    return user_id
 
-    pred_col  = _first_existing_col(
-        tbl,
-        [
-            "predpokladana_suma_s_dph",
-            "suma_s_dph",
-            "total_s_dph",
-            "total_gross",
-        ],
-    )
-    items_col = _first_existing_col(tbl, ["polozky", "polozky_json", "items"])
 
-    cols = ["id"]
-    if no_col:   cols.append(f"{no_col} AS cislo_objednavky")
-    if del_col:  cols.append(f"{del_col} AS pozadovany_datum_dodania")
-    if dat_col:  cols.append(f"{dat_col} AS datum_objednavky")
-    if fin_col:  cols.append(f"{fin_col} AS finalna_suma_s_dph")
-    if pred_col: cols.append(f"{pred_col} AS predpokladana_suma_s_dph")
-    if items_col:cols.append(f"{items_col} AS polozky")
+def _history_select(cols: Dict[str, Any], with_items: bool) -> str:
+    out = ["id"]
+    if cols["no"]:    out.append(f"{cols['no']} AS cislo_objednavky")
+    if cols["del"]:   out.append(f"{cols['del']} AS pozadovany_datum_dodania")
+    if cols["dat"]:   out.append(f"{cols['dat']} AS datum_objednavky")
+    if cols["fin"]:   out.append(f"{cols['fin']} AS finalna_suma_s_dph")
+    if cols["pred"]:  out.append(f"{cols['pred']} AS predpokladana_suma_s_dph")
+    if cols["stav"]:  out.append(f"{cols['stav']} AS stav")
+    if with_items and cols["items"]:
+        out.append(f"{cols['items']} AS polozky")
+    return ", ".join(out)
 
-    order_by = dat_col or "id"
-    sql = f"SELECT {', '.join(cols)} FROM {tbl} WHERE {fk_col} = %s ORDER BY {order_by} DESC"
-    rows = db_connector.execute_query(sql, (fk_val,)) or []
 
-    # fallback cesta k JSON objednávkam (staršie uložené)
-    orders_dir = os.path.join(os.path.dirname(__file__), "static", "uploads", "orders")
+def _history_index_cols() -> List[str]:
+    cols = _order_history_cols()
+    if not cols["fk"]:
+        return []
+    return [cols["fk"], cols["dat"], "id"] if cols["dat"] else [cols["fk"], "id"]
 
-    for r in rows:
-        # načítaj položky (DB alebo JSON súbor)
-        items = []
-        raw = r.get("polozky")
-        if isinstance(raw, str) and raw.strip():
-            try:
-                items = json.loads(raw)
-            except Exception:
-                items = []
-        elif isinstance(raw, (list, dict)):
-            items = raw if isinstance(raw, list) else [raw]
-
-        if not items:
-            order_no = r.get("cislo_objednavky") or r.get("id")
-            safe = "".join(ch for ch in str(order_no) if ch.isalnum() or ch in ("-","_"))
-            json_path = os.path.join(orders_dir, f"{safe}.json")
-            try:
-                with open(json_path, "r", encoding="utf-8") as f:
-                    od = json.load(f) or {}
-                    js = od.get("items") or []
-                    if isinstance(js, dict):
-                        js = [js]
-                    if isinstance(js, list):
-                        items = js
-            except Exception:
-                items = []
-
-        # dotiahni ceny z cenníka – robustne
-        eans = [it.get("ean") for it in items if it.get("ean")]
-        prices = _fetch_b2c_prices(eans)
 
-        total_net = 0.0
-        total_gross = 0.0
-        enriched = []
+order_history.register_index("b2c_objednavky", "idx_hist_customer", _history_index_cols)
 
-        for it in items:
-            ean = _norm_ean(it.get("ean"))
-            qty = _to_float(it.get("quantity") or it.get("mnozstvo"))
-            if qty <= 0:
-                qty = 0.0
 
-            pr = prices.get(ean) or (prices.get(ean.zfill(13)) if ean and ean.isdigit() else None)
-            dph_pct = _to_float((pr or {}).get("dph"))
+def _history_items(r: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Položky objednávky – zo stĺpca, inak zo staršieho JSON súboru objednávky."""
+    items = []
+    raw = r.get("polozky")
+    if isinstance(raw, str) and raw.strip():
+        try:
+            items = json.loads(raw)
+        except Exception:
+            items = []
+    elif isinstance(raw, (list, dict)):
+        items = raw if isinstance(raw, list) else [raw]
+
+    if not items:
+        # fallback cesta k JSON objednávkam (staršie uložené)
+        orders_dir = os.path.join(os.path.dirname(__file__), "static", "uploads", "orders")
+        order_no = r.get("cislo_objednavky") or r.get("id")
+        safe = "".join(ch for ch in str(order_no) if ch.isalnum() or ch in ("-","_"))
+        json_path = os.path.join(orders_dir, f"{safe}.json")
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                od = json.load(f) or {}
+                js = od.get("items") or []
+                if isinstance(js, dict):
+                    js = [js]
+                if isinstance(js, list):
+                    items = js
+        except Exception:
+            items = []
+    return items
 
-            if pr and pr.get("je_v_akcii") and _to_float(pr.get("akciova_cena_bez_dph")) > 0:
-                net = _to_float(pr.get("akciova_cena_bez_dph"))
-            else:
-                net = _to_float((pr or {}).get("cena"))
 
-            gross = net * (1.0 + dph_pct / 100.0)
-            total_net   += net   * qty
-            total_gross += gross * qty
+def _price_history_items(items: List[Dict[str, Any]], prices: Dict[str, Any]):
+    """Položky s cenami z B2C cenníka -> (položky, suma bez DPH, suma s DPH)."""
+    total_net = 0.0
+    total_gross = 0.0
+    enriched = []
+
+    for it in items:
+        ean = _norm_ean(it.get("ean"))
+        qty = _to_float(it.get("quantity") or it.get("mnozstvo"))
+        if qty <= 0:
+            qty = 0.0
+
+        pr = prices.get(ean) or (prices.get(ean.zfill(13)) if ean and ean.isdigit() else None)
+        dph_pct = _to_float((pr or {}).get("dph"))
+
+        if pr and pr.get("je_v_akcii") and _to_float(pr.get("akciova_cena_bez_dph")) > 0:
+            net = _to_float(pr.get("akciova_cena_bez_dph"))
+        else:
+            net = _to_float((pr or {}).get("cena"))
+
+        gross = net * (1.0 + dph_pct / 100.0)
+        total_net   += net   * qty
+        total_gross += gross * qty
+
+        enriched.append({
+            **it,
+            "price_bez_dph": net,
+            "price_s_dph":   gross,
+            "dph_percent":   dph_pct,
+        })
+    return enriched, total_net, total_gross
 
-            enriched.append({
-                **it,
-                "price_bez_dph": net,
-                "price_s_dph":   gross,
-                "dph_percent":   dph_pct,
-            })
 
-        # doplň predbežné sumy, ak chýbajú
-        if r.get("predpokladana_suma_s_dph") is None:
-            r["predpokladana_suma_bez_dph"] = total_net
-            r["predpokladana_dph"]          = total_gross - total_net
-            r["predpokladana_suma_s_dph"]   = total_gross
+def _fill_history_totals(r: Dict[str, Any], total_net: float, total_gross: float) -> None:
+    # doplň predbežné sumy, ak chýbajú
+    if r.get("predpokladana_suma_s_dph") is None:
+        r["predpokladana_suma_bez_dph"] = total_net
+        r["predpokladana_dph"]          = total_gross - total_net
+        r["predpokladana_suma_s_dph"]   = total_gross
+
+    # 🔴 DOPLNENIE FINÁLNEJ SUMY:
+    # ak v DB nie je nič alebo je 0, ale máme spočítaný total_gross,
+    # použijeme total_gross ako finálku (aby nebolo „čaká na preváženie“)
+    if r.get("finalna_suma_s_dph") in (None, 0, 0.0):
+        if total_gross > 0:
+            r["finalna_suma_s_dph"] = total_gross
+
+
+def _needs_computed_total(r: Dict[str, Any]) -> bool:
+    return r.get("predpokladana_suma_s_dph") is None or r.get("finalna_suma_s_dph") in (None, 0, 0.0)
+
+
+def get_order_history(user_id: int, cursor: Optional[str] = None, limit: Optional[int] = None) -> dict:
+    """
+    História objednávok pre B2C po stránkach (najnovšie prvé) – len súhrnné riadky.
+    Položky s cenami z B2C cenníka vráti get_order_detail() pre jednu objednávku;
+    súhrnom bez finálnej sumy sa suma dopočíta z položiek (jeden dotaz na stránku).
+    """
+    if not user_id:
+        return {"orders": [], "next_cursor": None}
+
+    cols = _order_history_cols()
+    if not cols["fk"]:
+        return {"orders": [], "next_cursor": None}
+    fk_val = _history_fk_value(user_id, cols)
+    if fk_val is None:
+        return {"orders": [], "next_cursor": None}
+
+    order_by = cols["dat"] or "id"
+    page = order_history.keyset_page(
+        "b2c_objednavky", _history_select(cols, with_items=False),
+        f"{cols['fk']} = %s", (fk_val,),
+        ts_col=order_by, ts_key="datum_objednavky" if cols["dat"] else "id",
+        cursor=cursor, limit=limit,
+    )
+    rows = page["rows"]
+
+    missing = [r for r in rows if _needs_computed_total(r)]
+    if missing:
+        item_rows = {}
+        if cols["items"]:
+            ids = [r["id"] for r in missing]
+            for x in db_connector.execute_query(
+                f"SELECT id, {cols['items']} AS polozky FROM b2c_objednavky WHERE id IN ({','.join(['%s'] * len(ids))})",
+                tuple(ids),
+            ) or []:
+                item_rows[x["id"]] = x.get("polozky")
+        items_by_id = {r["id"]: _history_items({**r, "polozky": item_rows.get(r["id"])}) for r in missing}
+        prices = _fetch_b2c_prices([it.get("ean") for items in items_by_id.values() for it in items if it.get("ean")])
+        for r in missing:
+            _, total_net, total_gross = _price_history_items(items_by_id[r["id"]], prices)
+            _fill_history_totals(r, total_net, total_gross)
+
+    return {"orders": rows, "next_cursor": page["next_cursor"]}
+
+
+def get_order_detail(user_id: int, order_id: int) -> dict:
+    """Jedna objednávka z histórie – s položkami a cenami (z B2C cenníka)."""
+    cols = _order_history_cols()
+    fk_val = _history_fk_value(user_id, cols) if user_id and cols["fk"] else None
+    if fk_val is None or not order_id:
+        return {"error": "Objednávka neexistuje."}
+    r = db_connector.execute_query(
+        f"SELECT {_history_select(cols, with_items=True)} FROM b2c_objednavky WHERE id = %s AND {cols['fk']} = %s",
+        (order_id, fk_val), fetch="one",
+    )
+    if not r:
+        return {"error": "Objednávka neexistuje."}
 
-        # 🔴 DOPLNENIE FINÁLNEJ SUMY:
-        # ak v DB nie je nič alebo je 0, ale máme spočítaný total_gross,
-        # použijeme total_gross ako finálku (aby nebolo „čaká na preváženie“)
-        if r.get("finalna_suma_s_dph") in (None, 0, 0.0):
-            if total_gross > 0:
-                r["finalna_suma_s_dph"] = total_gross
+    # načítaj položky (DB alebo JSON súbor) a dotiahni ceny z cenníka – robustne
+    items = _history_items(r)
+    prices = _fetch_b2c_prices([it.get("ean") for it in items if it.get("ean")])
+    enriched, total_net, total_gross = _price_history_items(items, prices)
+    _fill_history_totals(r, total_net, total_gross)
 
-        r["items"]   = enriched
-        r["polozky"] = json.dumps(enriched, ensure_ascii=False)
+    r["items"]   = enriched
+    r["polozky"] = json.dumps(enriched, ensure_ascii=False)
 
-    return {"orders": rows}
+    return {"order": r}
 
 # -------------------------------
 # Vernostné odmeny (body)
@@ -1373,6 +1467,8 @@ def delete_b2c_customer(customer_id: int) -> Dict[str, Any]:
                     pass
             
             safe_delete_by_fk("b2c_objednavky", ["zakaznik_id", "customer_id", "user_id"])
+            order_events.on_orders_changed(
+                "b2c", [o.get("id") if isinstance(o, dict) else o[0] for o in orders])
 
         # Preventívne vymažeme aj správy a košík, ak tam niečo uviazlo
         safe_delete_by_fk("b2b_messages", ["customer_id", "zakaznik_id"])
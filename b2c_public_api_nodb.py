@@ -24,7 +24,9 @@ from mail_handler import send_email as send_reset_email  # e-maily s linkom na r
 
 # tvoje existujúce funkcionality
 import b2c_handler
+import birthday_bonus
 import db_connector
+import http_cache
 
 # Poznámka: NEIMPORTUJEME tu kancelaria_b2c_api, lebo toto je verejné API
 
@@ -226,6 +228,7 @@ def _check_antibot(payload: dict):
 
 # ---------- verejné B2C ----------
 @b2c_public_bp.get("/api/b2c/get-pricelist")
+@http_cache.conditional(lambda: http_cache.version_key("b2c_pricelist", "catalog"))
 def public_pricelist():
     data = b2c_handler.get_public_pricelist()
     return jsonify(data or {})
@@ -292,6 +295,7 @@ def b2c_register():
     })
     profiles[email] = p
     _save_profiles(profiles)
+    birthday_bonus.sync_profile(email, p)
 
     return jsonify({"message": "Registrácia prebehla úspešne. Vitajte! Teraz sa môžete prihlásiť."})
 
@@ -418,9 +422,19 @@ def get_history():
     usr, err = _need_user()
     if err:
         return err
-    res = b2c_handler.get_order_history(usr["id"])
+    res = b2c_handler.get_order_history(usr["id"], request.args.get("cursor"), request.args.get("limit"))
     return jsonify(res or {})
 
+@b2c_public_bp.get("/api/b2c/order-items/<int:order_id>")
+def get_history_order_items(order_id):
+    usr, err = _need_user()
+    if err:
+        return err
+    res = b2c_handler.get_order_detail(usr["id"], order_id)
+    if res.get("error"):
+        return jsonify(res), 404
+    return jsonify(res)
+
 @b2c_public_bp.get("/api/b2c/get_rewards")
 def get_rewards():
     res = b2c_handler.get_available_rewards()
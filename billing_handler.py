@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, make_response
 from datetime import datetime, timedelta
 import db_connector
+import order_events
 import traceback
 
 billing_bp = Blueprint("billing", __name__)
@@ -104,6 +105,9 @@ def update_order_items():
             params.append(item['id'])
             cursor.execute(f"UPDATE b2b_objednavky_polozky SET {', '.join(upd_parts)} WHERE id = %s", tuple(params))
         conn.commit()
+        ph = ','.join(['%s'] * len(items))
+        touched = db_connector.execute_query(f"SELECT DISTINCT objednavka_id FROM b2b_objednavky_polozky WHERE id IN ({ph})", tuple(i['id'] for i in items), fetch="all") or []
+        order_events.on_orders_changed("b2b", [r['objednavka_id'] for r in touched])
         return jsonify({"status": "success"})
     except Exception as e:
         if 'conn' in locals() and conn: conn.rollback()
@@ -176,6 +180,7 @@ def issue_documents():
                 except Exception as ex: print("Chyba skladu:", ex)
 
         conn.commit()
+        order_events.on_orders_changed("b2b", order_ids)
         return jsonify({"message": f"Vystavené: DL č. {cislo_dl}" + (f" a FA č. {cislo_fa}" if create_fa else ""), "dl_id": dl_id, "fa_id": fa_id})
     except Exception as e:
         if conn: conn.rollback()
@@ -0,0 +1,336 @@
+# =================================================================
+# === B2C NARODENINOVÝ BONUS: INDEXOVANÉ STĹPCE + KĽÚČOVANÉ ODMENY ==
+# =================================================================
+#
+# Dátum narodenia a súhlas s bonusom sa zrkadlia z b2c_profile.json do
+# b2b_zakaznici (dob_month, dob_day, dob_year, bday_opt_in) s indexom
+# idx_zak_bday – mesačný beh je jeden set-based SELECT, žiadny scan profilov
+# ani LOWER(email) lookup per zákazník.
+#
+# Odmeny sú v b2c_birthday_awards s PK (award_year, award_month, customer_id):
+#   1. INSERT IGNORE nových odmien (idempotentné aj pri súbežnom behu),
+#   2. jeden UPDATE ... JOIN pripíše body všetkým nepripísaným (credited=0),
+#   3. e-maily sa neposielajú inline – send_pending() (scheduler) rozošle
+#      riadky s notified_at IS NULL po dávkach.
+#
+# ALTER nad b2b_zakaznici, index a jednorazový prenos z JSON robí migrate()
+# – plánovač chvíľu po štarte, alebo ručne `python birthday_bonus.py`.
+# Webový request DDL nespúšťa; kým migrácia neprebehla, zápis profilu sa
+# do stĺpcov neprenáša (prenos z JSON to dobehne) a čítanie vráti 0 bodov.
+# =================================================================
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import db_connector
+
+DATA_DIR = os.path.abspath(os.getenv("APP_DATA_DIR", os.path.join(os.path.dirname(__file__), "data")))
+PROFILE_JSON_PATH = os.path.join(DATA_DIR, "b2c_profile.json")
+LEGACY_AWARDS_PATH = os.path.join(DATA_DIR, "b2c_birthday_awards.json")
+
+BASE_POINTS = 100
+MILESTONE_POINTS = 150
+NOTIFY_BATCH = 50
+NOTIFY_MAX_ATTEMPTS = 3
+
+_MONTHS_GEN = ["januára", "februára", "marca", "apríla", "mája", "júna", "júla",
+               "augusta", "septembra", "októbra", "novembra", "decembra"]
+
+_schema_ready = False
+_checked_at = 0.0
+_RECHECK_S = 60
+
+
+def _col_exists(table: str, col: str) -> bool:
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s
+         LIMIT 1
+    """, (table, col), fetch='one')
+    return bool(r)
+
+
+def _index_exists(table: str, idx: str) -> bool:
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s
+         LIMIT 1
+    """, (table, idx), fetch='one')
+    return bool(r)
+
+
+def _table_exists(table: str) -> bool:
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.TABLES
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s
+         LIMIT 1
+    """, (table,), fetch='one')
+    return bool(r)
+
+
+def _schema_exists() -> bool:
+    return (_col_exists("b2b_zakaznici", "bday_opt_in")
+            and _index_exists("b2b_zakaznici", "idx_zak_bday")
+            and _table_exists("b2c_birthday_awards"))
+
+
+def ready() -> bool:
+    """Prebehla migrácia? Kým nie, overí sa znova po chvíli (len INFORMATION_SCHEMA)."""
+    global _schema_ready, _checked_at
+    if _schema_ready or time.time() - _checked_at < _RECHECK_S:
+        return _schema_ready
+    _checked_at = time.time()
+    _schema_ready = _schema_exists()
+    return _schema_ready
+
+
+def migrate() -> Dict[str, Any]:
+    """Stĺpce + index v b2b_zakaznici, tabuľka odmien, pri prvom behu prenos z JSON (migrácia, nie request)."""
+    global _schema_ready
+    fresh = not _col_exists("b2b_zakaznici", "dob_month")
+    for col, ddl in (
+        ("dob_month", "TINYINT NULL"),
+        ("dob_day", "TINYINT NULL"),
+        ("dob_year", "SMALLINT NULL"),
+        ("bday_opt_in", "TINYINT(1) NOT NULL DEFAULT 0"),
+    ):
+        if not _col_exists("b2b_zakaznici", col):
+            db_connector.execute_query(f"ALTER TABLE b2b_zakaznici ADD COLUMN {col} {ddl}", fetch='none')
+    if not _index_exists("b2b_zakaznici", "idx_zak_bday"):
+        db_connector.execute_query(
+            "CREATE INDEX idx_zak_bday ON b2b_zakaznici(dob_month, bday_opt_in, typ)", fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS b2c_birthday_awards (
+            award_year   SMALLINT NOT NULL,
+            award_month  TINYINT  NOT NULL,
+            customer_id  INT      NOT NULL,
+            points       INT      NOT NULL,
+            milestone    TINYINT(1) NOT NULL DEFAULT 0,
+            age          SMALLINT NULL,
+            credited     TINYINT(1) NOT NULL DEFAULT 0,
+            awarded_at   DATETIME NOT NULL,
+            notified_at  DATETIME NULL,
+            notify_attempts TINYINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (award_year, award_month, customer_id),
+            INDEX idx_bda_notify (notified_at, notify_attempts)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = _schema_exists()
+    if not _schema_ready:
+        return {"fresh": fresh, "error": "Schému narodeninových odmien sa nepodarilo vytvoriť."}
+    return {"fresh": fresh, **(backfill_from_json() if fresh else {})}
+
+
+# --- PROFIL -> STĹPCE --------------------------------------------------------
+def parse_dob(dob: Optional[dict]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """{"iso_ymd": "YYYY-MM-DD", "md": "MM-DD"} -> (mesiac, deň, rok) – chýbajúce časti None."""
+    dob = dob or {}
+    iso, md = dob.get("iso_ymd"), dob.get("md")
+    try:
+        if isinstance(iso, str) and len(iso) >= 10:
+            y, m, d = (int(x) for x in iso[:10].split("-"))
+            return m, d, y
+        if isinstance(md, str) and "-" in md:
+            m, d = (int(x) for x in md.split("-", 1))
+            if 1 <= m <= 12 and 1 <= d <= 31:
+                return m, d, None
+    except (TypeError, ValueError):
+        pass
+    return None, None, None
+
+
+def _profile_row(prof: dict) -> tuple:
+    m, d, y = parse_dob((prof or {}).get("dob"))
+    return m, d, y, 1 if (prof or {}).get("birthday_bonus_opt_in") else 0
+
+
+def sync_profile(email: str, prof: dict) -> None:
+    """Po zápise profilu (registrácia, úprava v kancelárii) – prenesie DOB a súhlas do b2b_zakaznici."""
+    email = (email or "").strip()
+    if not email or not ready():
+        return
+    try:
+        db_connector.execute_query(
+            "UPDATE b2b_zakaznici SET dob_month=%s, dob_day=%s, dob_year=%s, bday_opt_in=%s "
+            "WHERE email=%s AND typ='B2C'",
+            _profile_row(prof) + (email,), fetch='none')
+    except Exception as e:
+        print(f"[NARODENINY] sync {email}: {e}")
+
+
+def _load_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f) or {}
+    except Exception:
+        return {}
+
+
+def backfill_from_json() -> Dict[str, int]:
+    """Jednorazovo: stĺpce z b2c_profile.json + doterajšie odmeny zo starého JSON logu."""
+    profiles = _load_json(PROFILE_JSON_PATH)
+    rows = [_profile_row(p) + (email,) for email, p in profiles.items() if isinstance(p, dict)]
+
+    legacy = _load_json(LEGACY_AWARDS_PATH)
+    ids = {}
+    if legacy:
+        for r in db_connector.execute_query(
+                "SELECT id, email FROM b2b_zakaznici WHERE typ='B2C' AND email IS NOT NULL") or []:
+            ids[(r["email"] or "").lower()] = r["id"]
+    awards = []
+    for ym, bucket in legacy.items():
+        try:
+            y, m = (int(x) for x in ym.split("-"))
+        except ValueError:
+            continue
+        for email, rec in (bucket or {}).items():
+            cid = ids.get((email or "").lower())
+            if cid:
+                awards.append((y, m, cid, int((rec or {}).get("points") or 0)))
+
+    def work(conn):
+        cur = conn.cursor()
+        if rows:
+            cur.executemany(
+                "UPDATE b2b_zakaznici SET dob_month=%s, dob_day=%s, dob_year=%s, bday_opt_in=%s "
+                "WHERE email=%s AND typ='B2C'", rows)
+        if awards:
+            # staré odmeny už boli pripísané aj oznámené
+            cur.executemany(
+                "INSERT IGNORE INTO b2c_birthday_awards "
+                "(award_year, award_month, customer_id, points, credited, awarded_at, notified_at) "
+                "VALUES (%s, %s, %s, %s, 1, NOW(), NOW())", awards)
+        cur.close()
+
+    db_connector.with_transaction(work)
+    return {"profiles": len(rows), "awards": len(awards)}
+
+
+# --- MESAČNÝ BEH -------------------------------------------------------------
+def _points_for(year: int, birth_year: Optional[int]) -> Tuple[int, bool, Optional[int]]:
+    if not birth_year:
+        return BASE_POINTS, False, None
+    age = year - int(birth_year)
+    if age >= 20 and age % 5 == 0:
+        return MILESTONE_POINTS, True, age
+    return BASE_POINTS, False, age
+
+
+def run(year: int, month: int, dry_run: bool = False) -> Dict[str, Any]:
+    """Pripíše narodeninové body za mesiac. Opakovaný beh nič nezdvojí."""
+    if not ready():
+        return {"awarded": [], "skipped": [], "credited": 0,
+                "error": "Migrácia narodeninových odmien ešte neprebehla."}
+    rows = db_connector.execute_query("""
+        SELECT z.id, z.email, z.dob_year, a.customer_id AS already
+          FROM b2b_zakaznici z
+          LEFT JOIN b2c_birthday_awards a
+            ON a.award_year=%s AND a.award_month=%s AND a.customer_id=z.id
+         WHERE z.dob_month=%s AND z.bday_opt_in=1 AND z.typ='B2C'
+    """, (year, month, month)) or []
+
+    awarded: List[Dict[str, Any]] = []
+    skipped: List[Dict[str, Any]] = []
+    new_rows = []
+    for r in rows:
+        if r.get("already"):
+            skipped.append({"email": r.get("email"), "reason": "already_credited"})
+            continue
+        points, milestone, age = _points_for(year, r.get("dob_year"))
+        new_rows.append((year, month, int(r["id"]), points, 1 if milestone else 0, age))
+        awarded.append({"email": r.get("email"), "points": points, "milestone": milestone})
+
+    if dry_run or not new_rows:
+        return {"awarded": awarded, "skipped": skipped, "credited": 0}
+
+    def work(conn):
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT IGNORE INTO b2c_birthday_awards "
+            "(award_year, award_month, customer_id, points, milestone, age, awarded_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, NOW())", new_rows)
+        cur.execute("""
+            UPDATE b2b_zakaznici z
+              JOIN b2c_birthday_awards a ON a.customer_id = z.id
+               SET z.vernostne_body = COALESCE(z.vernostne_body, 0) + a.points,
+                   a.credited = 1
+             WHERE a.award_year=%s AND a.award_month=%s AND a.credited=0
+        """, (year, month))
+        n = cur.rowcount // 2  # multi-table UPDATE počíta riadky oboch tabuliek
+        cur.close()
+        return n
+
+    credited = db_connector.with_transaction(work)
+    return {"awarded": awarded, "skipped": skipped, "credited": credited}
+
+
+# --- NOTIFIKÁCIE (FRONTA) ----------------------------------------------------
+def send_pending(limit: int = NOTIFY_BATCH) -> Dict[str, int]:
+    """Rozošle e-maily k pripísaným odmenám (notified_at IS NULL), max NOTIFY_MAX_ATTEMPTS pokusov."""
+    if not ready():
+        return {"sent": 0, "failed": 0}
+    import notification_handler
+
+    rows = db_connector.execute_query("""
+        SELECT a.award_year, a.award_month, a.customer_id, a.points, a.milestone, a.age,
+               z.email, z.nazov_firmy
+          FROM b2c_birthday_awards a
+          JOIN b2b_zakaznici z ON z.id = a.customer_id
+         WHERE a.notified_at IS NULL AND a.credited = 1 AND a.notify_attempts < %s
+         ORDER BY a.awarded_at
+         LIMIT %s
+    """, (NOTIFY_MAX_ATTEMPTS, int(limit))) or []
+
+    sent = failed = 0
+    for r in rows:
+        key = (r["award_year"], r["award_month"], r["customer_id"])
+        try:
+            if r.get("email"):
+                notification_handler.send_b2c_birthday_bonus_email(
+                    r["email"], r.get("nazov_firmy") or "", _MONTHS_GEN[(int(r["award_month"]) - 1) % 12],
+                    int(r["points"]), bool(r.get("milestone")), r.get("age"))
+            db_connector.execute_query(
+                "UPDATE b2c_birthday_awards SET notified_at=NOW(), notify_attempts=notify_attempts+1 "
+                "WHERE award_year=%s AND award_month=%s AND customer_id=%s", key, fetch='none')
+            sent += 1
+        except Exception as e:
+            print(f"[NARODENINY] e-mail {r.get('email')}: {e}")
+            db_connector.execute_query(
+                "UPDATE b2c_birthday_awards SET notify_attempts=notify_attempts+1 "
+                "WHERE award_year=%s AND award_month=%s AND customer_id=%s", key, fetch='none')
+            failed += 1
+    return {"sent": sent, "failed": failed}
+
+
+# --- ČÍTANIE PRE KANCELÁRIU --------------------------------------------------
+def points_for_month(year: int, month: int, customer_ids: Iterable[int] = None) -> Dict[int, int]:
+    """{customer_id: body} za mesiac (pre zoznam zákazníkov)."""
+    if not ready():
+        return {}
+    rows = db_connector.execute_query(
+        "SELECT customer_id, points FROM b2c_birthday_awards WHERE award_year=%s AND award_month=%s",
+        (year, month)) or []
+    wanted = set(customer_ids) if customer_ids is not None else None
+    return {int(r["customer_id"]): int(r["points"] or 0) for r in rows
+            if wanted is None or int(r["customer_id"]) in wanted}
+
+
+def total_points(date_from: str = None, date_to: str = None) -> int:
+    """Súčet pripísaných bodov; mesiac sa počíta, ak jeho 1. deň padne do [date_from, date_to]."""
+    if not ready():
+        return 0
+    q = ("SELECT COALESCE(SUM(points), 0) AS s FROM b2c_birthday_awards "
+         "WHERE credited = 1")
+    params = []
+    bucket = "CONCAT(LPAD(award_year, 4, '0'), '-', LPAD(award_month, 2, '0'), '-01')"
+    if date_from:
+        q += f" AND {bucket} >= %s"; params.append(date_from)
+    if date_to:
+        q += f" AND {bucket} <= %s"; params.append(date_to)
+    r = db_connector.execute_query(q, tuple(params) if params else None, fetch='one') or {}
+    return int(r.get("s") or 0)
+
+
+if __name__ == "__main__":
+    print(json.dumps(migrate(), ensure_ascii=False, default=str))
@@ -0,0 +1,492 @@
+# =================================================================
+# === KALENDÁR: VÝSKYTY OPAKOVANÝCH UDALOSTÍ + KONFLIKTY ZDROJOV =====
+# =================================================================
+#
+# Opakované udalosti (calendar_events.recurrence_rule, iCal RRULE, napr.
+# "FREQ=WEEKLY;BYDAY=MO") sa nerozvíjajú pri každom dotaze, ale vopred do
+# tabuľky výskytov pre posuvné okno [dnes - CAL_OCC_BACK_DAYS,
+# dnes + CAL_OCC_HORIZON_DAYS]:
+#
+#   calendar_occurrences  (resource_id, occ_start, event_id) -> occ_end
+#       resource_id = 0 pre každú udalosť (zoznam v kalendári) + jeden riadok
+#       za každý priradený zdroj (auto, zasadačka – calendar_event_resources)
+#   calendar_occurrence_span  resource_id -> najdlhší výskyt (s)
+#
+# Prekrytie s intervalom [od, do) je rozsahový prechod indexu:
+#   resource_id = r AND occ_start >= od - najdlhší AND occ_start < do AND occ_end > od
+# teda O(log n + k) bez ohľadu na počet sérií. Konflikty nového termínu
+# (aj všetkých jeho opakovaní) sa hľadajú jedným dotazom na zdroj
+# a bisekciou v zoradených výskytoch.
+#
+# Zmena udalosti -> refresh_event(id) prepočíta len túto sériu; nočný
+# roll_horizon() posunie okno (dopočíta nový úsek, staré výskyty zmaže).
+# Jednorazové udalosti majú v tabuľke vždy jeden riadok; opakované série
+# mimo okna sa rozvinú za behu (vzácne – staré mesiace).
+#
+# Stĺpce opakovania, tabuľky a prvý prepočet robí migrate() – scheduler
+# chvíľu po štarte (alebo `python calendar_occurrences.py`), nie request.
+# Kým neprebehne, kalendár ukazuje len jednorazové udalosti a výskyty sa
+# neprepočítavajú (prvý prepočet ich doplní).
+# =================================================================
+import argparse
+import bisect
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from dateutil.rrule import rrulestr
+
+import db_connector
+
+HORIZON_DAYS   = int(os.getenv("CAL_OCC_HORIZON_DAYS", "400"))
+BACK_DAYS      = int(os.getenv("CAL_OCC_BACK_DAYS", "90"))
+MAX_PER_SERIES = int(os.getenv("CAL_OCC_MAX_PER_SERIES", "5000"))   # poistka (FREQ=HOURLY a pod.)
+
+ALL = 0   # resource_id pre "všetky udalosti"
+
+_ACTIVE = "e.is_deleted = 0 AND (e.status IS NULL OR e.status <> 'CANCELLED')"
+
+_schema_ready = False
+_checked_at = 0.0
+_RECHECK_S = 60
+
+Interval = Tuple[datetime, datetime]
+
+
+def _has_col(table, col):
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s
+         LIMIT 1
+    """, (table, col), fetch='one')
+    return bool(r)
+
+
+def ready() -> bool:
+    """Prebehla migrácia (stĺpce + tabuľky + prvé okno výskytov)? Kým nie, overí sa znova po chvíli."""
+    global _schema_ready, _checked_at
+    if _schema_ready or time.time() - _checked_at < _RECHECK_S:
+        return _schema_ready
+    _checked_at = time.time()
+    _schema_ready = (_has_col("calendar_events", "recurrence_rule")
+                     and _has_col("calendar_occurrence_window", "window_from")
+                     and _read_window() is not None)
+    return _schema_ready
+
+
+def migrate() -> Dict[str, Any]:
+    """Stĺpce opakovania, tabuľky výskytov a zdrojov; bez okna aj prvý prepočet (migrácia, nie request)."""
+    global _schema_ready
+    if not _has_col("calendar_events", "recurrence_rule"):
+        db_connector.execute_query(
+            "ALTER TABLE calendar_events ADD COLUMN recurrence_rule VARCHAR(255) NULL", fetch='none')
+    if not _has_col("calendar_events", "recurrence_until"):
+        db_connector.execute_query(
+            "ALTER TABLE calendar_events ADD COLUMN recurrence_until DATETIME NULL", fetch='none')
+    # zdroje podľa calendar_models (CalendarResource, calendar_event_resources)
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS calendar_resources (
+            id             INT AUTO_INCREMENT PRIMARY KEY,
+            name           VARCHAR(255) NOT NULL,
+            resource_type  VARCHAR(20)  NOT NULL DEFAULT 'OTHER',
+            asset_id       INT          NULL,
+            location       VARCHAR(255) NULL,
+            capacity       INT          NULL,
+            is_active      TINYINT(1)   NOT NULL DEFAULT 1
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS calendar_event_resources (
+            event_id     INT NOT NULL,
+            resource_id  INT NOT NULL,
+            PRIMARY KEY (event_id, resource_id),
+            KEY idx_cer_resource (resource_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS calendar_occurrences (
+            resource_id  INT      NOT NULL DEFAULT 0,
+            occ_start    DATETIME NOT NULL,
+            event_id     INT      NOT NULL,
+            occ_end      DATETIME NOT NULL,
+            PRIMARY KEY (resource_id, occ_start, event_id),
+            KEY idx_occ_event (event_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS calendar_occurrence_span (
+            resource_id  INT PRIMARY KEY,
+            max_span_s   INT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS calendar_occurrence_window (
+            name         VARCHAR(32) PRIMARY KEY,
+            window_from  DATETIME NOT NULL,
+            window_to    DATETIME NOT NULL,
+            updated_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    if not (_has_col("calendar_events", "recurrence_rule") and _has_col("calendar_events", "recurrence_until")
+            and _has_col("calendar_occurrence_window", "window_from")):
+        return {"error": "Stĺpce / tabuľky kalendára sa nepodarilo vytvoriť."}
+    fresh = _read_window() is None
+    res = rebuild_all() if fresh else {}
+    _schema_ready = True
+    return {"fresh": fresh, **res}
+
+
+# -----------------------------------------------------------------
+# Rozvinutie RRULE
+# -----------------------------------------------------------------
+def normalize_rule(rule: Optional[str]) -> Optional[str]:
+    rule = (rule or "").strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[6:].strip()
+    return rule or None
+
+
+def expand(rule: Optional[str], start: datetime, end: Optional[datetime],
+           until: Optional[datetime], lo: datetime, hi: datetime) -> List[Interval]:
+    """
+    Výskyty udalosti, ktoré zasahujú do [lo, hi). Jednorazová udalosť vráti
+    svoj jediný interval vždy (nezávisle od okna). Neplatné RRULE -> ValueError.
+    """
+    end = end or start
+    rule = normalize_rule(rule)
+    if not rule:
+        return [(start, end)]
+    duration = end - start
+    rr = rrulestr(rule, dtstart=start)
+    if until:
+        rr = rr.replace(until=until)
+    out: List[Interval] = []
+    for occ in rr.xafter(lo - duration, count=MAX_PER_SERIES, inc=True):
+        if occ >= hi:
+            break
+        if occ + duration > lo or (duration == timedelta(0) and occ >= lo):
+            out.append((occ, occ + duration))
+    return out
+
+
+def validate_rule(rule: Optional[str], start: datetime) -> Optional[str]:
+    """Chybová správa pre neplatné RRULE (alebo None)."""
+    if not normalize_rule(rule):
+        return None
+    try:
+        rrulestr(normalize_rule(rule), dtstart=start)
+    except (ValueError, TypeError) as e:
+        return f"Neplatné pravidlo opakovania: {e}"
+    return None
+
+
+# -----------------------------------------------------------------
+# Okno a materializácia
+# -----------------------------------------------------------------
+def _target_window() -> Interval:
+    today = datetime.combine(date.today(), datetime.min.time())
+    return today - timedelta(days=BACK_DAYS), today + timedelta(days=HORIZON_DAYS)
+
+
+def _read_window() -> Optional[Interval]:
+    row = db_connector.execute_query(
+        "SELECT window_from, window_to FROM calendar_occurrence_window WHERE name='main'", fetch='one')
+    return (row["window_from"], row["window_to"]) if row else None
+
+
+def window() -> Interval:
+    return (ready() and _read_window()) or _target_window()
+
+
+def _load_events(where: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+    rows = db_connector.execute_query(f"""
+        SELECT e.id, e.start_at, e.end_at, e.recurrence_rule, e.recurrence_until
+          FROM calendar_events e
+         WHERE {_ACTIVE} AND e.start_at IS NOT NULL AND ({where})
+    """, tuple(params), fetch='all') or []
+    if not rows:
+        return []
+    ph = ",".join(["%s"] * len(rows))
+    links = db_connector.execute_query(
+        f"SELECT event_id, resource_id FROM calendar_event_resources WHERE event_id IN ({ph})",
+        tuple(r["id"] for r in rows), fetch='all') or []
+    res: Dict[int, List[int]] = {}
+    for l in links:
+        res.setdefault(int(l["event_id"]), []).append(int(l["resource_id"]))
+    for r in rows:
+        r["resource_ids"] = res.get(int(r["id"]), [])
+    return rows
+
+
+def _occurrence_rows(events: Iterable[Dict[str, Any]], lo: datetime, hi: datetime,
+                     only_recurring: bool = False) -> List[tuple]:
+    out = []
+    for ev in events:
+        if only_recurring and not normalize_rule(ev.get("recurrence_rule")):
+            continue
+        try:
+            intervals = expand(ev.get("recurrence_rule"), ev["start_at"], ev.get("end_at"),
+                               ev.get("recurrence_until"), lo, hi)
+        except (ValueError, TypeError) as e:
+            print(f"[KALENDÁR] udalosť {ev['id']}: neplatné RRULE – {e}")
+            intervals = [(ev["start_at"], ev.get("end_at") or ev["start_at"])]
+        for s, e in intervals:
+            for rid in [ALL, *ev["resource_ids"]]:
+                out.append((rid, s, int(ev["id"]), e))
+    return out
+
+
+def _write(conn, rows: List[tuple]) -> None:
+    if not rows:
+        return
+    cur = conn.cursor()
+    try:
+        cur.executemany("""
+            INSERT IGNORE INTO calendar_occurrences (resource_id, occ_start, event_id, occ_end)
+            VALUES (%s, %s, %s, %s)
+        """, rows)
+        spans: Dict[int, int] = {}
+        for rid, s, _, e in rows:
+            spans[rid] = max(spans.get(rid, 0), int((e - s).total_seconds()))
+        # najdlhší výskyt len rastie (konzervatívna spodná hranica dotazu);
+        # presne ho prepočíta rebuild_all()
+        cur.executemany("""
+            INSERT INTO calendar_occurrence_span (resource_id, max_span_s) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE max_span_s = GREATEST(max_span_s, VALUES(max_span_s))
+        """, list(spans.items()))
+    finally:
+        cur.close()
+
+
+def _save_window(conn, lo: datetime, hi: datetime) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO calendar_occurrence_window (name, window_from, window_to) VALUES ('main', %s, %s)
+            ON DUPLICATE KEY UPDATE window_from = VALUES(window_from), window_to = VALUES(window_to)
+        """, (lo, hi))
+    finally:
+        cur.close()
+
+
+def rebuild_all() -> Dict[str, Any]:
+    """Úplný prepočet výskytov pre aktuálne okno (prvé spustenie, oprava)."""
+    lo, hi = _target_window()
+    # jednorazové udalosti majú jeden riadok bez ohľadu na okno, série len v okne
+    events = _load_events("1=1", ())
+    rows = _occurrence_rows(events, lo, hi)
+
+    def _work(conn):
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM calendar_occurrences")
+            cur.execute("DELETE FROM calendar_occurrence_span")
+        finally:
+            cur.close()
+        _write(conn, rows)
+        _save_window(conn, lo, hi)
+
+    db_connector.with_transaction(_work)
+    return {"events": len(events), "occurrences": len(rows), "window_from": lo, "window_to": hi}
+
+
+def refresh_event(event_id: int) -> int:
+    """Po uložení / zrušení udalosti: znovu rozvinie len túto sériu. Vráti počet výskytov."""
+    if not ready():
+        return 0
+    lo, hi = window()
+    events = _load_events("e.id = %s", (int(event_id),))
+    rows = _occurrence_rows(events, lo, hi)
+
+    def _work(conn):
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM calendar_occurrences WHERE event_id=%s", (int(event_id),))
+        finally:
+            cur.close()
+        _write(conn, rows)
+
+    db_connector.with_transaction(_work)
+    return len(rows)
+
+
+def roll_horizon() -> Dict[str, Any]:
+    """Nočný posun okna: dopočíta nový úsek opakovaných sérií a zmaže výskyty pred oknom."""
+    if not ready():
+        return {"skipped": "migrácia kalendára ešte neprebehla"}
+    old_lo, old_hi = window()
+    lo, hi = _target_window()
+    added = 0
+    if hi > old_hi:
+        events = _load_events("e.recurrence_rule IS NOT NULL AND e.start_at < %s "
+                              "AND (e.recurrence_until IS NULL OR e.recurrence_until >= %s)", (hi, old_hi))
+        # výskyty začínajúce pred old_hi už v tabuľke sú (INSERT IGNORE)
+        rows = [r for r in _occurrence_rows(events, old_hi, hi, only_recurring=True) if r[1] >= old_hi]
+        added = len(rows)
+    else:
+        rows = []
+
+    def _work(conn):
+        _write(conn, rows)
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                DELETE o FROM calendar_occurrences o
+                  JOIN calendar_events e ON e.id = o.event_id
+                 WHERE e.recurrence_rule IS NOT NULL AND o.occ_end < %s
+            """, (lo,))
+        finally:
+            cur.close()
+        _save_window(conn, lo, max(hi, old_hi))
+
+    db_connector.with_transaction(_work)
+    return {"added": added, "window_from": lo, "window_to": max(hi, old_hi)}
+
+
+def set_resources(event_id: int, resource_ids: Iterable[Any]) -> List[int]:
+    """Priradí udalosti zdroje (nahradí pôvodné). Výskyty prepočíta refresh_event()."""
+    if not ready():
+        return []
+    ids = sorted({int(r) for r in (resource_ids or []) if str(r).strip() not in ("", "0")})
+
+    def _work(conn):
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM calendar_event_resources WHERE event_id=%s", (int(event_id),))
+            if ids:
+                cur.executemany(
+                    "INSERT INTO calendar_event_resources (event_id, resource_id) VALUES (%s, %s)",
+                    [(int(event_id), rid) for rid in ids])
+        finally:
+            cur.close()
+
+    db_connector.with_transaction(_work)
+    return ids
+
+
+def list_resources() -> List[Dict[str, Any]]:
+    if not ready():
+        return []
+    return db_connector.execute_query("""
+        SELECT id, name, resource_type, asset_id, location, capacity
+          FROM calendar_resources WHERE is_active = 1 ORDER BY resource_type, name
+    """, fetch='all') or []
+
+
+# -----------------------------------------------------------------
+# Dotazy: rozsah a konflikty
+# -----------------------------------------------------------------
+def _span_s(resource_id: int) -> int:
+    row = db_connector.execute_query(
+        "SELECT max_span_s FROM calendar_occurrence_span WHERE resource_id=%s", (resource_id,), fetch='one')
+    return int(row["max_span_s"]) if row else 0
+
+
+def _outside_parts(lo: datetime, hi: datetime, win: Interval) -> List[Interval]:
+    parts = []
+    if lo < win[0]:
+        parts.append((lo, min(hi, win[0])))
+    if hi > win[1]:
+        parts.append((max(lo, win[1]), hi))
+    return parts
+
+
+def _range_rows(resource_id: int, lo: datetime, hi: datetime,
+                recurring_only: bool = False) -> List[Tuple[datetime, datetime, int]]:
+    """(start, end, event_id) výskytov zasahujúcich do [lo, hi), zoradené podľa začiatku."""
+    win = window()
+    span = _span_s(resource_id)
+    join = ("JOIN calendar_events e ON e.id = o.event_id AND e.recurrence_rule IS NOT NULL"
+            if recurring_only else "")
+    rows = db_connector.execute_query(f"""
+        SELECT o.occ_start, o.occ_end, o.event_id FROM calendar_occurrences o {join}
+         WHERE o.resource_id = %s AND o.occ_start >= %s AND o.occ_start < %s AND o.occ_end > %s
+         ORDER BY o.occ_start, o.event_id
+    """, (resource_id, lo - timedelta(seconds=span), hi, lo), fetch='all') or []
+    out = [(r["occ_start"], r["occ_end"], int(r["event_id"])) for r in rows]
+
+    parts = _outside_parts(lo, hi, win)
+    if parts:
+        # opakované série mimo materializovaného okna – rozvinúť za behu
+        where = ("e.recurrence_rule IS NOT NULL AND e.start_at < %s "
+                 "AND (e.recurrence_until IS NULL OR e.recurrence_until >= %s)")
+        params: List[Any] = [hi, lo]
+        if resource_id != ALL:
+            where += " AND e.id IN (SELECT event_id FROM calendar_event_resources WHERE resource_id=%s)"
+            params.append(resource_id)
+        seen = {(s, ev) for s, _, ev in out}
+        for ev in _load_events(where, params):
+            for p_lo, p_hi in parts:
+                for rid, s, eid, e in _occurrence_rows([ev], p_lo, p_hi, only_recurring=True):
+                    if rid == ALL and (s, eid) not in seen and e > lo and s < hi:
+                        seen.add((s, eid))
+                        out.append((s, e, eid))
+        out.sort(key=lambda x: (x[0], x[2]))
+    return out
+
+
+def occurrences(lo: datetime, hi: datetime, resource_id: Optional[int] = None,
+                recurring_only: bool = False) -> List[Dict[str, Any]]:
+    """Výskyty v [lo, hi) – voliteľne len pre jeden zdroj / len opakovaných sérií."""
+    if not ready():
+        return []
+    rows = _range_rows(int(resource_id or ALL), lo, hi, recurring_only)
+    return [{"event_id": ev, "start": s, "end": e} for s, e, ev in rows]
+
+
+def find_conflicts(resource_ids: Iterable[Any], intervals: Sequence[Interval],
+                   exclude_event_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Obsadenosť zdrojov pre dané intervaly (napr. všetky výskyty novej série).
+    Jeden dotaz na zdroj, potom bisekcia – O(log n + k) na interval.
+    """
+    if not ready():
+        return []
+    ids = sorted({int(r) for r in (resource_ids or []) if str(r).strip() not in ("", "0")})
+    ivs = sorted((s, e if e > s else s + timedelta(seconds=1)) for s, e in intervals)
+    if not ids or not ivs:
+        return []
+
+    hits: Dict[Tuple[int, int, datetime], Dict[str, Any]] = {}
+    for rid in ids:
+        span = timedelta(seconds=_span_s(rid))
+        rows = [r for r in _range_rows(rid, ivs[0][0], max(e for _, e in ivs))
+                if r[2] != exclude_event_id]
+        starts = [r[0] for r in rows]
+        for s, e in ivs:
+            i = bisect.bisect_left(starts, s - span)
+            j = bisect.bisect_left(starts, e)
+            for occ_s, occ_e, ev in rows[i:j]:
+                if occ_e > s:
+                    hits.setdefault((rid, ev, occ_s), {
+                        "resource_id": rid, "event_id": ev, "start": occ_s, "end": occ_e,
+                        "requested_start": s, "requested_end": e,
+                    })
+    if not hits:
+        return []
+
+    ev_ids = sorted({h["event_id"] for h in hits.values()})
+    ph_e = ",".join(["%s"] * len(ev_ids))
+    ph_r = ",".join(["%s"] * len(ids))
+    titles = {int(r["id"]): r["title"] for r in (db_connector.execute_query(
+        f"SELECT id, title FROM calendar_events WHERE id IN ({ph_e})", tuple(ev_ids), fetch='all') or [])}
+    names = {int(r["id"]): r["name"] for r in (db_connector.execute_query(
+        f"SELECT id, name FROM calendar_resources WHERE id IN ({ph_r})", tuple(ids), fetch='all') or [])}
+    out = []
+    for h in sorted(hits.values(), key=lambda x: (x["start"], x["resource_id"])):
+        h["title"] = titles.get(h["event_id"])
+        h["resource_name"] = names.get(h["resource_id"])
+        out.append(h)
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Výskyty opakovaných udalostí kalendára (calendar_occurrences)")
+    ap.add_argument("--rebuild", action="store_true", help="kompletný prepočet, aj keď migrácia už prebehla")
+    args = ap.parse_args()
+    res = migrate()
+    if args.rebuild and not res.get("fresh") and not res.get("error"):
+        res = rebuild_all()
+    print(json.dumps(res, ensure_ascii=False, default=str))
@@ -9,8 +9,7 @@ from typing import List, Optional, Iterable
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 
-from dateutil.rrule import rrulestr  # pip install python-dateutil
-
+import calendar_occurrences
 from calendar_models import (
     CalendarEvent,
     CalendarResource,
@@ -256,26 +255,22 @@ class CalendarService:
         if not resource_ids:
             return []
 
-        # jednoduchá logika prekrytia:
-        # (existing.start < new_end) AND (existing.end > new_start)
-        start = event.start_at
-        end = event.end_at or event.start_at
+        # všetky výskyty eventu v okne (aj opakovania) proti materializovaným
+        # výskytom ostatných udalostí – calendar_occurrences.find_conflicts
+        win_from, win_to = calendar_occurrences.window()
+        wanted = list(self.iter_occurrences(event, max(win_from, event.start_at), win_to))
+        conflicts = calendar_occurrences.find_conflicts(
+            resource_ids, wanted, exclude_event_id=event.id)
+        if not conflicts:
+            return []
 
-        q = (
+        ids = sorted({c["event_id"] for c in conflicts})
+        return list(
             self.session.query(CalendarEvent)
-            .join(CalendarEvent.resources)
-            .filter(
-                CalendarEvent.id != event.id,
-                CalendarEvent.is_cancelled == False,
-                CalendarResource.id.in_(resource_ids),
-                CalendarEvent.start_at < end,
-                CalendarEvent.end_at > start,
-            )
-            .distinct()
+            .filter(CalendarEvent.id.in_(ids), CalendarEvent.is_cancelled == False)
+            .all()
         )
 
-        return list(q.all())
-
     # ---------- OPAKOVANIE (RECURRENCE) ---------------------------
 
     def iter_occurrences(
@@ -289,22 +284,14 @@ class CalendarService:
         Používa iCal RRULE reťazec v event.recurrence_rule.
         Vracia dvojice (occ_start, occ_end).
         """
-        if not event.recurrence_rule:
-            yield (event.start_at, event.end_at or event.start_at)
-            return
-
-        rule_str = event.recurrence_rule
-        dtstart = event.start_at
-        until = event.recurrence_until
-
-        rule = rrulestr(rule_str, dtstart=dtstart)
-        if until:
-            rule = rule.replace(until=until)
-
-        duration = (event.end_at or event.start_at) - event.start_at
-
-        for occ_start in rule.between(range_start, range_end, inc=True):
-            yield (occ_start, occ_start + duration)
+        yield from calendar_occurrences.expand(
+            event.recurrence_rule,
+            event.start_at,
+            event.end_at,
+            event.recurrence_until,
+            range_start,
+            range_end,
+        )
 
     # ---------- PRIPOMIENKY ---------------------------------------
 
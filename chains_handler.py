@@ -4,6 +4,10 @@ import traceback
 from datetime import datetime
 from flask import Blueprint, request, jsonify
 import db_connector
+import auth_service
+import http_cache
+import sales_fact
+import order_events
 from auth_handler import login_required
 
 chains_bp = Blueprint('chains_api', __name__)
@@ -210,6 +214,8 @@ def add_chain_store(parent_id):
             conn.commit()
             cur.close()
             conn.close()
+            auth_service.invalidate_identity("b2b:")
+            http_cache.bump("pricelists")
 
         return jsonify({"message": "Prevádzka bola úspešne pridaná."})
     except Exception as e:
@@ -484,6 +490,19 @@ def import_edi_mapping(parent_id):
 # 4. REPORT AKCIOVÝCH PREDAJOV
 # ==========================================
 
+def get_action_sales_report(date_from, date_to, parent_id):
+    """Akciové predaje pobočiek reťazca (z faktov predaja) + súčet tržieb."""
+    rows = sales_fact.action_sales(date_from, date_to, parent_id)
+
+    total_rev = 0.0
+    for r in rows:
+        r['predane_mnozstvo'] = float(r['predane_mnozstvo'] or 0)
+        r['trzby_bez_dph'] = float(r['trzby_bez_dph'] or 0)
+        r['aplikovana_cena'] = float(r['aplikovana_cena'] or 0)
+        total_rev += r['trzby_bez_dph']
+
+    return {"report": rows, "total_action_revenue": total_rev}
+
 @chains_bp.route('/api/chains/action_report', methods=['POST'])
 @login_required(role=("kancelaria", "admin", "veduci"))
 def api_action_sales_report():
@@ -496,34 +515,7 @@ def api_action_sales_report():
         return jsonify({"error": "Chýbajú parametre (date_from, date_to, parent_id)."}), 400
 
     try:
-        sql = """
-            SELECT 
-                pol.ean_produktu AS ean,
-                pol.nazov_vyrobku AS produkt,
-                pol.mj,
-                SUM(pol.mnozstvo) AS predane_mnozstvo,
-                SUM(pol.mnozstvo * pol.cena_bez_dph) AS trzby_bez_dph,
-                MIN(pol.cena_bez_dph) AS aplikovana_cena
-            FROM b2b_objednavky_polozky pol
-            JOIN b2b_objednavky o ON o.id = pol.objednavka_id
-            WHERE pol.is_akcia = 1
-              AND o.pozadovany_datum_dodania >= %s 
-              AND o.pozadovany_datum_dodania <= %s
-              AND o.stav NOT IN ('Zrušená', 'Stornovaná')
-              AND o.zakaznik_id IN (SELECT zakaznik_id FROM b2b_zakaznici WHERE parent_id = %s)
-            GROUP BY pol.ean_produktu, pol.nazov_vyrobku, pol.mj
-            ORDER BY predane_mnozstvo DESC
-        """
-        rows = db_connector.execute_query(sql, (date_from, date_to, parent_id), fetch="all") or []
-        
-        total_rev = 0.0
-        for r in rows:
-            r['predane_mnozstvo'] = float(r['predane_mnozstvo'] or 0)
-            r['trzby_bez_dph'] = float(r['trzby_bez_dph'] or 0)
-            r['aplikovana_cena'] = float(r['aplikovana_cena'] or 0)
-            total_rev += r['trzby_bez_dph']
-            
-        return jsonify({"report": rows, "total_action_revenue": total_rev})
+        return jsonify(get_action_sales_report(date_from, date_to, parent_id))
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"Chyba pri generovaní reportu: {str(e)}"}), 500
@@ -596,6 +588,7 @@ def import_edi_orders(parent_id):
             return jsonify({"error": "Súbor neobsahuje žiadne platné dáta na import."}), 400
 
         processed_orders = 0
+        created_ids = []
         errors = []
 
         for branch_id, items in orders_grouped.items():
@@ -696,8 +689,10 @@ def import_edi_orders(parent_id):
                 """, (new_order_id,) + oi)
 
             processed_orders += 1
+            created_ids.append(new_order_id)
             
         conn.commit()
+        order_events.on_orders_changed("b2b", created_ids)
         return jsonify({
             "message": f"Dáta z EDI úspešne spracované. Vytvorených {processed_orders} objednávok na deň {delivery_date}.",
             "errors": errors
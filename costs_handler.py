@@ -7,6 +7,7 @@ from __future__ import annotations
 from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, date, timedelta
 import calendar
+import dashboard_snapshots
 import db_connector
 import hr_handler
 
@@ -157,12 +158,19 @@ def _update_energy_fields(year: int, month: int, updates: Dict[str, float]) -> N
             f"UPDATE costs_energy_monthly SET {cf_set} WHERE report_year=%s AND report_month=%s",
             tuple(cf_vals), fetch="none"
         )
+    dashboard_snapshots.invalidate("costs")
 
 
 # -----------------------------------------------------------------
 # GET – hlavný prehľad pre UI "Správa nákladov"
 # -----------------------------------------------------------------
-def get_costs_data(year: Any, month: Any) -> Dict[str, Any]:
+def get_costs_data(year: Any, month: Any, force: bool = False) -> Dict[str, Any]:
+    """Posledný snapshot prehľadu za mesiac; uloženia nižšie ho zneplatnia."""
+    y, m = _ym(year, month)
+    return dashboard_snapshots.get("costs", {"year": y, "month": m}, force=force)
+
+
+def _build_costs_data(year: int, month: int) -> Dict[str, Any]:
     y, m = _ym(year, month)
     row = _ensure_energy_row(y, m)
 
@@ -243,6 +251,14 @@ def get_costs_data(year: Any, month: Any) -> Dict[str, Any]:
     return {"year": y, "month": m, "energy": energy, "hr": hr, "operational": operational}
 
 
+def _current_month_params() -> List[Dict[str, Any]]:
+    t = date.today()
+    return [{"year": t.year, "month": t.month}]
+
+
+dashboard_snapshots.register("costs", _build_costs_data, every_s=900, defaults=_current_month_params)
+
+
 # -----------------------------------------------------------------
 # SAVE – energie (univerzálne aj sekčné)
 # -----------------------------------------------------------------
@@ -330,6 +346,7 @@ def save_hr_data(data: Dict[str, Any]) -> Dict[str, Any]:
         """,
         params, fetch="none"
     )
+    dashboard_snapshots.invalidate("costs")
     return {"message": "Dáta o ľudských zdrojoch boli uložené."}
 
 import calendar
@@ -427,12 +444,14 @@ def save_operational_cost(data: Dict[str, Any]) -> Dict[str, Any]:
             "UPDATE costs_items SET entry_date=%s, category_id=%s, name=%s, description=%s, amount_net=%s, is_recurring=%s WHERE id=%s",
             params + (int(item_id),), fetch="none"
         )
+        dashboard_snapshots.invalidate("costs")
         return {"message": "Náklad bol aktualizovaný."}
     else:
         db_connector.execute_query(
             "INSERT INTO costs_items (entry_date, category_id, name, description, amount_net, is_recurring) VALUES (%s, %s, %s, %s, %s, %s)",
             params, fetch="none"
         )
+        dashboard_snapshots.invalidate("costs")
         return {"message": "Nový náklad bol pridaný."}
 
 
@@ -441,6 +460,7 @@ def delete_operational_cost(data: Dict[str, Any]) -> Dict[str, Any]:
     if not item_id:
         return {"error": "Chýba ID nákladu."}
     db_connector.execute_query("DELETE FROM costs_items WHERE id=%s", (int(item_id),), fetch="none")
+    dashboard_snapshots.invalidate("costs")
     return {"message": "Náklad bol vymazaný."}
 
 
@@ -453,6 +473,7 @@ def save_cost_category(data: Dict[str, Any]) -> Dict[str, Any]:
             "INSERT INTO costs_categories (category_name) VALUES (%s)",
             (name,), fetch="none"
         )
+        dashboard_snapshots.invalidate("costs")
         return {"message": f"Kategória '{name}' bola úspešne pridaná."}
     except Exception as e:
         if "Duplicate entry" in str(e):
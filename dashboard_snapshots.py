@@ -0,0 +1,250 @@
+# =================================================================
+# === PREDPOČÍTANÉ SNAPSHOTY DASHBOARDOV ===========================
+# =================================================================
+#
+# Dashboardy (Kancelária, B2C prehľad, B2C štatistiky, náklady) sa
+# nepočítajú pri každom otvorení stránky. Každý si tu zaregistruje
+# builder a hotový výsledok sa uloží do tabuľky dashboard_snapshots
+# pod kľúčom "názov|parametre" – endpoint potom spraví jeden PK lookup.
+#
+# Čerstvosť:
+#   - scheduler (refresh_due) každú minútu obnoví predvolené snapshoty,
+#     ktorým uplynul ich interval alebo ich niekto zneplatnil,
+#   - invalidate(name) po zápise zvýši počítadlo gen; takýto snapshot
+#     prepočíta najbližší tick scheduleru, nie čítanie – pri špičke zápisov
+#     by sa inak takmer každý GET staval znova pod zámkom,
+#   - čítanie stavia inline len chýbajúci snapshot; snapshot s inými než
+#     predvolenými parametrami (ten scheduler neobnovuje) aj po max_age_s,
+#   - get(..., force=True) (endpoint s ?refresh=1) prepočíta vždy.
+# Odpoveď nesie "_snapshot": {built_at, age_s, build_ms, stale}.
+# =================================================================
+import json
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from werkzeug.http import http_date
+
+import db_connector
+
+_registry: Dict[str, Dict[str, Any]] = {}
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_schema_ready = False
+
+KEEP_DAYS = 7  # snapshoty s nepredvolenými parametrami, ktoré nikto nečíta
+
+
+def ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS dashboard_snapshots (
+            snap_key   VARCHAR(191) NOT NULL PRIMARY KEY,
+            name       VARCHAR(64)  NOT NULL,
+            params     TEXT NULL,
+            payload    LONGTEXT NOT NULL,
+            built_at   DATETIME NOT NULL,
+            build_ms   INT NOT NULL DEFAULT 0,
+            gen        INT NOT NULL DEFAULT 0,
+            built_gen  INT NOT NULL DEFAULT 0,
+            INDEX idx_ds_name (name),
+            INDEX idx_ds_built (built_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = True
+
+
+def register(name: str, builder: Callable[..., Dict[str, Any]], every_s: int = 300,
+             max_age_s: Optional[int] = None,
+             defaults: Optional[Callable[[], List[Dict[str, Any]]]] = None) -> None:
+    """
+    name      – kľúč dashboardu
+    builder   – builder(**params) -> dict (dict s "error" sa neukladá)
+    every_s   – ako často scheduler obnovuje predvolené snapshoty
+    max_age_s – staršie snapshoty s nepredvolenými parametrami sa pri čítaní
+                prepočítajú hneď (default 3× every_s)
+    defaults  – () -> zoznam parametrov, ktoré scheduler drží teplé (default [{}])
+    """
+    _registry[name] = {
+        "builder": builder,
+        "every_s": int(every_s),
+        "max_age_s": int(max_age_s or every_s * 3),
+        "defaults": defaults or (lambda: [{}]),
+    }
+
+
+def _norm_params(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: v for k, v in sorted((params or {}).items()) if v not in (None, "")}
+
+
+def _key(name: str, params: Dict[str, Any]) -> str:
+    return (name + "|" + json.dumps(params, sort_keys=True, ensure_ascii=False, default=str))[:191]
+
+
+def _json_default(o):
+    # rovnaké kódovanie ako Flask jsonify, aby sa tvar odpovede nezmenil
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, (datetime, date)):
+        return http_date(o)
+    return str(o)
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        lk = _locks.get(key)
+        if lk is None:
+            lk = _locks[key] = threading.Lock()
+        return lk
+
+
+def _read(key: str) -> Optional[Dict[str, Any]]:
+    return db_connector.execute_query("""
+        SELECT payload, built_at, build_ms, gen, built_gen,
+               TIMESTAMPDIFF(SECOND, built_at, NOW()) AS age_s
+          FROM dashboard_snapshots
+         WHERE snap_key=%s
+    """, (key,), fetch='one')
+
+
+def _is_default(spec: Dict[str, Any], params: Dict[str, Any]) -> bool:
+    try:
+        return any(_norm_params(p) == params for p in (spec["defaults"]() or [{}]))
+    except Exception:
+        return False
+
+
+def _servable(row: Optional[Dict[str, Any]], spec: Dict[str, Any], default: bool) -> bool:
+    """Dá sa vrátiť bez prepočtu? Zneplatnenie (gen) rieši scheduler, nie request."""
+    if not row:
+        return False
+    return default or int(row.get("age_s") or 0) < spec["max_age_s"]
+
+
+def _is_fresh(row: Optional[Dict[str, Any]], max_age_s: int) -> bool:
+    if not row:
+        return False
+    if int(row.get("built_gen") or 0) < int(row.get("gen") or 0):
+        return False
+    return int(row.get("age_s") or 0) < max_age_s
+
+
+def _build(name: str, params: Dict[str, Any], key: str) -> Dict[str, Any]:
+    spec = _registry[name]
+    cur = db_connector.execute_query(
+        "SELECT gen FROM dashboard_snapshots WHERE snap_key=%s", (key,), fetch='one')
+    gen = int((cur or {}).get("gen") or 0)  # čo príde po tomto bode, snapshot znovu zneplatní
+
+    t0 = time.perf_counter()
+    payload = spec["builder"](**params)
+    build_ms = int((time.perf_counter() - t0) * 1000)
+    if not isinstance(payload, dict) or payload.get("error"):
+        return payload
+
+    db_connector.execute_query("""
+        INSERT INTO dashboard_snapshots (snap_key, name, params, payload, built_at, build_ms, gen, built_gen)
+        VALUES (%s, %s, %s, %s, NOW(), %s, %s, %s)
+        ON DUPLICATE KEY UPDATE payload=VALUES(payload), built_at=VALUES(built_at),
+                                build_ms=VALUES(build_ms), built_gen=VALUES(built_gen)
+    """, (key, name, json.dumps(params, ensure_ascii=False, default=str),
+          json.dumps(payload, ensure_ascii=False, default=_json_default),
+          build_ms, gen, gen), fetch='none')
+    out = json.loads(json.dumps(payload, ensure_ascii=False, default=_json_default))
+    out["_snapshot"] = {"built_at": datetime.now().isoformat(timespec="seconds"),
+                        "age_s": 0, "build_ms": build_ms, "stale": False}
+    return out
+
+
+def _from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    out = json.loads(row["payload"])
+    built = row.get("built_at")
+    out["_snapshot"] = {
+        "built_at": built.isoformat(timespec="seconds") if hasattr(built, "isoformat") else str(built),
+        "age_s": int(row.get("age_s") or 0),
+        "build_ms": int(row.get("build_ms") or 0),
+        "stale": int(row.get("built_gen") or 0) < int(row.get("gen") or 0),
+    }
+    return out
+
+
+def get(name: str, params: Optional[Dict[str, Any]] = None, force: bool = False) -> Dict[str, Any]:
+    """
+    Posledný snapshot dashboardu (jeden PK lookup) aj so svojím vekom;
+    inline sa stavia len chýbajúci (resp. prestarnutý nepredvolený) alebo pri force.
+    """
+    spec = _registry[name]
+    ensure_schema()
+    params = _norm_params(params)
+    key = _key(name, params)
+    default = _is_default(spec, params)
+
+    if not force:
+        row = _read(key)
+        if _servable(row, spec, default):
+            return _from_row(row)
+
+    with _lock_for(key):
+        if not force:
+            # kým sme čakali na zámok, mohol snapshot postaviť iný request
+            row = _read(key)
+            if _servable(row, spec, default):
+                return _from_row(row)
+        return _build(name, params, key)
+
+
+def invalidate(*names: str) -> None:
+    """Po zápise: snapshoty daných dashboardov prepočíta najbližší tick scheduleru. Nikdy nevyhodí chybu."""
+    names = [n for n in names if n]
+    if not names:
+        return
+    try:
+        ensure_schema()
+        db_connector.execute_query(
+            f"UPDATE dashboard_snapshots SET gen = gen + 1 WHERE name IN ({','.join(['%s'] * len(names))})",
+            tuple(names), fetch='none')
+    except Exception as e:
+        print(f"[SNAPSHOTY] invalidate {names}: {e}")
+
+
+def refresh_due() -> Dict[str, int]:
+    """Scheduler tick: obnoví predvolené snapshoty po intervale alebo po zneplatnení, upratuje staré kľúče."""
+    ensure_schema()
+    built = 0
+    for name, spec in list(_registry.items()):
+        try:
+            param_sets = spec["defaults"]() or [{}]
+        except Exception as e:
+            print(f"[SNAPSHOTY] {name} defaults: {e}")
+            continue
+        for params in param_sets:
+            params = _norm_params(params)
+            key = _key(name, params)
+            try:
+                if _is_fresh(_read(key), spec["every_s"]):
+                    continue
+                with _lock_for(key):
+                    _build(name, params, key)
+                built += 1
+            except Exception as e:
+                print(f"[SNAPSHOTY] {key}: {e}")
+    db_connector.execute_query(
+        "DELETE FROM dashboard_snapshots WHERE built_at < NOW() - INTERVAL %s DAY",
+        (KEEP_DAYS,), fetch='none')
+    return {"built": built}
+
+
+def wants_refresh(args) -> bool:
+    """?refresh=1 na endpointe vynúti prepočet."""
+    return str((args or {}).get("refresh") or "").lower() in ("1", "true", "yes")
+
+
+# dashboardy, ktoré počítajú objednávky – zneplatňujú sa po vytvorení/zmene objednávky
+ORDER_DASHBOARDS = ("kancelaria_home", "b2c_dashboard", "b2c_stats_overview")
+
+
+def orders_changed() -> None:
+    invalidate(*ORDER_DASHBOARDS)
@@ -1,4 +1,5 @@
 import db_connector
+import product_cost_index
 from datetime import datetime, timedelta
 import math
 
@@ -131,6 +132,7 @@ def receive_multiple_stock_items(items):
         execute_query("INSERT INTO zaznamy_prijem (datum, nazov_suroviny, mnozstvo_kg, nakupna_cena_eur_kg, poznamka_dodavatel) VALUES (%s, %s, %s, %s, %s)", items_to_log, fetch='none', multi=True)
     if updates_to_sklad:
         execute_query("UPDATE sklad SET mnozstvo = %s, nakupna_cena = %s WHERE nazov = %s", updates_to_sklad, fetch='none', multi=True)
+        product_cost_index.refresh_stock_items(u[2] for u in updates_to_sklad)
 
     return {"message": f"Úspešne prijatých {len(items_to_log)} položiek na sklad."}
 
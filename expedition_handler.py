@@ -7,6 +7,7 @@
 # - Bez zásahu do tvojej schémy – všetky doplnky sú „autodetect“
 
 import db_connector
+import product_cost_index
 from datetime import datetime, date, timedelta
 import json
 import math
@@ -837,6 +838,7 @@ def accept_production_item(payload: Dict[str, Any]):
             cur.execute(f"UPDATE produkty SET {manuf_col}=%s WHERE ean=%s", (new_avg, ean))
 
         conn.commit()
+        product_cost_index.refresh_products([ean])
         msg = f"Príjem uložený. +{kg_add:.2f} kg na sklad."
         return {"message": msg}
 
@@ -846,6 +848,194 @@ def accept_production_item(payload: Dict[str, Any]):
     finally:
         if conn and conn.is_connected(): conn.close()
 
+def accept_production_items(payload: Dict[str, Any]):
+    """
+    Hromadný príjem na konci zmeny – veľa šarží v jednej transakcii.
+    payload: {items:[{batchId, unit, actualValue, note?}], workerName, acceptDate}
+    Vráti {"results":[{batchId, ok, message|error}], "accepted", "failed"}.
+
+    Oproti accept_production_item:
+      - produkty sa zamknú naraz, zoradené podľa EAN (rovnaké poradie vo
+        všetkých transakciách => žiadny deadlock medzi dvoma tabletmi),
+      - súčty prijmov šarže sa načítajú raz a ďalej sa len pripočítavajú,
+      - INSERT do expedicia_prijmy a UPDATE zaznamy_vyroba/produkty idú cez executemany.
+    Neplatné riadky sa preskočia s chybou; chyba DB vráti späť celú dávku.
+    """
+    _ensure_expedition_schema()
+
+    payload  = payload or {}
+    worker   = payload.get('workerName') or 'Neznámy'
+    accept_d = payload.get('acceptDate') or date.today().strftime('%Y-%m-%d')
+    raw      = payload.get('items') or []
+
+    results: List[Dict[str, Any]] = []
+    todo = []
+    for it in raw:
+        batch_id = (it or {}).get('batchId')
+        unit     = (it or {}).get('unit')
+        value    = _parse_num((it or {}).get('actualValue'))
+        if not batch_id or unit not in ('kg', 'ks') or value <= 0:
+            results.append({"batchId": batch_id, "ok": False,
+                            "error": "Chýba batchId/unit alebo neplatná hodnota prijmu."})
+            continue
+        todo.append({"batchId": str(batch_id), "unit": unit, "value": value,
+                     "note": (it or {}).get('note'), "idx": len(results)})
+        results.append(None)
+
+    if not todo:
+        return {"results": results, "accepted": 0, "failed": len(results)}
+
+    zv = _zv_name_col()
+    batch_ids = sorted({t['batchId'] for t in todo})
+    ph = ",".join(["%s"] * len(batch_ids))
+    info_rows = db_connector.execute_query(
+        f"""
+        SELECT zv.id_davky, zv.celkova_cena_surovin,
+               p.nazov_vyrobku, p.mj, p.vaha_balenia_g, p.ean
+          FROM zaznamy_vyroba zv
+          LEFT JOIN produkty p ON TRIM(zv.{zv}) = TRIM(p.nazov_vyrobku)
+         WHERE zv.id_davky IN ({ph})
+        """,
+        tuple(batch_ids)
+    ) or []
+    info: Dict[str, Dict[str, Any]] = {}
+    for r in info_rows:
+        info.setdefault(str(r['id_davky']), r)
+
+    for t in list(todo):
+        if t['batchId'] not in info:
+            results[t['idx']] = {"batchId": t['batchId'], "ok": False,
+                                 "error": "Nepodarilo sa nájsť produkt pre danú šaržu."}
+            todo.remove(t)
+    if not todo:
+        return {"results": results, "accepted": 0, "failed": len(results)}
+
+    manuf_col = _product_manuf_avg_col()
+    eans = sorted({(info[t['batchId']].get('ean') or '').strip() for t in todo} - {''})
+    batch_ids = sorted({t['batchId'] for t in todo})
+
+    conn = db_connector.get_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+
+        # 1) zámky produktov – vždy v poradí EAN
+        stock: Dict[str, Dict[str, Any]] = {}
+        if eans:
+            avg_sel = f", {manuf_col} AS avgc" if manuf_col else ""
+            cur.execute(
+                f"SELECT ean, COALESCE(aktualny_sklad_finalny_kg,0) AS q{avg_sel} FROM produkty "
+                f"WHERE ean IN ({','.join(['%s'] * len(eans))}) ORDER BY ean FOR UPDATE",
+                tuple(eans)
+            )
+            for r in cur.fetchall() or []:
+                try: avgc = float(r.get('avgc')) if manuf_col else None
+                except (TypeError, ValueError): avgc = None
+                stock[r['ean']] = {"q": float(r.get('q') or 0.0), "avg": avgc, "avg_changed": False}
+
+        # 2) doterajšie súčty prijmov šarží – raz, ďalej len inkrementálne
+        totals = {b: {"kg": 0.0, "ks": 0} for b in batch_ids}
+        cur.execute(
+            f"""
+            SELECT ep.id_davky, ep.unit, SUM(COALESCE(ep.prijem_kg,0)) AS kg, SUM(COALESCE(ep.prijem_ks,0)) AS ks
+              FROM expedicia_prijmy ep
+             WHERE ep.id_davky IN ({','.join(['%s'] * len(batch_ids))}) AND ep.is_deleted=0
+             GROUP BY ep.id_davky, ep.unit
+            """,
+            tuple(batch_ids)
+        )
+        for r in cur.fetchall() or []:
+            tot = totals[str(r['id_davky'])]
+            if r['unit'] == 'kg':
+                tot['kg'] += float(r['kg'] or 0.0)
+            else:
+                wg = float(info[str(r['id_davky'])].get('vaha_balenia_g') or 0.0)
+                ks_val = int(r['ks'] or 0)
+                tot['ks'] += ks_val
+                if wg > 0:
+                    tot['kg'] += (ks_val * wg) / 1000.0
+
+        # 3) výpočet v pamäti (v poradí požiadavky, rovnako ako postupné volania)
+        inserts = []
+        unit_costs: Dict[str, Optional[float]] = {}
+        for t in todo:
+            b = t['batchId']
+            inf = info[b]
+            ean = (inf.get('ean') or '').strip()
+            mj  = inf.get('mj') or 'kg'
+            wg  = float(inf.get('vaha_balenia_g') or 0.0)
+            kg_add = t['value'] if t['unit'] == 'kg' else ((t['value'] * wg) / 1000.0)
+
+            if t['unit'] == 'kg':
+                inserts.append((b, inf.get('nazov_vyrobku'), 'kg', t['value'], None, worker, t['note'], accept_d))
+                totals[b]['kg'] += t['value']
+            else:
+                inserts.append((b, inf.get('nazov_vyrobku'), 'ks', None, int(t['value']), worker, t['note'], accept_d))
+                totals[b]['ks'] += int(t['value'])
+                if wg > 0:
+                    totals[b]['kg'] += kg_add
+
+            total_cost = float(inf.get('celkova_cena_surovin') or 0.0)
+            unit_cost = perkg_cost = None
+            if total_cost > 0:
+                if mj == 'kg' and totals[b]['kg'] > 0:
+                    unit_cost = perkg_cost = total_cost / totals[b]['kg']
+                elif mj == 'ks' and totals[b]['ks'] > 0:
+                    unit_cost = total_cost / totals[b]['ks']
+                    if wg > 0:
+                        perkg_cost = unit_cost / (wg / 1000.0)
+            if unit_cost is not None:
+                unit_costs[b] = unit_cost
+
+            st = stock.get(ean)
+            if st is not None:
+                if perkg_cost is not None and manuf_col:
+                    new_total = st['q'] + kg_add
+                    st['avg'] = perkg_cost if (st['avg'] is None or new_total <= 0) else \
+                                ((st['avg'] * st['q']) + (perkg_cost * kg_add)) / new_total
+                    st['avg_changed'] = True
+                st['q'] += kg_add
+
+            results[t['idx']] = {"batchId": b, "ok": True,
+                                 "message": f"Príjem uložený. +{kg_add:.2f} kg na sklad."}
+
+        # 4) zápisy po dávkach
+        cur.executemany("""INSERT INTO expedicia_prijmy
+                           (id_davky, nazov_vyrobku, unit, prijem_kg, prijem_ks, prijal, dovod, datum_prijmu, created_at)
+                           VALUES (%s,%s,%s,%s,%s,%s,%s,%s,NOW())""", inserts)
+
+        zv_kg = [(totals[b]['kg'], b) for b in batch_ids if (info[b].get('mj') or 'kg') == 'kg']
+        zv_ks = [(totals[b]['ks'], totals[b]['kg'], b) for b in batch_ids if (info[b].get('mj') or 'kg') != 'kg']
+        if zv_kg:
+            cur.executemany(
+                "UPDATE zaznamy_vyroba SET stav='Prijaté, čaká na tlač', realne_mnozstvo_kg=%s, datum_ukoncenia=NOW() WHERE id_davky=%s",
+                zv_kg)
+        if zv_ks:
+            cur.executemany(
+                "UPDATE zaznamy_vyroba SET stav='Prijaté, čaká na tlač', realne_mnozstvo_ks=%s, realne_mnozstvo_kg=%s, datum_ukoncenia=NOW() WHERE id_davky=%s",
+                zv_ks)
+        if unit_costs:
+            cur.executemany("UPDATE zaznamy_vyroba SET cena_za_jednotku=%s WHERE id_davky=%s",
+                            [(c, b) for b, c in sorted(unit_costs.items())])
+
+        if stock:
+            cur.executemany("UPDATE produkty SET aktualny_sklad_finalny_kg=%s WHERE ean=%s",
+                            [(st['q'], e) for e, st in sorted(stock.items())])
+            changed = [(st['avg'], e) for e, st in sorted(stock.items()) if st['avg_changed']]
+            if changed:
+                cur.executemany(f"UPDATE produkty SET {manuf_col}=%s WHERE ean=%s", changed)
+
+        conn.commit()
+    except Exception as e:
+        if conn: conn.rollback()
+        raise e
+    finally:
+        if conn and conn.is_connected(): conn.close()
+
+    product_cost_index.refresh_products(eans)
+    accepted = sum(1 for r in results if r and r.get('ok'))
+    return {"results": results, "accepted": accepted, "failed": len(results) - accepted,
+            "message": f"Prijatých šarží: {accepted} z {len(results)}."}
+
 # ─────────────────────────────────────────────────────────────
 # Archív prijmov
 # ─────────────────────────────────────────────────────────────
@@ -1044,6 +1234,7 @@ def finalize_slicing_transaction(log_id, actual_pieces):
         """, (batch_id_out, source_prod['nazov_vyrobku'], -total_weight_kg))
 
         conn.commit()
+        product_cost_index.refresh_products([target_ean, source_ean])
         return {"message": "Hotovo. Krájanie bolo úspešne zapísané do denného príjmu (čaká na večernú uzávierku)."}
 
     except Exception as e:
@@ -1364,10 +1555,19 @@ def get_traceability_info(batch_id):
                 "ccp": meta_row.get('ccp_body')          # Ak chcete tlačiť aj CCP
             }
 
+    # 4. Genealógia: z ktorých príjmov surovín dávka vznikla a komu bola dodaná
+    try:
+        import lot_genealogy
+        genealogy = lot_genealogy.summary(lot_genealogy.DAVKA, batch_id)
+    except Exception as e:
+        print(f"[TRACE] genealógia {batch_id}: {e}")
+        genealogy = {}
+
     return {
         "batch_info": batch_info, 
         "ingredients": ingredients,
-        "meta_info": meta_info  # <--- Posielame na frontend
+        "meta_info": meta_info,  # <--- Posielame na frontend
+        "genealogy": genealogy
     }
 # expedition_handler.py
 
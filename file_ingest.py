@@ -0,0 +1,415 @@
+# =================================================================
+# === PRÍJEM SÚBOROV Z VÝMENNÝCH ADRESÁROV (TERMINÁL, EDI, ERP) ======
+# =================================================================
+#
+# Spoločný rámec pre adresáre, do ktorých iné systémy "hodia" súbor:
+#   terminal  -> static/vyprobjed (váženie z terminálu)
+#   edi       -> ERP_EXCHANGE_DIR (EDI objednávky reťazcov)
+#   erp_stock -> ERP_EXCHANGE_DIR (ZASOBA.CSV zo skladového ERP)
+#   erp_edi   -> sync_erp.py --mode edi
+# Kanál (Channel) si registruje modul, ktorý súbory spracúva; handler
+# dostane cestu k jednému súboru a pri chybe vyhodí výnimku. O zvyšok sa
+# stará tento modul:
+#
+#   - sledovanie: inotify (Linux, cez ctypes – bez závislostí); ak nie je
+#     k dispozícii, polling adresárov každých INGEST_POLL_S sekúnd,
+#   - dopísaný súbor: IN_CLOSE_WRITE / IN_MOVED_TO, inak mtime starší ako
+#     INGEST_SETTLE_S – nikde sa nečaká cez sleep, nedopísané súbory sa
+#     len skontrolujú znova v ďalšom ťahu slučky,
+#   - exactly-once: žurnál file_ingest_journal s kľúčom (adresár, SHA-256
+#     obsahu). Súbor spracuje len ten proces, ktorý si ho zaberie; rovnaký
+#     obsah už spracovaný skôr ide rovno do archívu. Zaseknuté 'processing'
+#     (pád procesu) sa po INGEST_STALE_S zaberie znova, 'error' po
+#     opätovnom vložení súboru tiež,
+#   - paralelne: pool INGEST_WORKERS vlákien,
+#   - jednotné smerovanie: úspech -> archive_dir, chyba -> error_dir
+#     (+ <súbor>.error.txt s chybou); pri kolízii názvu sa pridá čas.
+#
+# start() spúšťa trvalé sledovanie (scheduler), sweep() jednorazový prechod
+# (CLI skripty a minútová poistka v scheduleri).
+# =================================================================
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import shutil
+import socket
+import struct
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import db_connector
+
+SETTLE_S = float(os.getenv("INGEST_SETTLE_S", "2"))
+POLL_S = float(os.getenv("INGEST_POLL_S", "2"))
+POLL_WITH_INOTIFY_S = float(os.getenv("INGEST_POLL_WITH_INOTIFY_S", "60"))
+STALE_S = int(os.getenv("INGEST_STALE_S", "600"))
+WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Channel:
+    """Jeden vstupný adresár a jeho spracovanie."""
+
+    def __init__(self, name: str, directory: str, handler: Callable[[str], Any], *,
+                 accept: Callable[[str], bool], archive_dir: str, error_dir: str,
+                 once_per_content: bool = True):
+        self.name = name
+        self.directory = directory
+        self.handler = handler
+        self.accept = accept
+        self.archive_dir = archive_dir
+        self.error_dir = error_dir
+        # False = rovnaký obsah nahraný znova (napr. nezmenený stav skladu) sa spracuje znova
+        self.once_per_content = once_per_content
+
+    @property
+    def dir_key(self) -> str:
+        return os.path.realpath(self.directory)[:255]
+
+    def ensure_dirs(self) -> None:
+        for d in (self.directory, self.archive_dir, self.error_dir):
+            os.makedirs(d, exist_ok=True)
+
+    def list_files(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, n) for n in sorted(names)
+                if self.accept(n) and os.path.isfile(os.path.join(self.directory, n))]
+
+
+_channels: Dict[str, Channel] = {}
+
+
+def register(channel: Channel) -> Channel:
+    _channels[channel.name] = channel
+    return channel
+
+
+def _selected(names: Optional[Iterable[str]]) -> List[Channel]:
+    if names is None:
+        return list(_channels.values())
+    return [_channels[n] for n in names if n in _channels]
+
+
+# --- žurnál -----------------------------------------------------------------------
+_schema_ready = False
+
+
+def ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS file_ingest_journal (
+            id          BIGINT AUTO_INCREMENT PRIMARY KEY,
+            dir_key     VARCHAR(255) NOT NULL,
+            fingerprint CHAR(64) NOT NULL,
+            channel     VARCHAR(32) NOT NULL,
+            filename    VARCHAR(255) NOT NULL,
+            size_bytes  BIGINT NOT NULL DEFAULT 0,
+            state       ENUM('processing','done','error') NOT NULL,
+            attempts    INT NOT NULL DEFAULT 1,
+            claimed_by  VARCHAR(96) NULL,
+            message     TEXT NULL,
+            moved_to    VARCHAR(512) NULL,
+            started_at  DATETIME NOT NULL,
+            finished_at DATETIME NULL,
+            UNIQUE KEY uq_fij_file (dir_key, fingerprint),
+            KEY idx_fij_channel (channel, started_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = True
+
+
+def _claim(ch: Channel, filename: str, fingerprint: str, size: int):
+    """Vráti (journal_id, 'claimed' | 'duplicate' | 'busy')."""
+    def work(conn):
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("""
+                INSERT IGNORE INTO file_ingest_journal
+                    (dir_key, fingerprint, channel, filename, size_bytes, state, attempts, claimed_by, started_at)
+                VALUES (%s, %s, %s, %s, %s, 'processing', 1, %s, NOW())
+            """, (ch.dir_key, fingerprint, ch.name, filename[:255], size, _WORKER_ID))
+            if cur.rowcount == 1:
+                return cur.lastrowid, "claimed"
+            cur.execute("""
+                SELECT id, state, started_at < NOW() - INTERVAL %s SECOND AS stale
+                  FROM file_ingest_journal WHERE dir_key=%s AND fingerprint=%s FOR UPDATE
+            """, (STALE_S, ch.dir_key, fingerprint))
+            row = cur.fetchone()
+            if not row:
+                return None, "busy"
+            if row["state"] == "done":
+                return row["id"], "duplicate"
+            if row["state"] == "error" or row["stale"]:
+                cur.execute("""
+                    UPDATE file_ingest_journal
+                       SET state='processing', attempts=attempts+1, channel=%s, filename=%s, claimed_by=%s,
+                           started_at=NOW(), finished_at=NULL, message=NULL, moved_to=NULL
+                     WHERE id=%s
+                """, (ch.name, filename[:255], _WORKER_ID, row["id"]))
+                return row["id"], "claimed"
+            return row["id"], "busy"
+        finally:
+            cur.close()
+    return db_connector.with_transaction(work)
+
+
+def _finish(journal_id: int, state: str, message: Optional[str], moved_to: Optional[str]) -> None:
+    db_connector.execute_query("""
+        UPDATE file_ingest_journal SET state=%s, message=%s, moved_to=%s, finished_at=NOW() WHERE id=%s
+    """, (state, (message or None) and str(message)[:4000], moved_to, journal_id), fetch='none')
+
+
+# --- smerovanie ---------------------------------------------------------------------
+def _route(path: str, dest_dir: str) -> str:
+    os.makedirs(dest_dir, exist_ok=True)
+    name = os.path.basename(path)
+    dest = os.path.join(dest_dir, name)
+    if os.path.exists(dest):
+        base, ext = os.path.splitext(name)
+        dest = os.path.join(dest_dir, f"{base}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}{ext}")
+    shutil.move(path, dest)
+    return dest
+
+
+def _process(ch: Channel, path: str) -> str:
+    """Spracuje jeden dopísaný súbor; vráti výsledný stav."""
+    filename = os.path.basename(path)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data)
+        if not ch.once_per_content:
+            digest.update(str(os.stat(path).st_mtime_ns).encode())
+    except FileNotFoundError:
+        return "gone"
+    ensure_schema()
+    journal_id, claim = _claim(ch, filename, digest.hexdigest(), len(data))
+    if claim == "busy":
+        return claim
+    if claim == "duplicate":
+        _route(path, ch.archive_dir)
+        print(f">>> [INGEST:{ch.name}] {filename}: rovnaký obsah už bol spracovaný -> archív")
+        return claim
+
+    started = time.perf_counter()
+    try:
+        result = ch.handler(path)
+    except Exception as e:
+        dest = None
+        try:
+            dest = _route(path, ch.error_dir)
+            with open(dest + ".error.txt", "w", encoding="utf-8") as f:
+                f.write(traceback.format_exc())
+        except Exception as move_err:
+            print(f">>> [INGEST:{ch.name}] {filename}: presun do chýb zlyhal: {move_err}")
+        _finish(journal_id, "error", f"{type(e).__name__}: {e}", dest)
+        print(f">>> [INGEST:{ch.name}] CHYBA {filename}: {e}")
+        return "error"
+
+    dest = _route(path, ch.archive_dir)
+    _finish(journal_id, "done", None if result is None else str(result), dest)
+    print(f">>> [INGEST:{ch.name}] {filename} spracovaný za {int((time.perf_counter() - started) * 1000)} ms")
+    return "done"
+
+
+def _is_complete(path: str, closed: bool, now: float) -> Optional[bool]:
+    """True = dopísaný, False = ešte sa zapisuje, None = zmizol alebo je prázdny (čaká na zápis)."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if st.st_size == 0:
+        return None
+    return closed or (now - st.st_mtime) >= SETTLE_S
+
+
+# --- jednorazový prechod ----------------------------------------------------------------
+def sweep(names: Optional[Iterable[str]] = None, *, workers: int = WORKERS) -> Dict[str, int]:
+    """Spracuje všetky už dopísané súbory vybraných kanálov (paralelne) a počká na výsledok."""
+    stats: Dict[str, int] = {}
+    jobs = []
+    now = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest") as pool:
+        for ch in _selected(names):
+            ch.ensure_dirs()
+            for path in ch.list_files():
+                ready = _is_complete(path, False, now)
+                if ready:
+                    jobs.append(pool.submit(_process, ch, path))
+                elif ready is False:
+                    stats["pending"] = stats.get("pending", 0) + 1
+        for fut in jobs:
+            try:
+                state = fut.result()
+            except Exception as e:
+                print(f">>> [INGEST] sweep: {e}")
+                state = "failed"
+            stats[state] = stats.get(state, 0) + 1
+    return stats
+
+
+# --- inotify (Linux) -------------------------------------------------------------------
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        # rovnaký adresár vráti rovnaký wd – viac kanálov (napr. edi a erp_stock) zdieľa jeden watch
+        self.wds: Dict[int, List[Channel]] = {}
+
+    def watch(self, ch: Channel) -> None:
+        wd = self._add(self.fd, os.fsencode(ch.directory), _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch {ch.directory}")
+        self.wds.setdefault(wd, []).append(ch)
+
+    def read(self):
+        """[(channel, path, closed)] z udalostí, ktoré sú k dispozícii."""
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        out, i = [], 0
+        while i + _EVENT.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT.unpack_from(buf, i)
+            name = buf[i + _EVENT.size:i + _EVENT.size + length].rstrip(b"\0").decode("utf-8", "replace")
+            i += _EVENT.size + length
+            if not name:
+                continue
+            closed = bool(mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO))
+            for ch in self.wds.get(wd, ()):
+                if ch.accept(name):
+                    out.append((ch, os.path.join(ch.directory, name), closed))
+        return out
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+# --- trvalé sledovanie ------------------------------------------------------------------
+class _Watcher(threading.Thread):
+    def __init__(self, channels: List[Channel], wrap: Callable):
+        super().__init__(name="file-ingest", daemon=True)
+        self.channels = channels
+        self.pool = ThreadPoolExecutor(max_workers=max(1, WORKERS), thread_name_prefix="ingest")
+        self.run_one = wrap(_process)
+        self.stop_event = threading.Event()
+        self.pending: Dict[str, tuple] = {}      # path -> (channel, closed)
+        self.inflight: Set[str] = set()
+        self.lock = threading.Lock()
+        self.inotify: Optional[_Inotify] = None
+
+    def _submit(self, ch: Channel, path: str) -> None:
+        with self.lock:
+            if path in self.inflight:
+                return
+            self.inflight.add(path)
+
+        def done(_fut, path=path):
+            with self.lock:
+                self.inflight.discard(path)
+        self.pool.submit(self.run_one, ch, path).add_done_callback(done)
+
+    def _scan(self) -> None:
+        for ch in self.channels:
+            for path in ch.list_files():
+                if path not in self.pending:
+                    self.pending[path] = (ch, False)
+
+    def run(self) -> None:
+        for ch in self.channels:
+            ch.ensure_dirs()
+        try:
+            self.inotify = _Inotify()
+            for ch in self.channels:
+                self.inotify.watch(ch)
+            poll_s = POLL_WITH_INOTIFY_S
+        except Exception as e:
+            print(f">>> [INGEST] inotify nie je k dispozícii ({e}) – polling každých {POLL_S}s")
+            if self.inotify:
+                self.inotify.close()
+            self.inotify = None
+            poll_s = POLL_S
+        print(f">>> [INGEST] sledujem: {', '.join(f'{c.name}={c.directory}' for c in self.channels)}")
+
+        last_scan = 0.0
+        while not self.stop_event.is_set():
+            tick = 0.5 if self.pending else poll_s
+            if self.inotify:
+                ready, _, _ = select.select([self.inotify.fd], [], [], tick)
+                if ready:
+                    for ch, path, closed in self.inotify.read():
+                        prev = self.pending.get(path)
+                        self.pending[path] = (ch, closed or bool(prev and prev[1]))
+            else:
+                self.stop_event.wait(min(tick, POLL_S))
+
+            now = time.time()
+            if now - last_scan >= poll_s:
+                last_scan = now
+                try:
+                    self._scan()
+                except Exception as e:
+                    print(f">>> [INGEST] scan: {e}")
+
+            for path, (ch, closed) in list(self.pending.items()):
+                state = _is_complete(path, closed, now)
+                if state is None:
+                    self.pending.pop(path, None)
+                elif state:
+                    self.pending.pop(path, None)
+                    self._submit(ch, path)
+
+        if self.inotify:
+            self.inotify.close()
+        self.pool.shutdown(wait=True)
+
+
+_watcher: Optional[_Watcher] = None
+
+
+def start(names: Optional[Iterable[str]] = None, *, wrap: Optional[Callable] = None) -> bool:
+    """Spustí sledovanie vybraných kanálov na pozadí (raz za proces)."""
+    global _watcher
+    if _watcher and _watcher.is_alive():
+        return False
+    channels = _selected(names)
+    if not channels:
+        return False
+    _watcher = _Watcher(channels, wrap or (lambda f: f))
+    _watcher.start()
+    return True
+
+
+def stop(timeout: Optional[float] = None) -> None:
+    """Zastaví sledovanie; s `timeout` počká na dobehnutie vlákna (kvôli opätovnému start())."""
+    if _watcher:
+        _watcher.stop_event.set()
+        if timeout is not None and _watcher.is_alive():
+            _watcher.join(timeout)
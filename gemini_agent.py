@@ -23,6 +23,7 @@ ROW_LIMIT_DEFAULT = int(os.getenv("AI_SQL_ROW_LIMIT", "200"))
 
 # === DB + AI nástroje ========================================================
 import db_connector
+import ai_query_governor
 from nastroje_ai import (
     get_schema_prompt,         # <--- TOTO je kľúčová funkcia, ktorá číta tvoj súbor
     vykonaj_bezpecny_sql_prikaz,
@@ -107,6 +108,43 @@ def _extract_sql_only(text: str) -> Optional[str]:
     if s: return s.group(0).split(";")[0].strip()
     return None
 
+def _answer_from_result(q: str, sql: str, res: Dict[str, Any]) -> Dict[str, Any]:
+    """Zhrnutie od LLM + HTML tabuľka k výsledku SQL."""
+    rows = res.get("rows", [])
+    
+    # Summarizer
+    sample = json.dumps([{k: str(v) for k,v in r.items()} for r in rows[:3]], ensure_ascii=False)
+    sum_prompt = (
+        f"Pôvodná požiadavka užívateľa: {q}\n"
+        f"Nájdené dáta (vzorka): {sample}\n\n"
+        "Tvojou úlohou je napísať úvodný text e-mailu k týmto dátam.\n"
+        "PRAVIDLÁ:\n"
+        "1. Ak užívateľ v požiadavke napísal konkrétny text (napr. 'úvodný text mailu napíšeš...'), POUŽI PRESNE TEN TEXT.\n"
+        "2. Ak užívateľ text nešpecifikoval, napíš stručné zhrnutie pre manažéra.\n"
+        "3. Nevypisuj žiadne dáta ani tabuľky, tie sa pridajú automaticky pod tvoj text.\n"
+        "4. Odpovedz iba čistým textom správy."
+    )
+    sum_resp = _call_llm(sum_prompt)
+    human_text = sum_resp if not sum_resp.startswith("AI ERROR:") else f"Našiel som {len(rows)} záznamov. (AI sumarizácia zlyhala)"
+
+
+    html_table = _rows_to_email_html(rows)
+    
+    full_html = (
+        f"<div style='font-family: Arial, sans-serif;'>"
+        f"<p>{html.escape(human_text)}</p>"
+        f"{html_table}"
+        f"</div>"
+    )
+    
+    return {
+        "answer": human_text,
+        "answer_html": full_html,
+        "used_sql": sql,
+        "data": res,
+        "result_meta": {"row_count": len(rows)}
+    }
+
 def ask_gemini_agent(
     question: str,
     history: Optional[List[Dict[str, str]]] = None,
@@ -136,6 +174,14 @@ def ask_gemini_agent(
 
     prompt = f"{system_prompt}\n\n=== SCHÉMA DATABÁZY ===\n{full_schema_context}\n\n=== OTÁZKA ===\n{q}\n"
     
+    # Rovnaká otázka nad rovnakou schémou -> overené SQL z cache, bez generovania cez LLM
+    cached_sql = ai_query_governor.compiled_sql(q, full_schema_context)
+    if cached_sql:
+        res = vykonaj_bezpecny_sql_prikaz(cached_sql)
+        if not res.get("error"):
+            return _answer_from_result(q, cached_sql, res)
+        ai_query_governor.forget_sql(q, full_schema_context)
+
     MAX_REPAIRS = 3
     last_error = None
     
@@ -157,41 +203,9 @@ def ask_gemini_agent(
             prompt += f"\n\nCHYBA DB: {last_error}\nOPRAVA (pozri sa znova do schémy):"
             continue 
         
-        # 5. Úspech -> Generovanie odpovede
-        rows = res.get("rows", [])
-        
-        # Summarizer
-        sample = json.dumps([{k: str(v) for k,v in r.items()} for r in rows[:3]], ensure_ascii=False)
-        sum_prompt = (
-            f"Pôvodná požiadavka užívateľa: {q}\n"
-            f"Nájdené dáta (vzorka): {sample}\n\n"
-            "Tvojou úlohou je napísať úvodný text e-mailu k týmto dátam.\n"
-            "PRAVIDLÁ:\n"
-            "1. Ak užívateľ v požiadavke napísal konkrétny text (napr. 'úvodný text mailu napíšeš...'), POUŽI PRESNE TEN TEXT.\n"
-            "2. Ak užívateľ text nešpecifikoval, napíš stručné zhrnutie pre manažéra.\n"
-            "3. Nevypisuj žiadne dáta ani tabuľky, tie sa pridajú automaticky pod tvoj text.\n"
-            "4. Odpovedz iba čistým textom správy."
-        )
-        sum_resp = _call_llm(sum_prompt)
-        human_text = sum_resp if not sum_resp.startswith("AI ERROR:") else f"Našiel som {len(rows)} záznamov. (AI sumarizácia zlyhala)"
-
-
-        html_table = _rows_to_email_html(rows)
-        
-        full_html = (
-            f"<div style='font-family: Arial, sans-serif;'>"
-            f"<p>{html.escape(human_text)}</p>"
-            f"{html_table}"
-            f"</div>"
-        )
-        
-        return {
-            "answer": human_text,
-            "answer_html": full_html,
-            "used_sql": sql,
-            "data": res,
-            "result_meta": {"row_count": len(rows)}
-        }
+        # 5. Úspech -> zapamätaj SQL a vygeneruj odpoveď
+        ai_query_governor.remember_sql(q, sql, full_schema_context)
+        return _answer_from_result(q, sql, res)
 
     return {
         "answer": "Nepodarilo sa získať dáta.",
@@ -0,0 +1,186 @@
+# =================================================================
+# === HTTP: PODMIENENÉ GET (ETag / 304) + KOMPRESIA ODPOVEDÍ =======
+# =================================================================
+#
+# init_app(app) zaregistruje after_request, ktorý:
+#   - GET/HEAD JSON odpovediam 200 bez ETagu doplní silný ETag z hashu
+#     payloadu a pri zhode s If-None-Match vráti prázdne 304,
+#   - odpovede nad HTTP_COMPRESS_MIN_BYTES skomprimuje (br, inak gzip)
+#     podľa Accept-Encoding; statické súbory, SSE a už kódované odpovede
+#     nechá tak.
+#
+# Endpoint si môže deklarovať vlastný validačný kľúč:
+#     @http_cache.conditional(lambda: http_cache.version_key("pricelists", "catalog"))
+# Vtedy sa ETag spočíta z kľúča ešte pred view – pri zhode sa view vôbec
+# nevolá (polling katalógu stojí jeden PK lookup). Verzie v data_versions
+# zvyšuje bump(name) pri zápisoch; kľúč obsahuje aj časové okno
+# HTTP_CACHE_VERSION_TTL_S, takže zápis mimo hookov sa prejaví najneskôr
+# po jeho uplynutí.
+# =================================================================
+import functools
+import gzip
+import hashlib
+import os
+import time
+from typing import Callable, Optional
+
+from flask import make_response, request
+
+import db_connector
+
+try:
+    import brotli  # Brotli je v requirements.txt; bez neho ostane len gzip
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("HTTP_COMPRESS_MIN_BYTES", "1400"))
+VERSION_TTL_S = int(os.getenv("HTTP_CACHE_VERSION_TTL_S", "300"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # dynamické odpovede – rýchlosť pred pomerom
+
+_COMPRESSIBLE = ("application/json", "text/", "application/javascript", "image/svg+xml")
+_ENC_SUFFIX = {"br": "-br", "gzip": "-gz"}
+
+_schema_ready = False
+
+
+# --- VERZIE DÁT ---------------------------------------------------------------
+def _ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name       VARCHAR(64) NOT NULL PRIMARY KEY,
+            version    BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = True
+
+
+def bump(*names: str) -> None:
+    """Po zápise: zvýši verziu dát (napr. 'catalog', 'pricelists'). Nikdy nevyhodí chybu."""
+    try:
+        _ensure_schema()
+        for name in names:
+            db_connector.execute_query(
+                "INSERT INTO data_versions (name, version) VALUES (%s, 1) "
+                "ON DUPLICATE KEY UPDATE version = version + 1",
+                (name,), fetch='none')
+    except Exception as e:
+        print(f"[HTTP CACHE] bump {names}: {e}")
+
+
+def version_key(*names: str) -> str:
+    """Validačný kľúč z verzií dát (jeden dotaz) + časové okno VERSION_TTL_S."""
+    _ensure_schema()
+    rows = db_connector.execute_query(
+        f"SELECT name, version FROM data_versions WHERE name IN ({','.join(['%s'] * len(names))})",
+        tuple(names)) or []
+    ver = {r["name"]: r["version"] for r in rows}
+    parts = [f"{n}:{ver.get(n, 0)}" for n in names]
+    parts.append(f"t:{int(time.time() // VERSION_TTL_S)}")
+    return "|".join(parts)
+
+
+# --- ETAG ---------------------------------------------------------------------
+def _client_tags() -> set:
+    """Tagy z If-None-Match bez suffixu kódovania (ETag je rovnaký pre br/gz/identity obsah)."""
+    raw = request.headers.get("If-None-Match", "")
+    tags = set()
+    for t in raw.split(","):
+        t = t.strip()
+        if t.startswith("W/"):
+            t = t[2:]
+        t = t.strip('"')
+        for suf in _ENC_SUFFIX.values():
+            if t.endswith(suf):
+                t = t[:-len(suf)]
+        if t:
+            tags.add(t)
+    return tags
+
+
+def _not_modified(tag: str):
+    resp = make_response("", 304)
+    resp.set_etag(tag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+
+def conditional(key_fn: Callable[[], Optional[str]]):
+    """
+    Dekorátor: ETag z key_fn() (+ URL); pri zhode s If-None-Match vráti 304 bez volania view.
+    key_fn vráti None -> bežné spracovanie (ETag z payloadu v after_request).
+    """
+    def deco(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                key = key_fn()
+            except Exception as e:
+                print(f"[HTTP CACHE] key {view.__name__}: {e}")
+                key = None
+            if not key:
+                return view(*args, **kwargs)
+            tag = hashlib.sha256(f"{request.full_path}|{key}".encode("utf-8")).hexdigest()[:32]
+            if tag in _client_tags():
+                return _not_modified(tag)
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code == 200:
+                resp.set_etag(tag)
+            return resp
+        return wrapper
+    return deco
+
+
+# --- MIDDLEWARE ---------------------------------------------------------------
+def _pick_encoding() -> Optional[str]:
+    accept = request.headers.get("Accept-Encoding", "")
+    if brotli is not None and "br" in accept:
+        return "br"
+    if "gzip" in accept:
+        return "gzip"
+    return None
+
+
+def _after_request(resp):
+    if resp.direct_passthrough or resp.is_streamed or resp.status_code != 200:
+        return resp
+    mimetype = resp.mimetype or ""
+
+    if request.method in ("GET", "HEAD") and mimetype == "application/json":
+        tag, _ = resp.get_etag()
+        if not tag:
+            tag = hashlib.sha256(resp.get_data()).hexdigest()[:32]
+            resp.set_etag(tag)
+        if "Cache-Control" not in resp.headers:
+            resp.headers["Cache-Control"] = "private, no-cache"
+        if tag in _client_tags():
+            return _not_modified(tag)
+
+    if "Content-Encoding" in resp.headers or not mimetype.startswith(_COMPRESSIBLE):
+        return resp
+    data = resp.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return resp
+    enc = _pick_encoding()
+    if not enc:
+        resp.vary.add("Accept-Encoding")
+        return resp
+
+    body = brotli.compress(data, quality=BROTLI_QUALITY) if enc == "br" \
+        else gzip.compress(data, compresslevel=GZIP_LEVEL)
+    resp.set_data(body)
+    resp.headers["Content-Encoding"] = enc
+    resp.vary.add("Accept-Encoding")
+    tag, weak = resp.get_etag()
+    if tag:
+        resp.set_etag(tag + _ENC_SUFFIX[enc], weak=weak)
+    return resp
+
+
+def init_app(app) -> None:
+    app.after_request(_after_request)
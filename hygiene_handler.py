@@ -3,6 +3,7 @@
 # Obsahuje: Delete funkcií
 
 import db_connector
+import http_cache
 from datetime import datetime, date, timedelta
 AUTO_HYGIENE_PERFORMER = "Oravcová"
 AUTO_HYGIENE_CHECKER = "Riadiaci pracovník"
@@ -83,36 +84,16 @@ def get_hygiene_plan_for_date(target_date_str=None):
             
     return {"plan": plan_by_location, "date": _iso_date(target_date)}
 
-def run_hygiene_autostart_tick():
-    """
-    Auto-štart hygienických úloh.
-    Volané zo scheduler.py (ideálne každú minútu).
-
-    Logika:
-      - spúšťa sa len v pracovné dni (Po–Pi)
-      - pre aktuálnu minútu nájde úlohy s auto_start=1 a scheduled_time
-      - ak pre dnešný deň ešte neexistuje log, vytvorí ho
-      - do logu zapíše task_name, location, user_fullname aj checked_by_fullname
-        a nastaví verification_status='OK'
-    """
-    now = datetime.now()
-    today = now.date()
-
-    # 0 = pondelok, 6 = nedeľa
-    if today.weekday() >= 5:
-        return {"message": "Víkend – auto-štart hygieny sa nespúšťa.", "created": 0}
-
-    time_str = now.strftime("%H:%M")
-
-    # 1. Nájdeme úlohy, ktoré majú v danú minútu scheduled_time
-    tasks = db_connector.execute_query(
-        """
+def _autostart_candidates(where_sql, params):
+    return db_connector.execute_query(
+        f"""
         SELECT t.id,
                t.task_name,
                t.location,
                t.default_agent_id,
                t.default_concentration,
                t.default_exposure_time,
+               t.scheduled_time,
                a.agent_name
         FROM hygiene_tasks t
         LEFT JOIN hygiene_agents a ON a.id = t.default_agent_id
@@ -120,31 +101,82 @@ def run_hygiene_autostart_tick():
           AND t.auto_start = 1
           AND t.scheduled_time IS NOT NULL
           AND t.scheduled_time <> ''
-          -- !!! FIX: NIKDY nepoužívaj '%%H:%%i' !!!
-          AND TIME_FORMAT(t.scheduled_time, '%H:%i') = %s
+          AND {where_sql}
         """,
-        (time_str,),
+        params,
         fetch="all",
     ) or []
 
-    created = 0
-    skipped_existing = 0
 
-    for t in tasks:
-        task_id = t["id"]
+def _time_of_day(val):
+    """scheduled_time (TIME -> timedelta, alebo reťazec 'HH:MM[:SS]') -> timedelta od polnoci."""
+    if isinstance(val, timedelta):
+        return val
+    try:
+        parts = [int(x) for x in str(val).strip().split(":")[:3]]
+        parts += [0] * (3 - len(parts))
+        return timedelta(hours=parts[0], minutes=parts[1], seconds=parts[2])
+    except Exception:
+        return None
 
-        # 2. Skontrolujeme, či už na dnešný deň existuje log
-        exist = db_connector.execute_query(
-            "SELECT id FROM hygiene_log WHERE task_id=%s AND completion_date=%s LIMIT 1",
-            (task_id, today),
-            fetch="one",
-        )
-        if exist:
-            skipped_existing += 1
-            continue
 
-        # 3. Pripravíme údaje na INSERT
-        start_at = now.replace(second=0, microsecond=0)
+def get_autostart_schedule():
+    """
+    Úlohy s auto-štartom a ich čas v rámci dňa: [(task_id, timedelta od polnoci)].
+    Podklad pre reminder_timer (plánuje presný čas namiesto minútového ticku).
+    """
+    rows = _autostart_candidates("1=1", ())
+    out = []
+    for t in rows:
+        tod = _time_of_day(t.get("scheduled_time"))
+        if tod is not None:
+            out.append((int(t["id"]), tod))
+    return out
+
+
+def start_hygiene_tasks(task_ids, now=None):
+    """
+    Auto-štart daných úloh naraz: jeden dotaz na úlohy, jeden na dnešné logy,
+    jeden hromadný INSERT. Víkend, neaktívne úlohy a úlohy s dnešným logom
+    sa preskočia.
+    """
+    now = now or datetime.now()
+    today = now.date()
+    ids = sorted({int(i) for i in (task_ids or [])})
+
+    # 0 = pondelok, 6 = nedeľa
+    if today.weekday() >= 5:
+        return {"message": "Víkend – auto-štart hygieny sa nespúšťa.", "created": 0}
+    if not ids:
+        return {"message": f"Auto-štart hygieny {today.isoformat()}", "created": 0,
+                "skipped_existing": 0, "matched_tasks": 0}
+
+    ph = ",".join(["%s"] * len(ids))
+    tasks = _autostart_candidates(f"t.id IN ({ph})", tuple(ids))
+    return _create_autostart_logs(tasks, now)
+
+
+def _create_autostart_logs(tasks, now):
+    today = now.date()
+    if not tasks:
+        return {"message": f"Auto-štart hygieny {today.isoformat()} {now.strftime('%H:%M')}",
+                "created": 0, "skipped_existing": 0, "matched_tasks": 0}
+
+    # 2. Ktoré úlohy už majú dnešný log (jedným dotazom)
+    ph = ",".join(["%s"] * len(tasks))
+    existing = db_connector.execute_query(
+        f"SELECT DISTINCT task_id FROM hygiene_log WHERE completion_date=%s AND task_id IN ({ph})",
+        (today, *[t["id"] for t in tasks]),
+        fetch="all",
+    ) or []
+    done = {r["task_id"] for r in existing}
+
+    # 3. Pripravíme údaje na INSERT
+    start_at = now.replace(second=0, microsecond=0)
+    values = []
+    for t in tasks:
+        if t["id"] in done:
+            continue
 
         # ak default_exposure_time existuje, použi ho; inak 10
         exp_minutes = 10
@@ -158,88 +190,75 @@ def run_hygiene_autostart_tick():
         rinse_end_at = exposure_end_at + timedelta(minutes=10)
         finished_at = rinse_end_at
 
-        performer_name = AUTO_HYGIENE_PERFORMER
-        checker_name = AUTO_HYGIENE_CHECKER
+        values.append((
+            t["id"],
+            t["task_name"],
+            t["location"],
+            AUTO_HYGIENE_PERFORMER,
+            t.get("default_agent_id"),
+            t.get("agent_name"),
+            t.get("default_concentration"),
+            t.get("default_exposure_time"),
+            start_at,
+            exposure_end_at,
+            rinse_end_at,
+            finished_at,
+            today,
+            AUTO_HYGIENE_CHECKER,
+            now,
+            "OK",
+        ))
+
+    if values:
+        def _insert(conn):
+            cur = conn.cursor()
+            try:
+                cur.executemany(
+                    """
+                    INSERT INTO hygiene_log
+                        (task_id, task_name, location, user_fullname,
+                         agent_id, agent_name, concentration, exposure_time,
+                         start_at, exposure_end_at, rinse_end_at, finished_at,
+                         completion_date, checked_by_fullname, checked_at, verification_status)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    values,
+                )
+            finally:
+                cur.close()
+        db_connector.with_transaction(_insert)
 
-        agent_id = t.get("default_agent_id")
-        agent_name = t.get("agent_name")
-        concentration = t.get("default_concentration")
-        exposure_time = t.get("default_exposure_time")
+    return {
+        "message": f"Auto-štart hygieny {today.isoformat()} {now.strftime('%H:%M')}",
+        "created": len(values),
+        "skipped_existing": len(tasks) - len(values),
+        "matched_tasks": len(tasks),  # aby si v logu videl, či vôbec našlo úlohy
+    }
 
-        db_connector.execute_query(
-            """
-            INSERT INTO hygiene_log
-                (task_id,
-                 task_name,
-                 location,
-                 user_fullname,
-                 agent_id,
-                 agent_name,
-                 concentration,
-                 exposure_time,
-                 start_at,
-                 exposure_end_at,
-                 rinse_end_at,
-                 finished_at,
-                 completion_date,
-                 checked_by_fullname,
-                 checked_at,
-                 verification_status)
-            VALUES
-                (%s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s,
-                 %s)
-            """,
-            (
-                task_id,
-                t["task_name"],
-                t["location"],
-                performer_name,
-                agent_id,
-                agent_name,
-                concentration,
-                exposure_time,
-                start_at,
-                exposure_end_at,
-                rinse_end_at,
-                finished_at,
-                today,
-                checker_name,
-                now,
-                "OK",
-            ),
-            fetch="none",
-        )
 
-        created += 1
+def run_hygiene_autostart_tick():
+    """
+    Auto-štart hygienických úloh – minútový tick (záloha, keď nebeží reminder_timer).
+    Volané zo scheduler.py.
 
-        # Voliteľné: ak máš v hygiene_tasks stĺpec status a chceš ho prepnúť
-        # (ak stĺpec neexistuje, tak to nechaj zakomentované alebo obal try/except)
-        # db_connector.execute_query(
-        #     "UPDATE hygiene_tasks SET status='hotova' WHERE id=%s",
-        #     (task_id,),
-        #     fetch="none",
-        # )
+    Logika:
+      - spúšťa sa len v pracovné dni (Po–Pi)
+      - pre aktuálnu minútu nájde úlohy s auto_start=1 a scheduled_time
+      - ak pre dnešný deň ešte neexistuje log, vytvorí ho
+      - do logu zapíše task_name, location, user_fullname aj checked_by_fullname
+        a nastaví verification_status='OK'
+    """
+    now = datetime.now()
+    today = now.date()
 
-    return {
-        "message": f"Auto-štart hygieny {today.isoformat()} {time_str}",
-        "created": created,
-        "skipped_existing": skipped_existing,
-        "matched_tasks": len(tasks),  # aby si v logu videl, či vôbec našlo úlohy
-    }
+    # 0 = pondelok, 6 = nedeľa
+    if today.weekday() >= 5:
+        return {"message": "Víkend – auto-štart hygieny sa nespúšťa.", "created": 0}
+
+    # 1. Nájdeme úlohy, ktoré majú v danú minútu scheduled_time
+    # !!! FIX: NIKDY nepoužívaj '%%H:%%i' !!!
+    tasks = _autostart_candidates("TIME_FORMAT(t.scheduled_time, '%H:%i') = %s", (now.strftime("%H:%M"),))
+    return _create_autostart_logs(tasks, now)
 
 
 def log_hygiene_completion(data):
@@ -415,6 +434,7 @@ def save_hygiene_task(data):
                  default_agent_id, default_concentration, default_exposure_time, is_active, scheduled_time, auto_start) 
                  VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
         db_connector.execute_query(sql, params, fetch='none')
+    http_cache.bump("hygiene_plan")
     return {"message": "Uložené."}
 
 # --- Admin: Vymazať (NOVÉ) ---
@@ -424,6 +444,7 @@ def delete_hygiene_task(data):
     if not tid: return {"error": "Chýba ID."}
     # Hard delete (záznamy v logu ostanú vďaka ON DELETE SET NULL)
     db_connector.execute_query("DELETE FROM hygiene_tasks WHERE id=%s", (tid,), fetch='none')
+    http_cache.bump("hygiene_plan")
     return {"message": "Úloha bola vymazaná."}
 
 def delete_hygiene_agent(data):
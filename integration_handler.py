@@ -3,6 +3,7 @@ from datetime import datetime
 import traceback
 from pathlib import Path
 import db_connector
+import product_cost_index
 from decimal import Decimal, ROUND_HALF_UP
 
 # --- KONFIGURÁCIA ---
@@ -33,6 +34,7 @@ def generate_daily_receipt_export(date_str):
     except:
         zv_col = 'nazov_vyrobku'
 
+    product_cost_index.ensure_schema()
     sql = f"""
         SELECT
             p.ean,
@@ -45,14 +47,7 @@ def generate_daily_receipt_export(date_str):
             ) AS qty,
             (
                 COALESCE(
-                    (
-                        SELECT zv2.cena_za_jednotku
-                          FROM zaznamy_vyroba zv2
-                         WHERE TRIM(zv2.{zv_col}) = TRIM(p.nazov_vyrobku)
-                           AND zv2.cena_za_jednotku > 0
-                         ORDER BY zv2.datum_ukoncenia DESC, zv2.id_davky DESC
-                         LIMIT 1
-                    ),
+                    NULLIF(MAX(ci.last_unit_cost), 0),
                     p.nakupna_cena,
                     0.0000
                 ) * 1.25
@@ -60,6 +55,7 @@ def generate_daily_receipt_export(date_str):
         FROM expedicia_prijmy ep
         JOIN zaznamy_vyroba zv ON zv.id_davky = ep.id_davky
         JOIN produkty p ON TRIM(zv.{zv_col}) = TRIM(p.nazov_vyrobku)
+        LEFT JOIN product_cost_index ci ON ci.ean = p.ean
         WHERE ep.is_deleted = 0
           AND ep.datum_prijmu = %s
           AND p.typ_polozky IN ({placeholders})
@@ -16,7 +16,12 @@ from flask import Blueprint, request, jsonify, make_response
 from datetime import date, datetime, timedelta
 import os, json
 
+import birthday_bonus
+import dashboard_snapshots
 import db_connector
+import http_cache
+import sales_fact
+import order_events
 import pdf_generator
 import notification_handler as notify
 import notification_handler
@@ -36,7 +41,6 @@ DW_PATH             = os.path.join(B2C_DIR, "_delivery_windows.json")
 GIFTCODES_PATH      = os.path.join(B2C_DIR, "_giftcodes.json")
 GIFTCODE_USAGE_PATH = os.path.join(B2C_DIR, "_giftcode_usage.json")
 PROFILE_JSON_PATH   = os.path.join(DATA_DIR, "b2c_profile.json")
-AWARDS_LOG_PATH     = os.path.join(DATA_DIR, "b2c_birthday_awards.json")
 B2C_META_TABLE = "b2c_product_meta"
 # =================== pomocné I/O ===================
 def _ensure_b2c_meta_table():
@@ -132,6 +136,8 @@ def _add_status(table: str, row_id: int, value: str):
     sc = _first_col(table, ["stav","stav_vybavenia","stav_objednavky","status"])
     if sc:
         db_connector.execute_query(f"UPDATE {table} SET {sc}=%s WHERE id=%s", (value, row_id), fetch="none")
+        if table == "b2c_objednavky":
+            order_events.on_orders_changed("b2c", row_id)
 
 def _get_order_row(order_id_or_number):
     """Riadok objednávky s aliasmi final/predb. + polozky + fk."""
@@ -820,10 +826,6 @@ def get_product_meta():
     return jsonify(rec)
 
 # =================== CUSTOMERS (výbery) ===================
-def _sk_month_genitive(m: int) -> str:
-    names = ["januára","februára","marca","apríla","mája","júna","júla","augusta","septembra","októbra","novembra","decembra"]
-    return names[(m-1) % 12]
-
 @kancelaria_b2c_bp.get("/api/kancelaria/b2c/get_customers")
 def b2c_get_customers():
     rows = db_connector.execute_query("""
@@ -835,9 +837,8 @@ def b2c_get_customers():
     """) or []
 
     profiles   = _load_json(PROFILE_JSON_PATH, {}) or {}
-    awards_log = _load_json(AWARDS_LOG_PATH, {}) or {}
-    now = datetime.now(); bucket = f"{now.year:04d}-{now.month:02d}"
-    awarded_this_month = (awards_log.get(bucket) or {})
+    now = datetime.now()
+    awarded_this_month = birthday_bonus.points_for_month(now.year, now.month)
 
     for r in rows:
         email_key = (r.get("email") or "").lower()
@@ -856,8 +857,7 @@ def b2c_get_customers():
             except: mm = None
         r["dob_month"] = mm
         r["dob_year_known"] = bool(dob.get("iso_ymd"))
-        award = awarded_this_month.get(email_key) or awarded_this_month.get(r.get("email") or "")
-        r["birthday_points_this_month"] = int((award or {}).get("points") or 0)
+        r["birthday_points_this_month"] = awarded_this_month.get(int(r["id"]), 0)
 
     return jsonify(rows)
 
@@ -884,6 +884,7 @@ def save_product_meta():
     # voliteľne: môžeš ešte chvíľu zapisovať aj do JSON ako zálohu,
     # alebo to rovno zmazať – podľa chuti
 
+    http_cache.bump("b2c_pricelist")
     return jsonify({
         "message": "Produktové meta uložené.",
         "ean": ean,
@@ -903,78 +904,12 @@ def run_birthday_bonus():
     month = int(request.args.get("month") or (request.json or {}).get("month") or now.month)
     dry   = str(request.args.get("dry_run") or (request.json or {}).get("dry_run") or "0").lower() in ("1","true","yes","y")
 
-    profiles   = _load_json(PROFILE_JSON_PATH, {}) or {}
-    awards_log = _load_json(AWARDS_LOG_PATH, {}) or {}
-    bucket_key = f"{year:04d}-{month:02d}"
-    if bucket_key not in awards_log:
-        awards_log[bucket_key] = {}
-
-    month_gen = _sk_month_genitive(month)
-    awarded, skipped = [], []
-
-    for email, prof in (profiles or {}).items():
-        try:
-            if not prof or not prof.get("birthday_bonus_opt_in"):
-                continue
-            dob = prof.get("dob") or {}
-            mm = None
-            if isinstance(dob.get("md"), str) and len(dob["md"]) >= 2:
-                mm = int(dob["md"].split("-")[0])
-            elif isinstance(dob.get("iso_ymd"), str) and len(dob["iso_ymd"]) >= 7:
-                mm = int(dob["iso_ymd"].split("-")[1])
-            if mm != month:
-                continue
-
-            key = email.lower()
-            if key in awards_log[bucket_key]:
-                skipped.append({"email": email, "reason": "already_credited"})
-                continue
-
-            cust = db_connector.execute_query(
-                "SELECT id, email, nazov_firmy FROM b2b_zakaznici WHERE LOWER(email)=LOWER(%s) AND typ='B2C' LIMIT 1",
-                (email,), fetch="one"
-            )
-            if not cust:
-                skipped.append({"email": email, "reason": "customer_not_found"})
-                continue
-
-            milestone = False
-            points = 100
-            age = None
-            if isinstance(dob.get("iso_ymd"), str) and len(dob["iso_ymd"]) >= 4:
-                try:
-                    birth_year = int(dob["iso_ymd"].split("-")[0])
-                    age = year - birth_year
-                    if age >= 20 and age % 5 == 0:
-                        milestone = True
-                        points = 150
-                except Exception:
-                    pass
-
-            if not dry:
-                db_connector.execute_query(
-                    "UPDATE b2b_zakaznici SET vernostne_body = COALESCE(vernostne_body,0) + %s WHERE id=%s",
-                    (points, int(cust["id"])), fetch="none"
-                )
-                try:
-                    notify.send_b2c_birthday_bonus_email(
-                        cust.get("email"),
-                        prof.get("name") or (cust.get("nazov_firmy") or ""),
-                        month_gen,
-                        points,
-                        milestone,
-                        age
-                    )
-                except Exception:
-                    pass
-
-                awards_log[bucket_key][key] = {"points": points, "ts": datetime.utcnow().isoformat()+"Z"}
-
-            awarded.append({"email": email, "points": points, "milestone": milestone})
-        except Exception as e:
-            skipped.append({"email": email, "error": str(e)})
-
-    _save_json(AWARDS_LOG_PATH, awards_log)
+    res = birthday_bonus.run(year, month, dry_run=dry)
+    if res.get("error"):
+        return jsonify({"error": res["error"]}), 503
+    if res.get("credited"):
+        dashboard_snapshots.invalidate("b2c_stats_overview")
+    awarded, skipped = res["awarded"], res["skipped"]
 
     return jsonify({
         "ok": True, "year": year, "month": month,
@@ -1011,48 +946,8 @@ def customers_query():
     """) or []
     profiles = _load_json(PROFILE_JSON_PATH, {}) or {}
 
-    final_expr = _coalesce_expr(
-        "b2c_objednavky", "o",
-        ["finalna_suma_s_dph","finalna_suma","final_total_s_dph","suma_s_dph","total_s_dph"],
-        "finalka"
-    )
-    pred_expr = _coalesce_expr(
-        "b2c_objednavky", "o",
-        ["predpokladana_suma_s_dph","suma_s_dph","total_s_dph","total_gross"],
-        "pred"
-    )
-    noc = _first_col("b2c_objednavky", ["cislo_objednavky","objednavka_cislo","order_number"])
-    dat = _first_col("b2c_objednavky", ["datum_objednavky","created_at","created","datum"])
-
-    select_cols = ["z.id AS cust_id"]
-    if noc: select_cols.append(f"o.{noc} AS cislo_objednavky")
-    if dat: select_cols.append(f"o.{dat} AS datum_objednavky")
-    select_cols += [final_expr, pred_expr]
-
-    join_parts = []
-    if _col_exists("b2c_objednavky", "zakaznik_id"):
-        if _is_numeric("b2c_objednavky", "zakaznik_id"):
-            join_parts.append("o.zakaznik_id = z.id")
-        else:
-            join_parts.append("o.zakaznik_id = z.zakaznik_id")
-    if _col_exists("b2c_objednavky", "customer_id"):
-        join_parts.append("o.customer_id = z.id")
-    if _col_exists("b2c_objednavky", "user_id"):
-        join_parts.append("o.user_id = z.id")
-
-    orders_map = {}
-    if join_parts:
-        ord_rows = db_connector.execute_query(
-            f"SELECT {', '.join(select_cols)} FROM b2c_objednavky o "
-            f"JOIN b2b_zakaznici z ON ({' OR '.join(join_parts)}) WHERE z.typ='B2C'"
-        ) or []
-        for r in ord_rows:
-            cid = r["cust_id"]
-            m = orders_map.setdefault(cid, {"count":0,"last":None,"final_sum":0.0})
-            m["count"] += 1
-            if r.get("datum_objednavky") and (m["last"] is None or r["datum_objednavky"]>m["last"]):
-                m["last"] = r["datum_objednavky"]
-            m["final_sum"] += float(r.get("finalka") or 0.0)
+    # počet / posledná / finálna suma objednávok – z faktov predaja (zákazník je už vyriešený)
+    orders_map = sales_fact.customer_order_totals("b2c")
 
     now = datetime.now(); cur_m = now.month
     out = []
@@ -1078,7 +973,7 @@ def customers_query():
             "dob_year_known": bool(dob.get("iso_ymd")),
             "birthday_bonus_opt_in": bool((prof or {}).get("birthday_bonus_opt_in"))
         }
-        ord_info = orders_map.get(r["id"]) or {"count":0,"last":None,"final_sum":0.0}
+        ord_info = orders_map.get(str(r["id"])) or {"count":0,"last":None,"final_sum":0.0}
         rec["orders_count"]    = ord_info["count"]
         rec["last_order_date"] = ord_info["last"]
         rec["final_paid_sum"]  = ord_info["final_sum"]
@@ -1144,6 +1039,7 @@ def customer_update_profile():
 
     profiles[key] = prof
     _save_json(PROFILE_JSON_PATH, profiles)
+    birthday_bonus.sync_profile(cust["email"], prof)
     return jsonify({"message":"Profil uložený."})
 
 @kancelaria_b2c_bp.post("/api/kancelaria/b2c/customer/adjust_points")
@@ -1173,6 +1069,7 @@ def customer_adjust_points():
     os.makedirs(DATA_DIR, exist_ok=True)
     with open(os.path.join(DATA_DIR, "b2c_points_adjustments.jsonl"), "a", encoding="utf-8") as f:
         f.write(json.dumps({"ts": datetime.utcnow().isoformat()+"Z", "customer_id":int(cust_id), "delta":int(delta), "reason": d.get("reason")}, ensure_ascii=False) + "\n")
+    dashboard_snapshots.invalidate("b2c_stats_overview")
     return jsonify({"message":"Body upravené."})
 
 @kancelaria_b2c_bp.get("/api/kancelaria/b2c/customer/orders")
@@ -1332,7 +1229,12 @@ def _orders_agg(date_from: str=None, date_to: str=None):
 
 @kancelaria_b2c_bp.get("/api/kancelaria/b2c/stats/overview")
 def stats_overview():
-    df = request.args.get("date_from"); dt = request.args.get("date_to")
+    params = {"date_from": request.args.get("date_from"), "date_to": request.args.get("date_to")}
+    return jsonify(dashboard_snapshots.get("b2c_stats_overview", params,
+                                           force=dashboard_snapshots.wants_refresh(request.args)))
+
+def _build_stats_overview(date_from: str=None, date_to: str=None):
+    df = date_from; dt = date_to
     ords = _orders_agg(df, dt)
     orders = len(ords)
     final_sum = sum(float(o.get("finalka") or 0.0) for o in ords)
@@ -1373,17 +1275,9 @@ def stats_overview():
                         points_manual += int(rec.get("delta") or 0)
                 except: pass
 
-    bday_points = 0
-    data = _load_json(AWARDS_LOG_PATH, {}) or {}
-    for ym, bucket in (data or {}).items():
-        try:
-            y,m = ym.split("-"); d = f"{y}-{m}-01"
-            if (not df or d >= df) and (not dt or d <= dt):
-                for v in (bucket or {}).values():
-                    bday_points += int((v or {}).get("points") or 0)
-        except: pass
+    bday_points = birthday_bonus.total_points(df, dt)
 
-    return jsonify({
+    return {
         "orders": orders,
         "final_sum": round(final_sum,2),
         "avg_order": round(avg_order,2),
@@ -1391,38 +1285,29 @@ def stats_overview():
         "rewards_redeemed": rewards_redeemed,
         "points_awarded_manual": points_manual,
         "points_awarded_birthday": bday_points
-    })
+    }
+
+dashboard_snapshots.register("b2c_stats_overview", _build_stats_overview, every_s=900)
 
 @kancelaria_b2c_bp.get("/api/kancelaria/b2c/stats/top_customers")
 def stats_top_customers():
     limit = int(request.args.get("limit") or 20)
     df = request.args.get("date_from"); dt = request.args.get("date_to")
-    tbl = "b2c_objednavky"
-    fk  = _first_col(tbl, ["zakaznik_id","customer_id","user_id"])
-    dat = _first_col(tbl, ["datum_objednavky","created_at","created","datum"]) or "id"
-    final_expr = _coalesce_expr(tbl,"o",["finalna_suma_s_dph","finalna_suma","final_total_s_dph","suma_s_dph","total_s_dph"],"finalka")
-    if not fk:
+    top = sales_fact.top_customers("b2c", df, dt, limit)
+    if not top:
         return jsonify([])
-    q = f"""
-      SELECT z.id AS customer_id, z.zakaznik_id, z.nazov_firmy, z.email,
-             SUM({final_expr.split(' AS ')[0]}) AS suma
-      FROM b2c_objednavky o
-      JOIN b2b_zakaznici z ON (
-        { ' OR '.join([p for p in [
-            "o.zakaznik_id=z.zakaznik_id" if _col_exists(tbl,"zakaznik_id") and not _is_numeric(tbl,"zakaznik_id") else None,
-            "o.zakaznik_id=z.id"          if _col_exists(tbl,"zakaznik_id") and _is_numeric(tbl,"zakaznik_id") else None,
-            "o.customer_id=z.id"          if _col_exists(tbl,"customer_id") else None,
-            "o.user_id=z.id"              if _col_exists(tbl,"user_id") else None
-        ] if p]) }
-      )
-      WHERE z.typ='B2C'
-    """
-    params=[]
-    if df: q += f" AND DATE(o.{dat}) >= %s"; params.append(df)
-    if dt: q += f" AND DATE(o.{dat}) <= %s"; params.append(dt)
-    q += " GROUP BY z.id, z.zakaznik_id, z.nazov_firmy, z.email ORDER BY suma DESC LIMIT %s"
-    params.append(limit)
-    return jsonify(db_connector.execute_query(q, tuple(params), fetch='all') or [])
+    ids = [int(t["customer_key"]) for t in top]
+    ph = ",".join(["%s"] * len(ids))
+    custs = {c["id"]: c for c in db_connector.execute_query(
+        f"SELECT id, zakaznik_id, nazov_firmy, email FROM b2b_zakaznici WHERE typ='B2C' AND id IN ({ph})",
+        tuple(ids), fetch='all') or []}
+    out = []
+    for t in top:
+        c = custs.get(int(t["customer_key"]))
+        if c:
+            out.append({"customer_id": c["id"], "zakaznik_id": c["zakaznik_id"], "nazov_firmy": c["nazov_firmy"],
+                        "email": c["email"], "suma": t["suma"]})
+    return jsonify(out)
 
 @kancelaria_b2c_bp.get("/api/kancelaria/b2c/stats/rewards_usage")
 def stats_rewards_usage():
@@ -1702,7 +1587,7 @@ def get_dashboard_data():
     - b2b_pending_orders: B2B objednávky čakajúce na potvrdenie v období
     - next7Days: počty objednávok (B2B/B2C) po dňoch na najbližšie dni podľa dátumu dodania/ vyzdvihnutia
 
-    GET ?date_from=YYYY-MM-DD&?date_to=YYYY-MM-DD (voliteľné – pre KPI karty)
+    GET ?date_from=YYYY-MM-DD&?date_to=YYYY-MM-DD (voliteľné – pre KPI karty), ?refresh=1 vynúti prepočet
     """
 
     def _dt(s):
@@ -1714,6 +1599,17 @@ def get_dashboard_data():
 
     df = _dt(request.args.get("date_from")) or date.today()
     dt_ = _dt(request.args.get("date_to"))   or df
+    params = {"date_from": df.isoformat(), "date_to": dt_.isoformat(), "today": date.today().isoformat()}
+    return jsonify(dashboard_snapshots.get("b2c_dashboard", params,
+                                           force=dashboard_snapshots.wants_refresh(request.args)))
+
+def _today_params():
+    t = date.today().isoformat()
+    return [{"date_from": t, "date_to": t, "today": t}]
+
+def _build_dashboard_data(date_from: str, date_to: str, today: str):
+    df = datetime.strptime(date_from, "%Y-%m-%d").date()
+    dt_ = datetime.strptime(date_to, "%Y-%m-%d").date()
 
     # --- helper na spočítanie v intervale podľa detegovaného dátumového stĺpca
     def _count_in_period(table: str, date_candidates: list[str], where_extra: str = "", params_extra: tuple = ()):
@@ -1771,7 +1667,7 @@ def get_dashboard_data():
     dcol_b2c = ["pozadovany_datum_dodania","datum_dodania","delivery_date"]
     dcol_b2b = ["pozadovany_datum_dodania","datum_dodania","delivery_date"]
 
-    start7 = date.today()
+    start7 = datetime.strptime(today, "%Y-%m-%d").date()
     end7   = start7 + timedelta(days=6)
 
     map_b2c = _counts_by_day("b2c_objednavky", dcol_b2c, start7, end7)
@@ -1790,7 +1686,7 @@ def get_dashboard_data():
             "total": b2c + b2b
         })
 
-    return jsonify({
+    return {
         "period": {"date_from": df.isoformat(), "date_to": dt_.isoformat()},
         "cards": {
             "b2b_orders":         {"count": b2b_orders,        "label": "B2B prijaté"},
@@ -1805,7 +1701,10 @@ def get_dashboard_data():
         "lowStockGoods": {},
         "topProducts": [],
         "timeSeriesData": []
-    })
+    }
+
+dashboard_snapshots.register("b2c_dashboard", _build_dashboard_data, every_s=300, defaults=_today_params)
+
 def _get_customer_data(mode, fk_val):
     if not fk_val: return None
     if mode == "by_zakaznik_id":
@@ -1949,6 +1848,7 @@ def b2c_add_to_pricelist():
                 added_count += 1
         
         conn.commit()
+        http_cache.bump("b2c_pricelist")
         return jsonify({"ok": True, "added": added_count})
         
     except Exception as e:
@@ -2019,6 +1919,7 @@ def b2c_update_pricelist():
                 updated_count += 1
 
         conn.commit()
+        http_cache.bump("b2c_pricelist")
         return jsonify({"ok": True, "deleted": deleted_count, "updated": updated_count})
 
     except Exception as e:
@@ -2,7 +2,7 @@
 # Zlúčené so schémou DB (pozri schema_prompt.md). Flexibilné voči názvom stĺpcov.
 # (C) tvoj projekt
 
-from flask import Blueprint, json, request, jsonify, redirect
+from flask import Blueprint, Response, json, request, jsonify, redirect
 from datetime import datetime, date, timedelta
 from typing import Any, Optional
 import os
@@ -13,6 +13,12 @@ import random
 import b2b_handler # IMPORT PRE ZRKADLENIE LOGISTIKY
 
 import db_connector
+import live_kpi
+import http_cache
+import stock_reservations
+import sales_fact
+import order_events
+import search_index
 from auth_handler import login_required
 
 leader_bp = Blueprint('leader', __name__, url_prefix='/api/leader')
@@ -153,11 +159,13 @@ def leader_catalog_names():
 @leader_bp.get('/catalog/products')
 @login_required(role=('veduci','admin'))
 def leader_get_products():
-    """Vráti katalóg produktov, stav skladu a dynamicky vypočítanú priemernú cenu z predajov"""
-    sql = """
+    """Vráti katalóg produktov, stav skladu, rezervácie a dynamicky vypočítanú priemernú cenu z predajov"""
+    res_src, res_params = stock_reservations.counters_source()
+    sql = f"""
         SELECT p.ean, p.nazov_vyrobku, p.predajna_kategoria, p.mj, 
                COALESCE(p.dph, 20) as dph,
                COALESCE(p.aktualny_sklad_finalny_kg, 0) as stock,
+               COALESCE(r.qty_b2b, 0) + COALESCE(r.qty_b2c, 0) as reserved,
                (
                    SELECT COALESCE(AVG(pol.cena_bez_dph), 0)
                    FROM b2b_objednavky_polozky pol
@@ -165,15 +173,26 @@ def leader_get_products():
                    WHERE pol.ean_produktu = p.ean AND obj.stav NOT IN ('Zrušená')
                ) as avg_price
         FROM produkty p
+        LEFT JOIN {res_src} r ON r.ean = p.ean
         ORDER BY p.nazov_vyrobku
     """
-    rows = db_connector.execute_query(sql, fetch='all') or []
+    rows = db_connector.execute_query(sql, res_params or None, fetch='all') or []
     for r in rows:
         r['dph'] = float(r.get('dph') or 20)
         r['stock'] = float(r.get('stock') or 0)
+        r['reserved'] = float(r.get('reserved') or 0)
+        r['available'] = r['stock'] - r['reserved']
         r['avg_price'] = float(r.get('avg_price') or 0)
     return jsonify(rows)
 
+@leader_bp.route('/catalog/availability', methods=['GET', 'POST'])
+@login_required(role=('veduci','admin'))
+def leader_catalog_availability():
+    """Hromadná dostupnosť (sklad − rezervácie) pre zoznam EAN: ?eans=a,b,c alebo {"eans": [...]}"""
+    data = request.get_json(silent=True) or {}
+    eans = data.get('eans') or [e for e in (request.args.get('eans') or '').split(',')]
+    return jsonify(stock_reservations.availability(eans))
+
 @leader_bp.route('/catalog/products/sales_explorer', methods=['GET'])
 @login_required(role=('veduci','admin'))
 def leader_product_sales_explorer():
@@ -181,32 +200,8 @@ def leader_product_sales_explorer():
     ean = request.args.get('ean')
     if not ean: return jsonify([])
 
-    # B2B Predaje (zamerané na vypracované objednávky)
-    # Pridávame o.id ako 'order_id' pre PDF okná
-    b2b_sql = """
-        SELECT o.id as order_id, o.cislo_objednavky as order_no, 
-               o.pozadovany_datum_dodania as date, o.nazov_firmy as customer, 
-               COALESCE(p.dodane_mnozstvo, p.mnozstvo) as qty, p.mj as unit, 
-               p.cena_bez_dph as price, 'B2B' as type
-        FROM b2b_objednavky_polozky p
-        JOIN b2b_objednavky o ON o.id = p.objednavka_id
-        WHERE p.ean_produktu = %s AND o.stav IN ('Hotová', 'Expedovaná', 'Vybavená')
-    """
-    
-    # B2C Predaje
-    b2c_sql = """
-        SELECT o.id as order_id, o.cislo_objednavky as order_no, 
-               o.pozadovany_datum_dodania as date, COALESCE(o.nazov_firmy, 'B2C Zákazník') as customer, 
-               p.mnozstvo as qty, p.mj as unit, p.cena_s_dph as price, 'B2C' as type
-        FROM b2c_objednavky_polozky p
-        JOIN b2c_objednavky o ON o.id = p.objednavka_id
-        WHERE p.ean_produktu = %s AND o.stav NOT IN ('Zrušená')
-    """
-
-    b2b_rows = db_connector.execute_query(b2b_sql, (ean,), fetch='all') or []
-    b2c_rows = db_connector.execute_query(b2c_sql, (ean,), fetch='all') or []
-    
-    combined = b2b_rows + b2c_rows
+    # B2B predaje (vypracované objednávky, dodané množstvo) + B2C predaje – z faktov predaja
+    combined = sales_fact.product_sales(ean)
     for r in combined:
         r['date'] = str(r['date']) if r['date'] else 'Neuvedený'
         r['qty'] = float(r['qty'] or 0)
@@ -254,6 +249,8 @@ def leader_save_product():
             """, (ean, nazov, kat, mj, dph, nazov, kat, mj, dph))
             
         conn.commit()
+        http_cache.bump("catalog")
+        search_index.refresh('product', [ean, old_ean])
         return jsonify({'message': 'Produkt bol úspešne uložený do databázy.'})
     except Exception as e:
         if conn: conn.rollback()
@@ -324,6 +321,7 @@ def leader_b2b_get_pricelists():
 
 @leader_bp.get('/b2b/get_pricelists_and_products')
 @login_required(role=('veduci','admin'))
+@http_cache.conditional(lambda: http_cache.version_key('pricelists', 'catalog'))
 def leader_b2b_get_pricelists_and_products():
     cid = request.args.get('customer_id')
     if not cid:
@@ -361,115 +359,13 @@ def leader_b2b_order_pdf_alias():
 @login_required(role=('veduci','admin'))
 def leader_dashboard():
     d = _d(request.args.get('date'))
-    b2c_cols = _table_cols('b2c_objednavky')
-    b2b_cols = _table_cols('b2b_objednavky')
-    b2c_date = 'pozadovany_datum_dodania' if 'pozadovany_datum_dodania' in b2c_cols else 'datum_objednavky'
-    b2b_date = 'pozadovany_datum_dodania' if 'pozadovany_datum_dodania' in b2b_cols else 'datum_objednavky'
 
-    rows_b2c = db_connector.execute_query(
-        f"SELECT * FROM b2c_objednavky WHERE DATE({b2c_date})=%s", (d,)
-    ) or []
-    rows_b2b = db_connector.execute_query(
-        f"SELECT * FROM b2b_objednavky WHERE DATE({b2b_date})=%s", (d,)
-    ) or []
-
-    def _items_count(rows):
-        import json
-        total = 0
-        for r in rows:
-            raw = r.get('polozky_json') or r.get('polozky') or r.get('items') or '[]'
-            try:
-                arr = json.loads(raw) if isinstance(raw, str) else (raw if isinstance(raw, list) else [])
-            except Exception:
-                arr = []
-            total += len(arr)
-        return total
-
-    # podľa schémy používame celkova_suma_s_dph
-    kpi = {
-        'b2c_count': len(rows_b2c),
-        'b2b_count': len(rows_b2b),
-        'items_total': _items_count(rows_b2c) + _items_count(rows_b2b),
-        'sum_total': sum(float(r.get('celkova_suma_s_dph') or 0) for r in rows_b2c)
-                   + sum(float(r.get('celkova_suma_s_dph') or 0) for r in rows_b2b),
-    }
-
-# --- VÝPOČET TEMPA A ODHADU KONCA ---
-    from datetime import datetime, timedelta, date
-    
-    today_str = date.today().strftime('%Y-%m-%d') # Pridané pre kontrolu dneška
-    
-    hotove_casy = []
-    zostava_chystat = 0
-    
-    for r in rows_b2c + rows_b2b:
-        stav = r.get('stav', '')
-        if stav in ('Hotová', 'Expedovaná'):
-            cas = r.get('datum_vypracovania') or r.get('vypracovane') or r.get('cas_dokoncenia') or r.get('updated_at')
-            if cas:
-                # ZJEDNOTENIE S TV TABUĽOU: Berieme len to, čo reálne spravili DNES
-                c_date_str = cas.strftime('%Y-%m-%d') if hasattr(cas, 'strftime') else str(cas)[:10]
-                if c_date_str == today_str:
-                    hotove_casy.append(cas)
-        elif stav not in ('Hotová', 'Expedovaná', 'Zrušená'):
-            zostava_chystat += 1
-
-    tempo_minuty = 0
-    odhad_konca = ""
-    
-    if len(hotove_casy) > 1:
-        parsed_casy = []
-        for c in hotove_casy:
-            if isinstance(c, datetime):
-                parsed_casy.append(c)
-            elif isinstance(c, str):
-                try:
-                    parsed_casy.append(datetime.strptime(c[:19], '%Y-%m-%d %H:%M:%S'))
-                except:
-                    try: parsed_casy.append(datetime.fromisoformat(c.replace('Z', '+00:00')))
-                    except: pass
-        
-        if len(parsed_casy) > 1:
-            parsed_casy.sort()
-            platne_intervaly = []
-            
-            for i in range(1, len(parsed_casy)):
-                rozdiel_sekundy = (parsed_casy[i] - parsed_casy[i-1]).total_seconds()
-                
-                # ZJEDNOTENIE S TV TABUĽOU: 10 až 1200 sekúnd (20 minút limit)
-                if 10 < rozdiel_sekundy < 1200:
-                    platne_intervaly.append(rozdiel_sekundy)
-
-            if platne_intervaly:
-                priemer_sekundy = sum(platne_intervaly) / len(platne_intervaly)
-                tempo_minuty = round(priemer_sekundy / 60.0, 1)
-            else:
-                tempo_minuty = 0
-
-            if tempo_minuty > 0 and zostava_chystat > 0:
-                odhad_dt = datetime.now() + timedelta(minutes=(zostava_chystat * tempo_minuty))
-                odhad_konca = odhad_dt.strftime('%H:%M')
-                
-    kpi['zostava_chystat'] = zostava_chystat
-    kpi['tempo_minuty'] = tempo_minuty
-    kpi['odhad_konca'] = odhad_konca
-    # ----------------------------------
+    # KPI zo zdieľaného agregátora (úzke COUNT/SUM dotazy, jeden výpočet pre všetky taby)
+    kpi = live_kpi.day_kpi(d)
+    kpi.pop('date', None)
 
     start_date = datetime.strptime(d, "%Y-%m-%d").date()
-    days = [ (start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7) ]
-
-    def _count(table: str, date_col: str, the_day: str) -> int:
-        row = db_connector.execute_query(
-            f"SELECT COUNT(*) AS c FROM {table} WHERE DATE({date_col})=%s",
-            (the_day,), fetch='one'
-        ) or {}
-        return int(row.get('c') or 0)
-
-    next7_orders = []
-    for day in days:
-        c_b2c = _count('b2c_objednavky', b2c_date, day)
-        c_b2b = _count('b2b_objednavky', b2b_date, day)
-        next7_orders.append({'date': day, 'b2c': c_b2c, 'b2b': c_b2b, 'total': c_b2c + c_b2b})
+    next7_orders = live_kpi.orders_per_day(d, 7)
 
     workdays = _workdays(start_date, 7)
     tomorrow = (date.today() + timedelta(days=1)).strftime("%Y-%m-%d")
@@ -680,6 +576,7 @@ def leader_b2c_cancel_order():
             )
     except Exception as e:
         return jsonify({'error': f'Nepodarilo sa zmeniť stav: {e}'}), 500
+    order_events.on_orders_changed('b2c', order_id)
     return jsonify({'message': 'Objednávka zrušená.', 'order_id': order_id})
 
 # =============================================================================
@@ -777,6 +674,7 @@ def leader_b2b_create_order():
                 """, (order_id, ean, name, qty, unit, price))
 
             conn.commit()
+            order_events.on_orders_changed('b2b', order_id)
             return jsonify({'message': 'Objednávka prijatá', 'order_id': order_id, 'order_no': order_no})
         except Exception as e:
             conn.rollback()
@@ -829,6 +727,7 @@ def leader_b2b_update_order():
             except: pass
     except Exception as e:
         return jsonify({'error': f'Chyba pripojenia: {e}'}), 500
+    order_events.on_orders_changed('b2b', order_id)
     return jsonify({'message': 'Objednávka upravená.', 'order_id': order_id})
 
 
@@ -948,72 +847,27 @@ def leader_b2b_notify_order():
 @leader_bp.get('/tv_board/live_kpi')
 @login_required(role=('veduci','admin'))
 def tv_board_live_kpi():
-    from datetime import date, datetime, timedelta
-    
-    today_str = date.today().strftime('%Y-%m-%d')
-    
-    # 1. Oprava tabuľky: v projekte sa volá 'system_settings'
-    target_date_row = db_connector.execute_query(
-        "SELECT hodnota FROM system_settings WHERE kluc='expedicia_cielovy_datum'", 
-        fetch='one'
-    )
-    t_date = target_date_row.get('hodnota') if target_date_row else (date.today() + timedelta(days=1)).strftime('%Y-%m-%d')
-
-    # 2. Dynamická detekcia stĺpcov pre dátum dodania
-    b2c_date_col = _pick_col('b2c_objednavky', ['pozadovany_datum_dodania', 'datum_dodania', 'datum_objednavky']) or 'id'
-    b2b_date_col = _pick_col('b2b_objednavky', ['pozadovany_datum_dodania', 'datum_objednavky']) or 'id'
-
-    # 3. Použijeme SELECT *, aby sme sa vyhli chybe s neexistujúcim stĺpcom datum_vypracovania
-    rows_b2c = db_connector.execute_query(f"SELECT * FROM b2c_objednavky WHERE DATE({b2c_date_col}) = %s", (t_date,)) or []
-    rows_b2b = db_connector.execute_query(f"SELECT * FROM b2b_objednavky WHERE DATE({b2b_date_col}) = %s", (t_date,)) or []
-
-    hotove_dnes_casy = []
-    zostava_chystat = 0
-    
-    for r in rows_b2c + rows_b2b:
-        stav = r.get('stav', '')
-        if stav in ('Hotová', 'Expedovaná'):
-            # Použijeme tvoju logiku z dashboardu na hľadanie času dokončenia
-            cas = r.get('datum_vypracovania') or r.get('vypracovane') or r.get('cas_dokoncenia') or r.get('updated_at')
-            if cas:
-                c_date_str = cas.strftime('%Y-%m-%d') if hasattr(cas, 'strftime') else str(cas)[:10]
-                if c_date_str == today_str:
-                    hotove_dnes_casy.append(cas)
-        elif stav not in ('Zrušená'):
-            zostava_chystat += 1
-
-    tempo_minuty = 0
-    odhad_konca = ""
-    
-    if len(hotove_dnes_casy) > 1:
-        parsed_casy = []
-        for c in hotove_dnes_casy:
-            if isinstance(c, datetime): parsed_casy.append(c)
-            elif isinstance(c, str):
-                try: parsed_casy.append(datetime.strptime(c[:19], '%Y-%m-%d %H:%M:%S'))
-                except: pass
-        
-        if len(parsed_casy) > 1:
-            parsed_casy.sort()
-            platne_intervaly = []
-            for i in range(1, len(parsed_casy)):
-                rozdiel = (parsed_casy[i] - parsed_casy[i-1]).total_seconds()
-                if 10 < rozdiel < 1200: # 10 sekúnd až 20 minút (pauzy ignorujeme)
-                    platne_intervaly.append(rozdiel)
-
-            if platne_intervaly:
-                tempo_minuty = round((sum(platne_intervaly) / len(platne_intervaly)) / 60.0, 1)
-                if zostava_chystat > 0:
-                    koniec_dt = datetime.now() + timedelta(minutes=(zostava_chystat * tempo_minuty))
-                    odhad_konca = koniec_dt.strftime('%H:%M')
-
+    # Jednorazové načítanie – rovnaký snapshot ako /kpi/poll
+    snap = live_kpi.snapshot()
+    tv = snap.get('tv') or {}
     return jsonify({
-        'zostava_chystat': zostava_chystat,
-        'tempo_minuty': tempo_minuty,
-        'odhad_konca': odhad_konca,
-        'target_date': t_date
+        'zostava_chystat': tv.get('zostava_chystat', 0),
+        'tempo_minuty': tv.get('tempo_minuty', 0),
+        'odhad_konca': tv.get('odhad_konca', ''),
+        'target_date': snap.get('target_date')
     })
 
+@leader_bp.get('/kpi/poll')
+@login_required(role=('veduci','admin'))
+def leader_kpi_poll():
+    """Krátky poll: aktuálny snapshot KPI hneď; 304, ak klient už má etag ?since=."""
+    snap = live_kpi.poll_snapshot(request.args.get('since') or None)
+    if snap is None:
+        return Response(status=304, headers={'Cache-Control': 'no-store'})
+    resp = jsonify(snap)
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
 @leader_bp.route('/tv_board/customers', methods=['GET'])
 @login_required(role=('veduci','admin'))
 def get_tv_board_customers():
@@ -1229,29 +1083,12 @@ def leader_search_customers():
     if len(q) < 2:
         return jsonify([])
 
-    # Hľadáme v B2B aj B2C tabuľkách
-    results = []
-    
-    # B2B
-    if _table_exists('b2b_zakaznici'):
-        rows = db_connector.execute_query(
-            "SELECT nazov_firmy as name, 'B2B' as type FROM b2b_zakaznici WHERE nazov_firmy LIKE %s LIMIT 10",
-            (f"%{q}%",)
-        ) or []
-        results.extend(rows)
-
-    # B2C (z objednávok, keďže nemusia mať vlastnú tabuľku zákazníkov)
-    if _table_exists('b2c_objednavky'):
-        # Skúsime nájsť unikátne mená/firmy
-        col_name = _pick_col('b2c_objednavky', ['zakaznik_meno', 'nazov_firmy', 'customer_name'])
-        if col_name:
-            rows = db_connector.execute_query(
-                f"SELECT DISTINCT {col_name} as name, 'B2C' as type FROM b2c_objednavky WHERE {col_name} LIKE %s LIMIT 10",
-                (f"%{q}%",)
-            ) or []
-            results.extend(rows)
-
-    return jsonify(results[:20]) # Vrátime max 20 výsledkov
+    # B2B aj B2C (mená z objednávok) – pamäťový index, bez ohľadu na diakritiku
+    hits = search_index.search(q, ('b2b', 'b2c'), limit=20)
+    return jsonify([
+        {'name': h['nazov_firmy'], 'type': 'B2B'} if h['kind'] == 'b2b' else {'name': h['name'], 'type': 'B2C'}
+        for h in hits
+    ])
 
 @leader_bp.patch('/cut_jobs/<int:job_id>')
 @login_required(role='veduci')
@@ -1282,23 +1119,7 @@ def leader_b2b_search_products():
     if len(q) < 2:
         return jsonify([])
 
-    sql = """
-        SELECT 
-            ean, 
-            nazov_vyrobku as name, 
-            mj, 
-            COALESCE(nakupna_cena, 0) as cost
-        FROM produkty 
-        WHERE LOWER(nazov_vyrobku) LIKE %s OR ean LIKE %s
-        LIMIT 20
-    """
-    like_q = f"%{q.lower()}%"
-    
-    try:
-        rows = db_connector.execute_query(sql, (like_q, like_q), fetch='all') or []
-    except Exception as e:
-        print(f"Chyba pri vyhľadávaní produktov: {e}")
-        return jsonify([])
+    rows = search_index.search(q, ('product',), limit=20)
     
     out = []
     for r in rows:
@@ -1325,6 +1146,8 @@ def leader_delete_product():
     
     try:
         db_connector.execute_query("DELETE FROM produkty WHERE ean = %s", (ean,), fetch='none')
+        http_cache.bump("catalog")
+        search_index.refresh('product', [ean])
         return jsonify({'message': 'Produkt bol úspešne odstránený z katalógu.'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1351,22 +1174,9 @@ def leader_product_stock_card():
         
         is_made = str(prod_row.get('typ_polozky', '')).upper().startswith('VÝROBOK')
 
-        # 2. DYNAMICKÝ VÝPOČET REZERVÁCIÍ (Spočíta tovar z aktívnych objednávok)
-        res_b2b = db_connector.execute_query("""
-            SELECT COALESCE(SUM(p.mnozstvo), 0) as res 
-            FROM b2b_objednavky_polozky p
-            JOIN b2b_objednavky o ON p.objednavka_id = o.id
-            WHERE p.ean_produktu = %s AND o.stav NOT IN ('Hotová', 'Expedovaná', 'Zrušená', 'Vybavená')
-        """, (ean,), fetch='one')
-        
-        res_b2c = db_connector.execute_query("""
-            SELECT COALESCE(SUM(p.mnozstvo), 0) as res 
-            FROM b2c_objednavky_polozky p
-            JOIN b2c_objednavky o ON p.objednavka_id = o.id
-            WHERE p.ean_produktu = %s AND o.stav NOT IN ('Hotová', 'Expedovaná', 'Zrušená', 'Vybavená')
-        """, (ean,), fetch='one')
-
-        total_reserved = float((res_b2b['res'] if res_b2b else 0) + (res_b2c['res'] if res_b2c else 0))
+        # 2. REZERVÁCIE z udržiavaných počítadiel (stock_reservations)
+        avail = stock_reservations.availability([ean]).get(prod_row['ean']) or {}
+        total_reserved = float(avail.get('reserved') or 0)
 
         # 3. Posledné B2B predaje (Ťahá aj reálne váhy dodane_mnozstvo)
         b2b_sql = """
@@ -1432,6 +1242,9 @@ def leader_product_stock_card():
                 "mj": prod_row['mj'] or 'kg',
                 "stock": float(prod_row['stock']),
                 "reserved": total_reserved,
+                "reserved_b2b": float(avail.get('reserved_b2b') or 0),
+                "reserved_b2c": float(avail.get('reserved_b2c') or 0),
+                "available": float(prod_row['stock']) - total_reserved,
                 "is_made": is_made
             },
             "b2b": b2b_list,
@@ -1618,31 +1431,20 @@ def search_all_customers():
     if len(q) < 2:
         return jsonify([])
     
-    like_q = f"%{q}%"
-
-    # 1. Hľadáme v registrovaných zákazníkoch (E-shop) - pridané cislo_prevadzky do SELECTu aj WHERE
-    sql_reg = """
-        SELECT id as db_id, zakaznik_id as interne_cislo, nazov_firmy, adresa, email as kontakt, '1' as is_registered, cislo_prevadzky 
-        FROM b2b_zakaznici 
-        WHERE typ='B2B' AND (nazov_firmy LIKE %s OR zakaznik_id LIKE %s OR cislo_prevadzky LIKE %s)
-        LIMIT 15
-    """
-    reg_rows = db_connector.execute_query(sql_reg, (like_q, like_q, like_q), fetch='all') or []
+    # 1. Registrovaní zákazníci (E-shop) – názov, zákaznícke číslo aj číslo prevádzky
+    reg_rows = [dict(h) for h in search_index.search(q, ('b2b',), limit=15)]
 
     # Vloženie čísla prevádzky priamo do názvu firmy pre frontend
     for r in reg_rows:
+        r.pop('kind', None)
         c_prev = str(r.get('cislo_prevadzky') or '').strip()
         if c_prev and not str(r['nazov_firmy']).startswith(f"[{c_prev}]"):
             r['nazov_firmy'] = f"[{c_prev}] {r['nazov_firmy']}"
 
-    # 2. Hľadáme v neregistrovaných (Manuálnych)
-    sql_man = """
-        SELECT id as db_id, interne_cislo, nazov_firmy, adresa, kontakt, '0' as is_registered 
-        FROM b2b_manual_zakaznici 
-        WHERE nazov_firmy LIKE %s OR interne_cislo LIKE %s
-        LIMIT 15
-    """
-    man_rows = db_connector.execute_query(sql_man, (like_q, like_q), fetch='all') or []
+    # 2. Neregistrovaní (Manuálni)
+    man_rows = search_index.search(q, ('manual',), limit=15)
+    for r in man_rows:
+        r.pop('kind', None)
 
     return jsonify(reg_rows + man_rows)
 
@@ -1665,6 +1467,9 @@ def save_manual_customer():
             VALUES (%s, %s, %s, %s)
             ON DUPLICATE KEY UPDATE nazov_firmy=%s, adresa=%s, kontakt=%s
         """, (interne_cislo, nazov_firmy, adresa, kontakt, nazov_firmy, adresa, kontakt), fetch='none')
+        row = db_connector.execute_query(
+            "SELECT id FROM b2b_manual_zakaznici WHERE interne_cislo=%s", (interne_cislo,), fetch='one')
+        search_index.refresh('manual', [row['id']] if row else [])
         return jsonify({'message': 'Zákazník uložený.'})
     except Exception as e:
         return jsonify({'error': f'Chyba uloženia: {str(e)}'}), 500
@@ -1828,6 +1633,7 @@ def submit_manual_order():
         if conn and conn.is_connected():
             cur.close()
             conn.close()
+    order_events.on_orders_changed('b2b', oid)
 
     import copy
     order_payload = {
@@ -0,0 +1,303 @@
+# =================================================================
+# === LIVE KPI EXPEDÍCIE: JEDEN AGREGÁTOR + KRÁTKY POLL ==============
+# =================================================================
+#
+# TV tabuľa aj dashboard vedúceho predtým pri každom pollingu robili
+# SELECT * nad dennými objednávkami, DATE() na stĺpci dodania, SHOW COLUMNS
+# a parsovanie polozky_json v Pythone – každá obrazovka zvlášť.
+#
+# Tu beží v procese jedno vlákno, ktoré snapshot prepočíta raz za
+# KPI_INTERVAL_S (alebo hneď po notify_change() pri zmene stavu objednávky)
+# z úzkych agregačných dotazov (COUNT/SUM + len časy dokončenia). Klienti
+# sa pýtajú krátkym pollom (/kpi/poll): požiadavka vráti hotový snapshot
+# z pamäte hneď, bez čakania – sync gunicorn worker nie je blokovaný.
+# Ak klient už má rovnaký etag (?since=), odpoveď je prázdna 304. Etag je
+# odtlačok obsahu, nie poradové číslo, takže je rovnaký vo všetkých
+# workeroch. Záťaž DB nerastie s počtom obrazoviek; keď sa nikto
+# nepozerá, agregátor nepočíta.
+# =================================================================
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import db_connector
+
+KPI_INTERVAL_S = int(os.getenv("KPI_INTERVAL_S", "15"))
+KPI_IDLE_S = int(os.getenv("KPI_IDLE_S", "120"))
+
+DONE_STATES = ("Hotová", "Expedovaná")
+CLOSED_STATES = ("Hotová", "Expedovaná", "Zrušená")
+
+_DATE_CANDIDATES = {
+    "b2c_objednavky": ["pozadovany_datum_dodania", "datum_dodania", "datum_objednavky"],
+    "b2b_objednavky": ["pozadovany_datum_dodania", "datum_objednavky"],
+}
+_DONE_CANDIDATES = ["datum_vypracovania", "vypracovane", "cas_dokoncenia", "updated_at"]
+_ITEMS_CANDIDATES = ["polozky_json", "polozky", "items"]
+
+
+# --- schéma (raz za proces) ---------------------------------------------------
+_cols_lock = threading.Lock()
+_cols_cache: Dict[str, Dict[str, str]] = {}
+
+
+def _cols(table: str) -> Dict[str, str]:
+    with _cols_lock:
+        if table in _cols_cache:
+            return _cols_cache[table]
+    rows = db_connector.execute_query(f"SHOW COLUMNS FROM `{table}`") or []
+    have = {str(r.get("Field")).lower(): str(r.get("Field")) for r in rows if r.get("Field")}
+    if have:
+        with _cols_lock:
+            _cols_cache[table] = have
+    return have
+
+
+def _pick(table: str, candidates: List[str]) -> Optional[str]:
+    have = _cols(table)
+    for c in candidates:
+        if c.lower() in have:
+            return have[c.lower()]
+    return None
+
+
+def due_date_column(table: str) -> Optional[str]:
+    """Stĺpec s požadovaným dátumom dodania (b2b_objednavky / b2c_objednavky) podľa schémy, alebo None."""
+    return _pick(table, _DATE_CANDIDATES[table])
+
+
+# --- agregácie ------------------------------------------------------------------
+def _day_range(d: str):
+    start = datetime.strptime(d, "%Y-%m-%d").date()
+    return start.strftime("%Y-%m-%d"), (start + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def _table_day(table: str, d: str, today: str) -> Dict[str, Any]:
+    date_col = _pick(table, _DATE_CANDIDATES[table])
+    if not date_col:
+        return {"count": 0, "sum": 0.0, "open": 0, "items": 0, "done_times": []}
+    d0, d1 = _day_range(d)
+    items_col = _pick(table, _ITEMS_CANDIDATES)
+    sum_col = _pick(table, ["celkova_suma_s_dph"])
+    items_expr = (f"SUM(CASE WHEN JSON_VALID(`{items_col}`) THEN JSON_LENGTH(`{items_col}`) ELSE 0 END)"
+                  if items_col else "0")
+    sum_expr = f"SUM(`{sum_col}`)" if sum_col else "0"
+    closed_ph = ",".join(["%s"] * len(CLOSED_STATES))
+    agg = db_connector.execute_query(
+        f"""
+        SELECT COUNT(*) AS n,
+               COALESCE({sum_expr}, 0) AS suma,
+               COALESCE(SUM(COALESCE(stav,'') NOT IN ({closed_ph})), 0) AS open_n,
+               COALESCE({items_expr}, 0) AS items
+          FROM `{table}`
+         WHERE `{date_col}` >= %s AND `{date_col}` < %s
+        """,
+        (*CLOSED_STATES, d0, d1), fetch="one"
+    ) or {}
+
+    done_times: List[datetime] = []
+    done_cols = [c for c in (_pick(table, [x]) for x in _DONE_CANDIDATES) if c]
+    if done_cols:
+        t0, t1 = _day_range(today)
+        done_ph = ",".join(["%s"] * len(DONE_STATES))
+        rows = db_connector.execute_query(
+            f"""
+            SELECT t FROM (
+                SELECT COALESCE({', '.join(f'`{c}`' for c in done_cols)}) AS t
+                  FROM `{table}`
+                 WHERE `{date_col}` >= %s AND `{date_col}` < %s AND stav IN ({done_ph})
+            ) x
+            WHERE t >= %s AND t < %s
+            """,
+            (d0, d1, *DONE_STATES, t0, t1)
+        ) or []
+        for r in rows:
+            t = r.get("t")
+            if isinstance(t, datetime):
+                done_times.append(t)
+            elif t:
+                try:
+                    done_times.append(datetime.strptime(str(t)[:19], "%Y-%m-%d %H:%M:%S"))
+                except ValueError:
+                    pass
+
+    return {
+        "count": int(agg.get("n") or 0),
+        "sum": float(agg.get("suma") or 0),
+        "open": int(agg.get("open_n") or 0),
+        "items": int(agg.get("items") or 0),
+        "done_times": done_times,
+    }
+
+
+def _tempo(done_times: List[datetime], remaining: int, now: datetime):
+    """Priemerný interval medzi dokončeniami (10 s – 20 min, pauzy ignorujeme)."""
+    tempo_minuty, odhad_konca = 0, ""
+    if len(done_times) > 1:
+        ts = sorted(done_times)
+        gaps = [(b - a).total_seconds() for a, b in zip(ts, ts[1:])]
+        gaps = [g for g in gaps if 10 < g < 1200]
+        if gaps:
+            tempo_minuty = round((sum(gaps) / len(gaps)) / 60.0, 1)
+            if tempo_minuty > 0 and remaining > 0:
+                odhad_konca = (now + timedelta(minutes=remaining * tempo_minuty)).strftime("%H:%M")
+    return tempo_minuty, odhad_konca
+
+
+def compute_day(d: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """KPI pre deň dodania d (rovnaké polia ako /api/leader/dashboard -> kpi)."""
+    now = now or datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    c = _table_day("b2c_objednavky", d, today)
+    b = _table_day("b2b_objednavky", d, today)
+    remaining = c["open"] + b["open"]
+    tempo, odhad = _tempo(c["done_times"] + b["done_times"], remaining, now)
+    return {
+        "date": d,
+        "b2c_count": c["count"],
+        "b2b_count": b["count"],
+        "items_total": c["items"] + b["items"],
+        "sum_total": round(c["sum"] + b["sum"], 2),
+        "zostava_chystat": remaining,
+        "tempo_minuty": tempo,
+        "odhad_konca": odhad,
+    }
+
+
+def orders_per_day(start: str, days: int = 7) -> List[Dict[str, Any]]:
+    """Počty objednávok na najbližšie dni – jeden GROUP BY na tabuľku."""
+    d0 = datetime.strptime(start, "%Y-%m-%d").date()
+    d1 = d0 + timedelta(days=days)
+    per: Dict[str, Dict[str, int]] = {}
+    for table, key in (("b2c_objednavky", "b2c"), ("b2b_objednavky", "b2b")):
+        col = _pick(table, _DATE_CANDIDATES[table])
+        if not col:
+            continue
+        rows = db_connector.execute_query(
+            f"SELECT DATE(`{col}`) AS d, COUNT(*) AS c FROM `{table}` "
+            f"WHERE `{col}` >= %s AND `{col}` < %s GROUP BY DATE(`{col}`)",
+            (d0.strftime("%Y-%m-%d"), d1.strftime("%Y-%m-%d"))
+        ) or []
+        for r in rows:
+            dd = r.get("d")
+            k = dd.strftime("%Y-%m-%d") if hasattr(dd, "strftime") else str(dd)[:10]
+            per.setdefault(k, {})[key] = int(r.get("c") or 0)
+    out = []
+    for i in range(days):
+        k = (d0 + timedelta(days=i)).strftime("%Y-%m-%d")
+        c_b2c = per.get(k, {}).get("b2c", 0)
+        c_b2b = per.get(k, {}).get("b2b", 0)
+        out.append({"date": k, "b2c": c_b2c, "b2b": c_b2b, "total": c_b2c + c_b2b})
+    return out
+
+
+def _tv_target_date() -> str:
+    row = db_connector.execute_query(
+        "SELECT hodnota FROM system_settings WHERE kluc='expedicia_cielovy_datum'", fetch="one"
+    )
+    val = (row or {}).get("hodnota")
+    if val:
+        try:
+            return datetime.strptime(str(val)[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return (date.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+# --- agregátor ------------------------------------------------------------------
+class _Aggregator:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._version = 0
+        self._last_demand = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="live-kpi", daemon=True)
+            self._thread.start()
+
+    def _recompute(self) -> None:
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        tv_date = _tv_target_date()
+        days = {tv_date: compute_day(tv_date, now)}
+        if today not in days:
+            days[today] = compute_day(today, now)
+        snap = {
+            "computed_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "target_date": tv_date,
+            "tv": days[tv_date],
+            "days": days,
+        }
+        # odtlačok bez computed_at – mení sa len so zmenou dát
+        snap["etag"] = hashlib.sha1(json.dumps(
+            {"target_date": tv_date, "days": days}, sort_keys=True, default=str
+        ).encode("utf-8")).hexdigest()[:16]
+        with self._cond:
+            self._version += 1
+            snap["version"] = self._version
+            self._snapshot = snap
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            changed = self._wake.wait(KPI_INTERVAL_S)
+            if changed:
+                time.sleep(1.0)  # zlúčime dávku zmien (napr. hromadné uzavretie)
+            self._wake.clear()
+            if time.time() - self._last_demand > KPI_IDLE_S:
+                continue
+            try:
+                self._recompute()
+            except Exception as e:
+                print(f"[KPI] Prepočet zlyhal: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._last_demand = time.time()
+        self._ensure_thread()
+        with self._cond:
+            snap = self._snapshot
+        if snap is None:
+            self._recompute()
+            with self._cond:
+                snap = self._snapshot
+        return snap or {}
+
+    def notify(self) -> None:
+        self._wake.set()
+
+
+_agg = _Aggregator()
+
+
+def snapshot() -> Dict[str, Any]:
+    return _agg.snapshot()
+
+
+def day_kpi(d: str) -> Dict[str, Any]:
+    """KPI dňa – zo snapshotu, ak ho agregátor drží, inak priamy (úzky) výpočet."""
+    snap = _agg.snapshot()
+    hit = (snap.get("days") or {}).get(d)
+    return dict(hit) if hit else compute_day(d)
+
+
+def notify_change() -> None:
+    """Volať po zmene stavu objednávky – snapshot sa prepočíta hneď, nie až po intervale."""
+    _agg.notify()
+
+
+def poll_snapshot(since: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Aktuálny snapshot bez čakania; None, ak má klient rovnaký etag (`since`)."""
+    snap = _agg.snapshot()
+    return None if since and snap.get("etag") == since else snap
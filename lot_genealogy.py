@@ -0,0 +1,465 @@
+# =================================================================
+# === GENEALÓGIA ŠARŽÍ (TRACEABILITY GRAF) ========================
+# =================================================================
+#
+# Indexovaný graf "čo išlo kam" pre stiahnutie z trhu / HACCP audit:
+#
+#   PRIJEM (zaznamy_prijem) ─┐
+#   OBJ_PRIJEM (vyrobne_objednavky_polozky) ─┴─> DAVKA (zaznamy_vyroba)
+#   DAVKA ──> EXP_PRIJEM (expedicia_prijmy) ──> DL_POLOZKA (doklady_polozky) ──> DL
+#   EXP_PRIJEM / TOVAR_PRIJEM (skladove_pohyby +) ──> DAVKA krájania ──> DL_POLOZKA
+#
+# Uzly sú v lot_nodes, hrany v lot_edges (PK zdroj->cieľ, index cieľ->zdroj),
+# takže dopredné ("kam išla táto surovina") aj spätné ("čo bolo v tejto
+# dodávke") dotazy sú BFS po indexe – jeden dotaz na úroveň grafu.
+#
+# Kde systém nevedie šaržu priamo (surovina v dávke, výrobok na dodacom
+# liste), hrana vzniká FIFO alokáciou podľa času v rámci jednej suroviny /
+# EAN-u a má basis='fifo'; priame väzby (dávka -> príjem expedície,
+# položka -> dodací list) majú basis='exact'.
+#
+# rebuild() prepočíta graf za posledných GENEALOGY_HORIZON_DAYS dní
+# (scheduler každých 30 minút, ručne POST /api/traceability/genealogy/rebuild).
+# =================================================================
+import json
+import os
+import time
+from collections import defaultdict, deque
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import db_connector
+
+HORIZON_DAYS = int(os.getenv("GENEALOGY_HORIZON_DAYS", "540"))
+SUPPLY_LEAD_DAYS = 90   # staršie príjmy, z ktorých FIFO berie na začiatku okna
+MAX_DEPTH = 12
+MAX_NODES = 5000
+_EPS = 1e-6
+
+PRIJEM = "PRIJEM"
+OBJ_PRIJEM = "OBJ_PRIJEM"
+DAVKA = "DAVKA"
+EXP_PRIJEM = "EXP_PRIJEM"
+TOVAR_PRIJEM = "TOVAR_PRIJEM"
+DL_POLOZKA = "DL_POLOZKA"
+DL = "DL"
+NODE_TYPES = (PRIJEM, OBJ_PRIJEM, DAVKA, EXP_PRIJEM, TOVAR_PRIJEM, DL_POLOZKA, DL)
+
+_schema_ready = False
+
+Node = Tuple[str, str]
+
+
+def _table_exists(table: str) -> bool:
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.TABLES
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s
+         LIMIT 1
+    """, (table,), fetch='one')
+    return bool(r)
+
+
+def ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS lot_nodes (
+            node_type VARCHAR(16)  NOT NULL,
+            node_id   VARCHAR(64)  NOT NULL,
+            label     VARCHAR(255) NULL,
+            item      VARCHAR(255) NULL,          -- surovina / EAN výrobku
+            qty       DECIMAL(14,3) NULL,
+            unit      VARCHAR(8)   NULL,
+            event_at  DATETIME     NULL,
+            info      VARCHAR(255) NULL,          -- dodávateľ / odberateľ / stav
+            PRIMARY KEY (node_type, node_id),
+            INDEX idx_ln_item (item, event_at),
+            INDEX idx_ln_event (event_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS lot_edges (
+            src_type VARCHAR(16) NOT NULL,
+            src_id   VARCHAR(64) NOT NULL,
+            dst_type VARCHAR(16) NOT NULL,
+            dst_id   VARCHAR(64) NOT NULL,
+            qty      DECIMAL(14,3) NULL,
+            basis    ENUM('exact','fifo') NOT NULL DEFAULT 'exact',
+            PRIMARY KEY (src_type, src_id, dst_type, dst_id),
+            INDEX idx_le_dst (dst_type, dst_id, src_type, src_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = True
+
+
+# --- POMOCNÉ ------------------------------------------------------------------
+def _key(s) -> str:
+    return " ".join(str(s or "").split()).lower()
+
+
+def _dt(v) -> Optional[datetime]:
+    if isinstance(v, datetime):
+        return v
+    if isinstance(v, date):
+        return datetime(v.year, v.month, v.day)
+    return None
+
+
+def _f(v) -> float:
+    try:
+        return float(v or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _fifo(supplies: List[Tuple[datetime, Node, float]],
+          demands: List[Tuple[datetime, Node, float]]) -> List[Tuple[Node, Node, float]]:
+    """
+    FIFO alokácia jednej položky: každý odber berie z najstarších príjmov
+    prijatých najneskôr v čase odberu. Vráti [(zdroj, cieľ, množstvo)].
+    """
+    supplies = sorted(supplies, key=lambda s: (s[0], s[1]))
+    demands = sorted(demands, key=lambda d: (d[0], d[1]))
+    out: List[Tuple[Node, Node, float]] = []
+    queue: deque = deque()
+    i = 0
+    for at, dst, need in demands:
+        while i < len(supplies) and supplies[i][0] <= at:
+            queue.append([supplies[i][1], supplies[i][2]])
+            i += 1
+        while need > _EPS and queue:
+            head = queue[0]
+            take = min(head[1], need)
+            if take > _EPS and head[0] != dst:
+                out.append((head[0], dst, take))
+            head[1] -= take
+            need -= take
+            if head[1] <= _EPS:
+                queue.popleft()
+    return out
+
+
+# --- ZBER UDALOSTÍ --------------------------------------------------------------
+class _Graph:
+    def __init__(self):
+        self.nodes: Dict[Node, Tuple] = {}
+        self.edges: Dict[Tuple[Node, Node], List] = {}
+
+    def node(self, ntype, nid, label=None, item=None, qty=None, unit=None, event_at=None, info=None) -> Node:
+        n = (ntype, str(nid))
+        self.nodes[n] = (ntype, str(nid), (label or "")[:255] or None, (item or "")[:255] or None,
+                         qty, unit, event_at, (info or "")[:255] or None)
+        return n
+
+    def edge(self, src: Node, dst: Node, qty: Optional[float], basis: str) -> None:
+        e = self.edges.get((src, dst))
+        if e:
+            e[0] = (e[0] or 0) + (qty or 0)
+        else:
+            self.edges[(src, dst)] = [qty, basis]
+
+
+def _collect(g: _Graph, since: datetime) -> Dict[str, int]:
+    from expedition_handler import _zv_name_col
+
+    supply_since = since - timedelta(days=SUPPLY_LEAD_DAYS)
+    raw_in: Dict[str, List] = defaultdict(list)    # surovina -> [(at, node, kg)]
+    raw_out: Dict[str, List] = defaultdict(list)
+    prod_in: Dict[str, List] = defaultdict(list)   # ean -> [(at, node, qty)]
+    prod_out: Dict[str, List] = defaultdict(list)
+
+    products = db_connector.execute_query(
+        "SELECT ean, nazov_vyrobku, mj FROM produkty WHERE ean IS NOT NULL AND ean <> ''") or []
+    ean_by_name = {_key(p["nazov_vyrobku"]): str(p["ean"]).strip() for p in products}
+    mj_by_ean = {str(p["ean"]).strip(): (p.get("mj") or "kg").lower() for p in products}
+
+    # 1) príjmy surovín
+    for r in db_connector.execute_query("""
+        SELECT id, datum, nazov_suroviny, mnozstvo_kg, poznamka_dodavatel
+          FROM zaznamy_prijem
+         WHERE datum >= %s AND mnozstvo_kg > 0
+    """, (supply_since,)) or []:
+        n = g.node(PRIJEM, r["id"], f"Príjem {r['nazov_suroviny']}", r["nazov_suroviny"],
+                   r["mnozstvo_kg"], "kg", r["datum"], r.get("poznamka_dodavatel"))
+        raw_in[_key(r["nazov_suroviny"])].append((_dt(r["datum"]), n, _f(r["mnozstvo_kg"])))
+
+    if _table_exists("vyrobne_objednavky_polozky"):
+        for r in db_connector.execute_query("""
+            SELECT p.id, p.nazov_suroviny, p.jednotka, p.mnozstvo_dodane,
+                   o.cislo, o.dodavatel_nazov, COALESCE(o.datum_dodania, DATE(o.updated_at)) AS datum
+              FROM vyrobne_objednavky_polozky p
+              JOIN vyrobne_objednavky o ON o.id = p.objednavka_id
+             WHERE o.stav = 'prijate' AND p.mnozstvo_dodane > 0
+               AND COALESCE(o.datum_dodania, DATE(o.updated_at)) >= %s
+        """, (supply_since.date(),)) or []:
+            n = g.node(OBJ_PRIJEM, r["id"], f"Objednávka {r['cislo']}: {r['nazov_suroviny']}",
+                       r["nazov_suroviny"], r["mnozstvo_dodane"], r.get("jednotka") or "kg",
+                       _dt(r["datum"]), r.get("dodavatel_nazov"))
+            raw_in[_key(r["nazov_suroviny"])].append((_dt(r["datum"]), n, _f(r["mnozstvo_dodane"])))
+
+    # 2) výrobné dávky a krájanie
+    zv = _zv_name_col()
+    batches: Dict[str, Dict[str, Any]] = {}
+    for r in db_connector.execute_query(f"""
+        SELECT id_davky, {zv} AS nazov, stav, datum_vyroby, datum_spustenia, datum_ukoncenia,
+               planovane_mnozstvo_kg, realne_mnozstvo_kg, realne_mnozstvo_ks, detaily_zmeny
+          FROM zaznamy_vyroba
+         WHERE COALESCE(datum_vyroby, datum_spustenia) >= %s AND stav <> 'Zrušená'
+    """, (supply_since,)) or []:
+        at = _dt(r.get("datum_vyroby")) or _dt(r.get("datum_spustenia"))
+        try:
+            det = json.loads(r.get("detaily_zmeny") or "{}")
+        except Exception:
+            det = {}
+        slicing = isinstance(det, dict) and det.get("operacia") == "krajanie"
+        name = det.get("cielovyNazov") if slicing else r["nazov"]
+        n = g.node(DAVKA, r["id_davky"], f"{'Krájanie' if slicing else 'Dávka'} {r['id_davky']}: {name}",
+                   det.get("cielovyEan") if slicing else ean_by_name.get(_key(name)),
+                   r.get("realne_mnozstvo_kg") or r.get("planovane_mnozstvo_kg"), "kg", at, r.get("stav"))
+        batches[str(r["id_davky"])] = {"node": n, "at": at, "slicing": slicing, "det": det, "row": r}
+        if slicing and det.get("zdrojovyEan") and at and at >= since:
+            kg = _f(r.get("realne_mnozstvo_kg")) or _f(r.get("planovane_mnozstvo_kg"))
+            prod_out[str(det["zdrojovyEan"]).strip()].append((at, n, kg))
+
+    ids = list(batches)
+    for chunk in (ids[i:i + 500] for i in range(0, len(ids), 500)):
+        for r in db_connector.execute_query(f"""
+            SELECT id_davky, nazov_suroviny, SUM(pouzite_mnozstvo_kg) AS kg
+              FROM zaznamy_vyroba_suroviny
+             WHERE id_davky IN ({','.join(['%s'] * len(chunk))})
+             GROUP BY id_davky, nazov_suroviny
+        """, tuple(chunk)) or []:
+            b = batches[str(r["id_davky"])]
+            if b["at"] and b["at"] >= since and _f(r["kg"]) > 0:
+                raw_out[_key(r["nazov_suroviny"])].append((b["at"], b["node"], _f(r["kg"])))
+
+    # 3) príjmy expedície (dávka -> sklad výrobkov, priama väzba)
+    received = set()
+    for r in db_connector.execute_query("""
+        SELECT id, id_davky, nazov_vyrobku, unit, prijem_kg, prijem_ks, prijal, datum_prijmu
+          FROM expedicia_prijmy
+         WHERE is_deleted = 0 AND datum_prijmu >= %s
+    """, (supply_since.date(),)) or []:
+        b = batches.get(str(r["id_davky"]))
+        ean = (b and g.nodes[b["node"]][3]) or ean_by_name.get(_key(r["nazov_vyrobku"]))
+        unit = (r.get("unit") or "kg").lower()
+        qty = _f(r["prijem_ks"]) if unit == "ks" else _f(r["prijem_kg"])
+        n = g.node(EXP_PRIJEM, r["id"], f"Príjem expedície {r['id_davky']}: {r['nazov_vyrobku']}",
+                   ean, qty, unit, _dt(r["datum_prijmu"]), r.get("prijal"))
+        if b:
+            g.edge(b["node"], n, qty, "exact")
+            received.add(str(r["id_davky"]))
+        if ean and qty > 0:
+            if mj_by_ean.get(ean, "kg") == "ks" and unit != "ks" and _f(r["prijem_ks"]) > 0:
+                qty = _f(r["prijem_ks"])
+            prod_in[ean].append((_dt(r["datum_prijmu"]), n, qty))
+
+    # nakrájaný výrobok, ktorý neprešiel príjmom expedície, ide na sklad priamo z dávky
+    for bid, b in batches.items():
+        if b["slicing"] and bid not in received and b["row"].get("datum_ukoncenia"):
+            ean = str(b["det"].get("cielovyEan") or "").strip()
+            row = b["row"]
+            qty = _f(row.get("realne_mnozstvo_ks")) if mj_by_ean.get(ean) == "ks" else _f(row.get("realne_mnozstvo_kg"))
+            if ean and qty > 0:
+                prod_in[ean].append((_dt(row["datum_ukoncenia"]), b["node"], qty))
+
+    # 4) príjem tovaru mimo výroby (kladné skladové pohyby)
+    if _table_exists("skladove_pohyby"):
+        for r in db_connector.execute_query("""
+            SELECT id, datum_pohybu, ean, nazov_vyrobku, typ_pohybu, mnozstvo, mj
+              FROM skladove_pohyby
+             WHERE mnozstvo > 0 AND datum_pohybu >= %s
+        """, (supply_since,)) or []:
+            ean = str(r.get("ean") or "").strip()
+            if not ean:
+                continue
+            n = g.node(TOVAR_PRIJEM, r["id"], f"{r.get('typ_pohybu') or 'Príjem'}: {r.get('nazov_vyrobku')}",
+                       ean, r["mnozstvo"], r.get("mj"), _dt(r["datum_pohybu"]), r.get("typ_pohybu"))
+            prod_in[ean].append((_dt(r["datum_pohybu"]), n, _f(r["mnozstvo"])))
+
+    # 5) dodacie listy (výdaj zákazníkom)
+    if _table_exists("doklady_polozky"):
+        for r in db_connector.execute_query("""
+            SELECT dp.id, dp.doklad_id, dp.objednavka_id, dp.ean, dp.nazov_polozky, dp.mnozstvo, dp.mj,
+                   dh.cislo_dokladu, dh.odberatel_nazov, dh.datum_vystavenia
+              FROM doklady_polozky dp
+              JOIN doklady_hlavicka dh ON dh.id = dp.doklad_id
+             WHERE dh.typ_dokladu = 'DL' AND dh.datum_vystavenia >= %s
+        """, (since.date(),)) or []:
+            issued = _dt(r["datum_vystavenia"])
+            doc = g.node(DL, r["doklad_id"], f"DL {r['cislo_dokladu']}", None, None, None, issued,
+                         r.get("odberatel_nazov"))
+            # DL nesie len dátum – príjmy z toho istého dňa v ňom už môžu byť
+            at = issued.replace(hour=23, minute=59, second=59) \
+                if issued and not isinstance(r["datum_vystavenia"], datetime) else issued
+            ean = str(r.get("ean") or "").strip()
+            n = g.node(DL_POLOZKA, r["id"], f"DL {r['cislo_dokladu']}: {r['nazov_polozky']}", ean,
+                       r["mnozstvo"], r.get("mj"), at, r.get("odberatel_nazov"))
+            g.edge(n, doc, _f(r["mnozstvo"]), "exact")
+            if ean and _f(r["mnozstvo"]) > 0:
+                prod_out[ean].append((at, n, _f(r["mnozstvo"])))
+
+    # 6) FIFO väzby
+    for key, demands in raw_out.items():
+        for src, dst, q in _fifo(raw_in.get(key, []), demands):
+            g.edge(src, dst, q, "fifo")
+    for ean, demands in prod_out.items():
+        for src, dst, q in _fifo(prod_in.get(ean, []), demands):
+            g.edge(src, dst, q, "fifo")
+
+    return {"raw_items": len(raw_out), "products": len(prod_out)}
+
+
+def rebuild(horizon_days: int = None) -> Dict[str, Any]:
+    """Prepočíta uzly a hrany za posledných horizon_days dní (jedna transakcia)."""
+    ensure_schema()
+    t0 = time.perf_counter()
+    since = datetime.now() - timedelta(days=int(horizon_days or HORIZON_DAYS))
+    g = _Graph()
+    stats = _collect(g, since)
+
+    def work(conn):
+        cur = conn.cursor()
+        cur.execute("DELETE FROM lot_edges")
+        cur.execute("DELETE FROM lot_nodes")
+        nodes = list(g.nodes.values())
+        for i in range(0, len(nodes), 1000):
+            cur.executemany("""
+                INSERT INTO lot_nodes (node_type, node_id, label, item, qty, unit, event_at, info)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, nodes[i:i + 1000])
+        edges = [(s[0], s[1], d[0], d[1], None if q is None else round(q, 3), basis)
+                 for (s, d), (q, basis) in g.edges.items()]
+        for i in range(0, len(edges), 1000):
+            cur.executemany("""
+                INSERT INTO lot_edges (src_type, src_id, dst_type, dst_id, qty, basis)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, edges[i:i + 1000])
+        cur.close()
+
+    db_connector.with_transaction(work)
+    stats.update({"nodes": len(g.nodes), "edges": len(g.edges),
+                  "ms": int((time.perf_counter() - t0) * 1000)})
+    return stats
+
+
+# --- DOTAZY -------------------------------------------------------------------
+def _node_rows(nodes: Iterable[Node]) -> Dict[Node, Dict[str, Any]]:
+    nodes = list(nodes)
+    out: Dict[Node, Dict[str, Any]] = {}
+    for i in range(0, len(nodes), 500):
+        chunk = nodes[i:i + 500]
+        rows = db_connector.execute_query(f"""
+            SELECT node_type, node_id, label, item, qty, unit, event_at, info
+              FROM lot_nodes
+             WHERE (node_type, node_id) IN ({','.join(['(%s,%s)'] * len(chunk))})
+        """, tuple(v for n in chunk for v in n)) or []
+        for r in rows:
+            out[(r["node_type"], r["node_id"])] = r
+    return out
+
+
+def trace(node_type: str, node_id, direction: str = "down", max_depth: int = MAX_DEPTH) -> Dict[str, Any]:
+    """
+    direction='down' – kam šiel uzol (surovina -> dávky -> dodacie listy),
+    direction='up'   – z čoho vznikol (dodací list -> dávky -> príjmy surovín).
+    """
+    ensure_schema()
+    node_type = (node_type or "").upper()
+    if node_type not in NODE_TYPES or node_id in (None, ""):
+        return {"error": "Neplatný uzol genealógie."}
+    down = direction != "up"
+    near, far = ("src", "dst") if down else ("dst", "src")
+    root: Node = (node_type, str(node_id))
+
+    depth_of = {root: 0}
+    edges: List[Dict[str, Any]] = []
+    frontier = [root]
+    truncated = False
+    for depth in range(1, max(1, min(int(max_depth), MAX_DEPTH)) + 1):
+        if not frontier:
+            break
+        rows = []
+        for i in range(0, len(frontier), 500):
+            chunk = frontier[i:i + 500]
+            rows += db_connector.execute_query(f"""
+                SELECT src_type, src_id, dst_type, dst_id, qty, basis
+                  FROM lot_edges
+                 WHERE ({near}_type, {near}_id) IN ({','.join(['(%s,%s)'] * len(chunk))})
+            """, tuple(v for n in chunk for v in n)) or []
+        nxt = []
+        for r in rows:
+            edges.append(r)
+            n = (r[f"{far}_type"], r[f"{far}_id"])
+            if n not in depth_of:
+                depth_of[n] = depth
+                nxt.append(n)
+        frontier = nxt
+        if len(depth_of) > MAX_NODES:
+            truncated = True
+            break
+
+    info = _node_rows(depth_of)
+    if root not in info:
+        return {"error": f"Uzol {node_type} {node_id} v genealógii neexistuje (prepočet beží každých 30 minút)."}
+    nodes = []
+    for n, d in sorted(depth_of.items(), key=lambda x: (x[1], x[0])):
+        row = dict(info.get(n) or {"node_type": n[0], "node_id": n[1]})
+        row["depth"] = d
+        nodes.append(row)
+    return {"root": info[root], "direction": "down" if down else "up",
+            "nodes": nodes, "edges": edges, "truncated": truncated}
+
+
+def recall_report(node_type: str, node_id) -> Dict[str, Any]:
+    """Stiahnutie z trhu: dodacie listy a odberatelia zasiahnutí daným uzlom (dopredný trace)."""
+    res = trace(node_type, node_id, "down")
+    if res.get("error"):
+        return res
+    docs = [n for n in res["nodes"] if n["node_type"] == DL]
+    lines = [n for n in res["nodes"] if n["node_type"] == DL_POLOZKA]
+    customers = sorted({(n.get("info") or "") for n in docs if n.get("info")})
+    return {
+        "root": res["root"],
+        "batches": [n for n in res["nodes"] if n["node_type"] == DAVKA],
+        "delivery_notes": docs,
+        "delivery_lines": lines,
+        "customers": customers,
+        "fifo_linked": any(e["basis"] == "fifo" for e in res["edges"]),
+        "truncated": res["truncated"],
+    }
+
+
+def summary(node_type: str, node_id) -> Dict[str, Any]:
+    """Krátky prehľad pre kartu šarže: priame vstupy a koneční odberatelia."""
+    up = trace(node_type, node_id, "up", max_depth=2)
+    if up.get("error"):
+        return {}
+    down = recall_report(node_type, node_id)
+    return {
+        "sources": [n for n in up["nodes"] if n["node_type"] in (PRIJEM, OBJ_PRIJEM, TOVAR_PRIJEM, EXP_PRIJEM, DAVKA)
+                    and n["depth"] > 0],
+        "delivery_notes": down.get("delivery_notes") or [],
+        "customers": down.get("customers") or [],
+    }
+
+
+def search(q: str, node_type: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Vyhľadanie uzlov (ID šarže, číslo DL, surovina / EAN) ako štart pre trace."""
+    ensure_schema()
+    q = (q or "").strip()
+    if not q:
+        return []
+    where, params = ["(node_id = %s OR item = %s OR label LIKE %s)"], [q, q, f"%{q}%"]
+    if node_type and node_type.upper() in NODE_TYPES:
+        where.append("node_type = %s")
+        params.append(node_type.upper())
+    params.append(max(1, min(int(limit or 50), 200)))
+    return db_connector.execute_query(f"""
+        SELECT node_type, node_id, label, item, qty, unit, event_at, info
+          FROM lot_nodes
+         WHERE {' AND '.join(where)}
+         ORDER BY event_at DESC
+         LIMIT %s
+    """, tuple(params)) or []
@@ -71,21 +71,6 @@ def _save_attachment_bytes(filename, content_type, data_bytes, message_id=None):
     )
     return att_id
 
-def _exists_by_external_uid(uid):
-    row = db_connector.execute_query(
-        "SELECT id FROM mail_messages WHERE external_uid = %s LIMIT 1",
-        (uid,), fetch='one'
-    )
-    return bool(row and row.get('id'))
-
-def _exists_by_message_id(mid):
-    if not mid: return False
-    row = db_connector.execute_query(
-        "SELECT id FROM mail_messages WHERE message_id_header = %s LIMIT 1",
-        (mid,), fetch='one'
-    )
-    return bool(row and row.get('id'))
-
 def _now():
     return datetime.utcnow()
 
@@ -165,7 +150,7 @@ def _insert_message(payload):
         date_header, received_at, sent_at, is_read, is_starred, is_spam,
         body_text, body_html, raw_headers, external_uid, has_attachments
     """
-    return db_connector.execute_query(
+    new_id = db_connector.execute_query(
         """
         INSERT INTO mail_messages
         (account_id, direction, folder, subject, from_name, from_email,
@@ -181,6 +166,8 @@ def _insert_message(payload):
         payload,
         fetch='lastrowid'
     )
+    _invalidate_counts()
+    return new_id
 def imap_test_connection():
     host = os.getenv('IMAP_HOST')
     port = int(os.getenv('IMAP_PORT', '993'))
@@ -201,158 +188,163 @@ def imap_test_connection():
         return {"error": f"IMAP zlyhal: {e}"}
 
 def fetch_imap(limit=50, folder=None):
-    host = os.getenv('IMAP_HOST')
-    port = int(os.getenv('IMAP_PORT', '993'))
-    ssl  = _get_env_bool('IMAP_SSL', True)
-    user = os.getenv('IMAP_USERNAME')
-    pw   = os.getenv('IMAP_PASSWORD')
-    mailbox = folder or os.getenv('IMAP_FOLDER', 'INBOX')
-    if not (host and user and pw):
-        return {"error":"Chýbajú IMAP premenné v .env (IMAP_HOST, IMAP_USERNAME, IMAP_PASSWORD)."}
-
-    fetched, skipped = 0, 0
-    try:
-        M = imaplib.IMAP4_SSL(host, port) if ssl else imaplib.IMAP4(host, port)
-        M.login(user, pw)
-        M.select(mailbox, readonly=False)
-
-        # Vezmeme posledných N podľa UID
-        typ, data = M.uid('search', None, 'ALL')
-        if typ != 'OK':
-            M.logout()
-            return {"error": "IMAP SEARCH zlyhal."}
-
-        uids = (data[0] or b'').split()
-        if not uids:
-            M.logout()
-            return {"message":"Žiadne správy.", "fetched":0, "skipped":0}
-
-        uids = uids[-int(limit):]
-
-        for uid in uids:
-            uid_str = uid.decode('utf-8', 'ignore')
-            ext_uid = f"imap:{uid_str}"
-            if _exists_by_external_uid(ext_uid):
-                skipped += 1
-                continue
-
-            typ, msgdata = M.uid('fetch', uid, '(RFC822)')
-            if typ != 'OK' or not msgdata or not msgdata[0]:
-                skipped += 1
-                continue
-
-            raw = msgdata[0][1]
-            msg = email.message_from_bytes(raw, policy=email_default_policy)
-
-            subj = _decode_mime(msg.get('Subject'))
-            from_field = msg.get('From', '')
-            to_field = msg.get('To', '')
-            cc_field = msg.get('Cc', '')
-            msg_id = msg.get('Message-Id') or msg.get('Message-ID')
-            in_reply_to = msg.get('In-Reply-To')
-            date_hdr = msg.get('Date')
+    """
+    Stiahne nové správy zo všetkých nakonfigurovaných IMAP účtov.
+    Inkrementálne podľa UIDVALIDITY + posledného UID (pozri mail_sync.py);
+    `limit` obmedzuje počet nových správ na priečinok za jedno volanie.
+    """
+    import mail_sync  # lazy – mail_sync importuje tento modul
+    return mail_sync.sync_all(limit=limit, folder=folder)
 
-            from_list = _parse_addresses(from_field)
-            from_name = from_list[0]['name'] if from_list else None
-            from_email = from_list[0]['email'] if from_list else None
-            to_list = _parse_addresses(to_field)
-            cc_list = _parse_addresses(cc_field)
+# =================================================================
+# === PUBLIC FUNKCIE PRE ROUTY (VOLÁ app.py) ======================
+# =================================================================
 
-            # dátum
-            try:
-                date_parsed = parsedate_to_datetime(date_hdr) if date_hdr else _now()
-            except Exception:
-                date_parsed = _now()
+# --- Vyhľadávanie / stránkovanie -------------------------------------------
+# FULLTEXT index nad (subject, from_email, body_text) udržiava MySQL sám pri
+# každom INSERTe (_insert_message). Zoznam sa stránkuje kurzorom (sort_ts, id)
+# namiesto OFFSET; celkové počty sa cachujú a pri hľadaní sa počítajú len
+# po strop MAIL_COUNT_CAP (potom je výsledok označený ako približný).
+#
+# ALTER / CREATE INDEX nad mail_messages nebeží v requeste: spúšťa ich
+# migrate_search_schema() – plánovač po štarte, alebo ručne
+# `python mail_handler.py --migrate`. Request len zistí, čo už existuje;
+# bez indexu sa hľadá pôvodným LIKE.
+MAIL_COUNT_CAP = int(os.getenv('MAIL_COUNT_CAP', '10000'))
+MAIL_COUNT_TTL = int(os.getenv('MAIL_COUNT_TTL', '60'))
+# innodb_ft_min_token_size (resp. ngram_token_size pri ngram parseri)
+_FT_MIN_TOKEN = int(os.getenv('MAIL_FT_MIN_TOKEN', '3'))
+_SCHEMA_RECHECK_S = 60
+
+_search_schema = {"ready": False, "checked_at": None,
+                  "sort": "COALESCE(sent_at, received_at, created_at)", "fulltext": False}
+_count_cache = {}
+_count_version = [0]
+
+
+def _index_exists(table, idx):
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s
+         LIMIT 1
+    """, (table, idx), fetch='one')
+    return bool(r)
+
+
+def _has_col(table, col):
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s
+         LIMIT 1
+    """, (table, col), fetch='one')
+    return bool(r)
+
+
+def migrate_search_schema():
+    """Stored stĺpec sort_ts + zoraďovací index + FULLTEXT index (migrácia, nie request)."""
+    if not _has_col("mail_messages", "sort_ts"):
+        db_connector.execute_query("""
+            ALTER TABLE mail_messages
+              ADD COLUMN sort_ts DATETIME
+              AS (COALESCE(sent_at, received_at, created_at)) STORED
+        """, fetch='none')
+    if _has_col("mail_messages", "sort_ts"):
+        if not _index_exists("mail_messages", "idx_mm_list"):
+            db_connector.execute_query(
+                "CREATE INDEX idx_mm_list ON mail_messages(is_deleted, folder, sort_ts, id)", fetch='none')
+    if not _index_exists("mail_messages", "ft_mm_search"):
+        db_connector.execute_query(
+            "CREATE FULLTEXT INDEX ft_mm_search ON mail_messages(subject, from_email, body_text)", fetch='none')
+    _search_schema.update(ready=False, checked_at=None)
+    return _search_state()
+
+
+def _search_state():
+    """Čo z migrácie už existuje (len INFORMATION_SCHEMA); kým nie je všetko, overí sa znova po chvíli."""
+    now = datetime.utcnow()
+    checked = _search_schema["checked_at"]
+    if _search_schema["ready"] or (checked and (now - checked).total_seconds() < _SCHEMA_RECHECK_S):
+        return _search_schema
+    has_sort = _has_col("mail_messages", "sort_ts")
+    _search_schema["sort"] = "sort_ts" if has_sort else "COALESCE(sent_at, received_at, created_at)"
+    _search_schema["fulltext"] = _index_exists("mail_messages", "ft_mm_search")
+    _search_schema["ready"] = (has_sort and _search_schema["fulltext"]
+                               and _index_exists("mail_messages", "idx_mm_list"))
+    _search_schema["checked_at"] = now
+    return _search_schema
+
+
+def _invalidate_counts():
+    _count_version[0] += 1
+    _count_cache.clear()
+
+
+def _fulltext_terms(query):
+    """'Objednávka Tesco' -> '+objednávka* +tesco*' (BOOLEAN MODE); krátke slová vynechá."""
+    words = re.findall(r"[\w]+", query or '', flags=re.UNICODE)
+    terms = [w for w in words if len(w) >= _FT_MIN_TOKEN]
+    return " ".join(f"+{w}*" for w in terms)
+
+
+def _search_clause(query, fulltext):
+    """
+    WHERE pre hľadaný výraz. Slová aspoň _FT_MIN_TOKEN znakov ide cez MATCH;
+    kratšie slová (FULLTEXT ich neindexuje) a hľadanie bez indexu ostávajú
+    na pôvodnom LIKE vrátane tela správy – po MATCH už len nad pár riadkami.
+    """
+    terms = _fulltext_terms(query) if fulltext else ""
+    if not terms:
+        q = f"%{query}%"
+        return "(subject LIKE %s OR from_email LIKE %s OR body_text LIKE %s)", [q, q, q]
+    parts = ["MATCH(subject, from_email, body_text) AGAINST (%s IN BOOLEAN MODE)"]
+    params = [terms]
+    for w in re.findall(r"[\w]+", query, flags=re.UNICODE):
+        if len(w) < _FT_MIN_TOKEN:
+            q = f"%{w}%"
+            parts.append("(subject LIKE %s OR from_email LIKE %s OR body_text LIKE %s)")
+            params.extend([q, q, q])
+    return " AND ".join(parts), params
+
+
+def _encode_cursor(ts, row_id):
+    if ts is None or row_id is None:
+        return None
+    if isinstance(ts, datetime):
+        ts = ts.strftime('%Y-%m-%d %H:%M:%S')
+    return f"{ts}|{int(row_id)}"
 
-            # body & attachments
-            body_text, body_html = "", None
-            has_attachments = False
-
-            if msg.is_multipart():
-                for part in msg.walk():
-                    cdisp = part.get_content_disposition()
-                    ctype = part.get_content_type()
-                    fname = part.get_filename()
-                    if cdisp == 'attachment' or fname:
-                        has_attachments = True
-                    if cdisp == 'attachment' or fname:
-                        fname_dec = _decode_mime(fname) if fname else None
-                        data = part.get_payload(decode=True) or b''
-                        if not fname_dec:
-                            ext = mimetypes.guess_extension(ctype or 'application/octet-stream') or '.bin'
-                            fname_dec = f'attachment-{uid_str}{ext}'
-                        # uložiť neskôr po inserte správy
-                        part._cached_attachment = (fname_dec, ctype, data)  # type: ignore
-                    elif ctype == 'text/plain' and not cdisp:
-                        body_text += (part.get_content() or "")
-                    elif ctype == 'text/html' and not cdisp:
-                        body_html = (part.get_content() or body_html)
-            else:
-                ctype = msg.get_content_type()
-                if ctype == 'text/html':
-                    body_html = msg.get_content()
-                else:
-                    body_text = msg.get_content()
-
-            # deduplikácia podľa Message-Id (ak chýba, berieme len podľa UID)
-            if msg_id and _exists_by_message_id(msg_id):
-                skipped += 1
-                continue
 
-            payload = {
-                "account_id": None,
-                "direction": "incoming",
-                "folder": "INBOX",
-                "subject": subj or '(bez predmetu)',
-                "from_name": from_name,
-                "from_email": from_email,
-                "to_json": json.dumps(to_list, ensure_ascii=False),
-                "cc_json": json.dumps(cc_list, ensure_ascii=False),
-                "bcc_json": json.dumps([], ensure_ascii=False),
-                "message_id_header": msg_id,
-                "in_reply_to": in_reply_to,
-                "thread_key": _thread_key(subj, from_email, to_list),
-                "date_header": date_parsed,
-                "received_at": _now(),
-                "sent_at": None,
-                "is_read": 0,
-                "is_starred": 0,
-                "is_spam": 0,
-                "body_text": body_text,
-                "body_html": body_html,
-                "raw_headers": None,
-                "external_uid": ext_uid,
-                "has_attachments": 1 if has_attachments else 0,
-                "created_at": _now(),
-                "updated_at": _now(),
-            }
-            message_row_id = _insert_message(payload)
-
-            # prílohy (ak sú)
-            if msg.is_multipart():
-                for part in msg.walk():
-                    tup = getattr(part, '_cached_attachment', None)
-                    if not tup: continue
-                    fname_dec, ctype, data = tup
-                    _save_attachment_bytes(fname_dec, ctype, data, message_id=message_row_id)
-
-            fetched += 1
-
-        M.close()
-        M.logout()
-        return {"message":"IMAP hotovo", "fetched": fetched, "skipped": skipped}
-    except Exception as e:
-        print("!!! CHYBA IMAP fetch:", traceback.format_exc())
-        return {"error": f"IMAP fetch zlyhal: {e}", "fetched": fetched, "skipped": skipped}
+def _decode_cursor(cursor):
+    try:
+        ts, row_id = str(cursor).rsplit('|', 1)
+        return datetime.strptime(ts, '%Y-%m-%d %H:%M:%S'), int(row_id)
+    except Exception:
+        return None
 
-# =================================================================
-# === PUBLIC FUNKCIE PRE ROUTY (VOLÁ app.py) ======================
-# =================================================================
 
-def list_messages(folder='INBOX', page=1, page_size=50, query=None, customer_id=None, unread=None, starred=None, has_attach=None):
+def _cached_count(where_sql, params, capped):
+    key = (where_sql, tuple(params), capped, _count_version[0])
+    hit = _count_cache.get(key)
+    now = datetime.utcnow()
+    if hit and (now - hit[1]).total_seconds() < MAIL_COUNT_TTL:
+        return hit[0]
+    if capped:
+        sql = f"SELECT COUNT(*) AS c FROM (SELECT 1 FROM mail_messages WHERE {where_sql} LIMIT {MAIL_COUNT_CAP + 1}) t"
+    else:
+        sql = f"SELECT COUNT(*) AS c FROM mail_messages WHERE {where_sql}"
+    row = db_connector.execute_query(sql, params, fetch='one') or {}
+    total = int(row.get('c') or 0)
+    if len(_count_cache) > 500:
+        _count_cache.clear()
+    _count_cache[key] = (total, now)
+    return total
+
+
+def list_messages(folder='INBOX', page=1, page_size=50, query=None, customer_id=None, unread=None, starred=None, has_attach=None, cursor=None):
+    schema = _search_state()
+    sort_expr = schema["sort"]
     page = max(1, int(page or 1))
     page_size = min(200, max(1, int(page_size or 50)))
-    offset = (page - 1) * page_size
 
     where = ["is_deleted = 0"]
     params = []
@@ -361,10 +353,12 @@ def list_messages(folder='INBOX', page=1, page_size=50, query=None, customer_id=
     if folder:
         where.append("folder = %s"); params.append(folder)
 
+    searching = False
     if query:
-        q = f"%{query}%"
-        where.append("(subject LIKE %s OR from_email LIKE %s OR body_text LIKE %s)")
-        params.extend([q, q, q])
+        clause, clause_params = _search_clause(query, schema["fulltext"])
+        where.append(clause)
+        params.extend(clause_params)
+        searching = True
 
     if customer_id:
         where.append("customer_id = %s"); params.append(int(customer_id))
@@ -378,23 +372,39 @@ def list_messages(folder='INBOX', page=1, page_size=50, query=None, customer_id=
     if has_attach is not None:
         where.append("has_attachments = %s"); params.append(1 if str(has_attach) in ('1','true','yes','y') else 0)
 
+    where_sql = " AND ".join(where)
+    page_where, page_params = list(where), list(params)
+    offset_sql = ""
+    after = _decode_cursor(cursor) if cursor else None
+    if after:
+        page_where.append(f"({sort_expr} < %s OR ({sort_expr} = %s AND id < %s))")
+        page_params.extend([after[0], after[0], after[1]])
+    elif page > 1:
+        # spätná kompatibilita – klient bez kurzora
+        offset_sql = f"OFFSET {int((page - 1) * page_size)}"
+
     rows_sql = f"""
         SELECT
           id, direction, folder, subject, from_name, from_email,
           JSON_EXTRACT(to_json, '$') AS to_json,
-          DATE_FORMAT(COALESCE(sent_at, received_at, created_at), '%Y-%m-%d %H:%i:%S') AS ts,
+          DATE_FORMAT({sort_expr}, '%Y-%m-%d %H:%i:%S') AS ts,
           is_read, is_starred, is_spam, has_attachments
         FROM mail_messages
-        WHERE {" AND ".join(where)}
-        ORDER BY COALESCE(sent_at, received_at, created_at) DESC
-        LIMIT {int(page_size)} OFFSET {int(offset)}
+        WHERE {" AND ".join(page_where)}
+        ORDER BY {sort_expr} DESC, id DESC
+        LIMIT {int(page_size) + 1} {offset_sql}
     """
-    rows = db_connector.execute_query(rows_sql, params, fetch='all')
+    rows = db_connector.execute_query(rows_sql, page_params, fetch='all') or []
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = _encode_cursor(rows[-1].get('ts'), rows[-1].get('id')) if (rows and has_more) else None
 
-    total_sql = f"SELECT COUNT(*) AS c FROM mail_messages WHERE {' AND '.join(where)}"
-    total_row = db_connector.execute_query(total_sql, params, fetch='one')
-    total = (total_row or {}).get('c', 0)
-    return {"items": rows or [], "page": page, "page_size": page_size, "total": total}
+    total = _cached_count(where_sql, params, capped=searching)
+    approximate = searching and total > MAIL_COUNT_CAP
+    if approximate:
+        total = MAIL_COUNT_CAP
+    return {"items": rows, "page": page, "page_size": page_size, "total": total,
+            "total_approximate": approximate, "has_more": has_more, "next_cursor": next_cursor}
 
 
 def get_message(message_id):
@@ -425,6 +435,7 @@ def mark_read(message_id, read=True):
         "UPDATE mail_messages SET is_read = %s, updated_at = %s WHERE id = %s",
         (1 if read else 0, _now(), message_id), fetch='none'
     )
+    _invalidate_counts()
     return {"message": "OK"}
 
 def move_to_folder(message_id, folder):
@@ -434,6 +445,7 @@ def move_to_folder(message_id, folder):
         "UPDATE mail_messages SET folder = %s, updated_at = %s WHERE id = %s",
         (folder, _now(), message_id), fetch='none'
     )
+    _invalidate_counts()
     return {"message": "OK"}
 
 def delete_message(message_id):
@@ -441,6 +453,7 @@ def delete_message(message_id):
         "UPDATE mail_messages SET is_deleted = 1, updated_at = %s WHERE id = %s",
         (_now(), message_id), fetch='none'
     )
+    _invalidate_counts()
     return {"message": "OK"}
 
 def send_email_from_form(flask_request):
@@ -637,6 +650,12 @@ def handle_inbound_webhook(flask_request, token):
                 continue
             _save_attachment(fs, message_id=message_row_id)
 
+        # 6) Auto-klasifikácia
+        try:
+            classify_messages([{"id": message_row_id, "from_email": from_email, "subject": subj}])
+        except Exception:
+            print("!!! Auto-klasifikácia (webhook) zlyhala:", traceback.format_exc())
+
         return {"message": "OK", "id": message_row_id}
     except Exception:
         print("!!! CHYBA pri prijme e-mailu (webhook):", traceback.format_exc())
@@ -674,7 +693,12 @@ def signatures_delete(sig_id):
 def signatures_get_default():
     row = db_connector.execute_query("SELECT id, name, html FROM mail_signatures WHERE is_default=1 LIMIT 1", fetch='one')
     return {"item": row} if row else {"item": None}
-def customers_list():
+def customers_list(q=None, limit=20):
+    if q and q.strip():
+        # typeahead nad registrovanými B2B zákazníkmi (pamäťový index)
+        import search_index
+        hits = search_index.search(q, ("b2b",), limit=limit)
+        return {"items": [{"customer_id": h["db_id"], "customer_name": h["nazov_firmy"]} for h in hits]}
     rows = db_connector.execute_query("""
         SELECT customer_id, MAX(customer_name) AS customer_name
         FROM mail_contact_links
@@ -690,6 +714,8 @@ def contact_links_create(email, customer_id, customer_name=None, domain=None):
         INSERT INTO mail_contact_links (email, domain, customer_id, customer_name, created_at)
         VALUES (%s,%s,%s,%s,%s)
     """, (email, domain, int(customer_id), customer_name, _now()), fetch='lastrowid')
+    import mail_rules
+    mail_rules.invalidate()
     return {"id": new_id}
 
 def message_assign_customer(message_id, customer_id):
@@ -697,59 +723,66 @@ def message_assign_customer(message_id, customer_id):
                                (int(customer_id), _now(), int(message_id)), fetch='none')
     return {"message": "OK"}
 def _auto_classify_message(message_row_id, from_email, to_list, subject):
-    cid = None
-    # 1) email exact
-    if from_email:
-        row = db_connector.execute_query(
-            "SELECT customer_id FROM mail_contact_links WHERE email=%s LIMIT 1",
-            (from_email.strip().lower(),), fetch='one'
-        )
-        if row: cid = row['customer_id']
-        else:
-            # 2) domain
-            dom = from_email.split('@')[-1].lower()
-            row = db_connector.execute_query(
-                "SELECT customer_id FROM mail_contact_links WHERE domain=%s LIMIT 1",
-                (dom,), fetch='one'
-            )
-            if row: cid = row['customer_id']
-
-    if cid:
-        db_connector.execute_query("UPDATE mail_messages SET customer_id=%s WHERE id=%s",
-                                   (cid, message_row_id), fetch='none')
-
-    # 3) pravidlá
-    rules = db_connector.execute_query(
-        "SELECT * FROM mail_rules WHERE active=1 ORDER BY priority ASC", fetch='all'
-    )
-    subj = (subject or '').lower()
-    sndr = (from_email or '').lower()
-    dom  = sndr.split('@')[-1] if '@' in sndr else sndr
-
-    for r in rules or []:
-        if r.get('match_sender') and r['match_sender'].lower() not in sndr:
-            continue
-        if r.get('match_domain') and r['match_domain'].lower() != dom:
-            continue
-        if r.get('match_subject') and r['match_subject'].lower() not in subj:
-            continue
-
-        updates = []
-        params  = []
-        if r.get('customer_id'):
-            updates.append("customer_id=%s"); params.append(r['customer_id'])
-        if r.get('target_folder'):
-            updates.append("folder=%s"); params.append(r['target_folder'])
-        if r.get('set_starred') is not None:
-            updates.append("is_starred=%s"); params.append(1 if r['set_starred'] else 0)
-        if r.get('set_read') is not None:
-            updates.append("is_read=%s"); params.append(1 if r['set_read'] else 0)
-        if updates:
-            updates.append("updated_at=%s"); params.append(_now())
-            params.append(message_row_id)
-            db_connector.execute_query(f"UPDATE mail_messages SET {', '.join(updates)} WHERE id=%s",
-                                       tuple(params), fetch='none')
-        break  # prvé match stačí
+    """Jedna správa – deleguje na skompilovaný engine (mail_rules.classify_batch)."""
+    import mail_rules
+    mail_rules.classify_batch(
+        [{"id": message_row_id, "from_email": from_email, "subject": subject}], now=_now())
+
+def classify_messages(messages):
+    """Dávková klasifikácia: [{id, from_email, subject}] -> jeden UPDATE."""
+    import mail_rules
+    n = mail_rules.classify_batch(messages, now=_now())
+    if n:
+        _invalidate_counts()
+    return n
+
+# --- Pravidlá (mail_rules) ----------------------------------------
+_RULE_FIELDS = ('match_sender', 'match_domain', 'match_subject', 'customer_id',
+                'target_folder', 'set_starred', 'set_read', 'priority', 'active')
+
+def rules_list():
+    rows = db_connector.execute_query(
+        "SELECT * FROM mail_rules ORDER BY priority ASC, id ASC", fetch='all')
+    return {"items": rows or []}
+
+def rules_save(data):
+    import mail_rules
+    data = data or {}
+    if not any((data.get(k) or '').strip() for k in ('match_sender', 'match_domain', 'match_subject')) \
+            and not data.get('allow_unconditional'):
+        return {"error": "Pravidlo musí mať aspoň jednu podmienku (odosielateľ, doména alebo predmet)."}
+    vals = {}
+    for k in _RULE_FIELDS:
+        v = data.get(k)
+        if isinstance(v, str):
+            v = v.strip() or None
+        vals[k] = v
+    if vals['target_folder'] and vals['target_folder'] not in ('INBOX', 'SENT', 'DRAFTS', 'SPAM', 'TRASH', 'ARCHIVE'):
+        return {"error": "Neznáma zložka."}
+    vals['priority'] = int(vals['priority'] or 100)
+    vals['active'] = 0 if str(vals['active']) in ('0', 'false', 'False') else 1
+    for k in ('set_starred', 'set_read'):
+        if vals[k] is not None:
+            vals[k] = 1 if str(vals[k]) in ('1', 'true', 'True', 'on') else 0
+    cols = list(_RULE_FIELDS)
+    if data.get('id'):
+        db_connector.execute_query(
+            f"UPDATE mail_rules SET {', '.join(f'{c}=%s' for c in cols)} WHERE id=%s",
+            tuple(vals[c] for c in cols) + (int(data['id']),), fetch='none')
+        rid = int(data['id'])
+    else:
+        rid = db_connector.execute_query(
+            f"INSERT INTO mail_rules ({', '.join(cols)}) VALUES ({', '.join(['%s'] * len(cols))})",
+            tuple(vals[c] for c in cols), fetch='lastrowid')
+    mail_rules.invalidate()
+    return {"id": rid}
+
+def rules_delete(rule_id):
+    import mail_rules
+    db_connector.execute_query("DELETE FROM mail_rules WHERE id=%s", (int(rule_id),), fetch='none')
+    mail_rules.invalidate()
+    return {"message": "OK"}
+
 def folder_summary():
     """
     Súhrny pre priečinky + TOP zákazníci na paneli vľavo.
@@ -847,3 +880,14 @@ def posli_email(to_addr: str, subject: str, text: str) -> None:
     except Exception as e:
         # nechceme padnúť, len zalogujeme
         print(f"[tasks] posli_email: fallback SMTP zlyhal: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Údržba pošty (mail_messages)")
+    ap.add_argument("--migrate", action="store_true", help="stĺpec sort_ts + indexy pre zoznam a FULLTEXT hľadanie")
+    args = ap.parse_args()
+    if args.migrate:
+        print(json.dumps(migrate_search_schema(), ensure_ascii=False, default=str))
+    else:
+        ap.print_help()
@@ -0,0 +1,235 @@
+# =================================================================
+# === MAIL: SKOMPILOVANÝ ENGINE PRE AUTO-KLASIFIKÁCIU =============
+# =================================================================
+#
+# Pôvodne každá správa = až 3 dotazy (email, doména, SELECT * FROM mail_rules)
+# a pravidlá sa skúšali jedno po druhom. Tu sa mail_contact_links aj
+# mail_rules načítajú raz do pamäte:
+#   - kontakty:  dict email -> customer_id, dict doména -> customer_id
+#   - pravidlá:  Aho-Corasick automat nad všetkými podreťazcami
+#                (match_sender, match_subject) + dict pre match_domain
+# Jeden prechod predmetom a odosielateľom vráti len pravidlá, ktorých
+# podmienky mohli sadnúť – cena nerastie s počtom pravidiel.
+#
+# Cache sa zahodí pri contact_links_create / úprave pravidiel
+# (invalidate()) a pre istotu aj po RULES_TTL sekundách (iné workery).
+# =================================================================
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import db_connector
+
+RULES_TTL = int(os.getenv("MAIL_RULES_TTL", "120"))
+
+
+class _AhoCorasick:
+    """Klasický Aho-Corasick automat nad malými písmenami."""
+
+    def __init__(self, needles: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Set[str]] = [set()]
+        for n in set(needles):
+            if n:
+                self._add(n)
+        self._build()
+
+    def _add(self, word: str) -> None:
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            state = nxt
+        self._out[state].add(word)
+
+    def _build(self) -> None:
+        queue = deque()
+        for nxt in self._goto[0].values():
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[str]:
+        found: Set[str] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            if self._out[state]:
+                found |= self._out[state]
+        return found
+
+
+class _CompiledRules:
+    def __init__(self, links: List[Dict[str, Any]], rules: List[Dict[str, Any]]):
+        self.by_email: Dict[str, int] = {}
+        self.by_domain: Dict[str, int] = {}
+        for r in links:
+            cid = r.get("customer_id")
+            if not cid:
+                continue
+            em = (r.get("email") or "").strip().lower()
+            dom = (r.get("domain") or "").strip().lower()
+            if em and em not in self.by_email:
+                self.by_email[em] = cid
+            if dom and dom not in self.by_domain:
+                self.by_domain[dom] = cid
+
+        # poradie = priorita (ORDER BY priority, id) -> index v self.rules
+        self.rules = rules
+        self._by_sender: Dict[str, List[int]] = {}
+        self._by_subject: Dict[str, List[int]] = {}
+        self._by_domain: Dict[str, List[int]] = {}
+        self._unconditional: List[int] = []
+        for idx, r in enumerate(rules):
+            snd = (r.get("match_sender") or "").lower()
+            dom = (r.get("match_domain") or "").lower()
+            subj = (r.get("match_subject") or "").lower()
+            r["_snd"], r["_dom"], r["_subj"] = snd, dom, subj
+            # pravidlo indexujeme podľa jednej (najselektívnejšej) podmienky
+            if dom:
+                self._by_domain.setdefault(dom, []).append(idx)
+            elif snd:
+                self._by_sender.setdefault(snd, []).append(idx)
+            elif subj:
+                self._by_subject.setdefault(subj, []).append(idx)
+            else:
+                self._unconditional.append(idx)
+        self._ac_sender = _AhoCorasick(r["_snd"] for r in rules if r["_snd"])
+        self._ac_subject = _AhoCorasick(r["_subj"] for r in rules if r["_subj"])
+
+    def customer_for(self, from_email: Optional[str]) -> Optional[int]:
+        if not from_email:
+            return None
+        em = from_email.strip().lower()
+        cid = self.by_email.get(em)
+        if cid is None:
+            cid = self.by_domain.get(em.split('@')[-1])
+        return cid
+
+    def first_rule(self, from_email: Optional[str], subject: Optional[str]) -> Optional[Dict[str, Any]]:
+        sndr = (from_email or "").lower()
+        subj = (subject or "").lower()
+        dom = sndr.split('@')[-1] if '@' in sndr else sndr
+        snd_hits = self._ac_sender.find(sndr) if sndr else set()
+        subj_hits = self._ac_subject.find(subj) if subj else set()
+
+        cand: Set[int] = set(self._unconditional)
+        cand.update(self._by_domain.get(dom, ()))
+        for n in snd_hits:
+            cand.update(self._by_sender.get(n, ()))
+        for n in subj_hits:
+            cand.update(self._by_subject.get(n, ()))
+
+        for idx in sorted(cand):
+            r = self.rules[idx]
+            if r["_snd"] and r["_snd"] not in snd_hits:
+                continue
+            if r["_dom"] and r["_dom"] != dom:
+                continue
+            if r["_subj"] and r["_subj"] not in subj_hits:
+                continue
+            return r
+        return None
+
+
+_lock = threading.Lock()
+_cache: Dict[str, Any] = {"compiled": None, "loaded_at": 0.0}
+
+
+def invalidate() -> None:
+    with _lock:
+        _cache["compiled"] = None
+
+
+def _compiled() -> _CompiledRules:
+    with _lock:
+        c = _cache["compiled"]
+        if c is not None and time.time() - _cache["loaded_at"] < RULES_TTL:
+            return c
+    links = db_connector.execute_query(
+        "SELECT email, domain, customer_id FROM mail_contact_links ORDER BY id ASC", fetch='all'
+    ) or []
+    rules = db_connector.execute_query(
+        "SELECT * FROM mail_rules WHERE active=1 ORDER BY priority ASC, id ASC", fetch='all'
+    ) or []
+    c = _CompiledRules(links, rules)
+    with _lock:
+        _cache["compiled"] = c
+        _cache["loaded_at"] = time.time()
+    return c
+
+
+def _updates_for(c: _CompiledRules, msg: Dict[str, Any]) -> Dict[str, Any]:
+    upd: Dict[str, Any] = {}
+    cid = c.customer_for(msg.get("from_email"))
+    if cid:
+        upd["customer_id"] = cid
+    r = c.first_rule(msg.get("from_email"), msg.get("subject"))
+    if r:
+        if r.get("customer_id"):
+            upd["customer_id"] = r["customer_id"]
+        if r.get("target_folder"):
+            upd["folder"] = r["target_folder"]
+        if r.get("set_starred") is not None:
+            upd["is_starred"] = 1 if r["set_starred"] else 0
+        if r.get("set_read") is not None:
+            upd["is_read"] = 1 if r["set_read"] else 0
+    return upd
+
+
+def classify_batch(messages: List[Dict[str, Any]], now=None) -> int:
+    """
+    messages: [{id, from_email, subject}, ...]
+    Vyhodnotí všetky v pamäti a zapíše výsledok jedným UPDATE ... CASE.
+    Vráti počet správ, ktorým sa niečo nastavilo.
+    """
+    if not messages:
+        return 0
+    c = _compiled()
+    per_msg: List[Tuple[int, Dict[str, Any]]] = []
+    for m in messages:
+        if m.get("id") is None:
+            continue
+        upd = _updates_for(c, m)
+        if upd:
+            per_msg.append((int(m["id"]), upd))
+    if not per_msg:
+        return 0
+
+    cols = sorted({k for _, u in per_msg for k in u})
+    set_parts, params = [], []
+    for col in cols:
+        whens = []
+        for mid, u in per_msg:
+            if col in u:
+                whens.append("WHEN %s THEN %s")
+                params.extend([mid, u[col]])
+        set_parts.append(f"{col} = CASE id {' '.join(whens)} ELSE {col} END")
+    if now is not None:
+        set_parts.append("updated_at = %s")
+        params.append(now)
+    ids = [mid for mid, _ in per_msg]
+    params.extend(ids)
+    db_connector.execute_query(
+        f"UPDATE mail_messages SET {', '.join(set_parts)} WHERE id IN ({','.join(['%s'] * len(ids))})",
+        tuple(params), fetch='none'
+    )
+    return len(per_msg)
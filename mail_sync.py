@@ -0,0 +1,694 @@
+# =================================================================
+# === MAIL: INKREMENTÁLNA IMAP SYNCHRONIZÁCIA =====================
+# =================================================================
+#
+# Namiesto "UID SEARCH ALL + posledných N" si pamätáme pre každý účet
+# a priečinok UIDVALIDITY a najvyššie videné UID (mail_sync_state):
+#   - sťahujeme len "UID n+1:*",
+#   - hlavičky (Message-ID, veľkosť) aj telá ťaháme dávkovo cez UID FETCH,
+#   - deduplikácia je jeden SQL dotaz na dávku,
+#   - veľké správy (> IMAP_STREAM_THRESHOLD) sa neťahajú celé – podľa
+#     BODYSTRUCTURE sa stiahnu textové časti a prílohy sa po kúskoch
+#     (BODY.PEEK[sekcia]<offset.dĺžka>) dekódujú rovno do súboru.
+#
+# Účty: predvolený účet z IMAP_* premenných (+ IMAP_FOLDERS="INBOX,Objednavky")
+# a voliteľne IMAP_ACCOUNTS = JSON zoznam
+#   [{"key":"objednavky","host":"...","port":993,"ssl":true,
+#     "username":"...","password":"...","folders":["INBOX"]}]
+#
+# Pre testy sa dá podsunúť vlastný IMAP klient cez parameter `connect`
+# (funkcia account -> objekt s API ako imaplib.IMAP4).
+# =================================================================
+import binascii
+import email
+import hashlib
+import imaplib
+import json
+import mimetypes
+import os
+import re
+import traceback
+from datetime import datetime
+from email.policy import default as email_default_policy
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import db_connector
+import mail_handler
+
+BATCH_SIZE = int(os.getenv("IMAP_BATCH_SIZE", "25"))
+STREAM_THRESHOLD = int(os.getenv("IMAP_STREAM_THRESHOLD", str(5 * 1024 * 1024)))
+STREAM_CHUNK = int(os.getenv("IMAP_STREAM_CHUNK", str(512 * 1024)))
+
+DEFAULT_ACCOUNT_KEY = "default"
+UI_FOLDERS = ('INBOX', 'SENT', 'DRAFTS', 'SPAM', 'TRASH', 'ARCHIVE')
+
+_schema_ready = False
+
+
+# --- SCHÉMA -------------------------------------------------------------------
+def _index_exists(table: str, idx: str) -> bool:
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s
+         LIMIT 1
+    """, (table, idx), fetch='one')
+    return bool(r)
+
+
+def _ensure_sync_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS mail_sync_state (
+            account_key  VARCHAR(64)  NOT NULL,
+            folder       VARCHAR(190) NOT NULL,
+            uidvalidity  BIGINT       NULL,
+            last_uid     BIGINT       NOT NULL DEFAULT 0,
+            last_sync_at DATETIME     NULL,
+            PRIMARY KEY (account_key, folder)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    if not _index_exists("mail_messages", "idx_mm_external_uid"):
+        db_connector.execute_query(
+            "CREATE INDEX idx_mm_external_uid ON mail_messages(external_uid)", fetch='none')
+    if not _index_exists("mail_messages", "idx_mm_message_id_header"):
+        db_connector.execute_query(
+            "CREATE INDEX idx_mm_message_id_header ON mail_messages(message_id_header)", fetch='none')
+    _schema_ready = True
+
+
+def _load_state(account_key: str, folder: str) -> Dict[str, Any]:
+    row = db_connector.execute_query(
+        "SELECT uidvalidity, last_uid FROM mail_sync_state WHERE account_key=%s AND folder=%s",
+        (account_key, folder), fetch='one'
+    )
+    return row or {"uidvalidity": None, "last_uid": 0}
+
+
+def _save_state(account_key: str, folder: str, uidvalidity: Optional[int], last_uid: int) -> None:
+    db_connector.execute_query("""
+        INSERT INTO mail_sync_state (account_key, folder, uidvalidity, last_uid, last_sync_at)
+        VALUES (%s,%s,%s,%s,%s)
+        ON DUPLICATE KEY UPDATE uidvalidity=VALUES(uidvalidity), last_uid=VALUES(last_uid),
+                                last_sync_at=VALUES(last_sync_at)
+    """, (account_key, folder, uidvalidity, int(last_uid), mail_handler._now()), fetch='none')
+
+
+# --- ÚČTY ---------------------------------------------------------------------
+def get_accounts() -> List[Dict[str, Any]]:
+    accounts: List[Dict[str, Any]] = []
+    host = os.getenv('IMAP_HOST')
+    user = os.getenv('IMAP_USERNAME')
+    pw = os.getenv('IMAP_PASSWORD')
+    if host and user and pw:
+        folders = os.getenv('IMAP_FOLDERS') or os.getenv('IMAP_FOLDER', 'INBOX')
+        accounts.append({
+            "key": DEFAULT_ACCOUNT_KEY,
+            "host": host,
+            "port": int(os.getenv('IMAP_PORT', '993')),
+            "ssl": mail_handler._get_env_bool('IMAP_SSL', True),
+            "username": user,
+            "password": pw,
+            "folders": [f.strip() for f in folders.split(',') if f.strip()],
+        })
+    extra = os.getenv('IMAP_ACCOUNTS')
+    if extra:
+        try:
+            for a in json.loads(extra):
+                if not (a.get("key") and a.get("host") and a.get("username")):
+                    continue
+                a.setdefault("port", 993)
+                a.setdefault("ssl", True)
+                a.setdefault("folders", ["INBOX"])
+                accounts.append(a)
+        except Exception:
+            print("!!! IMAP_ACCOUNTS nie je platný JSON:", traceback.format_exc())
+    return accounts
+
+
+def _connect(account: Dict[str, Any]):
+    port = int(account.get("port") or 993)
+    M = imaplib.IMAP4_SSL(account["host"], port) if account.get("ssl", True) \
+        else imaplib.IMAP4(account["host"], port)
+    M.login(account["username"], account.get("password") or "")
+    return M
+
+
+# --- PARSOVANIE IMAP ODPOVEDÍ ------------------------------------------------
+_RE_UID = re.compile(rb'UID (\d+)')
+_RE_SIZE = re.compile(rb'RFC822\.SIZE (\d+)')
+
+
+def _iter_fetch_items(data: Iterable[Any]) -> Iterable[Tuple[bytes, Optional[bytes]]]:
+    """
+    imaplib vracia FETCH ako zmes tuple(meta, literal) a bytes (zvyšok riadku).
+    Vráti dvojice (celé meta, literal) – meta obsahuje aj text za literálom,
+    lebo niektoré servery posielajú UID až za ním.
+    """
+    pending: Optional[List[Any]] = None
+    for item in data or []:
+        if isinstance(item, tuple):
+            if pending is not None:
+                yield pending[0], pending[1]
+            pending = [item[0] or b'', item[1]]
+        elif isinstance(item, bytes):
+            if pending is not None:
+                pending[0] += b' ' + item
+                yield pending[0], pending[1]
+                pending = None
+            elif item.strip() not in (b'', b')'):
+                yield item, None
+    if pending is not None:
+        yield pending[0], pending[1]
+
+
+def _uid_of(meta: bytes) -> Optional[int]:
+    m = _RE_UID.search(meta or b'')
+    return int(m.group(1)) if m else None
+
+
+def _parse_sexp(buf: bytes, pos: int = 0) -> Tuple[Any, int]:
+    """Minimalistický parser IMAP zátvorkových výrazov (pre BODYSTRUCTURE)."""
+    n = len(buf)
+    while pos < n and buf[pos:pos + 1] in (b' ', b'\r', b'\n'):
+        pos += 1
+    c = buf[pos:pos + 1]
+    if c == b'(':
+        out = []
+        pos += 1
+        while True:
+            while pos < n and buf[pos:pos + 1] in (b' ', b'\r', b'\n'):
+                pos += 1
+            if pos >= n or buf[pos:pos + 1] == b')':
+                return out, pos + 1
+            val, pos = _parse_sexp(buf, pos)
+            out.append(val)
+    if c == b'"':
+        pos += 1
+        chunks = bytearray()
+        while pos < n and buf[pos:pos + 1] != b'"':
+            if buf[pos:pos + 1] == b'\\':
+                pos += 1
+            chunks += buf[pos:pos + 1]
+            pos += 1
+        return bytes(chunks).decode('utf-8', 'replace'), pos + 1
+    if c == b'{':
+        end = buf.index(b'}', pos)
+        size = int(buf[pos + 1:end])
+        start = end + 1
+        while buf[start:start + 1] in (b'\r', b'\n'):
+            start += 1
+        return buf[start:start + size].decode('utf-8', 'replace'), start + size
+    start = pos
+    while pos < n and buf[pos:pos + 1] not in (b' ', b'(', b')', b'\r', b'\n'):
+        pos += 1
+    atom = buf[start:pos].decode('ascii', 'replace')
+    return (None if atom.upper() == 'NIL' else atom), pos
+
+
+def _pairs(lst: Any) -> Dict[str, str]:
+    if not isinstance(lst, list):
+        return {}
+    return {str(lst[i]).lower(): lst[i + 1] for i in range(0, len(lst) - 1, 2) if lst[i]}
+
+
+def _walk_bodystructure(node: List[Any], prefix: str = "") -> List[Dict[str, Any]]:
+    """BODYSTRUCTURE -> plochý zoznam listových častí so sekciou pre BODY[...]."""
+    if node and isinstance(node[0], list):
+        parts: List[Dict[str, Any]] = []
+        i = 0
+        while i < len(node) and isinstance(node[i], list):
+            sec = f"{prefix}.{i + 1}" if prefix else str(i + 1)
+            parts.extend(_walk_bodystructure(node[i], sec))
+            i += 1
+        return parts
+
+    mtype = (node[0] or 'application').lower()
+    subtype = (node[1] or 'octet-stream').lower()
+    params = _pairs(node[2] if len(node) > 2 else None)
+    encoding = ((node[5] if len(node) > 5 else None) or '7bit').lower()
+    try:
+        size = int(node[6]) if len(node) > 6 and node[6] else 0
+    except Exception:
+        size = 0
+    ext = 8 if mtype == 'text' else (10 if (mtype, subtype) == ('message', 'rfc822') else 7)
+    disposition, dparams = None, {}
+    if len(node) > ext + 1 and isinstance(node[ext + 1], list) and node[ext + 1]:
+        disposition = (node[ext + 1][0] or '').lower() or None
+        dparams = _pairs(node[ext + 1][1] if len(node[ext + 1]) > 1 else None)
+    filename = dparams.get('filename') or params.get('name')
+    return [{
+        "section": prefix or "1",
+        "ctype": f"{mtype}/{subtype}",
+        "charset": params.get('charset') or 'utf-8',
+        "encoding": encoding,
+        "size": size,
+        "disposition": disposition,
+        "filename": mail_handler._decode_mime(filename) if filename else None,
+    }]
+
+
+# --- INKREMENTÁLNE DEKÓDERY (stream príloh) ----------------------------------
+class _B64Stream:
+    def __init__(self):
+        self._rest = b''
+
+    def feed(self, chunk: bytes) -> bytes:
+        data = self._rest + re.sub(rb'\s+', b'', chunk)
+        cut = len(data) - (len(data) % 4)
+        self._rest = data[cut:]
+        return binascii.a2b_base64(data[:cut]) if cut else b''
+
+    def flush(self) -> bytes:
+        if not self._rest:
+            return b''
+        data = self._rest + b'=' * (-len(self._rest) % 4)
+        self._rest = b''
+        try:
+            return binascii.a2b_base64(data)
+        except binascii.Error:
+            return b''
+
+
+class _QPStream:
+    def __init__(self):
+        self._rest = b''
+
+    def feed(self, chunk: bytes) -> bytes:
+        data = self._rest + chunk
+        cut = data.rfind(b'\n') + 1
+        self._rest = data[cut:]
+        return binascii.a2b_qp(data[:cut]) if cut else b''
+
+    def flush(self) -> bytes:
+        data, self._rest = self._rest, b''
+        return binascii.a2b_qp(data) if data else b''
+
+
+class _RawStream:
+    def feed(self, chunk: bytes) -> bytes:
+        return chunk
+
+    def flush(self) -> bytes:
+        return b''
+
+
+def _decoder_for(encoding: str):
+    if encoding == 'base64':
+        return _B64Stream()
+    if encoding == 'quoted-printable':
+        return _QPStream()
+    return _RawStream()
+
+
+def _attachment_target(filename: str) -> str:
+    storage_root = mail_handler._ensure_storage_dir()
+    now = datetime.utcnow()
+    target_dir = os.path.join(storage_root, now.strftime('%Y'), now.strftime('%m'))
+    os.makedirs(target_dir, exist_ok=True)
+    safe = re.sub(r'[^a-zA-Z0-9._-]+', '_', filename or 'attachment')
+    return os.path.join(target_dir, safe)
+
+
+def _register_attachment(full_path: str, filename: str, content_type: str,
+                         size_bytes: int, sha_hex: str, message_id: int):
+    return db_connector.execute_query(
+        """
+        INSERT INTO mail_attachments
+        (message_id, filename, content_type, size_bytes, storage_path, checksum_sha256, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """,
+        (message_id, os.path.basename(full_path), content_type or 'application/octet-stream',
+         size_bytes, full_path, sha_hex, mail_handler._now()),
+        fetch='lastrowid'
+    )
+
+
+def _fetch_section_chunks(M, uid: int, section: str) -> Iterable[bytes]:
+    """Po kúskoch stiahne BODY[section] (partial fetch), nič nedrží celé v pamäti."""
+    offset = 0
+    while True:
+        typ, data = M.uid('FETCH', str(uid), f'(BODY.PEEK[{section}]<{offset}.{STREAM_CHUNK}>)')
+        if typ != 'OK':
+            return
+        chunk = b''
+        for _meta, lit in _iter_fetch_items(data):
+            if lit:
+                chunk = lit
+                break
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < STREAM_CHUNK:
+            return
+        offset += len(chunk)
+
+
+def _stream_attachment(M, uid: int, part: Dict[str, Any], message_id: int) -> None:
+    fname = part.get("filename")
+    if not fname:
+        ext = mimetypes.guess_extension(part["ctype"]) or '.bin'
+        fname = f'attachment-{uid}-{part["section"]}{ext}'
+    full_path = _attachment_target(fname)
+    dec = _decoder_for(part["encoding"])
+    h = hashlib.sha256()
+    size = 0
+    with open(full_path, 'wb') as fh:
+        for chunk in _fetch_section_chunks(M, uid, part["section"]):
+            out = dec.feed(chunk)
+            if out:
+                fh.write(out)
+                h.update(out)
+                size += len(out)
+        out = dec.flush()
+        if out:
+            fh.write(out)
+            h.update(out)
+            size += len(out)
+    _register_attachment(full_path, fname, part["ctype"], size, h.hexdigest(), message_id)
+
+
+def _decode_text_part(raw: bytes, part: Dict[str, Any]) -> str:
+    dec = _decoder_for(part["encoding"])
+    data = dec.feed(raw) + dec.flush()
+    try:
+        return data.decode(part.get("charset") or 'utf-8', 'replace')
+    except LookupError:
+        return data.decode('utf-8', 'replace')
+
+
+# --- SPRÁVA -> PAYLOAD --------------------------------------------------------
+def _payload_from_headers(msg, ext_uid: str, ui_folder: str, body_text: str,
+                          body_html: Optional[str], has_attachments: bool) -> Dict[str, Any]:
+    subj = mail_handler._decode_mime(msg.get('Subject'))
+    from_list = mail_handler._parse_addresses(msg.get('From', ''))
+    to_list = mail_handler._parse_addresses(msg.get('To', ''))
+    cc_list = mail_handler._parse_addresses(msg.get('Cc', ''))
+    from_name = from_list[0]['name'] if from_list else None
+    from_email = from_list[0]['email'] if from_list else None
+    date_hdr = msg.get('Date')
+    try:
+        date_parsed = parsedate_to_datetime(date_hdr) if date_hdr else mail_handler._now()
+    except Exception:
+        date_parsed = mail_handler._now()
+    now = mail_handler._now()
+    return {
+        "account_id": None,
+        "direction": "incoming",
+        "folder": ui_folder,
+        "subject": subj or '(bez predmetu)',
+        "from_name": from_name,
+        "from_email": from_email,
+        "to_json": json.dumps(to_list, ensure_ascii=False),
+        "cc_json": json.dumps(cc_list, ensure_ascii=False),
+        "bcc_json": json.dumps([], ensure_ascii=False),
+        "message_id_header": msg.get('Message-Id') or msg.get('Message-ID'),
+        "in_reply_to": msg.get('In-Reply-To'),
+        "thread_key": mail_handler._thread_key(subj, from_email, to_list),
+        "date_header": date_parsed,
+        "received_at": now,
+        "sent_at": None,
+        "is_read": 0,
+        "is_starred": 0,
+        "is_spam": 0,
+        "body_text": body_text,
+        "body_html": body_html,
+        "raw_headers": None,
+        "external_uid": ext_uid,
+        "has_attachments": 1 if has_attachments else 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _import_small(raw: bytes, uid: int, ext_uid: str, ui_folder: str) -> Optional[Dict[str, Any]]:
+    """Správa pod prahom – celé telo prišlo v dávke, parsujeme v pamäti."""
+    msg = email.message_from_bytes(raw, policy=email_default_policy)
+    body_text, body_html = "", None
+    attachments: List[Tuple[str, str, bytes]] = []
+    if msg.is_multipart():
+        for part in msg.walk():
+            cdisp = part.get_content_disposition()
+            ctype = part.get_content_type()
+            fname = part.get_filename()
+            if cdisp == 'attachment' or fname:
+                fname_dec = mail_handler._decode_mime(fname) if fname else None
+                if not fname_dec:
+                    ext = mimetypes.guess_extension(ctype or 'application/octet-stream') or '.bin'
+                    fname_dec = f'attachment-{uid}{ext}'
+                attachments.append((fname_dec, ctype, part.get_payload(decode=True) or b''))
+            elif ctype == 'text/plain' and not cdisp:
+                body_text += (part.get_content() or "")
+            elif ctype == 'text/html' and not cdisp:
+                body_html = (part.get_content() or body_html)
+    else:
+        if msg.get_content_type() == 'text/html':
+            body_html = msg.get_content()
+        else:
+            body_text = msg.get_content()
+
+    payload = _payload_from_headers(msg, ext_uid, ui_folder, body_text, body_html, bool(attachments))
+    row_id = mail_handler._insert_message(payload)
+    for fname_dec, ctype, data in attachments:
+        mail_handler._save_attachment_bytes(fname_dec, ctype, data, message_id=row_id)
+    payload["id"] = row_id
+    return payload
+
+
+def _import_large(M, uid: int, ext_uid: str, ui_folder: str) -> Optional[Dict[str, Any]]:
+    """Veľká správa – hlavička + text cez BODY[sekcia], prílohy streamom na disk."""
+    typ, data = M.uid('FETCH', str(uid), '(BODYSTRUCTURE BODY.PEEK[HEADER])')
+    if typ != 'OK':
+        return None
+    header_raw, bs_buf = b'', b''
+    for meta, lit in _iter_fetch_items(data):
+        if b'BODY[HEADER]' in meta and lit is not None:
+            header_raw = lit
+            bs_buf += meta.split(b'BODY[HEADER]')[0]
+        else:
+            bs_buf += meta + ((b'\r\n' + lit) if lit is not None else b'')
+    idx = bs_buf.find(b'BODYSTRUCTURE')
+    if idx < 0:
+        return None
+    structure, _ = _parse_sexp(bs_buf, idx + len(b'BODYSTRUCTURE'))
+    parts = _walk_bodystructure(structure if isinstance(structure, list) else [])
+
+    msg = email.message_from_bytes(header_raw, policy=email_default_policy)
+    body_text, body_html = "", None
+    att_parts = []
+    for p in parts:
+        is_att = p["disposition"] == 'attachment' or p["filename"] or not p["ctype"].startswith('text/')
+        if is_att:
+            att_parts.append(p)
+            continue
+        raw = b''.join(_fetch_section_chunks(M, uid, p["section"]))
+        if p["ctype"] == 'text/html':
+            body_html = _decode_text_part(raw, p)
+        else:
+            body_text += _decode_text_part(raw, p)
+
+    payload = _payload_from_headers(msg, ext_uid, ui_folder, body_text, body_html, bool(att_parts))
+    row_id = mail_handler._insert_message(payload)
+    for p in att_parts:
+        _stream_attachment(M, uid, p, row_id)
+    payload["id"] = row_id
+    return payload
+
+
+# --- DEDUPLIKÁCIA -------------------------------------------------------------
+def _existing_keys(ext_uids: List[str], msg_ids: List[str]) -> Tuple[set, set]:
+    """Jeden dotaz na dávku: ktoré external_uid / Message-ID už v DB sú."""
+    if not ext_uids and not msg_ids:
+        return set(), set()
+    conds, params = [], []
+    if ext_uids:
+        conds.append(f"external_uid IN ({','.join(['%s'] * len(ext_uids))})")
+        params.extend(ext_uids)
+    if msg_ids:
+        conds.append(f"message_id_header IN ({','.join(['%s'] * len(msg_ids))})")
+        params.extend(msg_ids)
+    rows = db_connector.execute_query(
+        f"SELECT external_uid, message_id_header FROM mail_messages WHERE {' OR '.join(conds)}",
+        tuple(params)
+    ) or []
+    return ({r['external_uid'] for r in rows if r.get('external_uid')},
+            {r['message_id_header'] for r in rows if r.get('message_id_header')})
+
+
+def _ext_uid(account_key: str, folder: str, uidvalidity: Optional[int], uid: int) -> str:
+    return f"imap:{account_key}/{folder}/{uidvalidity or 0}/{uid}"
+
+
+# --- SYNC ---------------------------------------------------------------------
+def _select(M, folder: str) -> Optional[int]:
+    typ, _ = M.select(f'"{folder}"' if ' ' in folder else folder, readonly=True)
+    if typ != 'OK':
+        raise RuntimeError(f"IMAP SELECT {folder} zlyhal.")
+    try:
+        _, vals = M.response('UIDVALIDITY')
+        if vals and vals[0]:
+            return int(vals[0])
+    except Exception:
+        pass
+    return None
+
+
+def sync_folder(M, account: Dict[str, Any], folder: str, limit: Optional[int] = None,
+                classify: bool = True) -> Dict[str, Any]:
+    """
+    Synchronizuje jeden priečinok. limit = max. počet nových správ za beh
+    (berieme od najstarších, aby last_uid rástlo monotónne).
+    """
+    _ensure_sync_schema()
+    key = account["key"]
+    uidvalidity = _select(M, folder)
+    state = _load_state(key, folder)
+    last_uid = int(state.get("last_uid") or 0)
+    first_run = state.get("uidvalidity") is None
+    if not first_run and uidvalidity is not None and state.get("uidvalidity") != uidvalidity:
+        # schránka bola prestavaná – UID už neplatia, ideme odznova (dedup cez Message-ID)
+        last_uid, first_run = 0, True
+
+    typ, data = M.uid('SEARCH', None, f'UID {last_uid + 1}:*')
+    if typ != 'OK':
+        raise RuntimeError("IMAP UID SEARCH zlyhal.")
+    uids = sorted(int(x) for x in (data[0] or b'').split() if int(x) > last_uid)
+    if first_run and limit:
+        # prvé spustenie: nesťahujeme celú históriu, len posledných `limit`
+        uids = uids[-int(limit):]
+    elif limit:
+        uids = uids[:int(limit)]
+
+    ui_folder = folder.upper() if folder.upper() in UI_FOLDERS else 'INBOX'
+    legacy = key == DEFAULT_ACCOUNT_KEY and folder.upper() == 'INBOX'
+    fetched, skipped = 0, 0
+    imported: List[Dict[str, Any]] = []
+
+    for i in range(0, len(uids), BATCH_SIZE):
+        batch = uids[i:i + BATCH_SIZE]
+        uidset = ",".join(str(u) for u in batch)
+
+        # 1) hlavičky pre dedup + veľkosť
+        typ, data = M.uid('FETCH', uidset, '(UID RFC822.SIZE BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
+        if typ != 'OK':
+            raise RuntimeError("IMAP FETCH hlavičiek zlyhal.")
+        info: Dict[int, Dict[str, Any]] = {}
+        for meta, lit in _iter_fetch_items(data):
+            uid = _uid_of(meta)
+            if uid is None:
+                continue
+            m = _RE_SIZE.search(meta)
+            hdr = email.message_from_bytes(lit or b'', policy=email_default_policy)
+            info[uid] = {
+                "size": int(m.group(1)) if m else 0,
+                "msg_id": (hdr.get('Message-Id') or hdr.get('Message-ID') or '').strip() or None,
+                "ext_uid": _ext_uid(key, folder, uidvalidity, uid),
+            }
+
+        ext_keys = [v["ext_uid"] for v in info.values()]
+        if legacy:
+            ext_keys += [f"imap:{u}" for u in info]
+        seen_ext, seen_mid = _existing_keys(ext_keys, [v["msg_id"] for v in info.values() if v["msg_id"]])
+
+        todo_small, todo_large = [], []
+        for uid in batch:
+            v = info.get(uid)
+            if not v or v["ext_uid"] in seen_ext or (legacy and f"imap:{uid}" in seen_ext) \
+                    or (v["msg_id"] and v["msg_id"] in seen_mid):
+                skipped += 1
+                continue
+            if v["msg_id"]:
+                seen_mid.add(v["msg_id"])  # duplicity aj v rámci jednej dávky
+            (todo_large if v["size"] > STREAM_THRESHOLD else todo_small).append(uid)
+
+        # 2) malé správy – celé telá jednou dávkou
+        if todo_small:
+            typ, data = M.uid('FETCH', ",".join(str(u) for u in todo_small), '(UID BODY.PEEK[])')
+            if typ != 'OK':
+                raise RuntimeError("IMAP FETCH tiel zlyhal.")
+            for meta, lit in _iter_fetch_items(data):
+                uid = _uid_of(meta)
+                if uid is None or lit is None:
+                    continue
+                p = _import_small(lit, uid, info[uid]["ext_uid"], ui_folder)
+                if p:
+                    imported.append(p)
+                    fetched += 1
+
+        # 3) veľké správy – po jednej, prílohy streamom
+        for uid in todo_large:
+            p = _import_large(M, uid, info[uid]["ext_uid"], ui_folder)
+            if p:
+                imported.append(p)
+                fetched += 1
+
+        last_uid = max(last_uid, batch[-1])
+        _save_state(key, folder, uidvalidity, last_uid)
+
+    if not uids:
+        _save_state(key, folder, uidvalidity, last_uid)
+
+    if classify and imported:
+        _classify_imported(imported)
+
+    return {"account": key, "folder": folder, "fetched": fetched, "skipped": skipped,
+            "last_uid": last_uid, "uidvalidity": uidvalidity}
+
+
+def _classify_imported(imported: List[Dict[str, Any]]) -> None:
+    """Celá dávka naraz – pravidlá v pamäti, jeden UPDATE."""
+    try:
+        mail_handler.classify_messages(
+            [{"id": p["id"], "from_email": p.get("from_email"), "subject": p.get("subject")}
+             for p in imported if p.get("id")])
+    except Exception:
+        print("!!! Auto-klasifikácia zlyhala:", traceback.format_exc())
+
+
+def sync_account(account: Dict[str, Any], limit: Optional[int] = None,
+                 folders: Optional[List[str]] = None,
+                 connect: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Dict[str, Any]:
+    M = (connect or _connect)(account)
+    results = []
+    try:
+        for folder in (folders or account.get("folders") or ["INBOX"]):
+            try:
+                results.append(sync_folder(M, account, folder, limit=limit))
+            except Exception as e:
+                print(f"!!! IMAP sync {account.get('key')}/{folder}:", traceback.format_exc())
+                results.append({"account": account.get("key"), "folder": folder, "error": str(e)})
+    finally:
+        try:
+            M.logout()
+        except Exception:
+            pass
+    return {"account": account.get("key"), "folders": results}
+
+
+def sync_all(limit: Optional[int] = None, folder: Optional[str] = None,
+             connect: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Dict[str, Any]:
+    """Synchronizuje všetky nakonfigurované účty (alebo len zadaný priečinok)."""
+    accounts = get_accounts()
+    if not accounts:
+        return {"error": "Chýbajú IMAP premenné v .env (IMAP_HOST, IMAP_USERNAME, IMAP_PASSWORD)."}
+    fetched, skipped, out, errors = 0, 0, [], []
+    for acc in accounts:
+        try:
+            res = sync_account(acc, limit=limit, folders=[folder] if folder else None, connect=connect)
+        except Exception as e:
+            errors.append(f"{acc.get('key')}: {e}")
+            continue
+        for r in res["folders"]:
+            fetched += int(r.get("fetched") or 0)
+            skipped += int(r.get("skipped") or 0)
+            if r.get("error"):
+                errors.append(f"{r.get('account')}/{r.get('folder')}: {r['error']}")
+        out.append(res)
+    result = {"message": "IMAP hotovo", "fetched": fetched, "skipped": skipped, "accounts": out}
+    if errors and not fetched:
+        result = {"error": "IMAP fetch zlyhal: " + "; ".join(errors), "fetched": fetched, "skipped": skipped}
+    elif errors:
+        result["warnings"] = errors
+    return result
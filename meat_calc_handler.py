@@ -5,8 +5,10 @@ from datetime import datetime
 from typing import List, Dict, Any, Tuple, Optional
 import io
 
+import numpy as np
 from flask import jsonify, make_response, render_template, send_file
 import db_connector
+import meat_yield_stats
 
 # ---------- UTIL --------------------------------------------------
 def _to_decimal(x, nd:int=3):
@@ -188,12 +190,21 @@ def delete_breakdown(breakdown_id: int):
     Fyzicky zmaže celý záznam rozrábky vrátane výstupov, extra nákladov a výsledkov.
     """
     bid = int(breakdown_id)
+    old_key = _breakdown_stats_key(bid)
     db_connector.execute_query("DELETE FROM meat_breakdown_result WHERE breakdown_id=%s", (bid,), fetch='none')
     db_connector.execute_query("DELETE FROM meat_breakdown_output WHERE breakdown_id=%s", (bid,), fetch='none')
     db_connector.execute_query("DELETE FROM meat_breakdown_extra_costs WHERE breakdown_id=%s", (bid,), fetch='none')
     db_connector.execute_query("DELETE FROM meat_breakdown WHERE id=%s", (bid,), fetch='none')
+    meat_yield_stats.refresh_keys([old_key])
     return {"message": "Rozrábka zmazaná."}
 
+def _breakdown_stats_key(breakdown_id: int):
+    """Kľúč skupiny v meat_yield_stats (surovina, dodávateľ, mesiac) pre rozrábku."""
+    row = db_connector.execute_query(
+        "SELECT material_id, supplier_id, supplier, breakdown_date FROM meat_breakdown WHERE id=%s",
+        (int(breakdown_id),), fetch='one')
+    return meat_yield_stats.key_of(row) if row else None
+
 # =================================================================
 # === ŠABLÓNY ROZRÁBKY (TEMPLATES) - MAXIMUM FORCE REFRESH ========
 # =================================================================
@@ -501,8 +512,10 @@ def save_breakdown(data):
 
     # --- INSERT / UPDATE hlavičky ---
     breakdown_id = header.get('id')
+    old_key = None
     if breakdown_id:
         breakdown_id = int(breakdown_id)
+        old_key = _breakdown_stats_key(breakdown_id)
         qh = """
             UPDATE meat_breakdown
             SET breakdown_date=%s,
@@ -569,9 +582,12 @@ def save_breakdown(data):
         q = "INSERT INTO meat_breakdown_extra_costs (breakdown_id, name, amount_eur) VALUES (%s,%s,%s)"
         db_connector.execute_query(q, (breakdown_id, e["name"], e["amount_eur"]), fetch='none')
 
-    # auto-lock cien + prepočet výsledkov
+    # auto-lock cien + prepočet výsledkov + štatistiky výťažnosti (stará aj nová skupina)
     _ensure_price_locks(int(material_id), clean_outputs)
-    compute_breakdown_results(breakdown_id)
+    try:
+        compute_breakdown_results(breakdown_id)
+    finally:
+        meat_yield_stats.refresh_keys([old_key, _breakdown_stats_key(breakdown_id)])
 
     return {"message": msg, "breakdown_id": breakdown_id}
 
@@ -670,80 +686,95 @@ def list_breakdowns(material_id=None, date_from=None, date_to=None, supplier=Non
     return jsonify(rows)
 
 # ---------- ODHAD – priemerné výťažnosti --------------------------
+def _yield_profile(material_id:int, supplier:Optional[str]=None, date_from=None, date_to=None):
+    """Súčty za surovinu (+ dodávateľ, obdobie) z meat_yield_stats: (skupina, {product_id: súčty})."""
+    groups, products = meat_yield_stats.collect(
+        {"material_id": int(material_id), "supplier": supplier}, date_from, date_to)
+    group = groups.get((int(material_id),))
+    if not group or group["input_kg"] <= 0:
+        return None, {}
+    return group, {k[1]: p for k, p in products.items() if p["out_kg"] > 0}
+
 def _avg_yields(material_id:int, supplier:Optional[str]=None, date_from=None, date_to=None) -> Dict[int,float]:
     """Vážené priemerné výťažnosti z histórie pre danú surovinu (+ voliteľné filtre)."""
-    wh = ["b.material_id=%s"]; params=[int(material_id)]
-    if supplier:
-        wh.append("b.supplier=%s"); params.append(supplier)
-    if date_from:
-        wh.append("b.breakdown_date >= %s"); params.append(date_from)
-    if date_to:
-        wh.append("b.breakdown_date <= %s"); params.append(date_to)
-    where = " WHERE " + " AND ".join(wh)
-
-    tot = db_connector.execute_query(f"SELECT SUM(b.input_weight_kg) AS w FROM meat_breakdown b {where}", tuple(params)) or []
-    total_input = float(tot[0]['w'] or 0.0)
-    if total_input <= 0:
+    group, products = _yield_profile(material_id, supplier, date_from, date_to)
+    if not group:
         return {}
+    return {pid: meat_yield_stats.mean(group, p) for pid, p in products.items()}  # pomer 0..1
 
-    rows = db_connector.execute_query(f"""
-        SELECT mbo.product_id, SUM(mbo.weight_kg) AS w
-        FROM meat_breakdown b
-        JOIN meat_breakdown_output mbo ON mbo.breakdown_id=b.id
-        {where}
-        GROUP BY mbo.product_id
-    """, tuple(params)) or []
-
-    res={}
-    for r in rows:
-        res[int(r['product_id'])] = float(r['w']) / total_input
-    return res  # pomer 0..1
-
-def _get_product_id_by_code(code: str) -> Optional[int]:
-    row = db_connector.execute_query("SELECT id FROM meat_products WHERE code=%s LIMIT 1", (code,), fetch='one')
-    return int(row['id']) if row and row.get('id') is not None else None
+def _tolerance_from_group(group) -> float:
+    avg_tol = (group["tol_x_input"] / group["input_kg"]) if group and group["input_kg"] > 0 else 0.0
+    # ohranič, keby niekde bola extrémna hodnota
+    return round(min(max(avg_tol, 0.0), 100.0), 4)
 
 def _avg_tolerance_pct(material_id:int, supplier:Optional[str]=None, date_from=None, date_to=None) -> float:
     """
-    Vypočíta vážený priemer tolerance_pct (v %) podľa vstupnej váhy:
+    Vážený priemer tolerance_pct (v %) podľa vstupnej váhy:
       avg_tol = SUM(input_weight * tolerance_pct) / SUM(input_weight)
-    Null tolerancie sa ignorujú (berie sa 0).
+    Null tolerancie sa berú ako 0.
     """
-    wh = ["b.material_id=%s"]; params=[int(material_id)]
-    if supplier:
-        wh.append("b.supplier=%s"); params.append(supplier)
-    if date_from:
-        wh.append("b.breakdown_date >= %s"); params.append(date_from)
-    if date_to:
-        wh.append("b.breakdown_date <= %s"); params.append(date_to)
-    where = " WHERE " + " AND ".join(wh)
-
-    row = db_connector.execute_query(f"""
-        SELECT 
-          SUM(b.input_weight_kg * COALESCE(b.tolerance_pct,0)) / NULLIF(SUM(b.input_weight_kg),0) AS avg_tol
-        FROM meat_breakdown b
-        {where}
-    """, tuple(params), fetch='one') or {}
-
-    avg_tol = float(row.get('avg_tol') or 0.0)
-    # ohranič, keby niekde bola extrémna hodnota
-    if avg_tol < 0: avg_tol = 0.0
-    if avg_tol > 100: avg_tol = 100.0
-    return round(avg_tol, 4)
+    group, _ = _yield_profile(material_id, supplier, date_from, date_to)
+    return _tolerance_from_group(group)
 
 def _get_product_id_by_code(code: str) -> Optional[int]:
     row = db_connector.execute_query("SELECT id FROM meat_products WHERE code=%s LIMIT 1", (code,), fetch='one')
     return int(row['id']) if row and row.get('id') is not None else None
 
-def _get_product_codes(ids: list[int]) -> dict[int, str]:
+def _product_prices(material_id:int, ids: list[int]) -> dict[int, dict]:
+    """{id: {code, price}} – cena: lock pre materiál, inak predajná; neaktívne produkty 0."""
     if not ids:
         return {}
     placeholders = ",".join(["%s"]*len(ids))
-    rows = db_connector.execute_query(
-        f"SELECT id, code FROM meat_products WHERE id IN ({placeholders})",
-        tuple(ids), fetch='all'
-    ) or []
-    return { int(r["id"]): (r["code"] or "").strip().upper() for r in rows }
+    rows = db_connector.execute_query(f"""
+        SELECT p.id, p.code, p.is_active, p.selling_price_eur_kg, mpl.price_eur_kg AS lock_price
+        FROM meat_products p
+        LEFT JOIN meat_price_lock mpl ON mpl.product_id=p.id AND mpl.material_id=%s
+        WHERE p.id IN ({placeholders})
+    """, tuple([int(material_id)] + list(ids)), fetch='all') or []
+    out = {}
+    for r in rows:
+        if not r.get('is_active'):
+            price = 0.0
+        elif r.get('lock_price') is not None:
+            price = float(r['lock_price'])
+        else:
+            price = float(r['selling_price_eur_kg'] or 0.0)
+        out[int(r['id'])] = {"code": (r.get('code') or "").strip().upper(), "price": price}
+    return out
+
+def _estimate_basis(material_id:int, supplier:Optional[str]=None, date_from=None, date_to=None):
+    """
+    Podklad odhadu: výťažnosti bez STRATA renormalizované na 100 %, ich rozptyl,
+    ceny a priemerná tolerancia. Vráti dict alebo {"error"}.
+    """
+    group, products = _yield_profile(material_id, supplier, date_from, date_to)
+    if not group or not products:
+        return {"error":"Nie sú dostupné historické dáta pre zvolený filter (materiál/dodávateľ/dátumy)."}
+
+    prices = _product_prices(material_id, list(products.keys()))
+    yields = {pid: meat_yield_stats.mean(group, p) for pid, p in products.items()
+              if (prices.get(pid) or {}).get("code") != "STRATA"}
+    if not yields:
+        return {"error":"Historické dáta po odfiltrovaní položky STRATA neobsahujú žiadne predajné diely."}
+
+    s = float(sum(yields.values()))
+    if s <= 0:
+        return {"error":"Výťažnosti po odfiltrovaní sú nulové. Skontroluj historické záznamy."}
+
+    n_eff = meat_yield_stats.effective_count(group)
+    pids = sorted(yields)
+    return {
+        "product_ids": pids,
+        "yields": {pid: yields[pid] / s for pid in pids},  # teraz ∑yields = 1.0
+        # rozptyl výťažnosti jednej budúcej rozrábky (predikčný: + neistota priemeru)
+        "variances": {pid: meat_yield_stats.variance(group, products[pid]) * (1.0 + 1.0 / max(n_eff, 1.0)) / (s * s)
+                      for pid in pids},
+        "prices": {pid: (prices.get(pid) or {}).get("price", 0.0) for pid in pids},
+        "avg_tolerance_pct": _tolerance_from_group(group),
+        "breakdowns": int(group["breakdowns"]),
+        "effective_breakdowns": round(n_eff, 2),
+    }
+
 def supplier_product_stats(params: dict):
     """
     Agregovaný report:
@@ -777,48 +808,50 @@ def supplier_product_stats(params: dict):
     date_to   = params.get('date_to')
     supplier_id = params.get('supplier_id')
 
-    where = ["1=1"]
-    args: list[Any] = []
-
-    if date_from:
-        where.append("b.breakdown_date >= %s")
-        args.append(date_from)
-    if date_to:
-        where.append("b.breakdown_date <= %s")
-        args.append(date_to)
-    if supplier_id:
-        where.append("b.supplier_id = %s")
-        args.append(int(supplier_id))
-
-    where_sql = " AND ".join(where)
-
-    q = f"""
-        SELECT
-          COALESCE(s.name, b.supplier) AS supplier_name,
-          r.product_id,
-          p.name AS product_name,
-          SUM(b.input_weight_kg)         AS total_input_kg,
-          SUM(r.weight_kg)               AS total_output_kg,
-          AVG(r.yield_pct)               AS avg_yield_pct,
-          SUM(r.profit_eur)              AS total_profit_eur,
-          SUM(b.duration_minutes)        AS total_duration_min,
-          SUM(COALESCE(b.workers_count,0) * COALESCE(b.duration_minutes,0)) AS total_workers_min
-        FROM meat_breakdown_result r
-        JOIN meat_breakdown b ON b.id = r.breakdown_id
-        LEFT JOIN meat_products p ON p.id = r.product_id
-        LEFT JOIN meat_suppliers s ON s.id = b.supplier_id
-        WHERE {where_sql}
-        GROUP BY supplier_name, r.product_id, p.name
-        ORDER BY supplier_name ASC, avg_yield_pct DESC
-    """
+    # súčty za obdobie z meat_yield_stats (celé mesiace) + krajné dni zo surových dát
+    filters = {"supplier_id": int(supplier_id)} if supplier_id else {}
+    _, products = meat_yield_stats.collect(filters, date_from, date_to, by=("supplier_id", "supplier"))
+    products = {k: p for k, p in products.items() if p["res_rows"] > 0}
+
+    sup_ids = sorted({k[0] for k in products if k[0]})
+    pids = sorted({k[2] for k in products})
+    sup_names, prod_names = {}, {}
+    if sup_ids:
+        rows = db_connector.execute_query(
+            f"SELECT id, name FROM meat_suppliers WHERE id IN ({','.join(['%s']*len(sup_ids))})", tuple(sup_ids)) or []
+        sup_names = {int(r['id']): r['name'] for r in rows}
+    if pids:
+        rows = db_connector.execute_query(
+            f"SELECT id, name FROM meat_products WHERE id IN ({','.join(['%s']*len(pids))})", tuple(pids)) or []
+        prod_names = {int(r['id']): r['name'] for r in rows}
+
+    merged: dict[tuple, dict] = {}
+    for (sid, sname, pid), p in products.items():
+        supplier_name = sup_names.get(sid) or sname or None
+        m = merged.setdefault((supplier_name, pid), dict.fromkeys(meat_yield_stats.PRODUCT_FIELDS, 0.0))
+        for f in meat_yield_stats.PRODUCT_FIELDS:
+            m[f] += p[f]
+
+    rows = []
+    for (supplier_name, pid), m in merged.items():
+        rows.append({
+            "supplier_name": supplier_name,
+            "product_id": pid,
+            "product_name": prod_names.get(pid),
+            "total_input_kg": round(m["res_input_kg"], 3),
+            "total_output_kg": round(m["res_out_kg"], 3),
+            "avg_yield_pct": round(m["res_yield_pct_sum"] / m["res_rows"], 4),
+            "total_profit_eur": round(m["res_profit_eur"], 2),
+            "total_duration_min": m["res_duration_min"],
+            "total_workers_min": m["res_workers_min"],
+        })
+    rows.sort(key=lambda r: (r["supplier_name"] is not None, (r["supplier_name"] or "").lower(), -r["avg_yield_pct"]))
 
-    rows = db_connector.execute_query(q, tuple(args)) or []
     # dopočítame odvodené KPI v Pythone (aby to bolo prehľadné)
     for row in rows:
         out_kg = row['total_output_kg'] or 0
         profit = row['total_profit_eur'] or 0
         workers_min = row['total_workers_min'] or 0
-        duration_min = row['total_duration_min'] or 0
 
         row['profit_per_kg'] = round(profit / out_kg, 4) if out_kg else None
         # produktivita: kg / osoba / hodinu
@@ -826,49 +859,23 @@ def supplier_product_stats(params: dict):
             row['efficiency_kg_per_person_hour'] = round(out_kg / (workers_min / 60.0), 3)
         else:
             row['efficiency_kg_per_person_hour'] = None
-        row['total_duration_min'] = duration_min
 
     return jsonify(rows)
 
 def estimate(material_id:int, planned_weight_kg:float, expected_purchase_unit_price:float,
              supplier:Optional[str]=None, date_from=None, date_to=None, extra_costs:list|None=None):
-    # 1) Priemerné výťažnosti z histórie
-    yields = _avg_yields(material_id, supplier, date_from, date_to)  # {product_id: fraction 0..1}
-    if not yields:
-        return {"error":"Nie sú dostupné historické dáta pre zvolený filter (materiál/dodávateľ/dátumy)."}
-
-    # 2) Vylúč STRATA z odhadu a renormalizuj na 100 %
-    pid_list = list(yields.keys())
-    codes = _get_product_codes(pid_list)
-    for pid in list(yields.keys()):
-        if codes.get(pid) == "STRATA":
-            yields.pop(pid, None)
-    if not yields:
-        return {"error":"Historické dáta po odfiltrovaní položky STRATA neobsahujú žiadne predajné diely."}
-
-    s = float(sum(yields.values()))
-    if s <= 0:
-        return {"error":"Výťažnosti po odfiltrovaní sú nulové. Skontroluj historické záznamy."}
-    for k in list(yields.keys()):
-        yields[k] = float(yields[k]) / s  # teraz ∑yields = 1.0
-
-    # 3) Priemerná Tolerancia straty (%) – vážená vstupom
-    avg_tol_pct = _avg_tolerance_pct(material_id, supplier, date_from, date_to)  # napr. 3.25
+    # 1–4) Výťažnosti (bez STRATA, ∑ = 1), tolerancia a ceny zo štatistík
+    basis = _estimate_basis(material_id, supplier, date_from, date_to)
+    if basis.get("error"):
+        return basis
+    yields = basis["yields"]
+    prices = basis["prices"]
+    avg_tol_pct = basis["avg_tolerance_pct"]
     tol_factor = max(0.0, 1.0 - (avg_tol_pct / 100.0))
 
     # Efektívna výstupná váha (plán – strata)
     effective_output_weight = planned_weight_kg * tol_factor
 
-    # 4) Ceny – preferuj lock pre materiál, inak predajné
-    locks = db_connector.execute_query(
-        "SELECT product_id, price_eur_kg FROM meat_price_lock WHERE material_id=%s",
-        (int(material_id),)
-    ) or []
-    lock_map = { int(r['product_id']): float(r['price_eur_kg']) for r in locks }
-    all_prices = db_connector.execute_query("SELECT id, selling_price_eur_kg FROM meat_products WHERE is_active=1") or []
-    prices = { int(r['id']): (lock_map.get(int(r['id'])) if int(r['id']) in lock_map else float(r['selling_price_eur_kg']))
-               for r in all_prices }
-
     # 5) Odhad váh – ∑w == effective_output_weight
     est_rows=[]
     for pid, y in yields.items():
@@ -916,6 +923,104 @@ def estimate(material_id:int, planned_weight_kg:float, expected_purchase_unit_pr
     }
 
 
+# ---------- ODHAD – viac scenárov naraz (ponuky dodávateľov) -------
+def estimate_scenarios(data: dict):
+    """
+    Porovnanie ponúk: veľa kombinácií (dodávateľ, váha, nákupná cena) naraz.
+
+    data = {
+      material_id, date_from?, date_to?, supplier?  (predvolený dodávateľ),
+      z?: 1.96 (šírka pásma), include_rows?: bool,
+      scenarios: [{planned_weight_kg, purchase_unit_price, supplier?, extras?: [{amount_eur}], label?}]
+    }
+
+    Pre každého dodávateľa sa podklad (výťažnosti, rozptyl, ceny) načíta raz,
+    scenáre sa spočítajú maticovo. Pásmo zisku vychádza z rozptylu
+    výťažností jednej rozrábky (diely berieme ako nezávislé).
+    """
+    material_id = data.get('material_id')
+    scenarios = data.get('scenarios') or []
+    if not material_id or not scenarios:
+        return {"error": "Chýba material_id alebo zoznam scenárov."}
+    material_id = int(material_id)
+    z = float(data.get('z') or 1.96)
+    include_rows = bool(data.get('include_rows'))
+    default_supplier = data.get('supplier') or None
+
+    by_supplier: dict = {}
+    for i, sc in enumerate(scenarios):
+        by_supplier.setdefault((sc or {}).get('supplier') or default_supplier, []).append(i)
+
+    results: list = [None] * len(scenarios)
+    bases = []
+    for supplier, idx in by_supplier.items():
+        basis = _estimate_basis(material_id, supplier, data.get('date_from'), data.get('date_to'))
+        if basis.get("error"):
+            for i in idx:
+                results[i] = {"index": i, "supplier": supplier, "error": basis["error"]}
+            continue
+        bases.append({"supplier": supplier, "breakdowns": basis["breakdowns"],
+                      "effective_breakdowns": basis["effective_breakdowns"],
+                      "avg_tolerance_pct": basis["avg_tolerance_pct"]})
+
+        pids = basis["product_ids"]
+        y  = np.array([basis["yields"][p] for p in pids])
+        sd = np.sqrt(np.array([basis["variances"][p] for p in pids]))
+        sp = np.array([basis["prices"][p] for p in pids])
+        tol_factor = max(0.0, 1.0 - basis["avg_tolerance_pct"] / 100.0)
+
+        # z jednej rozrábky sa rozptyl odhadnúť nedá – pásmo sa nevráti
+        has_band = basis["breakdowns"] >= 2
+
+        sc = [scenarios[i] or {} for i in idx]
+        W = np.array([_to_decimal(s.get('planned_weight_kg'), 3) or 0.0 for s in sc])
+        P = np.array([_to_decimal(s.get('purchase_unit_price'), 4) or 0.0 for s in sc])
+        E = np.array([sum(float(x.get('amount_eur') or 0) for x in (s.get('extras') or [])) for s in sc])
+
+        eff = W * tol_factor                      # efektívna výstupná váha
+        weights = np.outer(eff, y)                # scenár × diel
+        weights_sd = np.outer(eff, sd)
+        revenue = weights @ sp
+        revenue_sd = eff * np.sqrt(np.sum((sp * sd) ** 2))
+        joint = np.round(W * P + E, 2)
+        profit = revenue - joint
+        safe_w = np.where(W > 0, W, np.nan)
+        breakeven = (revenue - E) / safe_w       # nákupná cena €/kg pri nulovom zisku
+
+        for j, i in enumerate(idx):
+            if W[j] <= 0:
+                results[i] = {"index": i, "supplier": supplier, "label": sc[j].get('label'),
+                              "error": "Neplatná plánovaná váha."}
+                continue
+            res = {
+                "index": i,
+                "label": sc[j].get('label'),
+                "supplier": supplier,
+                "planned_weight_kg": float(W[j]),
+                "purchase_unit_price": float(P[j]),
+                "effective_output_weight_kg": round(float(eff[j]), 3),
+                "joint_cost_eur": float(joint[j]),
+                "revenue_eur": round(float(revenue[j]), 2),
+                "profit_eur": round(float(profit[j]), 2),
+                "profit_low_eur": round(float(profit[j] - z * revenue_sd[j]), 2) if has_band else None,
+                "profit_high_eur": round(float(profit[j] + z * revenue_sd[j]), 2) if has_band else None,
+                "profit_per_kg_input": round(float(profit[j] / W[j]), 4),
+                "breakeven_unit_price": round(float(breakeven[j]), 4),
+            }
+            if include_rows:
+                res["rows"] = [{
+                    "product_id": pid,
+                    "weight_kg": round(float(weights[j, k]), 3),
+                    "weight_low_kg": round(max(0.0, float(weights[j, k] - z * weights_sd[j, k])), 3) if has_band else None,
+                    "weight_high_kg": round(float(weights[j, k] + z * weights_sd[j, k]), 3) if has_band else None,
+                    "selling_price_eur_kg": float(sp[k]),
+                } for k, pid in enumerate(pids)]
+            results[i] = res
+
+    ok = [r for r in results if r and not r.get("error")]
+    best = max(ok, key=lambda r: r["profit_eur"])["index"] if ok else None
+    return {"z": z, "suppliers": bases, "best_index": best, "scenarios": results}
+
 # ---------- PROFITABILITY REPORT (existujúci breakdown) -----------
 def profitability(breakdown_id:int):
     rows = db_connector.execute_query("""
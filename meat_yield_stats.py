@@ -0,0 +1,361 @@
+# =================================================================
+# === ROZRÁBKA MÄSA: ŠTATISTIKY VÝŤAŽNOSTI (surovina × dodávateľ × mesiac)
+# =================================================================
+#
+# Odhad rozrábky (meat_calc_handler.estimate / estimate_scenarios) a report
+# dodávateľ × produkt nečítajú celú históriu rozrábok pri každom volaní,
+# ale udržiavané súčty:
+#
+#   meat_yield_groups – 1 riadok na (surovina, dodávateľ, mesiac):
+#                       počet rozrábok, Σ vstup, Σ vstup², Σ vstup × tolerancia
+#   meat_yield_stats  – 1 riadok na (surovina, dodávateľ, mesiac, produkt):
+#                       Σ výstup, Σ výstup²/vstup (=> vážený rozptyl
+#                       výťažnosti) + súčty z meat_breakdown_result pre report
+#
+# Ukladajú sa súčty, nie priemery – mesiace sa dajú ľubovoľne sčítať
+# a priemer aj rozptyl sa dopočítajú až pri čítaní (mean(), variance()).
+# Obdobie od–do: celé mesiace idú zo štatistík, načaté krajné mesiace sa
+# dorátajú zo surových rozrábok (len tie dni).
+#
+# refresh_keys() prepočíta skupiny dotknuté uložením / zmazaním rozrábky
+# (volá meat_calc_handler). Prvé použitie na prázdnej tabuľke spraví
+# rebuild_all().
+# =================================================================
+import calendar
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import db_connector
+
+GROUP_FIELDS = ("breakdowns", "input_kg", "input_sq_kg", "tol_x_input")
+PRODUCT_FIELDS = ("out_kg", "out_sq_kg", "res_rows", "res_input_kg", "res_out_kg",
+                  "res_yield_pct_sum", "res_profit_eur", "res_duration_min", "res_workers_min")
+KEY_FIELDS = ("material_id", "supplier_id", "supplier", "ym")
+
+Key = Tuple[int, int, str, int]
+
+_schema_ready = False
+
+
+def ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS meat_yield_groups (
+            material_id  INT           NOT NULL,
+            supplier_id  INT           NOT NULL DEFAULT 0,
+            supplier     VARCHAR(255)  NOT NULL DEFAULT '',
+            ym           INT           NOT NULL,
+            breakdowns   INT           NOT NULL DEFAULT 0,
+            input_kg     DOUBLE        NOT NULL DEFAULT 0,
+            input_sq_kg  DOUBLE        NOT NULL DEFAULT 0,
+            tol_x_input  DOUBLE        NOT NULL DEFAULT 0,
+            PRIMARY KEY (material_id, supplier_id, supplier, ym),
+            KEY idx_ym (ym)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS meat_yield_stats (
+            material_id        INT           NOT NULL,
+            supplier_id        INT           NOT NULL DEFAULT 0,
+            supplier           VARCHAR(255)  NOT NULL DEFAULT '',
+            ym                 INT           NOT NULL,
+            product_id         INT           NOT NULL,
+            out_kg             DOUBLE        NOT NULL DEFAULT 0,
+            out_sq_kg          DOUBLE        NOT NULL DEFAULT 0,
+            res_rows           INT           NOT NULL DEFAULT 0,
+            res_input_kg       DOUBLE        NOT NULL DEFAULT 0,
+            res_out_kg         DOUBLE        NOT NULL DEFAULT 0,
+            res_yield_pct_sum  DOUBLE        NOT NULL DEFAULT 0,
+            res_profit_eur     DOUBLE        NOT NULL DEFAULT 0,
+            res_duration_min   DOUBLE        NOT NULL DEFAULT 0,
+            res_workers_min    DOUBLE        NOT NULL DEFAULT 0,
+            PRIMARY KEY (material_id, supplier_id, supplier, ym, product_id),
+            KEY idx_ym (ym)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = True
+    empty = not db_connector.execute_query("SELECT 1 FROM meat_yield_groups LIMIT 1", fetch='one')
+    if empty and db_connector.execute_query("SELECT 1 FROM meat_breakdown LIMIT 1", fetch='one'):
+        rebuild_all()
+
+
+# -----------------------------------------------------------------
+# Pomocné
+# -----------------------------------------------------------------
+def _to_date(x) -> Optional[date]:
+    if not x:
+        return None
+    if isinstance(x, datetime):
+        return x.date()
+    if isinstance(x, date):
+        return x
+    s = str(x).strip()
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%Y-%m-%dT%H:%M"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    return datetime.fromisoformat(s[:10]).date()
+
+
+def _ym(d: date) -> int:
+    return d.year * 100 + d.month
+
+
+def _month_bounds(ym: int) -> Tuple[date, date]:
+    """Prvý a posledný deň mesiaca."""
+    y, m = divmod(ym, 100)
+    return date(y, m, 1), date(y, m, calendar.monthrange(y, m)[1])
+
+
+def key_of(header: Dict[str, Any]) -> Optional[Key]:
+    """Kľúč skupiny pre hlavičku rozrábky (riadok meat_breakdown)."""
+    d = _to_date(header.get("breakdown_date"))
+    if not header.get("material_id") or not d:
+        return None
+    return (int(header["material_id"]), int(header.get("supplier_id") or 0),
+            (header.get("supplier") or ""), _ym(d))
+
+
+def _split_period(date_from, date_to):
+    """
+    Obdobie -> (ym_od, ym_do, krajné úseky). Celé mesiace [ym_od, ym_do] sa
+    čítajú zo štatistík (None = bez hranice), krajné úseky (od, do) zo surových dát.
+    """
+    d_from, d_to = _to_date(date_from), _to_date(date_to)
+    if d_from and d_to and d_from > d_to:
+        return 1, 0, []
+    edges: List[Tuple[date, date]] = []
+    lo = _ym(d_from) if d_from else None
+    hi = _ym(d_to) if d_to else None
+    if d_from and d_from.day != 1:
+        end = _month_bounds(lo)[1]
+        edges.append((d_from, min(end, d_to) if d_to else end))
+        nxt = end + timedelta(days=1)
+        lo = _ym(nxt)
+    if d_to and d_to != _month_bounds(_ym(d_to))[1]:
+        start = _month_bounds(_ym(d_to))[0]
+        if not (d_from and _ym(d_from) == _ym(d_to) and d_from.day != 1):
+            edges.append((max(start, d_from) if d_from else start, d_to))
+        hi = _ym(start - timedelta(days=1))
+    return lo, hi, edges
+
+
+def _filter_sql(filters: Dict[str, Any], alias: str = "") -> Tuple[List[str], List[Any]]:
+    wh, params = [], []
+    for col in ("material_id", "supplier_id", "supplier"):
+        if filters.get(col) not in (None, ""):
+            wh.append(f"{alias}{col}=%s")
+            params.append(filters[col])
+    return wh, params
+
+
+# -----------------------------------------------------------------
+# Agregácia zo surových rozrábok
+# -----------------------------------------------------------------
+def _fetch(cur, sql: str, params: tuple) -> List[Dict[str, Any]]:
+    if cur is None:
+        return db_connector.execute_query(sql, params, fetch='all') or []
+    cur.execute(sql, params)
+    return cur.fetchall() or []
+
+
+def _aggregate_raw(where: List[str], params: List[Any], cur=None):
+    """
+    Súčty pre rozrábky podľa filtra nad meat_breakdown b.
+    Vráti ({Key: {GROUP_FIELDS}}, {Key + (product_id,): {PRODUCT_FIELDS}}).
+    """
+    headers = _fetch(cur, f"""
+        SELECT b.id, b.material_id, COALESCE(b.supplier_id,0) AS supplier_id,
+               COALESCE(b.supplier,'') AS supplier, b.breakdown_date,
+               b.input_weight_kg, b.tolerance_pct, b.duration_minutes, b.workers_count
+          FROM meat_breakdown b
+         WHERE {' AND '.join(where) or '1=1'}
+    """, tuple(params))
+    groups: Dict[Key, Dict[str, float]] = {}
+    products: Dict[tuple, Dict[str, float]] = {}
+    if not headers:
+        return groups, products
+
+    by_id = {}
+    for h in headers:
+        k = key_of(h)
+        w = float(h.get("input_weight_kg") or 0.0)
+        if not k or w <= 0:
+            continue
+        by_id[int(h["id"])] = (k, h)
+        g = groups.setdefault(k, dict.fromkeys(GROUP_FIELDS, 0.0))
+        g["breakdowns"] += 1
+        g["input_kg"] += w
+        g["input_sq_kg"] += w * w
+        g["tol_x_input"] += w * float(h.get("tolerance_pct") or 0.0)
+    if not by_id:
+        return groups, products
+
+    ids = sorted(by_id)
+    ph = ",".join(["%s"] * len(ids))
+    outputs = _fetch(cur, f"""
+        SELECT breakdown_id, product_id, SUM(weight_kg) AS w
+          FROM meat_breakdown_output WHERE breakdown_id IN ({ph})
+         GROUP BY breakdown_id, product_id
+    """, tuple(ids))
+    results = _fetch(cur, f"""
+        SELECT breakdown_id, product_id, weight_kg, yield_pct, profit_eur
+          FROM meat_breakdown_result WHERE breakdown_id IN ({ph})
+    """, tuple(ids))
+
+    def prow(bid, pid):
+        k, h = by_id[int(bid)]
+        return products.setdefault(k + (int(pid),), dict.fromkeys(PRODUCT_FIELDS, 0.0)), h
+
+    for r in outputs:
+        p, h = prow(r["breakdown_id"], r["product_id"])
+        w = float(r["w"] or 0.0)
+        p["out_kg"] += w
+        p["out_sq_kg"] += w * w / float(h["input_weight_kg"])
+    for r in results:
+        p, h = prow(r["breakdown_id"], r["product_id"])
+        dur = float(h.get("duration_minutes") or 0)
+        p["res_rows"] += 1
+        p["res_input_kg"] += float(h["input_weight_kg"])
+        p["res_out_kg"] += float(r["weight_kg"] or 0.0)
+        p["res_yield_pct_sum"] += float(r["yield_pct"] or 0.0)
+        p["res_profit_eur"] += float(r["profit_eur"] or 0.0)
+        p["res_duration_min"] += dur
+        p["res_workers_min"] += float(h.get("workers_count") or 0) * dur
+    return groups, products
+
+
+# -----------------------------------------------------------------
+# Prepočet
+# -----------------------------------------------------------------
+def _write_key(cur, k: Key) -> None:
+    start, end = _month_bounds(k[3])
+    groups, products = _aggregate_raw(
+        ["b.material_id=%s", "COALESCE(b.supplier_id,0)=%s", "COALESCE(b.supplier,'')=%s",
+         "b.breakdown_date BETWEEN %s AND %s"],
+        [k[0], k[1], k[2], start, end], cur)
+    key_where = "material_id=%s AND supplier_id=%s AND supplier=%s AND ym=%s"
+    cur.execute(f"DELETE FROM meat_yield_groups WHERE {key_where}", k)
+    cur.execute(f"DELETE FROM meat_yield_stats WHERE {key_where}", k)
+    _insert(cur, groups, products)
+
+
+def _insert(cur, groups, products) -> None:
+    if groups:
+        cur.executemany(f"""
+            INSERT INTO meat_yield_groups ({', '.join(KEY_FIELDS + GROUP_FIELDS)})
+            VALUES ({', '.join(['%s'] * (len(KEY_FIELDS) + len(GROUP_FIELDS)))})
+        """, [k + tuple(g[f] for f in GROUP_FIELDS) for k, g in sorted(groups.items())])
+    if products:
+        cur.executemany(f"""
+            INSERT INTO meat_yield_stats ({', '.join(KEY_FIELDS + ('product_id',) + PRODUCT_FIELDS)})
+            VALUES ({', '.join(['%s'] * (len(KEY_FIELDS) + 1 + len(PRODUCT_FIELDS)))})
+        """, [k + tuple(p[f] for f in PRODUCT_FIELDS) for k, p in sorted(products.items())])
+
+
+def refresh_keys(keys: Iterable[Optional[Key]]) -> None:
+    """Prepočíta skupiny (surovina, dodávateľ, mesiac) – po uložení / zmazaní rozrábky."""
+    keys = sorted({k for k in keys if k})
+    if not keys:
+        return
+    ensure_schema()
+
+    def work(conn):
+        cur = conn.cursor(dictionary=True)
+        for k in keys:  # pevné poradie zámkov
+            _write_key(cur, k)
+
+    try:
+        db_connector.with_transaction(work)
+    except Exception as e:
+        print(f"[VÝŤAŽNOSŤ] prepočet {keys}: {e}")
+
+
+def rebuild_all() -> Dict[str, Any]:
+    ensure_schema()
+
+    def work(conn):
+        cur = conn.cursor(dictionary=True)
+        groups, products = _aggregate_raw([], [], cur)
+        cur.execute("DELETE FROM meat_yield_groups")
+        cur.execute("DELETE FROM meat_yield_stats")
+        _insert(cur, groups, products)
+        return len(groups)
+
+    n = db_connector.with_transaction(work)
+    return {"message": f"Štatistiky výťažnosti prepočítané ({n} skupín)."}
+
+
+# -----------------------------------------------------------------
+# Čítanie
+# -----------------------------------------------------------------
+def _fold(target: Dict[tuple, Dict[str, float]], key: tuple, values: Dict[str, Any], fields) -> None:
+    t = target.setdefault(key, dict.fromkeys(fields, 0.0))
+    for f in fields:
+        t[f] += float(values.get(f) or 0.0)
+
+
+def collect(filters: Dict[str, Any], date_from=None, date_to=None,
+            by: Tuple[str, ...] = ("material_id",)):
+    """
+    Súčty za obdobie zoskupené podľa `by` (podmnožina material_id/supplier_id/supplier).
+    Vráti ({by_key: GROUP_FIELDS}, {by_key + (product_id,): PRODUCT_FIELDS}).
+    """
+    ensure_schema()
+    lo, hi, edges = _split_period(date_from, date_to)
+    groups: Dict[tuple, Dict[str, float]] = {}
+    products: Dict[tuple, Dict[str, float]] = {}
+
+    if lo is None or hi is None or lo <= hi:
+        wh, params = _filter_sql(filters)
+        if lo is not None:
+            wh.append("ym >= %s"); params.append(lo)
+        if hi is not None:
+            wh.append("ym <= %s"); params.append(hi)
+        where = " AND ".join(wh) or "1=1"
+        cols = ", ".join(by)
+        for r in db_connector.execute_query(f"""
+            SELECT {cols}, {', '.join(f'SUM({f}) AS {f}' for f in GROUP_FIELDS)}
+              FROM meat_yield_groups WHERE {where} GROUP BY {cols}
+        """, tuple(params), fetch='all') or []:
+            _fold(groups, tuple(r[c] for c in by), r, GROUP_FIELDS)
+        for r in db_connector.execute_query(f"""
+            SELECT {cols}, product_id, {', '.join(f'SUM({f}) AS {f}' for f in PRODUCT_FIELDS)}
+              FROM meat_yield_stats WHERE {where} GROUP BY {cols}, product_id
+        """, tuple(params), fetch='all') or []:
+            _fold(products, tuple(r[c] for c in by) + (int(r["product_id"]),), r, PRODUCT_FIELDS)
+
+    idx = [KEY_FIELDS.index(c) for c in by]
+    for d1, d2 in edges:
+        wh, params = _filter_sql(filters, "b.")
+        wh.append("b.breakdown_date BETWEEN %s AND %s"); params += [d1, d2]
+        g_raw, p_raw = _aggregate_raw(wh, params)
+        for k, g in g_raw.items():
+            _fold(groups, tuple(k[i] for i in idx), g, GROUP_FIELDS)
+        for k, p in p_raw.items():
+            _fold(products, tuple(k[i] for i in idx) + (k[4],), p, PRODUCT_FIELDS)
+    return groups, products
+
+
+def mean(group: Dict[str, float], product: Dict[str, float]) -> float:
+    """Výťažnosť váhovo priemerovaná vstupom (pomer 0..1)."""
+    w = group.get("input_kg") or 0.0
+    return (product.get("out_kg") or 0.0) / w if w > 0 else 0.0
+
+
+def variance(group: Dict[str, float], product: Dict[str, float]) -> float:
+    """Váhový rozptyl výťažnosti jednej rozrábky (rozrábky bez produktu = 0)."""
+    w = group.get("input_kg") or 0.0
+    if w <= 0:
+        return 0.0
+    m = mean(group, product)
+    return max(0.0, (product.get("out_sq_kg") or 0.0) / w - m * m)
+
+
+def effective_count(group: Dict[str, float]) -> float:
+    """Efektívny počet rozrábok pri váhovaní vstupom (Kish): (Σw)² / Σw²."""
+    sq = group.get("input_sq_kg") or 0.0
+    return (group.get("input_kg") or 0.0) ** 2 / sq if sq > 0 else 0.0
@@ -0,0 +1,319 @@
+# =================================================================
+# === MRP: VIACDENNÝ PREPOČET POTREBY SUROVÍN ======================
+# =================================================================
+#
+# Vstupy:
+#   - naplánované výrobné úlohy (production_handler.get_planned_task_rows)
+#   - otvorené B2B/B2C objednávky z knihy rezervácií (stock_reservation_lines)
+#     s požadovaným dátumom dodania
+#   - recepty (recepty / produkty.vyrobna_davka_kg), viacúrovňové – surovina
+#     môže byť sama výrobkom s receptom – a krájané výrobky (zdrojovy_ean,
+#     rovnaké väzby ako office_handler.get_slicing_pairs, výťažnosť 100 %)
+#   - zásoby: produkty.aktualny_sklad_finalny_kg, sklad_vyroba.mnozstvo
+#   - otvorené objednávky u dodávateľov (vyrobne_objednavky, stav 'objednane')
+#
+# Všetko sa počíta v kg. Recepty tvoria maticu B (položka × položka, kg
+# zložky na 1 kg výrobku); dopyt je matica dni × položky. Výrobky sa
+# spracujú po úrovniach (low-level code): netto potreba jednej úrovne sa
+# vypočíta naraz pre všetky dni aj položky (kumulatívne súčty) a do
+# nižšej úrovne sa rozpadne jedným násobením matíc. Na konci sa suroviny
+# netujú proti skladu a objednávkam dodávateľov.
+#
+# Dni pred začiatkom horizontu (meškajúce úlohy / objednávky) sa zrátajú
+# do prvého dňa.
+# =================================================================
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import db_connector
+import stock_reservations
+import live_kpi
+from production_handler import INFINITE_STOCK_NAMES, get_planned_task_rows
+
+DEFAULT_BATCH_KG = 100.0
+MAX_DAYS = 60
+MAX_LEVELS = 20
+
+_INFINITE = None
+
+
+def _key(name) -> str:
+    return " ".join(str(name or "").split()).lower()
+
+
+def _infinite() -> set:
+    global _INFINITE
+    if _INFINITE is None:
+        _INFINITE = {_key(n) for n in INFINITE_STOCK_NAMES}
+    return _INFINITE
+
+
+def _to_date(v) -> Optional[date]:
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    if isinstance(v, str) and v:
+        try:
+            return datetime.strptime(v[:10], "%Y-%m-%d").date()
+        except ValueError:
+            return None
+    return None
+
+
+class _Items:
+    """Index položiek (normalizovaný názov -> stĺpec matice)."""
+
+    def __init__(self):
+        self.idx: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def get(self, name) -> Optional[int]:
+        k = _key(name)
+        if not k:
+            return None
+        i = self.idx.get(k)
+        if i is None:
+            i = self.idx[k] = len(self.names)
+            self.names.append(str(name).strip())
+        return i
+
+    def __len__(self):
+        return len(self.names)
+
+
+def _net(gross: "np.ndarray", receipts: "np.ndarray", on_hand: "np.ndarray"):
+    """
+    Časovo rozložené netovanie (dni × položky naraz).
+    net[d] = koľko treba navyše v deň d; projected[d] = zásoba na konci dňa bez tejto novej potreby.
+    """
+    balance = np.cumsum(receipts - gross, axis=0) + on_hand
+    short = np.maximum.accumulate(np.maximum(-balance, 0.0), axis=0)
+    net = np.diff(short, axis=0, prepend=np.zeros((1, gross.shape[1])))
+    return net, balance
+
+
+def _levels(adj: "np.ndarray", warnings: List[str]) -> "np.ndarray":
+    """Low-level code: úroveň položky = najdlhšia cesta od výrobku na vrchole."""
+    level = np.zeros(adj.shape[0], dtype=int)
+    for _ in range(MAX_LEVELS):
+        cand = np.where(adj, level[:, None] + 1, 0).max(axis=0) if adj.size else level
+        new = np.maximum(level, cand)
+        if np.array_equal(new, level):
+            return level
+        level = new
+    warnings.append("Recepty obsahujú cyklus – úrovne boli orezané.")
+    return np.minimum(level, MAX_LEVELS)
+
+
+def plan(date_from: Optional[str] = None, days: int = 7) -> Dict[str, Any]:
+    """Časovo rozložená potreba surovín na `days` dní od `date_from` (default dnes)."""
+    t0 = time.perf_counter()
+    start = _to_date(date_from) or date.today()
+    try:
+        days = max(1, min(int(days or 7), MAX_DAYS))
+    except (TypeError, ValueError):
+        days = 7
+    day_list = [start + timedelta(days=i) for i in range(days)]
+    warnings: List[str] = []
+
+    def day_of(v) -> Optional[int]:
+        d = _to_date(v)
+        if d is None:
+            return 0
+        i = (d - start).days
+        return None if i >= days else max(i, 0)
+
+    items = _Items()
+
+    # --- kmeňové dáta -----------------------------------------------------------
+    products = db_connector.execute_query("""
+        SELECT ean, nazov_vyrobku, mj, vaha_balenia_g, zdrojovy_ean, vyrobna_davka_kg,
+               COALESCE(aktualny_sklad_finalny_kg, 0) AS stock_kg
+          FROM produkty
+    """) or []
+    by_ean = {str(p["ean"]).strip(): p for p in products if p.get("ean")}
+    batch_kg: Dict[str, float] = {}
+    finished_stock: Dict[int, float] = {}
+    for p in products:
+        i = items.get(p["nazov_vyrobku"])
+        if i is None:
+            continue
+        finished_stock[i] = finished_stock.get(i, 0.0) + float(p["stock_kg"] or 0)
+        bk = float(p.get("vyrobna_davka_kg") or 0)
+        batch_kg[_key(p["nazov_vyrobku"])] = bk if bk > 0 else DEFAULT_BATCH_KG
+
+    recipe_rows = db_connector.execute_query(
+        "SELECT nazov_vyrobku, nazov_suroviny, mnozstvo_na_davku_kg FROM recepty") or []
+    edges = []
+    for r in recipe_rows:
+        pi, mi = items.get(r["nazov_vyrobku"]), items.get(r["nazov_suroviny"])
+        if pi is None or mi is None:
+            continue
+        per_kg = float(r["mnozstvo_na_davku_kg"] or 0) / batch_kg.get(_key(r["nazov_vyrobku"]), DEFAULT_BATCH_KG)
+        if per_kg > 0:
+            edges.append((pi, mi, per_kg))
+
+    # krájané výrobky: 1 kg cieľa = 1 kg zdrojového výrobku
+    for t in products:
+        src = by_ean.get(str(t.get("zdrojovy_ean") or "").strip())
+        if src is not None:
+            ti, si = items.get(t["nazov_vyrobku"]), items.get(src["nazov_vyrobku"])
+            if ti is not None and si is not None and ti != si:
+                edges.append((ti, si, 1.0))
+
+    raw_stock = db_connector.execute_query("SELECT nazov, COALESCE(mnozstvo, 0) AS q FROM sklad_vyroba") or []
+    for r in raw_stock:
+        items.get(r["nazov"])
+
+    # --- dopyt a plánované príjmy ---------------------------------------------------
+    task_rows = get_planned_task_rows()
+    for r in task_rows:
+        items.get(r["productName"])
+
+    lines_src, lines_params = stock_reservations.lines_source()
+    b2b_due = live_kpi.due_date_column("b2b_objednavky")
+    b2c_due = live_kpi.due_date_column("b2c_objednavky")
+    due_expr = "COALESCE({}, {})".format(f"b.`{b2b_due}`" if b2b_due else "NULL",
+                                         f"c.`{b2c_due}`" if b2c_due else "NULL")
+    demand_rows = db_connector.execute_query(f"""
+        SELECT l.ean, l.qty, {due_expr} AS due
+          FROM {lines_src} l
+          LEFT JOIN b2b_objednavky b ON l.kind = 'b2b' AND b.id = l.order_id
+          LEFT JOIN b2c_objednavky c ON l.kind = 'b2c' AND c.id = l.order_id
+    """, lines_params or None) or []
+
+    po_rows = db_connector.execute_query("""
+        SELECT p.nazov_suroviny, p.jednotka,
+               p.mnozstvo_ordered - COALESCE(p.mnozstvo_dodane, 0) AS qty,
+               COALESCE(o.datum_dodania, o.datum_objednania) AS due
+          FROM vyrobne_objednavky o
+          JOIN vyrobne_objednavky_polozky p ON p.objednavka_id = o.id
+         WHERE o.stav = 'objednane'
+    """) or []
+    for r in po_rows:
+        items.get(r["nazov_suroviny"])
+
+    n = len(items)
+    B = np.zeros((n, n))
+    for pi, mi, per_kg in edges:
+        B[pi, mi] += per_kg
+    makeable = B.any(axis=1)
+
+    gross = np.zeros((days, n))
+    tasks = np.zeros((days, n))
+    receipts = np.zeros((days, n))
+    on_hand = np.zeros(n)
+    for i, q in finished_stock.items():
+        on_hand[i] += q
+    for r in raw_stock:
+        i = items.idx.get(_key(r["nazov"]))
+        if i is not None:
+            on_hand[i] += float(r["q"] or 0)
+
+    for r in task_rows:
+        d = day_of(r.get("datum_vyroby"))
+        i = items.idx.get(_key(r["productName"]))
+        if d is not None and i is not None:
+            tasks[d, i] += float(r.get("actualKgQty") or 0)
+
+    skipped_pcs = skipped_unknown = 0
+    for r in demand_rows:
+        d = day_of(r.get("due"))
+        p = by_ean.get(str(r.get("ean") or "").strip())
+        if d is None or p is None:
+            continue
+        qty = float(r.get("qty") or 0)
+        if (p.get("mj") or "kg").lower() == "ks":
+            w = float(p.get("vaha_balenia_g") or 0)
+            if w <= 0:
+                skipped_pcs += 1
+                continue
+            qty = qty * w / 1000.0
+        i = items.idx.get(_key(p.get("nazov_vyrobku")))
+        if i is None:
+            skipped_unknown += 1
+            continue
+        gross[d, i] += qty
+    if skipped_pcs:
+        warnings.append(f"{skipped_pcs} položiek objednávok v ks bez váhy balenia – vynechané.")
+    if skipped_unknown:
+        warnings.append(f"{skipped_unknown} položiek objednávok s produktom bez názvu – vynechané.")
+
+    for r in po_rows:
+        if (r.get("jednotka") or "kg").lower() != "kg":
+            continue
+        d = day_of(r.get("due"))
+        i = items.idx.get(_key(r["nazov_suroviny"]))
+        if d is not None and i is not None:
+            receipts[d, i] += max(float(r.get("qty") or 0), 0.0)
+
+    # --- rozpad po úrovniach ----------------------------------------------------------
+    level = _levels(B > 0, warnings)
+    planned = np.zeros((days, n))
+    mk_proj = np.zeros((days, n))
+    for lv in range(int(level.max()) + 1 if n else 0):
+        mask = makeable & (level == lv)
+        if not mask.any():
+            continue
+        net, bal = _net(gross[:, mask], tasks[:, mask], on_hand[mask])
+        planned[:, mask] = net
+        mk_proj[:, mask] = bal
+        production = tasks[:, mask] + net
+        gross += production @ B[mask, :]
+
+    leaf = ~makeable
+    mat_net, mat_bal = _net(gross[:, leaf], receipts[:, leaf], on_hand[leaf])
+
+    # --- výstup -----------------------------------------------------------------
+    def r3(a) -> List[float]:
+        return [round(float(x), 3) for x in a]
+
+    infinite = _infinite()
+    materials = []
+    for col, i in enumerate(np.flatnonzero(leaf)):
+        if not gross[:, i].any() or _key(items.names[i]) in infinite:
+            continue
+        net_i = mat_net[:, col]
+        short_days = np.flatnonzero(net_i > 1e-9)
+        materials.append({
+            "name": items.names[i],
+            "on_hand": round(float(on_hand[i]), 3),
+            "gross": r3(gross[:, i]),
+            "receipts": r3(receipts[:, i]),
+            "projected": r3(mat_bal[:, col]),
+            "net": r3(net_i),
+            "total_gross": round(float(gross[:, i].sum()), 3),
+            "total_net": round(float(net_i.sum()), 3),
+            "first_shortage": day_list[int(short_days[0])].isoformat() if short_days.size else None,
+        })
+    materials.sort(key=lambda m: (m["first_shortage"] is None, m["first_shortage"] or "", -m["total_net"], m["name"]))
+
+    prods = []
+    for i in np.flatnonzero(makeable):
+        if not (gross[:, i].any() or tasks[:, i].any()):
+            continue
+        prods.append({
+            "name": items.names[i],
+            "on_hand": round(float(on_hand[i]), 3),
+            "gross": r3(gross[:, i]),
+            "planned_tasks": r3(tasks[:, i]),
+            "projected": r3(mk_proj[:, i]),
+            "unplanned": r3(planned[:, i]),
+            "total_unplanned": round(float(planned[:, i].sum()), 3),
+        })
+    prods.sort(key=lambda p: (-p["total_unplanned"], p["name"]))
+
+    return {
+        "from": start.isoformat(),
+        "days": [d.isoformat() for d in day_list],
+        "unit": "kg",
+        "materials": materials,
+        "products": prods,
+        "warnings": warnings,
+        "stats": {"items": n, "levels": int(level.max()) + 1 if n else 0,
+                  "ms": int((time.perf_counter() - t0) * 1000)},
+    }
@@ -1,4 +1,5 @@
 import db_connector
+import search_index
 
 def _ensure_nakup_schema():
     """Vykoná tvrdú kontrolu a migráciu stĺpcov, aby databáza nepadala na starej štruktúre."""
@@ -150,17 +151,19 @@ def zoznam_objednavok():
     rows = db_connector.execute_query(sql, fetch="all") or []
     return {"objednavky": rows}
 
-def get_produkty_autocomplete():
-    sql = """
-        SELECT ean, nazov_vyrobku as name, COALESCE(dph, 20.0) as dph 
-        FROM produkty 
-        WHERE nazov_vyrobku IS NOT NULL AND nazov_vyrobku != ''
-        UNION
-        SELECT ean, nazov as name, 20.0 as dph 
-        FROM sklad 
-        WHERE nazov IS NOT NULL AND nazov != ''
+def get_produkty_autocomplete(q=None, limit=30):
     """
-    rows = db_connector.execute_query(sql, fetch="all") or []
+    Bez `q`: celý zoznam (produkty + sklad, unikátne podľa názvu) pre klientsky autocomplete.
+    S `q`: zoradené výsledky z pamäťového indexu (bez ohľadu na diakritiku).
+    """
+    if q and q.strip():
+        hits = search_index.search(q, ("product", "stock"), limit=limit)
+        unique_products = {}
+        for h in hits:
+            unique_products.setdefault(h['name'], {"ean": h.get('ean'), "name": h['name'], "dph": h.get('dph', 20.0)})
+        return {"products": list(unique_products.values())}
+    rows = [{"ean": r.get('ean'), "name": r['name'], "dph": r.get('dph', 20.0)}
+            for kind in ("product", "stock") for r in search_index.all_docs(kind)]
     unique_products = {r['name']: r for r in rows}
     return {"products": list(unique_products.values())}
 
@@ -2,7 +2,7 @@
 # ------------------------------------------------------------
 # Schéma DB pre AI + bezpečné spúšťanie SQL:
 #  - get_schema_prompt()             -> číta schema_prompt.md (s cache)
-#  - vykonaj_bezpecny_sql_prikaz()   -> bezpečný SELECT‑only spúšťač
+#  - vykonaj_bezpecny_sql_prikaz()   -> bezpečný SELECT‑only spúšťač (cez ai_query_governor)
 #  - vykonaj_dml_sql()               -> zápisy (INSERT/UPDATE...)
 # ------------------------------------------------------------
 
@@ -12,17 +12,9 @@ from typing import Any, Dict, List, Optional
 
 # tvoje DB API
 import db_connector
+import ai_query_governor
 
 # ------------- Pomocné -------------------------------------------------------
-def _jsonify_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    def conv(v):
-        if isinstance(v, (datetime.datetime, datetime.date)):
-            return v.isoformat()
-        if isinstance(v, decimal.Decimal):
-            return float(v)
-        return v
-    return [{k: conv(v) for k, v in (r or {}).items()} for r in (rows or [])]
-
 def _strip_sql_comments_and_strings(s: str) -> str:
     s = re.sub(r"/\*.*?\*/", " ", s, flags=re.DOTALL)
     s = re.sub(r"(?m)--.*$", " ", s)
@@ -38,9 +30,11 @@ _SQL_DDL_IO       = re.compile(
 )
 _SQL_WRITE_STMT   = re.compile(r"^\s*(insert|update|delete|replace\s+into)\b", re.IGNORECASE)
 
-def vykonaj_bezpecny_sql_prikaz(sql: str, limit_default: int = 2000) -> Dict[str, Any]:
+def vykonaj_bezpecny_sql_prikaz(sql: str, limit_default: int = 2000, *, use_cache: bool = True) -> Dict[str, Any]:
     """
     Povolí iba SELECT/CTE SELECT, doplní LIMIT ak chýba.
+    Samotné vykonanie (EXPLAIN kontrola, časový limit, read-only snapshot,
+    cache výsledkov) rieši ai_query_governor.run_select().
     """
     if not isinstance(sql, str):
         return {"error": "SQL musí byť text."}
@@ -64,13 +58,7 @@ def vykonaj_bezpecny_sql_prikaz(sql: str, limit_default: int = 2000) -> Dict[str
     if re.search(r"\bLIMIT\s+\d+", candidate, re.IGNORECASE) is None:
         candidate = f"{candidate} LIMIT {int(limit_default)}"
 
-    try:
-        rows = db_connector.execute_query(candidate, fetch="all") or []
-        rows = _jsonify_rows(rows)
-        cols = list(rows[0].keys()) if rows else []
-        return {"columns": cols, "rows": rows, "row_count": len(rows)}
-    except Exception as e:
-        return {"error": str(e)}
+    return ai_query_governor.run_select(candidate, use_cache=use_cache)
 
 # ------------- DML (zápisy) ---------------------
 def vykonaj_dml_sql(sql: str) -> Dict[str, Any]:
@@ -15,6 +15,11 @@ from typing import Any, Dict, List, Optional, Tuple
 from flask import make_response, request, send_file
 
 import db_connector
+import dashboard_snapshots
+import order_events
+import http_cache
+import search_index
+import product_cost_index
 from expedition_handler import _table_exists
 import pdf_generator
 import production_handler
@@ -173,7 +178,15 @@ def upload_b2c_image():
 # === DASHBOARD KANCELÁRIA =========================================
 # =================================================================
 
-def get_kancelaria_dashboard_data():
+def get_kancelaria_dashboard_data(force: bool = False):
+    """
+    Dashboard Kancelárie – posledný predpočítaný snapshot (jeden PK lookup).
+    force=True (?refresh=1) ho prepočíta hneď.
+    """
+    return dashboard_snapshots.get("kancelaria_home", force=force)
+
+
+def _build_kancelaria_dashboard_data():
     """
     Dashboard s predajnými a ziskovými štatistikami (B2B + B2C).
     """
@@ -397,7 +410,11 @@ def get_kancelaria_dashboard_data():
     except Exception as e:
         print(f"Chyba v dashboarde: {e}")
         return {"error": str(e)}
-    
+
+
+dashboard_snapshots.register("kancelaria_home", _build_kancelaria_dashboard_data, every_s=300)
+
+
 def get_kancelaria_base_data():
     """
     Opravená základná funkcia dát bez zacyklenia.
@@ -741,6 +758,7 @@ def receive_production_stock(payload):
             """, (when, name, qty, price if price is not None else None, prijem_typ, note))
 
         conn.commit()
+        product_cost_index.refresh_stock_items(it.get('name') for it in items)
         return {"message": f"Prijatých {len(items)} položiek do výrobného skladu."}
     except Exception:
         if conn: conn.rollback()
@@ -787,12 +805,16 @@ def create_production_item(data: Dict[str, Any]):
             UPDATE produkty SET nazov_vyrobku=%s, mj=%s, vaha_balenia_g=%s, predajna_kategoria=%s, dph=%s
             WHERE ean=%s
         """, (name, mj, (int(w_g) if w_g else None), cat, float(dph or 0), ean), fetch='none')
+        http_cache.bump("catalog")
+        search_index.refresh("product", [ean])
         return {"message": "Produkt aktualizovaný."}
 
     db_connector.execute_query("""
         INSERT INTO produkty (ean, nazov_vyrobku, mj, typ_polozky, vaha_balenia_g, predajna_kategoria, dph)
         VALUES (%s,%s,%s,'produkt',%s,%s,%s)
     """, (ean, name, mj, (int(w_g) if w_g else None), cat, float(dph or 0)), fetch='none')
+    http_cache.bump("catalog")
+    search_index.refresh("product", [ean])
     return {"message": "Produkt vytvorený."}
 
 def update_production_item_qty(data: Dict[str, Any]):
@@ -836,6 +858,8 @@ def delete_production_item(data: Dict[str, Any]):
     if used_r or used_s:
         return {"error": "Nemožno vymazať – produkt je referencovaný (recept alebo krájanie)."}
     db_connector.execute_query("DELETE FROM produkty WHERE ean=%s", (ean,), fetch='none')
+    http_cache.bump("catalog")
+    search_index.refresh("product", [ean])
     return {"message": "Produkt zmazaný."}
 
 # ---- add new stock item (raw warehouse) -------------------------------------
@@ -958,6 +982,7 @@ def add_new_stock_item(data: Dict[str, Any]):
         )
         msg = f"Položka '{name}' založená."
 
+    product_cost_index.refresh_stock_items([name])
     return {"message": msg}
 
 
@@ -1144,6 +1169,7 @@ def save_stock_item(data: Dict[str, Any]):
     values.append(original_name)
     sql = f"UPDATE sklad SET {', '.join(set_parts)} WHERE nazov=%s"
     db_connector.execute_query(sql, tuple(values), fetch='none')
+    product_cost_index.refresh_stock_items([name])
     return {"message": "Karta upravená."}
 
 
@@ -1152,62 +1178,34 @@ def save_stock_item(data: Dict[str, Any]):
 # =================================================================
 
 def _avg_purchase_costs_map_by_ean() -> dict:
-    """Best-effort priemerná nákupná cena v sklade 2 (EAN → €/kg alebo €/ks podľa zdroja)."""
-    candidates = [
-        ('produkty_prijmy',  'ean',          'mnozstvo_kg', 'cena_eur_kg'),
-        ('prijmy_sklad2',    'ean',          'mnozstvo_kg', 'cena_kg'),
-        ('tovar_prijmy',     'ean_produktu', 'mnozstvo',    'cena_za_jednotku'),
-        ('prijmy_produktov', 'ean',          'mnozstvo',    'cena'),
-    ]
-    out = {}
-    for tbl, ce, cq, cp in candidates:
-        if _has_col(tbl, ce) and _has_col(tbl, cq) and _has_col(tbl, cp):
-            try:
-                rows = db_connector.execute_query(
-                    f"SELECT {ce} AS ean, SUM({cq}) AS qty, SUM({cq}*{cp}) AS val FROM {tbl} GROUP BY {ce}"
-                ) or []
-                for r in rows:
-                    q = float(r['qty'] or 0.0); v = float(r['val'] or 0.0)
-                    if q > 0: out[(r['ean'] or '').strip()] = v / q
-                if out: break
-            except Exception:
-                continue
-    return out
+    """Priemerná nákupná cena v sklade 2 (EAN → €/kg alebo €/ks podľa zdroja) z product_cost_index."""
+    return {ean: float(r["avg_purchase_cost"]) for ean, r in product_cost_index.cost_map().items()
+            if r.get("avg_purchase_cost") is not None}
 
 def get_avg_costs_catalog():
     """
-    Centrálne priemery pre Kanceláriu:
+    Centrálne priemery pre Kanceláriu (z product_cost_index):
      - avg_manufacturing_unit_cost: vážený priemer z 'zaznamy_vyroba.cena_za_jednotku' (€/kg alebo €/ks podľa MJ)
      - avg_purchase_unit_cost: best-effort z príjmov Sklad 2 (ak nie je zdroj, vráti None)
     """
-    zv = _zv_name_col()
-    rows = db_connector.execute_query(f"""
+    product_cost_index.ensure_schema()
+    rows = db_connector.execute_query("""
         SELECT p.ean, TRIM(p.nazov_vyrobku) AS product_name, p.mj AS prod_mj,
-               SUM((CASE WHEN p.mj='kg' THEN COALESCE(zv.realne_mnozstvo_kg,0)
-                         ELSE COALESCE(zv.realne_mnozstvo_ks,0) END)
-                   * COALESCE(zv.cena_za_jednotku,0)) AS sum_cost_units,
-               SUM(CASE WHEN p.mj='kg' THEN COALESCE(zv.realne_mnozstvo_kg,0)
-                        ELSE COALESCE(zv.realne_mnozstvo_ks,0) END) AS sum_units
-        FROM zaznamy_vyroba zv
-        JOIN produkty p ON TRIM(zv.{zv}) = TRIM(p.nazov_vyrobku)
-        WHERE COALESCE(zv.cena_za_jednotku,0) > 0
-        GROUP BY p.ean, TRIM(p.nazov_vyrobku), p.mj
+               ci.rolling_avg_cost, ci.avg_purchase_cost
+          FROM product_cost_index ci
+          JOIN produkty p ON p.ean = ci.ean
+         WHERE ci.rolling_avg_cost IS NOT NULL
     """) or []
     out = []
     for r in rows:
-        units = float(r['sum_units'] or 0.0)
-        avg   = (float(r['sum_cost_units'] or 0.0) / units) if units > 0 else 0.0
         out.append({
             "ean": (r['ean'] or '').strip(),
             "product": r['product_name'],
             "unit": r['prod_mj'],
-            "avg_manufacturing_unit_cost": round(avg, 4)
+            "avg_manufacturing_unit_cost": round(float(r['rolling_avg_cost'] or 0.0), 4),
+            "avg_purchase_unit_cost": (None if r['avg_purchase_cost'] is None
+                                       else round(float(r['avg_purchase_cost']), 4)),
         })
-
-    purchase_by_ean = _avg_purchase_costs_map_by_ean()
-    for rec in out:
-        rec["avg_purchase_unit_cost"] = (None if rec["ean"] not in purchase_by_ean
-                                         else round(float(purchase_by_ean[rec["ean"]]), 4))
     return {"rows": out}
 
 
@@ -1219,7 +1217,8 @@ def get_comprehensive_stock_view():
     Prehľad finálnych produktov.
     OPRAVA: Cenu ťaháme PRESNE TAK ISTO ako v Návrhu nákupu (z tabuľky sklad).
     """
-    # Používame subquery (pod-dotaz) rovnaký ako v get_goods_purchase_suggestion
+    # Ceny zo skladu aj výrobné náklady ťaháme z product_cost_index (jeden JOIN)
+    product_cost_index.ensure_schema()
     q = """
         SELECT
             p.ean, 
@@ -1228,25 +1227,11 @@ def get_comprehensive_stock_view():
             p.aktualny_sklad_finalny_kg AS stock_kg, 
             p.vaha_balenia_g, 
             p.mj AS unit,
-            
-            -- TOTO JE TEN KĽÚČOVÝ RIADOK (Cena zo skladu):
-            (SELECT s.nakupna_cena 
-               FROM sklad s 
-              WHERE (s.ean = p.ean AND s.ean <> '') OR s.nazov = p.nazov_vyrobku 
-              ORDER BY s.nakupna_cena DESC 
-              LIMIT 1
-            ) AS cena_zo_skladu_z_importu,
-
-            (
-              SELECT ROUND(zv.celkova_cena_surovin / NULLIF(zv.realne_mnozstvo_kg, 0), 4)
-              FROM zaznamy_vyroba zv
-              WHERE (zv.nazov_vyrobu = p.nazov_vyrobku OR zv.nazov_vyrobku = p.nazov_vyrobku)
-                AND zv.celkova_cena_surovin IS NOT NULL
-                AND zv.realne_mnozstvo_kg IS NOT NULL
-              ORDER BY COALESCE(zv.datum_ukoncenia, zv.datum_vyroby) DESC
-              LIMIT 1
-            ) AS last_cost_per_kg
+            ci.last_purchase_price AS cena_zo_skladu_z_importu,  -- cena zo skladu (ako v Návrhu nákupu)
+            ci.last_cost_per_kg,
+            ci.rolling_avg_cost AS manuf_avg
         FROM produkty p
+        LEFT JOIN product_cost_index ci ON ci.ean = p.ean
         WHERE p.typ_polozky = 'produkt' 
            OR p.typ_polozky LIKE 'VÝROBOK%%' 
            OR p.typ_polozky LIKE 'TOVAR%%'
@@ -1254,26 +1239,6 @@ def get_comprehensive_stock_view():
     """
     rows = db_connector.execute_query(q) or []
 
-    # Pripravíme si aj výrobné priemery (keby niečo)
-    zv = _zv_name_col()
-    mc_rows = db_connector.execute_query(f"""
-        SELECT TRIM(p.nazov_vyrobku) AS pn, p.mj AS mj,
-               SUM((CASE WHEN p.mj='kg' THEN COALESCE(zv.realne_mnozstvo_kg,0)
-                         ELSE COALESCE(zv.realne_mnozstvo_ks,0) END)
-                   * COALESCE(zv.cena_za_jednotku,0)) AS sum_cost_units,
-               SUM(CASE WHEN p.mj='kg' THEN COALESCE(zv.realne_mnozstvo_kg,0)
-                        ELSE COALESCE(zv.realne_mnozstvo_ks,0) END) AS sum_units
-          FROM zaznamy_vyroba zv
-          JOIN produkty p ON TRIM(zv.{zv}) = TRIM(p.nazov_vyrobku)
-         WHERE COALESCE(zv.cena_za_jednotku,0) > 0
-         GROUP BY TRIM(p.nazov_vyrobku), p.mj
-    """) or []
-    manuf_index = {}
-    for r in mc_rows:
-        su = float(r['sum_units'] or 0.0)
-        avg = (float(r['sum_cost_units'] or 0.0)/su) if su>0 else 0.0
-        manuf_index[(r['pn'], r['mj'])] = avg
-
     grouped: Dict[str, List[Dict[str, Any]]] = {}
     flat: List[Dict[str, Any]] = []
 
@@ -1291,7 +1256,7 @@ def get_comprehensive_stock_view():
         
         # 2. Priorita: Výrobná cena
         if final_price == 0:
-            manuf_avg = manuf_index.get((p['name'], unit), 0.0)
+            manuf_avg = float(p.get('manuf_avg') or 0.0)
             if manuf_avg:
                 final_price = float(manuf_avg)
             elif p.get('last_cost_per_kg'):
@@ -1729,6 +1694,8 @@ def add_catalog_item(data):
         INSERT INTO produkty (ean, nazov_vyrobku, typ_polozky, kategoria_pre_recepty, predajna_kategoria, dph, mj)
         VALUES (%s,%s,%s,%s,%s,%s,%s)
     """, (ean, name, item_type, None, sale_cat, dph, mj), fetch='none')
+    http_cache.bump("catalog")
+    search_index.refresh("product", [ean])
     return {"message": f"Položka '{name}' pridaná."}
 
 # office_handler.py
@@ -1813,6 +1780,7 @@ def import_catalog_bulk(data: dict):
                 cur.close()
                 conn.close()
 
+    http_cache.bump("catalog")
     return {
         "message": f"Import dokončený. Vložené: {inserted_count}, Preskočené (existujúce): {skipped_count}.",
         "inserted": inserted_count,
@@ -1870,6 +1838,8 @@ def update_catalog_item(data):
 
     try:
         db_connector.execute_query(sql, params, fetch='none')
+        http_cache.bump("catalog")
+        search_index.refresh("product", [ean, target_ean])
         return {"message": f"Položka {ean} úspešne aktualizovaná."}
     except Exception as e:
         print(f"Chyba update_catalog_item: {e}")
@@ -1996,6 +1966,8 @@ def delete_catalog_item(data):
         cur.execute(f"DELETE FROM produkty WHERE ean IN ({placeholders})", tuple(target_eans))
 
         conn.commit()
+        http_cache.bump("catalog")
+        search_index.refresh("product", target_eans)
         return {
             "message": f"Položka {ean} a všetky súvisiace väzby boli vymazané.",
             "force": force,
@@ -2511,6 +2483,8 @@ def create_and_link_sliced_product(data):
         INSERT INTO produkty (ean, nazov_vyrobku, mj, typ_polozky, vaha_balenia_g, zdrojovy_ean, dph, predajna_kategoria)
         VALUES (%s,%s,'ks','VÝROBOK_KRAJANY',%s,%s,%s,%s)
     """, (new_ean, new_name, float(new_weight), source_ean, dph_rate, sale_cat), fetch='none')
+    http_cache.bump("catalog")
+    search_index.refresh("product", [new_ean])
     return {"message": f"Produkt '{new_name}' vytvorený a prepojený."}
 
 def get_slicing_pairs():
@@ -3086,6 +3060,7 @@ def update_b2c_pricelist(data):
             meta[ean]['obrazok'] = img_url
 
     _b2c_meta_save(meta)
+    http_cache.bump("b2c_pricelist")
     return {"message": "Zmeny v cenníku uložené."}
 
 def add_products_to_b2c_pricelist(data):
@@ -3121,6 +3096,7 @@ def add_products_to_b2c_pricelist(data):
             )
             inserted += 1
 
+    http_cache.bump("b2c_pricelist")
     return {"message": "Hotovo.", "inserted": inserted, "updated": updated}
 
 def get_b2c_orders_for_admin():
@@ -3161,6 +3137,7 @@ def update_b2c_order_status(data):
     except Exception as e:
         return {"error": f"Nepodarilo sa zapísať stav: {e}"}
 
+    order_events.on_orders_changed('b2c', order_id)
     return {"message": f"Stav objednávky zmenený na '{new_status}'."}
 
 def finalize_b2c_order(data):
@@ -3294,6 +3271,7 @@ def finalize_b2c_order(data):
         )
     except Exception as e:
         print(f"Chyba DB update: {e}")
+    order_events.on_orders_changed('b2c', order_id)
 
     # 6. Notifikácia (Email zákazníkovi)
     customer_email = head.get('email')
@@ -3346,6 +3324,7 @@ def credit_b2c_loyalty_points(data):
         "UPDATE b2c_objednavky SET stav = 'Hotová' WHERE id = %s",
         (order_id,), fetch='none'
     )
+    order_events.on_orders_changed('b2c', order_id)
 
     # SERVER-SIDE SMS AUTONOTIFY (COMPLETED)
     try:
@@ -3421,6 +3400,7 @@ def cancel_b2c_order(data):
         "UPDATE b2c_objednavky SET stav = 'Zrušená', poznamka = CONCAT(IFNULL(poznamka, ''), ' | ZRUŠENÉ: ', %s) WHERE id = %s",
         (reason, order_id), fetch='none'
     )
+    order_events.on_orders_changed('b2c', order_id)
     order = db_connector.execute_query("SELECT zakaznik_id, cislo_objednavky FROM b2c_objednavky WHERE id = %s", (order_id,), 'one')
     if order:
         customer = db_connector.execute_query("SELECT nazov_firmy, email FROM b2b_zakaznici WHERE zakaznik_id = %s", (order['zakaznik_id'],), 'one')
@@ -3920,6 +3900,7 @@ def create_supplier(payload: Dict[str, Any]) -> Dict[str, Any]:
         "INSERT INTO suppliers (name, phone, email, address, is_active, created_at, updated_at) VALUES (%s,%s,%s,%s,1,NOW(),NOW())",
         (name, phone, email_val, address_val), fetch='lastrowid'
     )
+    search_index.refresh("supplier", [new_id])
     if categories:
         db_connector.execute_query(
             "INSERT INTO supplier_categories (supplier_id, category) VALUES (%s,%s)",
@@ -3958,11 +3939,13 @@ def update_supplier(payload: Dict[str, Any]) -> Dict[str, Any]:
             fetch='none'
         )
 
+    search_index.refresh("supplier", [sup_id])
     return {"message": "Dodávateľ upravený."}
 
 def delete_supplier(supplier_id: int) -> Dict[str, Any]:
     _ensure_suppliers_schema()
     db_connector.execute_query("UPDATE suppliers SET is_active=0, updated_at=NOW() WHERE id=%s", (supplier_id,), fetch='none')
+    search_index.refresh("supplier", [supplier_id])
     return {"message": "Dodávateľ zmazaný."}
 # ============================================================================
 # ======================  B2C SMS AUTO-NOTIFY  ===============================
@@ -6052,6 +6035,8 @@ def process_erp_import_file(file_path):
             processed += 1
 
         conn.commit()
+        product_cost_index.refresh_products(
+            e for it in items_to_update for e in (it['ean'], it['ean_full'], it['ean_short']))
         return {"message": f"Import OK. Nahratých {processed} položiek.", "processed": processed}
 
     except Exception as e:
@@ -6311,6 +6296,7 @@ def _execute_rozrabka_import(file_path, import_id):
             count += 1
 
         conn.commit()
+        product_cost_index.refresh_stock_items(it['name'] for it in items)
         return {"message": f"Import OK. Do výroby pripísaných {count} položiek.", "import_id": import_id}
 
     except Exception as e:
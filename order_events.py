@@ -0,0 +1,34 @@
+# =================================================================
+# === ZMENA OBJEDNÁVOK: JEDEN HOOK PRE ODVODENÉ DÁTA ================
+# =================================================================
+#
+# Po každom zápise objednávky (uloženie, úprava, zrušenie, dokončenie,
+# príprava, EDI / ERP import, doklady, zmazanie zákazníka) sa volá
+# on_orders_changed(kind, order_ids). Ten prepočíta všetko, čo sa
+# z objednávok odvodzuje:
+#   - stock_reservations – rezervácie skladu per EAN,
+#   - sales_fact         – fakty predaja a mesačný rollup,
+#   - dashboard_snapshots – zneplatní dashboardy s objednávkami,
+#   - live_kpi           – zobudí prepočet KPI expedície.
+# Nový zapisovateľ tak volá jednu funkciu a nová odvodená štruktúra sa
+# pridá len sem. Chyby jednotlivých krokov sa len zalogujú.
+# =================================================================
+from typing import Iterable, Union
+
+import dashboard_snapshots
+import live_kpi
+import sales_fact
+import stock_reservations
+
+
+def on_orders_changed(kind: str, order_ids: Union[int, str, Iterable, None]) -> None:
+    """kind = 'b2b' | 'b2c'; order_ids = jedno id alebo zoznam id (aj už zmazaných objednávok)."""
+    if order_ids is None or isinstance(order_ids, (int, str)):
+        order_ids = [order_ids]
+    ids = sorted({int(x) for x in order_ids if x})
+    if not ids:
+        return
+    stock_reservations.refresh_orders(kind, ids)
+    sales_fact.refresh_orders(kind, ids)
+    dashboard_snapshots.orders_changed()
+    live_kpi.notify_change()
@@ -0,0 +1,134 @@
+# =================================================================
+# === HISTÓRIA OBJEDNÁVOK / SPRÁV: KEYSET STRÁNKOVANIE ================
+# =================================================================
+#
+# Portály (B2B, B2C) nečítajú celú históriu zákazníka naraz ani cez
+# OFFSET (ten musí preskočiť všetky predchádzajúce riadky), ale po
+# stránkach podľa (dátum DESC, id DESC):
+#
+#   WHERE <zákazník> AND (dátum < :d OR (dátum = :d AND id < :id))
+#   ORDER BY dátum DESC, id DESC LIMIT n+1
+#
+# Kurzor je posledný riadok predchádzajúcej stránky (base64 JSON), takže
+# každá stránka je jeden rozsahový prechod indexu (zákazník, dátum, id) –
+# prvá stránka trvá rovnako pri 10 aj 10 000 objednávkach. Riadky bez
+# dátumu (NULL) idú v MySQL pri DESC až na koniec, kurzor ich pozná.
+#
+# Indexy si moduly registrujú (register_index) a vytvára ich migrácia
+# migrate_indexes() zo schedulera – nie prvý request po nasadení.
+# =================================================================
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import db_connector
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# (tabuľka, názov indexu, stĺpce alebo () -> stĺpce) – vytvára ich migrate_indexes()
+_indexes: List[Tuple[str, str, Any]] = []
+
+
+def register_index(table: str, name: str, columns) -> None:
+    """Zložený index pre keyset stránkovanie; `columns` môže byť funkcia (stĺpce podľa schémy)."""
+    if not any(t == table and n == name for t, n, _ in _indexes):
+        _indexes.append((table, name, columns))
+
+
+def ensure_index(table: str, name: str, columns: Sequence[str]) -> bool:
+    """Vytvorí zložený index, ak chýba a tabuľka existuje (chyba sa len zaloguje)."""
+    try:
+        if not db_connector.execute_query("""
+            SELECT 1 FROM INFORMATION_SCHEMA.TABLES
+             WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s LIMIT 1
+        """, (table,), fetch='one'):
+            return False
+        exists = db_connector.execute_query("""
+            SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+             WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s LIMIT 1
+        """, (table, name), fetch='one')
+        if not exists:
+            db_connector.execute_query(
+                f"CREATE INDEX {name} ON {table}({', '.join(columns)})", fetch='none')
+        return True
+    except Exception as e:
+        print(f"[HISTÓRIA] index {table}.{name}: {e}")
+        return False
+
+
+def migrate_indexes() -> Dict[str, bool]:
+    """
+    Migrácia (plánovač po štarte / `python order_history.py`): CREATE INDEX nad
+    veľkými tabuľkami objednávok a správ nebeží vo webovom requeste – bez
+    indexu je stránka len pomalšia, nie nesprávna.
+    """
+    out = {}
+    for table, name, columns in list(_indexes):
+        cols = columns() if callable(columns) else columns
+        out[f"{table}.{name}"] = bool(cols) and ensure_index(table, name, cols)
+    return out
+
+
+def _clamp(limit) -> int:
+    try:
+        n = int(limit or DEFAULT_LIMIT)
+    except (TypeError, ValueError):
+        n = DEFAULT_LIMIT
+    return max(1, min(MAX_LIMIT, n))
+
+
+def encode_cursor(ts, row_id) -> str:
+    if isinstance(ts, (datetime, date)):
+        ts = ts.isoformat(sep=" ") if isinstance(ts, datetime) else ts.isoformat()
+    raw = json.dumps([ts, int(row_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[Optional[str], int]]:
+    """(dátum alebo None, id) alebo None pri prázdnom/neplatnom kurzore."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(str(token) + "=" * (-len(str(token)) % 4))
+        ts, row_id = json.loads(raw.decode("utf-8"))
+        return (str(ts) if ts is not None else None), int(row_id)
+    except Exception:
+        return None
+
+
+def keyset_page(table: str, columns: str, where: str, params: Sequence[Any], *,
+                ts_col: str, ts_key: str, cursor: Optional[str] = None,
+                limit=None, id_col: str = "id") -> Dict[str, Any]:
+    """
+    Jedna stránka riadkov `table` (najnovšie prvé). `columns` musí obsahovať
+    id a dátum (pod kľúčom `ts_key`). Vráti {"rows", "next_cursor"}.
+    """
+    n = _clamp(limit)
+    sql = f"SELECT {columns} FROM {table} WHERE ({where})"
+    args: List[Any] = list(params)
+    pos = decode_cursor(cursor)
+    if pos:
+        ts, last_id = pos
+        if ts is None:
+            sql += f" AND {ts_col} IS NULL AND {id_col} < %s"
+            args.append(last_id)
+        else:
+            sql += f" AND ({ts_col} < %s OR ({ts_col} = %s AND {id_col} < %s) OR {ts_col} IS NULL)"
+            args += [ts, ts, last_id]
+    sql += f" ORDER BY {ts_col} DESC, {id_col} DESC LIMIT %s"
+    args.append(n + 1)
+
+    rows = db_connector.execute_query(sql, tuple(args), fetch='all') or []
+    next_cursor = None
+    if len(rows) > n:
+        rows = rows[:n]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.get(ts_key), last.get("id"))
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+if __name__ == "__main__":
+    import app  # noqa: F401 – načíta moduly, ktoré si indexy registrujú
+    print(json.dumps(migrate_indexes(), ensure_ascii=False))
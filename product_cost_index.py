@@ -0,0 +1,301 @@
+# =================================================================
+# === INDEX NÁKLADOV PRODUKTOV (posledná / priemerná cena per EAN) =
+# =================================================================
+#
+# product_cost_index(ean, ...) – jeden riadok na finálny produkt:
+#   last_unit_cost      – cena_za_jednotku poslednej ukončenej dávky (€/kg alebo €/ks podľa MJ)
+#   last_cost_per_kg    – celkova_cena_surovin / realne_mnozstvo_kg poslednej dávky
+#   rolling_avg_cost    – vážený priemer cena_za_jednotku cez všetky dávky (váha = kg/ks podľa MJ)
+#   last_purchase_price – nakupna_cena karty v `sklad` (EAN alebo názov; pri viacerých najvyššia)
+#   avg_purchase_cost   – vážený priemer z príjmov Sklad 2 (ak taká tabuľka existuje)
+#
+# ERP export, denný export VYROBKY.CSV, prehľad skladu a priemery cien tak
+# robia jeden indexovaný LEFT JOIN namiesto korelovaného poddotazu na
+# zaznamy_vyroba / sklad pre každý produkt.
+#
+# Dávka sa k produktu priraďuje cez zaznamy_vyroba.produkt_ean, inak cez
+# názov výrobku (TRIM). refresh_products() prepočíta len dané EAN-y – volá
+# sa po príjme výroby v expedícii, po krájaní, po príjme na sklad, po úprave
+# skladovej karty a po importe stavu skladu z ERP. Prvé naplnenie robí
+# build_initial() zo schedulera chvíľu po štarte (nie request) – dovtedy
+# čitatelia dostanú z LEFT JOINu NULL, ako pri produkte bez dávky;
+# rebuild_all() (v noci zo schedulera, ručne `python product_cost_index.py`)
+# prepočíta všetko a zachytí zápisy, ktoré hook obišli.
+# =================================================================
+import argparse
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import db_connector
+
+# kandidáti na tabuľku príjmov Sklad 2: (tabuľka, ean, množstvo, cena)
+_PURCHASE_SOURCES = [
+    ('produkty_prijmy',  'ean',          'mnozstvo_kg', 'cena_eur_kg'),
+    ('prijmy_sklad2',    'ean',          'mnozstvo_kg', 'cena_kg'),
+    ('tovar_prijmy',     'ean_produktu', 'mnozstvo',    'cena_za_jednotku'),
+    ('prijmy_produktov', 'ean',          'mnozstvo',    'cena'),
+]
+
+_COLS = ("last_unit_cost", "last_cost_per_kg", "rolling_avg_cost",
+         "last_purchase_price", "avg_purchase_cost", "last_batch_id", "last_batch_at")
+
+_schema_ready = False
+
+
+def _has_col(table: str, col: str) -> bool:
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s
+         LIMIT 1
+    """, (table, col), fetch='one')
+    return bool(r)
+
+
+def _table_exists(table: str) -> bool:
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.TABLES
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s
+         LIMIT 1
+    """, (table,), fetch='one')
+    return bool(r)
+
+
+def ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS product_cost_index (
+            ean                 VARCHAR(64)   NOT NULL PRIMARY KEY,
+            last_unit_cost      DECIMAL(12,4) NULL,
+            last_cost_per_kg    DECIMAL(12,4) NULL,
+            rolling_avg_cost    DECIMAL(12,4) NULL,
+            last_purchase_price DECIMAL(12,4) NULL,
+            avg_purchase_cost   DECIMAL(12,4) NULL,
+            last_batch_id       VARCHAR(64)   NULL,
+            last_batch_at       DATETIME      NULL,
+            updated_at          TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = True
+
+
+def _in(values: List[Any]) -> str:
+    return ",".join(["%s"] * len(values))
+
+
+def _f(v) -> float:
+    try:
+        return float(v or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# --- VÝPOČET ------------------------------------------------------------------
+def _compute(eans: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Hodnoty indexu pre dané EAN-y (None = všetky produkty)."""
+    from expedition_handler import _zv_name_col
+
+    where, params = "ean IS NOT NULL AND ean <> ''", []
+    if eans is not None:
+        if not eans:
+            return {}
+        where += f" AND ean IN ({_in(eans)})"
+        params = list(eans)
+    products = db_connector.execute_query(
+        f"SELECT ean, TRIM(nazov_vyrobku) AS name, mj FROM produkty WHERE {where}", tuple(params)) or []
+    if not products:
+        return {}
+
+    out: Dict[str, Dict[str, Any]] = {}
+    by_name: Dict[str, str] = {}
+    for p in products:
+        ean = str(p["ean"]).strip()
+        out[ean] = {c: None for c in _COLS}
+        out[ean].update({"_mj": (p.get("mj") or "kg").lower(), "_units": 0.0, "_cost": 0.0,
+                         "_last": None, "_last_kg": None})
+        if p.get("name"):
+            by_name[p["name"]] = ean
+
+    # 1) výrobné dávky
+    zv = _zv_name_col()
+    has_pean = _has_col("zaznamy_vyroba", "produkt_ean")
+    bwhere = ["(COALESCE(cena_za_jednotku,0) > 0 OR (celkova_cena_surovin IS NOT NULL AND realne_mnozstvo_kg IS NOT NULL))"]
+    bparams: List[Any] = []
+    if eans is not None:
+        names = list(by_name)
+        match = []
+        if names:
+            match.append(f"{zv} IN ({_in(names)})")
+            bparams += names
+        if has_pean:
+            match.append(f"produkt_ean IN ({_in(list(out))})")
+            bparams += list(out)
+        bwhere.append("(" + " OR ".join(match or ["FALSE"]) + ")")
+    rows = db_connector.execute_query(f"""
+        SELECT id_davky, TRIM({zv}) AS name, {'produkt_ean' if has_pean else 'NULL'} AS produkt_ean,
+               datum_ukoncenia, datum_vyroby, cena_za_jednotku,
+               realne_mnozstvo_kg, realne_mnozstvo_ks, celkova_cena_surovin
+          FROM zaznamy_vyroba
+         WHERE {' AND '.join(bwhere)}
+    """, tuple(bparams)) or []
+
+    for r in rows:
+        pean = str(r.get("produkt_ean") or "").strip()
+        ean = pean if pean in out else by_name.get(r.get("name") or "")
+        if not ean:
+            continue
+        rec = out[ean]
+        unit_cost = _f(r.get("cena_za_jednotku"))
+        if unit_cost > 0:
+            # ako ORDER BY datum_ukoncenia DESC, id_davky DESC (NULL dátum je najstarší)
+            key = (r["datum_ukoncenia"] is not None, r["datum_ukoncenia"] or datetime.min, str(r["id_davky"]))
+            if rec["_last"] is None or key > rec["_last"]:
+                rec["_last"] = key
+                rec["last_unit_cost"] = round(unit_cost, 4)
+                rec["last_batch_id"] = str(r["id_davky"])
+                rec["last_batch_at"] = r["datum_ukoncenia"]
+            units = _f(r.get("realne_mnozstvo_kg") if rec["_mj"] == "kg" else r.get("realne_mnozstvo_ks"))
+            rec["_units"] += units
+            rec["_cost"] += units * unit_cost
+        kg = _f(r.get("realne_mnozstvo_kg"))
+        if r.get("celkova_cena_surovin") is not None and r.get("realne_mnozstvo_kg") is not None and kg != 0:
+            at = r["datum_ukoncenia"] or r["datum_vyroby"]
+            key = (at is not None, at or datetime.min)
+            if rec["_last_kg"] is None or key > rec["_last_kg"]:
+                rec["_last_kg"] = key
+                rec["last_cost_per_kg"] = round(_f(r["celkova_cena_surovin"]) / kg, 4)
+
+    for rec in out.values():
+        if rec["_units"] > 0:
+            rec["rolling_avg_cost"] = round(rec["_cost"] / rec["_units"], 4)
+
+    # 2) nákupná cena z karty v `sklad` (EAN alebo názov)
+    eans_all = list(out)
+    pfilter = f"WHERE p.ean IN ({_in(eans_all)})" if eans is not None else ""
+    srows = db_connector.execute_query(f"""
+        SELECT p.ean, MAX(s.nakupna_cena) AS price
+          FROM produkty p
+          JOIN sklad s ON (s.ean = p.ean AND s.ean <> '') OR s.nazov = p.nazov_vyrobku
+         {pfilter}
+         GROUP BY p.ean
+    """, tuple(eans_all) if eans is not None else None)
+    for r in srows or []:
+        ean = str(r["ean"] or "").strip()
+        if ean in out and r.get("price") is not None:
+            out[ean]["last_purchase_price"] = round(_f(r["price"]), 4)
+
+    # 3) priemerná nákupná cena z príjmov Sklad 2 (prvá existujúca tabuľka s dátami)
+    for tbl, ce, cq, cp in _PURCHASE_SOURCES:
+        if not (_has_col(tbl, ce) and _has_col(tbl, cq) and _has_col(tbl, cp)):
+            continue
+        pwhere = f"WHERE {ce} IN ({_in(eans_all)})" if eans is not None else ""
+        prow = db_connector.execute_query(
+            f"SELECT {ce} AS ean, SUM({cq}) AS qty, SUM({cq}*{cp}) AS val FROM {tbl} {pwhere} GROUP BY {ce}",
+            tuple(eans_all) if eans is not None else None) or []
+        found = False
+        for r in prow:
+            ean = str(r["ean"] or "").strip()
+            q = _f(r["qty"])
+            if ean in out and q > 0:
+                out[ean]["avg_purchase_cost"] = round(_f(r["val"]) / q, 4)
+                found = True
+        if found:
+            break
+
+    return out
+
+
+def _store(values: Dict[str, Dict[str, Any]], replace_all: bool = False) -> int:
+    rows = [(ean, *[v[c] for c in _COLS]) for ean, v in values.items()]
+
+    def work(conn):
+        cur = conn.cursor()
+        if replace_all:
+            cur.execute("DELETE FROM product_cost_index")
+        for i in range(0, len(rows), 1000):
+            cur.executemany(f"""
+                INSERT INTO product_cost_index (ean, {', '.join(_COLS)})
+                VALUES (%s, {_in(list(_COLS))})
+                ON DUPLICATE KEY UPDATE {', '.join(f'{c}=VALUES({c})' for c in _COLS)}
+            """, rows[i:i + 1000])
+        cur.close()
+
+    db_connector.with_transaction(work)
+    return len(rows)
+
+
+# --- API ----------------------------------------------------------------------
+def refresh_products(eans: Iterable[str]) -> None:
+    """Po ukončení dávky / príjme tovaru: prepočíta index pre dané EAN-y. Nikdy nevyhodí chybu."""
+    eans = sorted({str(e).strip() for e in (eans or []) if e and str(e).strip()})
+    if not eans:
+        return
+    try:
+        ensure_schema()
+        _store(_compute(eans))
+    except Exception as e:
+        print(f"[COST INDEX] refresh {eans[:5]}: {e}")
+
+
+def refresh_stock_items(names: Iterable[str]) -> None:
+    """Po príjme na sklad (karty `sklad` podľa názvu): prepočíta produkty naviazané na tieto karty."""
+    names = sorted({str(n).strip() for n in (names or []) if n and str(n).strip()})
+    if not names:
+        return
+    try:
+        rows = db_connector.execute_query(f"""
+            SELECT DISTINCT p.ean
+              FROM sklad s
+              JOIN produkty p ON (p.ean = s.ean AND s.ean <> '') OR p.nazov_vyrobku = s.nazov
+             WHERE s.nazov IN ({_in(names)})
+        """, tuple(names)) or []
+        refresh_products(r["ean"] for r in rows)
+    except Exception as e:
+        print(f"[COST INDEX] sklad {names[:5]}: {e}")
+
+
+def rebuild_all() -> Dict[str, Any]:
+    """Kompletný prepočet indexu (noc / ručne)."""
+    ensure_schema()
+    return {"products": _store(_compute(None), replace_all=True)}
+
+
+def build_initial() -> Dict[str, Any]:
+    """
+    Po štarte plánovača: ak index nemá riadok pre každý produkt s EAN (nový
+    index, alebo ho doteraz plnili len hooky), prepočíta ho celý.
+    """
+    ensure_schema()
+    have = db_connector.execute_query("SELECT COUNT(*) AS n FROM product_cost_index", fetch='one') or {}
+    want = db_connector.execute_query(
+        "SELECT COUNT(DISTINCT ean) AS n FROM produkty WHERE ean IS NOT NULL AND ean <> ''", fetch='one') or {}
+    if int(have.get("n") or 0) >= int(want.get("n") or 0):
+        return {"built": False, "products": int(have.get("n") or 0)}
+    return {"built": True, **rebuild_all()}
+
+
+def cost_map(eans: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """{ean: riadok indexu} – pre spotrebiteľov, ktorí nerobia JOIN v SQL."""
+    ensure_schema()
+    if eans is None:
+        rows = db_connector.execute_query("SELECT * FROM product_cost_index") or []
+    else:
+        eans = [str(e).strip() for e in eans if e]
+        if not eans:
+            return {}
+        rows = db_connector.execute_query(
+            f"SELECT * FROM product_cost_index WHERE ean IN ({_in(eans)})", tuple(eans)) or []
+    return {r["ean"]: r for r in rows}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Prepočet indexu nákladov produktov (product_cost_index)")
+    ap.add_argument("--ean", action="append", help="len dané EAN-y (opakovateľné); bez neho celý index")
+    args = ap.parse_args()
+    if args.ean:
+        refresh_products(args.ean)
+        print(json.dumps({"refreshed": args.ean}, ensure_ascii=False))
+    else:
+        print(json.dumps(rebuild_all(), ensure_ascii=False))
@@ -201,9 +201,10 @@ def get_running_production_tasks_by_category() -> Dict[str, List[Dict[str, Any]]
         out.setdefault(cat, []).append(r)
     return out
 
-def get_planned_tasks_by_date() -> Dict[str, Any]:
+def get_planned_task_rows() -> List[Dict[str, Any]]:
+    """Naplánované (ešte nespustené) výrobné úlohy – plochý zoznam (aj pre MRP)."""
     zv_name = _zv_name_col()
-    rows = db_connector.execute_query(f"""
+    return db_connector.execute_query(f"""
         SELECT
             zv.id_davky AS logId,
             zv.{zv_name} AS productName,
@@ -216,6 +217,9 @@ def get_planned_tasks_by_date() -> Dict[str, Any]:
          ORDER BY zv.datum_vyroby ASC, p.kategoria_pre_recepty
     """) or []
 
+def get_planned_tasks_by_date() -> Dict[str, Any]:
+    rows = get_planned_task_rows()
+
     grouped = {}
     today = datetime.now().date()
     tomorrow = today + timedelta(days=1)
@@ -0,0 +1,290 @@
+# =================================================================
+# === ČASOVAČ PRIPOMIENOK: HALDA TERMÍNOV NAMIESTO MINÚTOVÉHO SKENU ===
+# =================================================================
+#
+# Kalendárové notifikácie (calendar_event_notifications) a auto-štart
+# hygieny (hygiene_tasks.scheduled_time) sa nehľadajú každú minútu.
+# Vlákno drží v pamäti haldu (termín, druh, id) pre položky do horizontu
+# (teraz + REMINDER_HORIZON_S) a spí presne do najbližšieho termínu:
+#
+#   - termín nastal  -> všetky splatné položky sa odošlú jednou dávkou
+#                       (notifikácie aj s kontaktmi jedným dotazom, stavy
+#                       jednou transakciou; hygiena jedným INSERTom),
+#   - horizont       -> načíta sa len ďalší úsek (starý, nový horizont],
+#                       horizont sa uloží do reminder_timer_state,
+#   - zmena dát      -> web po uložení udalosti / hygienickej úlohy zvýši
+#                       verziu v data_versions ('reminders', 'hygiene_plan');
+#                       časovač ju kontroluje každých REMINDER_SYNC_S
+#                       (jeden PK dotaz) a znovu načíta všetky PENDING
+#                       notifikácie v okne [teraz - CATCHUP, horizont] (aj
+#                       staršie id, ktorým sa posunul planned_at; _queued
+#                       drží platný termín každého id, neplatné záznamy
+#                       v halde sa pri výbere preskočia), resp. prepočíta
+#                       plán hygieny.
+#
+# Zrušené / zmenené notifikácie sa z haldy nemažú – pri odoslaní sa berú
+# len riadky, ktoré sú ešte PENDING. Keď odoslanie zlyhá, id sa vrátia do
+# haldy s pôvodným termínom a skúsia sa znova. Po štarte (a po prevzatí
+# lídra) sa dobehnú položky zmeškané najviac o REMINDER_CATCHUP_S.
+#
+# Beží v procese plánovača (scheduler.py), v klastri len na lídrovi.
+# =================================================================
+import heapq
+import itertools
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pytz import timezone
+
+import db_connector
+import http_cache
+import hygiene_handler
+import order_history
+import tasks
+
+ENABLED    = os.getenv("REMINDER_TIMER", "1").strip().lower() not in ("0", "false", "no", "off")
+HORIZON_S  = int(os.getenv("REMINDER_HORIZON_S", "3600"))
+SYNC_S     = float(os.getenv("REMINDER_SYNC_S", "5"))
+CATCHUP_S  = int(os.getenv("REMINDER_CATCHUP_S", os.getenv("CAL_NOTIF_WINDOW_SEC", "60")))
+BATCH_MAX  = int(os.getenv("REMINDER_BATCH_MAX", "200"))
+
+TZ = timezone(os.getenv("APP_TZ", "Europe/Bratislava"))
+STATE_NAME = "reminders"
+VERSION_NAMES = ("reminders", "hygiene_plan")
+
+log = logging.getLogger("erp-scheduler")
+
+_schema_ready = False
+
+
+def ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS reminder_timer_state (
+            name              VARCHAR(64)  PRIMARY KEY,
+            horizon_at        DATETIME     NOT NULL,
+            last_notif_id     BIGINT       NOT NULL DEFAULT 0,
+            dispatched_until  DATETIME     NULL,
+            updated_at        TIMESTAMP    DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = True
+
+
+# index na (status, planned_at) vytvorí migrácia order_history.migrate_indexes()
+order_history.register_index("calendar_event_notifications", "idx_notif_status_planned",
+                             ("status", "planned_at"))
+
+
+def _now() -> datetime:
+    """Lokálny čas bez tzinfo – tak sú uložené planned_at aj hygiene_log."""
+    return datetime.now(TZ).replace(tzinfo=None)
+
+
+def _read_versions() -> Dict[str, int]:
+    try:
+        rows = db_connector.execute_query(
+            f"SELECT name, version FROM data_versions WHERE name IN ({','.join(['%s'] * len(VERSION_NAMES))})",
+            VERSION_NAMES) or []
+    except Exception:
+        rows = []
+    return {r["name"]: int(r["version"] or 0) for r in rows}
+
+
+class ReminderTimer(threading.Thread):
+    """Halda termínov + jedno vlákno, ktoré spí do najbližšieho z nich."""
+
+    def __init__(self, wrap: Callable[[Callable], Callable]):
+        super().__init__(name="reminder-timer", daemon=True)
+        self.stop_event = threading.Event()
+        self.wrap = wrap
+        self.heap: List[Tuple[datetime, int, str, int, int]] = []
+        self._seq = itertools.count()
+        self._queued: Dict[int, datetime] = {}   # id notifikácie -> platný termín v halde
+        self._hyg_gen = 0            # plán hygieny po zmene – staršie položky sa ignorujú
+        self.horizon: Optional[datetime] = None
+        self._versions: Dict[str, int] = {}
+        self._retry_at: Optional[datetime] = None   # po zlyhaní odoslania nie skôr
+
+    # --- plnenie haldy -------------------------------------------------
+    def _push(self, due: datetime, kind: str, key: int, gen: int = 0) -> None:
+        heapq.heappush(self.heap, (due, next(self._seq), kind, key, gen))
+
+    def _load_notifications(self, where: str, params: tuple) -> None:
+        rows = db_connector.execute_query(f"""
+            SELECT id, planned_at FROM calendar_event_notifications
+             WHERE status = 'PENDING' AND {where}
+        """, params, fetch='all') or []
+        for r in rows:
+            nid, due = int(r["id"]), r.get("planned_at")
+            if due is None or self._queued.get(nid) == due:
+                continue
+            # presunutý termín: starý záznam v halde ostane, pri výbere sa preskočí
+            self._queued[nid] = due
+            self._push(due, "cal", nid)
+
+    def _load_hygiene(self, lower: datetime, upper: datetime) -> None:
+        """Termíny auto-štartu v (lower, upper] – plán sa číta celý (pár riadkov)."""
+        schedule = hygiene_handler.get_autostart_schedule()
+        day = lower.date()
+        while day <= upper.date():
+            if day.weekday() < 5:
+                midnight = datetime.combine(day, datetime.min.time())
+                for task_id, tod in schedule:
+                    due = midnight + tod
+                    if lower < due <= upper:
+                        self._push(due, "hyg", task_id, self._hyg_gen)
+            day += timedelta(days=1)
+
+    def _save_state(self, dispatched_until: Optional[datetime] = None) -> None:
+        db_connector.execute_query("""
+            INSERT INTO reminder_timer_state (name, horizon_at, dispatched_until)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE horizon_at = VALUES(horizon_at),
+                                    dispatched_until = COALESCE(VALUES(dispatched_until), dispatched_until)
+        """, (STATE_NAME, self.horizon, dispatched_until), fetch='none')
+
+    def _load_initial(self) -> None:
+        ensure_schema()
+        now = _now()
+        lower = now - timedelta(seconds=CATCHUP_S)
+        state = db_connector.execute_query(
+            "SELECT dispatched_until FROM reminder_timer_state WHERE name=%s",
+            (STATE_NAME,), fetch='one') or {}
+        # hygiena: čo predchádzajúci beh už odoslal, neopakujeme (log by aj tak existoval)
+        hyg_lower = max(lower, state.get("dispatched_until") or lower)
+        self.horizon = now + timedelta(seconds=HORIZON_S)
+        self._versions = _read_versions()
+        self._load_notifications("planned_at >= %s AND planned_at <= %s", (lower, self.horizon))
+        self._load_hygiene(hyg_lower, self.horizon)
+        self._save_state()
+        log.info("Reminder timer: %d položiek do %s.", len(self.heap), self.horizon)
+
+    def _extend_horizon(self, now: datetime) -> None:
+        old = self.horizon
+        self.horizon = now + timedelta(seconds=HORIZON_S)
+        self._load_notifications("planned_at > %s AND planned_at <= %s", (old, self.horizon))
+        self._load_hygiene(old, self.horizon)
+        self._save_state()
+
+    def _sync(self, now: datetime) -> None:
+        versions = _read_versions()
+        if versions.get("reminders", 0) != self._versions.get("reminders", 0):
+            # celé okno – upravená notifikácia môže mať staré id a nový planned_at
+            self._load_notifications("planned_at >= %s AND planned_at <= %s",
+                                     (now - timedelta(seconds=CATCHUP_S), self.horizon))
+        if versions.get("hygiene_plan", 0) != self._versions.get("hygiene_plan", 0):
+            self._hyg_gen += 1
+            self._load_hygiene(now, self.horizon)
+        self._versions = versions
+
+    # --- odoslanie ------------------------------------------------------
+    def _pop_due(self, now: datetime) -> Tuple[List[Tuple[datetime, int]], List[Tuple[datetime, int]]]:
+        """Splatné notifikácie a úlohy hygieny ako (termín, id) – termín kvôli vráteniu do haldy."""
+        cal, hyg = [], {}
+        while self.heap and self.heap[0][0] <= now and len(cal) + len(hyg) < BATCH_MAX:
+            due, _, kind, key, gen = heapq.heappop(self.heap)
+            if kind == "cal":
+                if self._queued.get(key) != due:
+                    continue
+                del self._queued[key]
+                cal.append((due, key))
+            elif gen == self._hyg_gen:
+                hyg.setdefault(key, due)
+        return cal, sorted((due, tid) for tid, due in hyg.items())
+
+    def _dispatch(self, now: datetime) -> None:
+        cal, hyg = self._pop_due(now)
+        if not cal and not hyg:
+            return
+        if cal:
+            try:
+                tasks.send_calendar_reminders([nid for _, nid in cal])
+            except Exception:
+                # vrátiť s pôvodným termínom – ďalší pokus po REMINDER_SYNC_S
+                for due, nid in cal:
+                    if nid not in self._queued:
+                        self._queued[nid] = due
+                        self._push(due, "cal", nid)
+                self._retry_at = now + timedelta(seconds=SYNC_S)
+                log.exception("Reminder timer: odoslanie %d notifikácií zlyhalo – zopakujem.", len(cal))
+        if hyg:
+            try:
+                res = hygiene_handler.start_hygiene_tasks([tid for _, tid in hyg], now)
+            except Exception:
+                # rovnako ako notifikácie – vrátiť do haldy, inak sa úloha v ten deň nespustí
+                for due, tid in hyg:
+                    self._push(due, "hyg", tid, self._hyg_gen)
+                self._retry_at = now + timedelta(seconds=SYNC_S)
+                log.exception("Reminder timer: auto-štart %d úloh hygieny zlyhal – zopakujem.", len(hyg))
+            else:
+                if res.get("created"):
+                    log.info("Hygiena auto-štart vytvoril: %s", res)
+        self._save_state(dispatched_until=now)
+
+    def run(self) -> None:
+        load_initial = self.wrap(self._load_initial)
+        dispatch = self.wrap(self._dispatch)
+        extend = self.wrap(self._extend_horizon)
+        sync = self.wrap(self._sync)
+        while not self.stop_event.is_set():
+            try:
+                load_initial()
+                break
+            except Exception as e:
+                log.warning("Reminder timer: načítanie zlyhalo (%s) – skúsim znova.", e)
+                self.stop_event.wait(SYNC_S)
+
+        next_sync = _now() + timedelta(seconds=SYNC_S)
+        while not self.stop_event.is_set():
+            now = _now()
+            try:
+                if self.heap and self.heap[0][0] <= now and (self._retry_at is None or now >= self._retry_at):
+                    self._retry_at = None
+                    dispatch(now)
+                    continue
+                if now >= self.horizon - timedelta(seconds=HORIZON_S / 2.0):
+                    extend(now)
+                if now >= next_sync:
+                    sync(now)
+                    next_sync = now + timedelta(seconds=SYNC_S)
+            except Exception:
+                log.exception("Reminder timer ERROR")
+                next_sync = now + timedelta(seconds=SYNC_S)
+
+            wake = min(next_sync, self.horizon - timedelta(seconds=HORIZON_S / 2.0))
+            if self.heap:
+                wake = min(wake, max(self.heap[0][0], self._retry_at or self.heap[0][0]))
+            self.stop_event.wait(max(0.0, (wake - _now()).total_seconds()))
+
+
+_timer: Optional[ReminderTimer] = None
+
+
+def start(wrap: Optional[Callable[[Callable], Callable]] = None) -> bool:
+    """Spustí časovač na pozadí (raz za proces). `wrap` obalí každý krok (DB/Flask kontext)."""
+    global _timer
+    if not ENABLED or (_timer and _timer.is_alive()):
+        return False
+    _timer = ReminderTimer(wrap or (lambda f: f))
+    _timer.start()
+    return True
+
+
+def stop(timeout: Optional[float] = None) -> None:
+    global _timer
+    if _timer:
+        _timer.stop_event.set()
+        if timeout is not None and _timer.is_alive():
+            _timer.join(timeout)
+        _timer = None
+
+
+def invalidate() -> None:
+    """Po zápise pripomienok mimo app.py (import, skripty) – časovač ich dočíta pri najbližšom sync."""
+    http_cache.bump("reminders")
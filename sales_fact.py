@@ -0,0 +1,693 @@
+# =================================================================
+# === FAKTY PREDAJA: ZÁKAZNÍK × PRODUKT × DEŇ × KANÁL ================
+# =================================================================
+#
+# Reporty (Zákazník 360, TOP B2C zákazníci, prehľad B2C zákazníkov,
+# história predajov produktu, report akciových predajov) nečítajú surové
+# objednávky s YEAR()/MONTH() filtrami a OR-joinom na zákazníkov, ale
+# udržiavané tabuľky:
+#
+#   sales_order_fact  – 1 riadok na objednávku (zákazník už vyriešený,
+#                       stav, dátumy, súčty položiek a finálna suma)
+#   sales_fact        – 1 riadok na položku objednávky (qty, net, gross)
+#   sales_monthly     – mesačný súčet (kanál, zákazník, mesiac, EAN)
+#                       bez zrušených objednávok
+#
+# refresh_order()/refresh_orders() prepočíta fakty vybraných objednávok
+# a dotknuté mesiace rollupu – volá ho order_events.on_orders_changed()
+# po každom zápise objednávky (uloženie, úprava, dokončenie, zrušenie,
+# EDI import, vystavenie dokladov). reconcile() v noci prepočíta
+# posledných SALES_FACT_RECONCILE_DAYS dní a zachytí zápisy mimo hookov.
+#
+# Prvé naplnenie (build_initial) nebeží v requeste: spustí ho plánovač
+# po štarte (alebo ručne `python sales_fact.py --rebuild`), v klastri
+# len raz vďaka GET_LOCK. Kým nie je hotové (sales_fact_state), čítacie
+# funkcie použijú pôvodné dotazy nad objednávkami.
+#
+# Zákazník (customer_key): B2B = b2b_objednavky.zakaznik_id (login / interné
+# číslo manuálneho zákazníka), B2C = b2b_zakaznici.id typu B2C.
+# =================================================================
+import argparse
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import mysql.connector
+
+import db_connector
+
+CANCELLED_STATES = ("Zrušená", "Zrusena", "Stornovaná")
+FINISHED_STATES = ("Hotová", "Expedovaná", "Vybavená")
+RECONCILE_DAYS = int(os.getenv("SALES_FACT_RECONCILE_DAYS", "35"))
+_BUILD_LOCK = "erp:sales_fact_build"
+
+_schema_ready = False
+_built = False
+_columns: Dict[str, Dict[str, str]] = {}
+
+
+def _cols(table: str) -> Dict[str, str]:
+    """{stĺpec: DATA_TYPE} – zisťuje sa raz za proces."""
+    if table not in _columns:
+        rows = db_connector.execute_query("""
+            SELECT COLUMN_NAME AS c, DATA_TYPE AS t FROM INFORMATION_SCHEMA.COLUMNS
+             WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,), fetch='all') or []
+        _columns[table] = {r["c"]: (r["t"] or "").lower() for r in rows}
+    return _columns[table]
+
+
+def _first(table: str, alias: str, candidates: List[str], default: str = "NULL") -> str:
+    cols = _cols(table)
+    found = [f"{alias}.{c}" for c in candidates if c in cols]
+    if not found:
+        return default
+    return found[0] if len(found) == 1 else f"COALESCE({', '.join(found)})"
+
+
+def ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS sales_order_fact (
+            channel       VARCHAR(3)    NOT NULL,
+            order_id      INT           NOT NULL,
+            order_no      VARCHAR(64)   NULL,
+            customer_key  VARCHAR(64)   NULL,
+            customer_name VARCHAR(255)  NULL,
+            stav          VARCHAR(32)   NULL,
+            ordered_at    DATETIME      NULL,
+            delivery_day  DATE          NULL,
+            net           DECIMAL(14,2) NOT NULL DEFAULT 0,
+            gross         DECIMAL(14,2) NOT NULL DEFAULT 0,
+            final_gross   DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (channel, order_id),
+            INDEX idx_sof_customer (channel, customer_key, ordered_at),
+            INDEX idx_sof_ordered (channel, ordered_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS sales_fact (
+            channel       VARCHAR(3)    NOT NULL,
+            item_id       INT           NOT NULL,
+            order_id      INT           NOT NULL,
+            customer_key  VARCHAR(64)   NULL,
+            ean           VARCHAR(64)   NULL,
+            name          VARCHAR(255)  NULL,
+            mj            VARCHAR(16)   NULL,
+            stav          VARCHAR(32)   NULL,
+            ordered_at    DATETIME      NULL,
+            delivery_day  DATE          NULL,
+            qty           DECIMAL(14,3) NOT NULL DEFAULT 0,
+            qty_delivered DECIMAL(14,3) NOT NULL DEFAULT 0,
+            unit_price    DECIMAL(14,4) NOT NULL DEFAULT 0,
+            net           DECIMAL(14,2) NOT NULL DEFAULT 0,
+            gross         DECIMAL(14,2) NOT NULL DEFAULT 0,
+            is_akcia      TINYINT(1)    NOT NULL DEFAULT 0,
+            PRIMARY KEY (channel, item_id),
+            INDEX idx_sf_order (channel, order_id),
+            INDEX idx_sf_customer (channel, customer_key, ordered_at),
+            INDEX idx_sf_ean (ean, delivery_day),
+            INDEX idx_sf_akcia (channel, is_akcia, delivery_day)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS sales_monthly (
+            channel      VARCHAR(3)    NOT NULL,
+            customer_key VARCHAR(64)   NOT NULL,
+            ym           INT           NOT NULL,
+            ean          VARCHAR(64)   NOT NULL,
+            name         VARCHAR(255)  NULL,
+            mj           VARCHAR(16)   NULL,
+            qty          DECIMAL(16,3) NOT NULL DEFAULT 0,
+            net          DECIMAL(16,2) NOT NULL DEFAULT 0,
+            gross        DECIMAL(16,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (channel, customer_key, ym, ean)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS sales_fact_state (
+            name      VARCHAR(32) PRIMARY KEY,
+            built_at  DATETIME    NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = True
+
+
+def is_built() -> bool:
+    """Dobehol prvý kompletný prepočet? Dovtedy reporty čítajú pôvodné dotazy."""
+    global _built
+    if _built:
+        return True
+    ensure_schema()
+    row = db_connector.execute_query(
+        "SELECT built_at FROM sales_fact_state WHERE name='initial'", fetch='one')
+    _built = bool(row and row.get("built_at"))
+    return _built
+
+
+# -----------------------------------------------------------------
+# SQL zdrojov (B2B / B2C) – stĺpce sa zisťujú podľa schémy
+# -----------------------------------------------------------------
+def _b2c_join_parts() -> List[str]:
+    """Podmienky párovania b2c_objednavky o ↔ b2b_zakaznici z (podľa existujúcich stĺpcov)."""
+    cols = _cols("b2c_objednavky")
+    parts = []
+    if "zakaznik_id" in cols:
+        numeric = any(k in cols["zakaznik_id"] for k in ("int", "decimal", "float", "double", "numeric"))
+        parts.append("o.zakaznik_id = z.id" if numeric else "o.zakaznik_id = z.zakaznik_id")
+    if "customer_id" in cols:
+        parts.append("o.customer_id = z.id")
+    if "user_id" in cols:
+        parts.append("o.user_id = z.id")
+    return parts
+
+
+def _b2c_customer_expr() -> str:
+    parts = _b2c_join_parts()
+    if not parts:
+        return "NULL"
+    return (f"(SELECT CAST(MIN(z.id) AS CHAR) FROM b2b_zakaznici z "
+            f"WHERE z.typ='B2C' AND ({' OR '.join(parts)}))")
+
+
+def _orders_select(kind: str, where: str) -> Optional[str]:
+    if kind == "b2b":
+        table, customer = "b2b_objednavky", "o.zakaznik_id"
+        name = _first(table, "o", ["nazov_firmy"])
+        final = _first(table, "o", ["finalna_suma", "celkova_suma_s_dph"], "0")
+    else:
+        table, customer = "b2c_objednavky", _b2c_customer_expr()
+        name = _first(table, "o", ["zakaznik_meno", "nazov_firmy"])
+        final = _first(table, "o", ["finalna_suma_s_dph", "finalna_suma", "final_total_s_dph",
+                                    "suma_s_dph", "total_s_dph"], "0")
+    if not _cols(table):
+        return None
+    order_no = _first(table, "o", ["cislo_objednavky", "objednavka_cislo", "order_number"], "CAST(o.id AS CHAR)")
+    ordered_at = _first(table, "o", ["datum_objednavky", "created_at", "created", "datum"])
+    delivery = _first(table, "o", ["pozadovany_datum_dodania"])
+    stav = _first(table, "o", ["stav", "stav_objednavky", "status"])
+    return f"""
+        SELECT '{kind}', o.id, LEFT({order_no}, 64), LEFT({customer}, 64), LEFT({name}, 255),
+               LEFT({stav}, 32), {ordered_at}, DATE({delivery}), 0, 0, COALESCE({final}, 0)
+          FROM {table} o
+         WHERE {where}
+    """
+
+
+def _items_select(kind: str, order_filter: str) -> Optional[str]:
+    table = "b2b_objednavky_polozky" if kind == "b2b" else "b2c_objednavky_polozky"
+    cols = _cols(table)
+    if not cols:
+        return None
+    qty = "COALESCE(p.mnozstvo, 0)"
+    delivered = f"COALESCE(p.dodane_mnozstvo, {qty})" if "dodane_mnozstvo" in cols else qty
+    dph = "COALESCE(p.dph, 20)" if "dph" in cols else "20"
+    if "cena_bez_dph" in cols:
+        price = "COALESCE(p.cena_bez_dph, 0)"
+    elif "cena_s_dph" in cols:
+        price = f"COALESCE(p.cena_s_dph, 0) / (1 + {dph} / 100)"
+    else:
+        price = "0"
+    akcia = "COALESCE(p.is_akcia, 0)" if "is_akcia" in cols else "0"
+    return f"""
+        SELECT f.channel, p.id, f.order_id, f.customer_key, LEFT(p.ean_produktu, 64), LEFT(p.nazov_vyrobku, 255),
+               LEFT(p.mj, 16), f.stav, f.ordered_at, f.delivery_day,
+               {qty}, {delivered}, {price}, {qty} * {price}, {qty} * {price} * (1 + {dph} / 100), {akcia}
+          FROM {table} p
+          JOIN sales_order_fact f ON f.channel = '{kind}' AND f.order_id = p.objednavka_id
+         WHERE {order_filter}
+    """
+
+
+# -----------------------------------------------------------------
+# Prepočet
+# -----------------------------------------------------------------
+def _month_bounds(ym: int) -> Tuple[date, date]:
+    y, m = divmod(ym, 100)
+    start = date(y, m, 1)
+    end = date(y + (m == 12), m % 12 + 1, 1)
+    return start, end
+
+
+def _touched_months(cur, kind: str, fact_where: str, params: tuple) -> Set[Tuple[str, int]]:
+    cur.execute(f"""
+        SELECT DISTINCT f.customer_key, YEAR(f.ordered_at) * 100 + MONTH(f.ordered_at)
+          FROM sales_order_fact f
+         WHERE f.channel = %s AND f.customer_key IS NOT NULL AND f.ordered_at IS NOT NULL AND {fact_where}
+    """, (kind, *params))
+    return {(r[0], int(r[1])) for r in cur.fetchall()}
+
+
+def _rollup_months(cur, kind: str, months: Set[Tuple[str, int]]) -> None:
+    ph = ",".join(["%s"] * len(CANCELLED_STATES))
+    for customer_key, ym in sorted(months):  # pevné poradie zámkov
+        start, end = _month_bounds(ym)
+        cur.execute("DELETE FROM sales_monthly WHERE channel=%s AND customer_key=%s AND ym=%s",
+                    (kind, customer_key, ym))
+        cur.execute(f"""
+            INSERT INTO sales_monthly (channel, customer_key, ym, ean, name, mj, qty, net, gross)
+            SELECT channel, customer_key, %s, ean, MAX(name), MAX(mj), SUM(qty), SUM(net), SUM(gross)
+              FROM sales_fact
+             WHERE channel = %s AND customer_key = %s AND ordered_at >= %s AND ordered_at < %s
+               AND ean IS NOT NULL AND COALESCE(stav, '') NOT IN ({ph})
+             GROUP BY channel, customer_key, ean
+        """, (ym, kind, customer_key, start, end, *CANCELLED_STATES))
+
+
+def _sync(conn, kind: str, fact_where: str, source_where: str, params: tuple, rollup: bool = True) -> int:
+    """
+    Nahradí fakty objednávok vybraných filtrom (fact_where nad sales_order_fact f,
+    source_where nad zdrojovou tabuľkou o, rovnaké parametre) a prepočíta
+    dotknuté mesiace rollupu.
+    """
+    orders_sql = _orders_select(kind, source_where)
+    cur = conn.cursor()
+    try:
+        months = _touched_months(cur, kind, fact_where, params) if rollup else set()
+        cur.execute(f"""
+            DELETE sf FROM sales_fact sf
+              JOIN sales_order_fact f ON f.channel = sf.channel AND f.order_id = sf.order_id
+             WHERE f.channel = %s AND {fact_where}
+        """, (kind, *params))
+        cur.execute(f"DELETE f FROM sales_order_fact f WHERE f.channel = %s AND {fact_where}", (kind, *params))
+        if not orders_sql:
+            _rollup_months(cur, kind, months)
+            return 0
+
+        cur.execute(f"""
+            INSERT INTO sales_order_fact (channel, order_id, order_no, customer_key, customer_name, stav,
+                                          ordered_at, delivery_day, net, gross, final_gross)
+            {orders_sql}
+        """, params)
+        n = cur.rowcount
+        items_sql = _items_select(kind, fact_where)
+        if items_sql:
+            cur.execute(f"""
+                INSERT INTO sales_fact (channel, item_id, order_id, customer_key, ean, name, mj, stav,
+                                        ordered_at, delivery_day, qty, qty_delivered, unit_price, net, gross, is_akcia)
+                {items_sql}
+            """, params)
+            cur.execute(f"""
+                UPDATE sales_order_fact t
+                  JOIN (SELECT sf.order_id, SUM(sf.net) AS net, SUM(sf.gross) AS gross
+                          FROM sales_fact sf
+                          JOIN sales_order_fact f ON f.channel = sf.channel AND f.order_id = sf.order_id
+                         WHERE f.channel = %s AND {fact_where}
+                         GROUP BY sf.order_id) s
+                    ON s.order_id = t.order_id
+                   SET t.net = s.net, t.gross = s.gross
+                 WHERE t.channel = %s
+            """, (kind, *params, kind))
+        if rollup:
+            months |= _touched_months(cur, kind, fact_where, params)
+            _rollup_months(cur, kind, months)
+        return n
+    finally:
+        cur.close()
+
+
+def refresh_orders(kind: str, order_ids: Iterable) -> None:
+    """Prepočíta fakty objednávok (kind = 'b2b' | 'b2c'). Chybu len zaloguje."""
+    ids = sorted({int(x) for x in order_ids or [] if x})
+    if kind not in ("b2b", "b2c") or not ids:
+        return
+    try:
+        ensure_schema()
+        ph = ",".join(["%s"] * len(ids))
+        db_connector.with_transaction(
+            lambda conn: _sync(conn, kind, f"f.order_id IN ({ph})", f"o.id IN ({ph})", tuple(ids))
+        )
+    except Exception as e:
+        print(f"[SALES_FACT] {kind} {ids[:10]}: {e}")
+
+
+def refresh_order(kind: str, order_id) -> None:
+    refresh_orders(kind, [order_id])
+
+
+def reconcile(days: int = RECONCILE_DAYS) -> Dict[str, Any]:
+    """Prepočíta objednávky za posledných `days` dní (nočná poistka)."""
+    ensure_schema()
+    since = datetime.combine(date.today() - timedelta(days=days), datetime.min.time())
+    out = {}
+    for kind, table in (("b2b", "b2b_objednavky"), ("b2c", "b2c_objednavky")):
+        ordered_at = _first(table, "o", ["datum_objednavky", "created_at", "created", "datum"])
+        if ordered_at == "NULL":
+            continue
+        out[kind] = db_connector.with_transaction(
+            lambda conn: _sync(conn, kind, "f.ordered_at >= %s", f"{ordered_at} >= %s", (since,))
+        )
+    return out
+
+
+def rebuild_all() -> Dict[str, Any]:
+    """Kompletný prepočet faktov aj rollupu (prvé spustenie, ručná oprava)."""
+    ensure_schema()
+
+    def work(conn):
+        result = {kind: _sync(conn, kind, "1=1", "1=1", (), rollup=False) for kind in ("b2b", "b2c")}
+        cur = conn.cursor()
+        ph = ",".join(["%s"] * len(CANCELLED_STATES))
+        cur.execute("DELETE FROM sales_monthly")
+        cur.execute(f"""
+            INSERT INTO sales_monthly (channel, customer_key, ym, ean, name, mj, qty, net, gross)
+            SELECT channel, customer_key, YEAR(ordered_at) * 100 + MONTH(ordered_at) AS ym, ean,
+                   MAX(name), MAX(mj), SUM(qty), SUM(net), SUM(gross)
+              FROM sales_fact
+             WHERE customer_key IS NOT NULL AND ordered_at IS NOT NULL AND ean IS NOT NULL
+               AND COALESCE(stav, '') NOT IN ({ph})
+             GROUP BY channel, customer_key, ym, ean
+        """, CANCELLED_STATES)
+        cur.close()
+        return result
+
+    global _built
+    result = db_connector.with_transaction(work)
+    db_connector.execute_query("""
+        INSERT INTO sales_fact_state (name, built_at) VALUES ('initial', NOW())
+        ON DUPLICATE KEY UPDATE built_at = NOW()
+    """, fetch='none')
+    _built = True
+    return result
+
+
+def build_initial() -> Dict[str, Any]:
+    """
+    Prvé naplnenie faktov (štart plánovača / CLI), ak ešte neprebehlo.
+    Zámok drží vlastné spojenie mimo poolu – v klastri prepočítava len jeden proces.
+    """
+    if is_built():
+        return {"built": False, "reason": "hotové"}
+    conn = mysql.connector.connect(**db_connector.DB_CONFIG)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT GET_LOCK(%s, 0)", (_BUILD_LOCK,))
+        got = cur.fetchone()
+        if not got or got[0] != 1:
+            cur.close()
+            return {"built": False, "reason": "beží inde"}
+        try:
+            if is_built():
+                return {"built": False, "reason": "hotové"}
+            return {"built": True, **rebuild_all()}
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s)", (_BUILD_LOCK,))
+            cur.fetchall()
+            cur.close()
+    finally:
+        conn.close()
+
+
+# -----------------------------------------------------------------
+# Čítanie pre reporty
+# -----------------------------------------------------------------
+def _period(time_filter: str) -> Tuple[Optional[datetime], Optional[datetime], bool]:
+    """(od, do, dá sa čítať z mesačného rollupu)."""
+    today = date.today()
+    if time_filter == "year":
+        return datetime(today.year, 1, 1), datetime(today.year + 1, 1, 1), True
+    if time_filter == "month":
+        start, end = _month_bounds(today.year * 100 + today.month)
+        return datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time()), True
+    if time_filter == "week":
+        start = today - timedelta(days=today.weekday())
+        return (datetime.combine(start, datetime.min.time()),
+                datetime.combine(start + timedelta(days=7), datetime.min.time()), False)
+    if time_filter == "day":
+        start = datetime.combine(today, datetime.min.time())
+        return start, start + timedelta(days=1), False
+    return None, None, True
+
+
+def customer_summary(kind: str, customer_key: str, time_filter: str = "all") -> Dict[str, Any]:
+    """Počet objednávok a tržba bez DPH (zrušené sa nerátajú)."""
+    ensure_schema()
+    if not is_built():
+        return _legacy_customer_summary(customer_key, time_filter)
+    start, end, _ = _period(time_filter)
+    ph = ",".join(["%s"] * len(CANCELLED_STATES))
+    sql = f"""
+        SELECT COUNT(*) AS total_orders, COALESCE(SUM(f.net), 0) AS total_revenue
+          FROM sales_order_fact f
+         WHERE f.channel = %s AND f.customer_key = %s AND COALESCE(f.stav, '') NOT IN ({ph})
+           AND EXISTS (SELECT 1 FROM sales_fact sf WHERE sf.channel = f.channel AND sf.order_id = f.order_id)
+    """
+    params: List[Any] = [kind, customer_key, *CANCELLED_STATES]
+    if start:
+        sql += " AND f.ordered_at >= %s AND f.ordered_at < %s"
+        params += [start, end]
+    return db_connector.execute_query(sql, tuple(params), fetch='one') or {}
+
+
+def customer_products(kind: str, customer_key: str, time_filter: str = "all") -> List[Dict[str, Any]]:
+    """Nákupy zákazníka po produktoch (z rollupu pre mesiac/rok/všetko, inak z faktov)."""
+    ensure_schema()
+    if not is_built():
+        return _legacy_customer_products(customer_key, time_filter)
+    start, end, monthly = _period(time_filter)
+    if monthly:
+        sql = """
+            SELECT s.ean, MAX(s.name) AS name, MAX(s.mj) AS unit,
+                   SUM(s.qty) AS total_qty, SUM(s.net) AS revenue
+              FROM sales_monthly s
+             WHERE s.channel = %s AND s.customer_key = %s
+        """
+        params: List[Any] = [kind, customer_key]
+        if start:
+            sql += " AND s.ym >= %s AND s.ym < %s"
+            params += [start.year * 100 + start.month, end.year * 100 + end.month]
+    else:
+        ph = ",".join(["%s"] * len(CANCELLED_STATES))
+        sql = f"""
+            SELECT s.ean, MAX(s.name) AS name, MAX(s.mj) AS unit,
+                   SUM(s.qty) AS total_qty, SUM(s.net) AS revenue
+              FROM sales_fact s
+             WHERE s.channel = %s AND s.customer_key = %s AND s.ordered_at >= %s AND s.ordered_at < %s
+               AND s.ean IS NOT NULL AND COALESCE(s.stav, '') NOT IN ({ph})
+        """
+        params = [kind, customer_key, start, end, *CANCELLED_STATES]
+    rows = db_connector.execute_query(f"""
+        SELECT x.*, COALESCE(p.nakupna_cena, 0) AS current_unit_cost
+          FROM ({sql} GROUP BY s.ean) x
+          LEFT JOIN produkty p ON p.ean = x.ean
+         ORDER BY x.total_qty DESC
+    """, tuple(params), fetch='all') or []
+    return rows
+
+
+def customer_order_totals(kind: str) -> Dict[str, Dict[str, Any]]:
+    """{customer_key: {count, last, final_sum}} – všetky objednávky zákazníka."""
+    ensure_schema()
+    if not is_built():
+        return _legacy_customer_order_totals()
+    rows = db_connector.execute_query("""
+        SELECT customer_key, COUNT(*) AS cnt, MAX(ordered_at) AS last_at, SUM(final_gross) AS final_sum
+          FROM sales_order_fact
+         WHERE channel = %s AND customer_key IS NOT NULL
+         GROUP BY customer_key
+    """, (kind,), fetch='all') or []
+    return {
+        r["customer_key"]: {"count": int(r["cnt"] or 0), "last": r["last_at"], "final_sum": float(r["final_sum"] or 0)}
+        for r in rows
+    }
+
+
+def top_customers(kind: str, date_from: Optional[str], date_to: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """Zákazníci podľa finálnej sumy objednávok za obdobie (dátumy vrátane)."""
+    ensure_schema()
+    if not is_built():
+        return _legacy_top_customers(date_from, date_to, limit)
+    sql = "SELECT customer_key, SUM(final_gross) AS suma FROM sales_order_fact WHERE channel = %s AND customer_key IS NOT NULL"
+    params: List[Any] = [kind]
+    if date_from:
+        sql += " AND ordered_at >= %s"
+        params.append(date_from)
+    if date_to:
+        sql += " AND ordered_at < DATE(%s) + INTERVAL 1 DAY"
+        params.append(date_to)
+    sql += " GROUP BY customer_key ORDER BY suma DESC LIMIT %s"
+    params.append(int(limit))
+    return db_connector.execute_query(sql, tuple(params), fetch='all') or []
+
+
+def product_sales(ean: str) -> List[Dict[str, Any]]:
+    """Predaje EAN po položkách: B2B dokončené (dodané množstvo, cena bez DPH), B2C nezrušené (cena s DPH)."""
+    ensure_schema()
+    if not is_built():
+        return _legacy_product_sales(ean)
+    ph_done = ",".join(["%s"] * len(FINISHED_STATES))
+    return db_connector.execute_query(f"""
+        SELECT f.order_id, o.order_no, f.delivery_day AS date, COALESCE(o.customer_name, 'B2C Zákazník') AS customer,
+               CASE WHEN f.channel = 'b2b' THEN f.qty_delivered ELSE f.qty END AS qty, f.mj AS unit,
+               CASE WHEN f.channel = 'b2b' THEN f.unit_price ELSE f.gross / NULLIF(f.qty, 0) END AS price,
+               UPPER(f.channel) AS type
+          FROM sales_fact f
+          JOIN sales_order_fact o ON o.channel = f.channel AND o.order_id = f.order_id
+         WHERE f.ean = %s
+           AND ((f.channel = 'b2b' AND f.stav IN ({ph_done}))
+                OR (f.channel = 'b2c' AND COALESCE(f.stav, '') <> 'Zrušená'))
+    """, (ean, *FINISHED_STATES), fetch='all') or []
+
+
+def action_sales(date_from: str, date_to: str, parent_id) -> List[Dict[str, Any]]:
+    """Akciové B2B predaje pobočiek reťazca za obdobie dodania."""
+    ensure_schema()
+    if not is_built():
+        return _legacy_action_sales(date_from, date_to, parent_id)
+    return db_connector.execute_query("""
+        SELECT f.ean, MAX(f.name) AS produkt, f.mj,
+               SUM(f.qty) AS predane_mnozstvo, SUM(f.net) AS trzby_bez_dph, MIN(f.unit_price) AS aplikovana_cena
+          FROM sales_fact f
+         WHERE f.channel = 'b2b' AND f.is_akcia = 1
+           AND f.delivery_day >= %s AND f.delivery_day <= %s
+           AND COALESCE(f.stav, '') NOT IN ('Zrušená', 'Stornovaná')
+           AND f.customer_key IN (SELECT zakaznik_id FROM b2b_zakaznici WHERE parent_id = %s)
+         GROUP BY f.ean, f.name, f.mj
+         ORDER BY predane_mnozstvo DESC
+    """, (date_from, date_to, parent_id), fetch='all') or []
+
+
+# -----------------------------------------------------------------
+# Pôvodné dotazy nad objednávkami – kým build_initial() nedobehne
+# (Zákazník 360 a reporty reťazca = B2B, zoznam a TOP zákazníci = B2C)
+# -----------------------------------------------------------------
+def _legacy_date_sql(time_filter: str) -> str:
+    if time_filter == "year":
+        return " AND YEAR(o.datum_objednavky) = YEAR(CURDATE())"
+    if time_filter == "month":
+        return " AND YEAR(o.datum_objednavky) = YEAR(CURDATE()) AND MONTH(o.datum_objednavky) = MONTH(CURDATE())"
+    if time_filter == "week":
+        return " AND YEARWEEK(o.datum_objednavky, 1) = YEARWEEK(CURDATE(), 1)"
+    if time_filter == "day":
+        return " AND DATE(o.datum_objednavky) = CURDATE()"
+    return ""
+
+
+def _legacy_customer_summary(customer_key: str, time_filter: str) -> Dict[str, Any]:
+    return db_connector.execute_query(f"""
+        SELECT COUNT(DISTINCT o.id) AS total_orders,
+               COALESCE(SUM(op.mnozstvo * op.cena_bez_dph), 0) AS total_revenue
+          FROM b2b_objednavky o
+          JOIN b2b_objednavky_polozky op ON o.id = op.objednavka_id
+         WHERE o.zakaznik_id = %s AND o.stav NOT IN ('Zrušená', 'Zrusena', 'Stornovaná'){_legacy_date_sql(time_filter)}
+    """, (customer_key,), fetch='one') or {}
+
+
+def _legacy_customer_products(customer_key: str, time_filter: str) -> List[Dict[str, Any]]:
+    return db_connector.execute_query(f"""
+        SELECT op.ean_produktu AS ean, op.nazov_vyrobku AS name, op.mj AS unit,
+               SUM(op.mnozstvo) AS total_qty,
+               COALESCE(SUM(op.mnozstvo * op.cena_bez_dph), 0) AS revenue,
+               MAX(COALESCE(p.nakupna_cena, 0)) AS current_unit_cost
+          FROM b2b_objednavky o
+          JOIN b2b_objednavky_polozky op ON o.id = op.objednavka_id
+          LEFT JOIN produkty p ON p.ean = op.ean_produktu
+         WHERE o.zakaznik_id = %s AND o.stav NOT IN ('Zrušená', 'Zrusena', 'Stornovaná'){_legacy_date_sql(time_filter)}
+         GROUP BY op.ean_produktu, op.nazov_vyrobku, op.mj
+         ORDER BY total_qty DESC
+    """, (customer_key,), fetch='all') or []
+
+
+def _legacy_b2c_orders() -> Optional[Tuple[str, str, str]]:
+    """(JOIN podmienka, dátum, finálna suma) pre B2C objednávky so zákazníkom, alebo None."""
+    parts = _b2c_join_parts()
+    if not parts:
+        return None
+    table = "b2c_objednavky"
+    ordered_at = _first(table, "o", ["datum_objednavky", "created_at", "created", "datum"], "o.id")
+    final = _first(table, "o", ["finalna_suma_s_dph", "finalna_suma", "final_total_s_dph",
+                                "suma_s_dph", "total_s_dph"], "0")
+    return " OR ".join(parts), ordered_at, final
+
+
+def _legacy_customer_order_totals() -> Dict[str, Dict[str, Any]]:
+    src = _legacy_b2c_orders()
+    if not src:
+        return {}
+    join, ordered_at, final = src
+    rows = db_connector.execute_query(f"""
+        SELECT CAST(z.id AS CHAR) AS customer_key, COUNT(*) AS cnt, MAX({ordered_at}) AS last_at,
+               SUM(COALESCE({final}, 0)) AS final_sum
+          FROM b2c_objednavky o
+          JOIN b2b_zakaznici z ON ({join})
+         WHERE z.typ = 'B2C'
+         GROUP BY z.id
+    """, fetch='all') or []
+    return {
+        r["customer_key"]: {"count": int(r["cnt"] or 0), "last": r["last_at"], "final_sum": float(r["final_sum"] or 0)}
+        for r in rows
+    }
+
+
+def _legacy_top_customers(date_from: Optional[str], date_to: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    src = _legacy_b2c_orders()
+    if not src:
+        return []
+    join, ordered_at, final = src
+    sql = f"""
+        SELECT CAST(z.id AS CHAR) AS customer_key, SUM({final}) AS suma
+          FROM b2c_objednavky o
+          JOIN b2b_zakaznici z ON ({join})
+         WHERE z.typ = 'B2C'
+    """
+    params: List[Any] = []
+    if date_from:
+        sql += f" AND DATE({ordered_at}) >= %s"
+        params.append(date_from)
+    if date_to:
+        sql += f" AND DATE({ordered_at}) <= %s"
+        params.append(date_to)
+    sql += " GROUP BY z.id ORDER BY suma DESC LIMIT %s"
+    params.append(int(limit))
+    return db_connector.execute_query(sql, tuple(params), fetch='all') or []
+
+
+def _legacy_product_sales(ean: str) -> List[Dict[str, Any]]:
+    ph_done = ",".join(["%s"] * len(FINISHED_STATES))
+    b2b = db_connector.execute_query(f"""
+        SELECT o.id AS order_id, o.cislo_objednavky AS order_no,
+               o.pozadovany_datum_dodania AS date, o.nazov_firmy AS customer,
+               COALESCE(p.dodane_mnozstvo, p.mnozstvo) AS qty, p.mj AS unit,
+               p.cena_bez_dph AS price, 'B2B' AS type
+          FROM b2b_objednavky_polozky p
+          JOIN b2b_objednavky o ON o.id = p.objednavka_id
+         WHERE p.ean_produktu = %s AND o.stav IN ({ph_done})
+    """, (ean, *FINISHED_STATES), fetch='all') or []
+    b2c = db_connector.execute_query("""
+        SELECT o.id AS order_id, o.cislo_objednavky AS order_no,
+               o.pozadovany_datum_dodania AS date, COALESCE(o.nazov_firmy, 'B2C Zákazník') AS customer,
+               p.mnozstvo AS qty, p.mj AS unit, p.cena_s_dph AS price, 'B2C' AS type
+          FROM b2c_objednavky_polozky p
+          JOIN b2c_objednavky o ON o.id = p.objednavka_id
+         WHERE p.ean_produktu = %s AND o.stav NOT IN ('Zrušená')
+    """, (ean,), fetch='all') or []
+    return b2b + b2c
+
+
+def _legacy_action_sales(date_from: str, date_to: str, parent_id) -> List[Dict[str, Any]]:
+    return db_connector.execute_query("""
+        SELECT pol.ean_produktu AS ean, pol.nazov_vyrobku AS produkt, pol.mj,
+               SUM(pol.mnozstvo) AS predane_mnozstvo,
+               SUM(pol.mnozstvo * pol.cena_bez_dph) AS trzby_bez_dph,
+               MIN(pol.cena_bez_dph) AS aplikovana_cena
+          FROM b2b_objednavky_polozky pol
+          JOIN b2b_objednavky o ON o.id = pol.objednavka_id
+         WHERE pol.is_akcia = 1
+           AND o.pozadovany_datum_dodania >= %s
+           AND o.pozadovany_datum_dodania <= %s
+           AND o.stav NOT IN ('Zrušená', 'Stornovaná')
+           AND o.zakaznik_id IN (SELECT zakaznik_id FROM b2b_zakaznici WHERE parent_id = %s)
+         GROUP BY pol.ean_produktu, pol.nazov_vyrobku, pol.mj
+         ORDER BY predane_mnozstvo DESC
+    """, (date_from, date_to, parent_id), fetch='all') or []
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fakty predaja (sales_fact)")
+    ap.add_argument("--rebuild", action="store_true", help="kompletný prepočet, aj keď už prebehol")
+    args = ap.parse_args()
+    res = rebuild_all() if args.rebuild else build_initial()
+    print(json.dumps(res, ensure_ascii=False, default=str))
@@ -3,10 +3,26 @@
 # Centrálna plánovačka pre ERP:
 #  - uloha_kontrola_skladu (denne o 14:00)       [ak je LOW_STOCK_EMAIL]
 #  - vykonaj_db_ulohu (automatizované SQL úlohy z DB)
-#  - check_calendar_notifications (Enterprise kalendár – pripomienky)
+#  - check_calendar_notifications (Enterprise kalendár – pripomienky)      [len ak REMINDER_TIMER=0]
+#  - Časovač pripomienok (kalendár + auto-štart hygieny): halda termínov, presnosť na sekundy
 #  -   - ERP export je ZAKÁZANÝ v scheduleri (VYROBKY.CSV vzniká iba po dennom príjme v Expedícii)
-#  - Hygiene autostart tick (každú minútu)
+#  - Hygiene autostart tick (každú minútu)                               [len ak REMINDER_TIMER=0]
 #  - B2C birthday bonus (HTTP endpoint raz denne)
+#  - Pošta: migrácia indexov hľadania po štarte + IMAP synchronizácia (ak je IMAP_SYNC_MINUTES > 0)
+#  - Teploty: hodinový rollup + denná archivácia surových meraní
+#  - Rezervácie skladu: migrácia + prvý prepočet po štarte, nočný prepočet počítadiel (03:10)
+#  - Index nákladov produktov: prvé naplnenie po štarte + nočný prepočet (03:20)
+#  - Fakty predaja: prvé naplnenie po štarte (raz v klastri) + nočné zosúladenie posledných dní (03:30)
+#  - Snapshoty dashboardov: obnova po intervale / po zneplatnení (každú minútu)
+#  - Narodeninové odmeny: migrácia stĺpcov po štarte + rozoslanie e-mailov z fronty (každých 5 minút)
+#  - Genealógia šarží: prepočet traceability grafu (každých 30 minút)
+#  - Príjem súborov (terminál, EDI, ZASOBA.CSV): inotify sledovanie + poistný prechod každú minútu
+#  - História behov jobov (job_runs): čistenie starých záznamov (03:40)
+#  - Kalendár: migrácia opakovania + prvé rozvinutie výskytov po štarte, posun okna (03:50)
+#  - História objednávok / správ, pripomienky: migrácia indexov po štarte
+#
+# V klastri (SCHEDULER_CLUSTER=1) joby vykonáva len proces, ktorý drží lease
+# v DB (scheduler_cluster.py); ostatné majú plánovač pozastavený.
 # ===========================================
 
 from __future__ import annotations
@@ -16,18 +32,36 @@ import argparse
 import logging
 import os
 import functools
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Optional
 
 import requests
-from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, EVENT_SCHEDULER_START
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
 from pytz import timezone
 
 import db_connector
+import file_ingest
 import terminal_handler
+import edi_auto_importer
+import erp_auto_import
 import hygiene_handler
+import temps_rollup
+import mail_handler
+import mail_sync
+import stock_reservations
+import product_cost_index
+import sales_fact
+import dashboard_snapshots
+import birthday_bonus
+import lot_genealogy
+import scheduler_cluster
+import reminder_timer
+import order_history
+import calendar_occurrences
 from tasks import (
     uloha_kontrola_skladu,
     vykonaj_db_ulohu,
@@ -144,6 +178,14 @@ def _remove_job_if_exists(sched: BlockingScheduler, job_id: str) -> None:
         log.info("Job odstránený: %s", job_id)
 
 
+def _add_job(sched: BlockingScheduler, func, trigger, **kwargs):
+    """
+    sched.add_job s obalom scheduler_cluster.tracked – job beží len na lídrovi,
+    nie súbežne na viacerých uzloch a každý beh sa zapíše do job_runs.
+    """
+    return sched.add_job(scheduler_cluster.tracked(kwargs["id"], func), trigger, **kwargs)
+
+
 def _make_trigger_from_cron(cron: str) -> CronTrigger:
     """
     Podpora 5-poličkového cronu (min hour dom mon dow) aj 6-poličkového (sec min hour dom mon dow).
@@ -181,7 +223,7 @@ def _schedule_builtin_jobs(sched: BlockingScheduler) -> None:
     low_stock_job_id = "builtin_low_stock_14"
     email_to = os.getenv("LOW_STOCK_EMAIL", "").strip()
     if email_to:
-        sched.add_job(
+        _add_job(sched,
             s_db_kontextom(uloha_kontrola_skladu), # <--- PRIDANÝ WRAPPER
             CronTrigger(hour=14, minute=0, timezone=TZ),
             args=[email_to],
@@ -197,28 +239,41 @@ def _schedule_builtin_jobs(sched: BlockingScheduler) -> None:
         log.info("LOW_STOCK_EMAIL nie je nastavené -> low stock job sa NEplánuje.")
 
     # 2) Enterprise kalendár – kontrola notifikácií každú minútu
-    sched.add_job(
-        s_db_kontextom(check_calendar_notifications), # <--- PRIDANÝ WRAPPER
+    #    (pri REMINDER_TIMER=1 ich odosiela reminder_timer presne v termíne)
+    if reminder_timer.ENABLED:
+        _remove_job_if_exists(sched, "calendar_notifications")
+    else:
+        _add_calendar_notifications_job(sched)
+
+    # 3) Výmenné adresáre (terminál, EDI, ZASOBA.CSV) – súbory okamžite spracúva
+    #    file_ingest.start() v main(); tento prechod je len poistka (každú minútu)
+    _add_job(sched,
+        s_db_kontextom(lambda: file_ingest.sweep(_ingest_channels())),
         CronTrigger(minute="*", timezone=TZ),
-        id="calendar_notifications",
+        id="terminal_sync_job",
         replace_existing=True,
-        misfire_grace_time=600,
+        misfire_grace_time=60,
         max_instances=1,
         coalesce=True,
     )
-    log.info("Calendar notifications naplánované každú minútu.")
+    log.info("Poistný prechod výmenných adresárov naplánovaný každú minútu.")
 
-    # 3) Kontrola zložky vyprobjed pre CSV z terminálu (každú minútu)
-    sched.add_job(
-        s_db_kontextom(terminal_handler.process_terminal_files), # <--- PRIDANÝ WRAPPER
+
+def _add_calendar_notifications_job(sched: BlockingScheduler) -> None:
+    _add_job(sched,
+        s_db_kontextom(check_calendar_notifications), # <--- PRIDANÝ WRAPPER
         CronTrigger(minute="*", timezone=TZ),
-        id="terminal_sync_job",
+        id="calendar_notifications",
         replace_existing=True,
-        misfire_grace_time=60,
+        misfire_grace_time=600,
         max_instances=1,
         coalesce=True,
     )
-    log.info("Spracovanie CSV z terminálu naplánované každú minútu.")
+    log.info("Calendar notifications naplánované každú minútu.")
+
+
+def _ingest_channels() -> List[str]:
+    return [c.strip() for c in os.getenv("INGEST_WATCH", "terminal,edi,erp_stock").split(",") if c.strip()]
 
 
 def _load_db_tasks(sched: BlockingScheduler) -> None:
@@ -258,7 +313,7 @@ def _load_db_tasks(sched: BlockingScheduler) -> None:
         job_id = f"dbtask_{tid}"
         desired_job_ids.add(job_id)
 
-        job = sched.add_job(
+        job = _add_job(sched,
             s_db_kontextom(vykonaj_db_ulohu), # <--- PRIDANÝ WRAPPER
             trig,
             args=[tid],
@@ -294,8 +349,13 @@ def _schedule_erp_export(sched: BlockingScheduler) -> None:
 def _schedule_hygiene_autostart(sched: BlockingScheduler) -> None:
     """
     Hygiena – auto-štart úloh podľa scheduled_time.
-    Volá hygiene_handler.run_hygiene_autostart_tick každú minútu.
+    Volá hygiene_handler.run_hygiene_autostart_tick každú minútu
+    (pri REMINDER_TIMER=1 úlohy spúšťa reminder_timer presne v termíne).
     """
+    if reminder_timer.ENABLED:
+        _remove_job_if_exists(sched, "hygiene_autostart")
+        return
+
     @s_db_kontextom # <--- PRIDANÝ WRAPPER
     def run_job():
         try:
@@ -307,7 +367,7 @@ def _schedule_hygiene_autostart(sched: BlockingScheduler) -> None:
         except Exception:
             log.exception("Hygiena auto-štart ERROR")
 
-    sched.add_job(
+    _add_job(sched,
         run_job,
         CronTrigger(minute="*", timezone=TZ),
         id="hygiene_autostart",
@@ -349,7 +409,7 @@ def _schedule_b2c_birthday_bonus(sched: BlockingScheduler) -> None:
         except Exception:
             log.exception("B2C birthday bonus ERROR")
 
-    sched.add_job(
+    _add_job(sched,
         run_bonus_job,
         CronTrigger(hour=13, minute=20, timezone=TZ),
         id=job_id,
@@ -361,6 +421,416 @@ def _schedule_b2c_birthday_bonus(sched: BlockingScheduler) -> None:
     log.info("B2C birthday bonus job naplánovaný (každý deň 13:20).")
 
 
+def _schedule_temps_rollup(sched: BlockingScheduler) -> None:
+    """
+    Teploty – hodinové/denné agregácie (každú hodinu v minúte 3)
+    a archivácia surových meraní starších ako TEMPS_RAW_RETENTION_DAYS (denne 02:40).
+    """
+    @s_db_kontextom
+    def run_rollup_job():
+        try:
+            result = temps_rollup.run_rollup()
+            log.debug("Temps rollup result=%s", result)
+        except Exception:
+            log.exception("Temps rollup ERROR")
+
+    @s_db_kontextom
+    def run_archive_job():
+        try:
+            result = temps_rollup.archive_raw()
+            if result.get("archived_days"):
+                log.info("Temps archív: %s", result)
+        except Exception:
+            log.exception("Temps archív ERROR")
+
+    _add_job(sched,
+        run_rollup_job,
+        CronTrigger(minute=3, timezone=TZ),
+        id="temps_rollup_hourly",
+        replace_existing=True,
+        misfire_grace_time=1800,
+        max_instances=1,
+        coalesce=True,
+    )
+    _add_job(sched,
+        run_archive_job,
+        CronTrigger(hour=2, minute=40, timezone=TZ),
+        id="temps_archive_daily",
+        replace_existing=True,
+        misfire_grace_time=7200,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("Teploty: rollup každú hodinu, archivácia denne 02:40.")
+
+
+def _schedule_imap_sync(sched: BlockingScheduler) -> None:
+    """
+    Pošta – migrácia indexov pre zoznam/hľadanie raz po štarte (ALTER nad
+    mail_messages nebeží vo webovom requeste) a inkrementálna IMAP
+    synchronizácia každých IMAP_SYNC_MINUTES minút.
+    """
+    @s_db_kontextom
+    def run_migrate():
+        try:
+            log.info("Pošta – schéma hľadania: %s", mail_handler.migrate_search_schema())
+        except Exception:
+            log.exception("Pošta – migrácia schémy ERROR")
+
+    _add_job(sched,
+        run_migrate,
+        DateTrigger(run_date=datetime.now(TZ) + timedelta(seconds=20), timezone=TZ),
+        id="mail_search_migrate",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    job_id = "imap_sync"
+    try:
+        minutes = int(os.getenv("IMAP_SYNC_MINUTES", "0") or 0)
+    except ValueError:
+        minutes = 0
+    if minutes <= 0:
+        _remove_job_if_exists(sched, job_id)
+        log.info("IMAP sync: IMAP_SYNC_MINUTES nie je nastavené -> job sa NEplánuje.")
+        return
+
+    @s_db_kontextom
+    def run_sync_job():
+        try:
+            result = mail_sync.sync_all(limit=int(os.getenv("IMAP_SYNC_LIMIT", "200")))
+            if result.get("fetched") or result.get("error"):
+                log.info("IMAP sync: %s", {k: v for k, v in result.items() if k != "accounts"})
+        except Exception:
+            log.exception("IMAP sync ERROR")
+
+    _add_job(sched,
+        run_sync_job,
+        CronTrigger(minute=f"*/{minutes}", second=30, timezone=TZ),
+        id=job_id,
+        replace_existing=True,
+        misfire_grace_time=300,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("IMAP sync naplánovaný (každých %s min).", minutes)
+
+
+def _schedule_stock_reservations(sched: BlockingScheduler) -> None:
+    """
+    Rezervácie skladu – migrácia (tabuľky, indexy nad položkami objednávok,
+    prvý prepočet) chvíľu po štarte, mimo webových requestov, a nočný
+    kompletný prepočet počítadiel (zachytí zápisy mimo hookov).
+    """
+    @s_db_kontextom
+    def run_migrate():
+        try:
+            log.info("Rezervácie skladu – migrácia: %s", stock_reservations.migrate())
+        except Exception:
+            log.exception("Rezervácie skladu (migrácia) ERROR")
+
+    _add_job(sched,
+        run_migrate,
+        DateTrigger(run_date=datetime.now(TZ) + timedelta(seconds=25), timezone=TZ),
+        id="stock_reservations_migrate",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    @s_db_kontextom
+    def run_rebuild():
+        try:
+            log.info("Rezervácie skladu prepočítané: %s", stock_reservations.rebuild_all())
+        except Exception:
+            log.exception("Rezervácie skladu ERROR")
+
+    _add_job(sched,
+        run_rebuild,
+        CronTrigger(hour=3, minute=10, timezone=TZ),
+        id="stock_reservations_rebuild",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("Rezervácie skladu: nočný prepočet naplánovaný (03:10).")
+
+
+def _schedule_product_cost_index(sched: BlockingScheduler) -> None:
+    """
+    Index nákladov produktov – prvé naplnenie chvíľu po štarte (mimo webových
+    requestov) a nočný kompletný prepočet (zachytí zápisy mimo hookov).
+    """
+    @s_db_kontextom
+    def run_initial():
+        try:
+            log.info("Index nákladov produktov – prvé naplnenie: %s", product_cost_index.build_initial())
+        except Exception:
+            log.exception("Index nákladov produktov (naplnenie) ERROR")
+
+    _add_job(sched,
+        run_initial,
+        DateTrigger(run_date=datetime.now(TZ) + timedelta(seconds=45), timezone=TZ),
+        id="product_cost_index_initial",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    @s_db_kontextom
+    def run_rebuild():
+        try:
+            log.info("Index nákladov produktov prepočítaný: %s", product_cost_index.rebuild_all())
+        except Exception:
+            log.exception("Index nákladov produktov ERROR")
+
+    _add_job(sched,
+        run_rebuild,
+        CronTrigger(hour=3, minute=20, timezone=TZ),
+        id="product_cost_index_rebuild",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("Index nákladov produktov: nočný prepočet naplánovaný (03:20).")
+
+
+def _schedule_sales_fact(sched: BlockingScheduler) -> None:
+    """
+    Fakty predaja – prvé naplnenie chvíľu po štarte (mimo webových requestov;
+    reporty dovtedy čítajú pôvodné dotazy) a nočné zosúladenie objednávok
+    za posledné dni (zachytí zápisy mimo hookov).
+    """
+    @s_db_kontextom
+    def run_initial():
+        try:
+            log.info("Fakty predaja – prvé naplnenie: %s", sales_fact.build_initial())
+        except Exception:
+            log.exception("Fakty predaja (naplnenie) ERROR")
+
+    @s_db_kontextom
+    def run_reconcile():
+        try:
+            if not sales_fact.is_built():
+                log.info("Fakty predaja – prvé naplnenie: %s", sales_fact.build_initial())
+            log.info("Fakty predaja zosúladené: %s", sales_fact.reconcile())
+        except Exception:
+            log.exception("Fakty predaja ERROR")
+
+    _add_job(sched,
+        run_initial,
+        DateTrigger(run_date=datetime.now(TZ) + timedelta(seconds=30), timezone=TZ),
+        id="sales_fact_initial",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    _add_job(sched,
+        run_reconcile,
+        CronTrigger(hour=3, minute=30, timezone=TZ),
+        id="sales_fact_reconcile",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("Fakty predaja: nočné zosúladenie naplánované (03:30).")
+
+
+def _schedule_dashboard_snapshots(sched: BlockingScheduler) -> None:
+    """
+    Snapshoty dashboardov – každú minútu obnoví tie, ktorým uplynul interval
+    alebo ich zneplatnil zápis (objednávka, náklady, body...).
+    """
+    @s_db_kontextom
+    def run_refresh():
+        try:
+            res = dashboard_snapshots.refresh_due()
+            if res.get("built"):
+                log.info("Snapshoty dashboardov obnovené: %s", res)
+        except Exception:
+            log.exception("Snapshoty dashboardov ERROR")
+
+    _add_job(sched,
+        run_refresh,
+        CronTrigger(minute="*", second=41, timezone=TZ),
+        id="dashboard_snapshots_refresh",
+        replace_existing=True,
+        misfire_grace_time=60,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("Snapshoty dashboardov: obnova naplánovaná (každú minútu).")
+
+
+def _schedule_birthday_notifications(sched: BlockingScheduler) -> None:
+    """
+    Narodeninové odmeny – migrácia (stĺpce a index v b2b_zakaznici, prenos
+    z JSON) chvíľu po štarte, mimo webových requestov; e-maily k pripísaným
+    bodom sa posielajú z fronty (b2c_birthday_awards.notified_at IS NULL).
+    """
+    @s_db_kontextom
+    def run_migrate():
+        try:
+            log.info("Narodeninové odmeny – migrácia: %s", birthday_bonus.migrate())
+        except Exception:
+            log.exception("Narodeninové odmeny (migrácia) ERROR")
+
+    _add_job(sched,
+        run_migrate,
+        DateTrigger(run_date=datetime.now(TZ) + timedelta(seconds=35), timezone=TZ),
+        id="birthday_bonus_migrate",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    @s_db_kontextom
+    def run_notify():
+        try:
+            res = birthday_bonus.send_pending()
+            if res.get("sent") or res.get("failed"):
+                log.info("Narodeninové e-maily: %s", res)
+        except Exception:
+            log.exception("Narodeninové e-maily ERROR")
+
+    _add_job(sched,
+        run_notify,
+        CronTrigger(minute="*/5", second=17, timezone=TZ),
+        id="birthday_bonus_notify",
+        replace_existing=True,
+        misfire_grace_time=300,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("Narodeninové e-maily: fronta naplánovaná (každých 5 minút).")
+
+
+def _schedule_lot_genealogy(sched: BlockingScheduler) -> None:
+    """
+    Genealógia šarží – prepočet grafu príjem -> dávka -> expedícia -> dodací list
+    (lot_nodes / lot_edges) pre spätnú a doprednú dohľadateľnosť.
+    """
+    @s_db_kontextom
+    def run_rebuild():
+        try:
+            res = lot_genealogy.rebuild()
+            log.info("Genealógia šarží prepočítaná: %s", res)
+        except Exception:
+            log.exception("Genealógia šarží ERROR")
+
+    _add_job(sched,
+        run_rebuild,
+        CronTrigger(minute="7,37", timezone=TZ),
+        id="lot_genealogy_rebuild",
+        replace_existing=True,
+        misfire_grace_time=600,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("Genealógia šarží: prepočet naplánovaný (každých 30 minút).")
+
+
+def _schedule_job_runs_cleanup(sched: BlockingScheduler) -> None:
+    """
+    História behov jobov – zmaže záznamy staršie ako JOB_RUNS_RETENTION_DAYS.
+    """
+    @s_db_kontextom
+    def run_cleanup():
+        try:
+            res = scheduler_cluster.cleanup()
+            log.info("job_runs vyčistené: %s", res)
+        except Exception:
+            log.exception("job_runs cleanup ERROR")
+
+    _add_job(sched,
+        run_cleanup,
+        CronTrigger(hour=3, minute=40, timezone=TZ),
+        id="job_runs_cleanup",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("job_runs: čistenie naplánované denne 03:40.")
+
+
+def _schedule_calendar_occurrences(sched: BlockingScheduler) -> None:
+    """
+    Kalendár – migrácia (stĺpce opakovania, tabuľky výskytov a zdrojov, prvé
+    rozvinutie) chvíľu po štarte, mimo webových requestov, a nočný posun okna
+    výskytov opakovaných udalostí o deň dopredu; výskyty pred oknom sa zmažú.
+    """
+    @s_db_kontextom
+    def run_migrate():
+        try:
+            log.info("Výskyty kalendára – migrácia: %s", calendar_occurrences.migrate())
+        except Exception:
+            log.exception("Výskyty kalendára (migrácia) ERROR")
+
+    _add_job(sched,
+        run_migrate,
+        DateTrigger(run_date=datetime.now(TZ) + timedelta(seconds=50), timezone=TZ),
+        id="calendar_occurrences_migrate",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    @s_db_kontextom
+    def run_roll():
+        try:
+            res = calendar_occurrences.roll_horizon()
+            log.info("Výskyty kalendára posunuté: %s", res)
+        except Exception:
+            log.exception("Výskyty kalendára ERROR")
+
+    _add_job(sched,
+        run_roll,
+        CronTrigger(hour=3, minute=50, timezone=TZ),
+        id="calendar_occurrences_roll",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+    log.info("Výskyty kalendára: migrácia po štarte, posun okna naplánovaný denne 03:50.")
+
+
+def _schedule_history_indexes(sched: BlockingScheduler) -> None:
+    """
+    Zložené indexy pre stránkovanie histórie objednávok / správ a pre časovač
+    pripomienok – raz chvíľu po štarte (CREATE INDEX nad veľkými tabuľkami
+    nebeží vo webovom requeste).
+    """
+    @s_db_kontextom
+    def run_migrate():
+        try:
+            log.info("Indexy histórie: %s", order_history.migrate_indexes())
+        except Exception:
+            log.exception("Indexy histórie (migrácia) ERROR")
+
+    _add_job(sched,
+        run_migrate,
+        DateTrigger(run_date=datetime.now(TZ) + timedelta(seconds=40), timezone=TZ),
+        id="history_indexes_migrate",
+        replace_existing=True,
+        misfire_grace_time=3600,
+        max_instances=1,
+        coalesce=True,
+    )
+
+
 def _refresh_all(sched: BlockingScheduler) -> None:
     """
     Refresh definícií:
@@ -400,9 +870,20 @@ def build_scheduler() -> BlockingScheduler:
     _load_db_tasks(sched)
     _schedule_b2c_birthday_bonus(sched)
     _schedule_hygiene_autostart(sched)
+    _schedule_temps_rollup(sched)
+    _schedule_imap_sync(sched)
+    _schedule_stock_reservations(sched)
+    _schedule_product_cost_index(sched)
+    _schedule_sales_fact(sched)
+    _schedule_dashboard_snapshots(sched)
+    _schedule_birthday_notifications(sched)
+    _schedule_lot_genealogy(sched)
+    _schedule_job_runs_cleanup(sched)
+    _schedule_calendar_occurrences(sched)
+    _schedule_history_indexes(sched)
 
     # refresh každých 5 minút, ale na sekunde 17 (menej kolízií s jobmi na sekunde 0)
-    sched.add_job(
+    _add_job(sched,
         lambda: _refresh_all(sched),
         CronTrigger(minute="*/5", second=17, timezone=TZ),
         id="refresh_tasks_global",
@@ -413,7 +894,7 @@ def build_scheduler() -> BlockingScheduler:
     )
 
     # Naplánovanie zberu VEZG cien na každú stredu o 15:30
-    sched.add_job(
+    _add_job(sched,
         _run_vezg_scraper_job,
         CronTrigger(day_of_week='wed', hour=15, minute=30, timezone=TZ),
         id='vezg_weekly_scraper',
@@ -473,13 +954,63 @@ def main(argv: Optional[List[str]] = None) -> int:
     if args.list or args.no_start:
         return 0
 
-    log.info("Scheduler spustený. (Ctrl+C na ukončenie)")
+    if not scheduler_cluster.CLUSTER:
+        _start_file_ingest()
+        _start_reminder_timer()
+        log.info("Scheduler spustený. (Ctrl+C na ukončenie)")
+        try:
+            sched.start()
+        except (KeyboardInterrupt, SystemExit):
+            log.info("Scheduler stop.")
+        finally:
+            reminder_timer.stop()
+            file_ingest.stop()
+        return 0
+
+    # Klaster: plánovač štartuje pozastavený, rozbehne ho až zvolenie za lídra.
+    def on_elected():
+        try:
+            _refresh_all(sched)
+            scheduler_cluster.prepare_resume(sched)
+        except Exception:
+            log.exception("Scheduler: príprava po zvolení zlyhala")
+        sched.resume()
+        _start_file_ingest()
+        _start_reminder_timer()
+
+    def on_demoted():
+        if sched.running:
+            sched.pause()
+        reminder_timer.stop(timeout=10)
+        file_ingest.stop(timeout=10)
+
+    def on_start(event):
+        # elektor až po štarte – sched.resume() na nespustenom plánovači zlyhá
+        scheduler_cluster.start_elector(on_elected, on_demoted)
+
+    sched.add_listener(on_start, EVENT_SCHEDULER_START)
+    log.info("Scheduler spustený v klastri ako %s – čakám na lease. (Ctrl+C na ukončenie)",
+             scheduler_cluster.NODE_ID)
     try:
-        sched.start()
+        sched.start(paused=True)
     except (KeyboardInterrupt, SystemExit):
         log.info("Scheduler stop.")
+    finally:
+        scheduler_cluster.stop_elector()
+        reminder_timer.stop()
+        file_ingest.stop()
     return 0
 
 
+def _start_reminder_timer() -> None:
+    if reminder_timer.start(wrap=s_db_kontextom):
+        log.info("Časovač pripomienok spustený (horizont %ss).", reminder_timer.HORIZON_S)
+
+
+def _start_file_ingest() -> None:
+    if file_ingest.start(_ingest_channels(), wrap=s_db_kontextom):
+        log.info("Sledovanie výmenných adresárov spustené: %s", ", ".join(_ingest_channels()))
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
\ No newline at end of file
@@ -0,0 +1,461 @@
+# =================================================================
+# === PLÁNOVAČ V KLASTRI: LÍDER CEZ DB LEASE + HISTÓRIA BEHOV ======
+# =================================================================
+#
+# scheduler.main() beží v každom procese, ktorý ho spustí (gunicorn
+# workery, `python scheduler.py`). Joby však vykonáva len jeden – líder:
+#
+#   scheduler_lease – 1 riadok na plánovač (holder, epoch, expires_at).
+#                     Elektor každých SCHEDULER_HEARTBEAT_S obnoví lease
+#                     na SCHEDULER_LEASE_TTL_S; keď lídrovi vyprší (pád,
+#                     zaseknutie, výpadok DB), prevezme ho iný proces.
+#                     Čas určuje výhradne DB (NOW(6)), nie hodiny uzlov.
+#   job_runs        – každý beh jobu: uzol, začiatok, trvanie, výsledok
+#                     (ok / error / skipped) – z neho metrics().
+#
+# Ostatné procesy majú plánovač pozastavený (paused). Po zvolení sa joby,
+# ktorým počas výpadku prepadol termín (v rámci misfire_grace_time
+# a podľa job_runs ešte nebežali), spustia raz; ostatné pokračujú
+# od najbližšieho termínu – nič sa nezdvojí ani nestratí.
+#
+# tracked() obalí funkciu jobu: mimo lídra ju nespustí a počet súbežných
+# behov toho istého jobu v celom klastri obmedzí cez MySQL GET_LOCK
+# (SCHEDULER_JOB_CONCURRENCY slotov, zámok drží vlastné spojenie behu mimo
+# poolu – pri páde procesu sa uvoľní sám).
+# =================================================================
+import functools
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import mysql.connector
+
+import db_connector
+
+LEASE_NAME      = os.getenv("SCHEDULER_LEASE_NAME", "erp-scheduler")
+LEASE_TTL_S     = int(os.getenv("SCHEDULER_LEASE_TTL_S", "30"))
+HEARTBEAT_S     = int(os.getenv("SCHEDULER_HEARTBEAT_S", "10"))
+JOB_CONCURRENCY = int(os.getenv("SCHEDULER_JOB_CONCURRENCY", "1"))
+RETENTION_DAYS  = int(os.getenv("JOB_RUNS_RETENTION_DAYS", "14"))
+CLUSTER         = os.getenv("SCHEDULER_CLUSTER", "1").strip().lower() not in ("0", "false", "no", "off")
+
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+log = logging.getLogger("erp-scheduler")
+
+_schema_ready = False
+
+
+def ensure_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS scheduler_lease (
+            name          VARCHAR(64)   PRIMARY KEY,
+            holder        VARCHAR(128)  NOT NULL,
+            epoch         INT           NOT NULL DEFAULT 1,
+            acquired_at   DATETIME(6)   NOT NULL,
+            heartbeat_at  DATETIME(6)   NOT NULL,
+            expires_at    DATETIME(6)   NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            id           BIGINT        AUTO_INCREMENT PRIMARY KEY,
+            job_id       VARCHAR(128)  NOT NULL,
+            node         VARCHAR(128)  NOT NULL,
+            epoch        INT           NULL,
+            started_at   DATETIME(6)   NOT NULL,
+            finished_at  DATETIME(6)   NULL,
+            duration_ms  INT           NULL,
+            status       VARCHAR(16)   NOT NULL,
+            error        TEXT          NULL,
+            KEY idx_job_started (job_id, started_at),
+            KEY idx_started (started_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    _schema_ready = True
+
+
+def _utcnow() -> datetime:
+    """UTC bez tzinfo – tak sa ukladá do job_runs."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# -----------------------------------------------------------------
+# Lease (voľba lídra)
+# -----------------------------------------------------------------
+def _try_acquire() -> Tuple[Optional[int], float]:
+    """
+    Obnoví / prevezme lease. Vráti (epoch, zostatok v s), ak je tento proces
+    lídrom a lease podľa DB ešte platí, inak (None, 0.0).
+    """
+    # Poradie priradení je podstatné: MySQL v ON DUPLICATE KEY UPDATE vidí už
+    # nové hodnoty predchádzajúcich stĺpcov (epoch/acquired_at podľa starého
+    # holdera, heartbeat/expires podľa nového).
+    db_connector.execute_query("""
+        INSERT INTO scheduler_lease (name, holder, epoch, acquired_at, heartbeat_at, expires_at)
+        VALUES (%s, %s, 1, NOW(6), NOW(6), NOW(6) + INTERVAL %s SECOND)
+        ON DUPLICATE KEY UPDATE
+            epoch        = IF(holder <> VALUES(holder) AND expires_at < NOW(6), epoch + 1, epoch),
+            acquired_at  = IF(holder <> VALUES(holder) AND expires_at < NOW(6), NOW(6), acquired_at),
+            holder       = IF(expires_at < NOW(6), VALUES(holder), holder),
+            heartbeat_at = IF(holder = VALUES(holder), NOW(6), heartbeat_at),
+            expires_at   = IF(holder = VALUES(holder), VALUES(expires_at), expires_at)
+    """, (LEASE_NAME, NODE_ID, LEASE_TTL_S), fetch='none')
+    # execute_query chybu UPSERTu len zaloguje – platnosť preto vždy čítame z DB
+    # (zostatok do expires_at), nie z lokálneho času odoslania heartbeatu
+    row = db_connector.execute_query("""
+        SELECT holder, epoch, TIMESTAMPDIFF(MICROSECOND, NOW(6), expires_at) AS remaining_us
+          FROM scheduler_lease WHERE name=%s
+    """, (LEASE_NAME,), fetch='one')
+    if row is None:
+        # bez riadku nevieme, kto je líder
+        raise RuntimeError("scheduler_lease nedostupný")
+    remaining_s = int(row.get("remaining_us") or 0) / 1e6
+    if row.get("holder") == NODE_ID and remaining_s > 0:
+        return int(row["epoch"]), remaining_s
+    return None, 0.0
+
+
+def _release() -> None:
+    db_connector.execute_query(
+        "UPDATE scheduler_lease SET expires_at = NOW(6) WHERE name=%s AND holder=%s",
+        (LEASE_NAME, NODE_ID), fetch='none')
+
+
+class LeaderElector(threading.Thread):
+    """
+    Heartbeat lease na pozadí. on_elected/on_demoted sa volajú z tohto vlákna
+    pri zmene stavu. Líder, ktorý lease nevie obnoviť (chyba DB), sa vzdá
+    ešte pred jeho vypršaním, aby nebežali dvaja.
+    """
+
+    def __init__(self, on_elected: Callable[[], None], on_demoted: Callable[[], None]):
+        super().__init__(name="scheduler-leader", daemon=True)
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.stop_event = threading.Event()
+        self.epoch: Optional[int] = None
+        self._valid_until = 0.0   # monotonic – do kedy je lease určite náš
+
+    @property
+    def is_leader(self) -> bool:
+        return self.epoch is not None and time.monotonic() < self._valid_until
+
+    def _set(self, epoch: Optional[int]) -> None:
+        was = self.epoch is not None
+        self.epoch = epoch
+        if epoch is not None and not was:
+            log.info("Scheduler: %s je líder (epoch %s).", NODE_ID, epoch)
+            self.on_elected()
+        elif epoch is None and was:
+            log.warning("Scheduler: %s už nie je líder.", NODE_ID)
+            self.on_demoted()
+
+    def run(self) -> None:
+        try:
+            ensure_schema()
+        except Exception as e:
+            log.warning("Scheduler lease: schéma – %s", e)
+        while not self.stop_event.is_set():
+            t0 = time.monotonic()
+            try:
+                epoch, remaining_s = _try_acquire()
+                if epoch is not None:
+                    # zostatok podľa DB meraný od odoslania (t0) – rezerva na oneskorenie
+                    # heartbeatu a rozdiel rýchlosti hodín uzla a DB
+                    self._valid_until = t0 + remaining_s - HEARTBEAT_S / 2.0
+                    if time.monotonic() >= self._valid_until:
+                        epoch = None
+                self._set(epoch)
+            except Exception as e:
+                log.warning("Scheduler lease: heartbeat zlyhal – %s", e)
+                if self.epoch is not None and time.monotonic() >= self._valid_until:
+                    self._set(None)
+            self.stop_event.wait(HEARTBEAT_S if self.epoch is not None else max(1.0, HEARTBEAT_S / 2.0))
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.epoch is not None:
+            try:
+                _release()
+            except Exception:
+                pass
+            self._set(None)
+
+
+_elector: Optional[LeaderElector] = None
+
+
+def start_elector(on_elected: Callable[[], None], on_demoted: Callable[[], None]) -> LeaderElector:
+    global _elector
+    _elector = LeaderElector(on_elected, on_demoted)
+    _elector.start()
+    return _elector
+
+
+def stop_elector() -> None:
+    """Ukončí heartbeat a uvoľní lease (iný uzol ho prevezme hneď, nie až po TTL)."""
+    global _elector
+    if _elector:
+        _elector.stop()
+        _elector = None
+
+
+def is_leader() -> bool:
+    """Bez klastrového režimu (SCHEDULER_CLUSTER=0) je lídrom každý proces."""
+    if not CLUSTER:
+        return True
+    return bool(_elector and _elector.is_leader)
+
+
+def lease_status() -> Optional[Dict[str, Any]]:
+    ensure_schema()
+    return db_connector.execute_query("""
+        SELECT name, holder, epoch, acquired_at, heartbeat_at, expires_at,
+               expires_at >= NOW(6) AS active
+          FROM scheduler_lease WHERE name=%s
+    """, (LEASE_NAME,), fetch='one')
+
+
+# -----------------------------------------------------------------
+# Behy jobov
+# -----------------------------------------------------------------
+def _lock_name(job_id: str, slot: int) -> str:
+    # názov zámku v MySQL má max. 64 znakov
+    digest = hashlib.sha1(f"{LEASE_NAME}:{job_id}".encode("utf-8")).hexdigest()[:24]
+    return f"erpjob:{digest}:{slot}"
+
+
+def _acquire_slot(job_id: str, cap: int):
+    """
+    (spojenie, názov zámku) alebo (None, None), keď sú všetky sloty obsadené.
+    Zámok drží vlastné spojenie mimo poolu – dlhý job tak neblokuje jedno
+    z POOL_SIZE spojení webu a zámok sa nevráti do poolu s iným vlastníkom.
+    """
+    conn = mysql.connector.connect(**db_connector.DB_CONFIG)
+    try:
+        cur = conn.cursor()
+        for slot in range(max(1, cap)):
+            name = _lock_name(job_id, slot)
+            cur.execute("SELECT GET_LOCK(%s, 0)", (name,))
+            got = cur.fetchone()
+            if got and got[0] == 1:
+                cur.close()
+                return conn, name
+        cur.close()
+    except Exception:
+        conn.close()
+        raise
+    conn.close()
+    return None, None
+
+
+def _release_slot(conn, name: str) -> None:
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT RELEASE_LOCK(%s)", (name,))
+        cur.fetchall()
+        cur.close()
+    except Exception:
+        pass
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _epoch() -> Optional[int]:
+    return _elector.epoch if _elector else None
+
+
+def _record(job_id: str, status: str, started: datetime, duration_ms: Optional[int] = None,
+            error: Optional[str] = None) -> Optional[int]:
+    try:
+        ensure_schema()
+        return db_connector.execute_query("""
+            INSERT INTO job_runs (job_id, node, epoch, started_at, finished_at, duration_ms, status, error)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (job_id, NODE_ID, _epoch(), started,
+              None if status == "running" else _utcnow(), duration_ms, status, error), fetch='lastrowid')
+    except Exception as e:
+        log.warning("job_runs: zápis %s zlyhal – %s", job_id, e)
+        return None
+
+
+def _finish(run_id: Optional[int], status: str, duration_ms: int, error: Optional[str]) -> None:
+    if not run_id:
+        return
+    try:
+        db_connector.execute_query("""
+            UPDATE job_runs SET finished_at=%s, duration_ms=%s, status=%s, error=%s WHERE id=%s
+        """, (_utcnow(), duration_ms, status, error, run_id), fetch='none')
+    except Exception as e:
+        log.warning("job_runs: dokončenie %s zlyhalo – %s", run_id, e)
+
+
+def tracked(job_id: str, func: Callable, max_concurrency: Optional[int] = None) -> Callable:
+    """Obal jobu: len na lídrovi, max. N súbežných behov v klastri, záznam do job_runs."""
+    cap = max_concurrency or JOB_CONCURRENCY
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not is_leader():
+            log.debug("Job %s preskočený – proces nie je líder.", job_id)
+            return None
+
+        conn = name = None
+        try:
+            conn, name = _acquire_slot(job_id, cap)
+            if conn is None:
+                _record(job_id, "skipped", _utcnow(), 0, f"beží už {cap}x v klastri")
+                log.info("Job %s preskočený – beží už na inom uzle.", job_id)
+                return None
+        except Exception as e:
+            # bez DB nevieme ani zamknúť, ani zapísať – job sa pokúsi bežať sám
+            log.warning("Job %s: zámok nedostupný (%s) – spúšťam bez obmedzenia.", job_id, e)
+
+        started = _utcnow()
+        run_id = _record(job_id, "running", started)
+        t0 = time.monotonic()
+        status, error = "ok", None
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            status, error = "error", f"{type(e).__name__}: {e}"[:2000]
+            raise
+        finally:
+            _finish(run_id, status, int((time.monotonic() - t0) * 1000), error)
+            if conn is not None:
+                _release_slot(conn, name)
+
+    return wrapper
+
+
+def last_starts(job_ids: List[str]) -> Dict[str, datetime]:
+    """Posledný začiatok behu (UTC, aware) pre joby – podklad pre dobehnutie po prevzatí."""
+    if not job_ids:
+        return {}
+    ensure_schema()
+    ph = ",".join(["%s"] * len(job_ids))
+    rows = db_connector.execute_query(f"""
+        SELECT job_id, MAX(started_at) AS last_start
+          FROM job_runs
+         WHERE job_id IN ({ph}) AND status <> 'skipped' AND started_at >= %s
+         GROUP BY job_id
+    """, (*job_ids, _utcnow() - timedelta(days=RETENTION_DAYS)), fetch='all') or []
+    return {r["job_id"]: r["last_start"].replace(tzinfo=timezone.utc) for r in rows if r.get("last_start")}
+
+
+def prepare_resume(sched) -> Dict[str, Any]:
+    """
+    Pred sched.resume() po zvolení: next_run_time každého jobu nastaví na prvý
+    termín po jeho poslednom behu v klastri (job_runs). Termín, ktorý počas
+    výpadku lídra prepadol, tak APScheduler po resume spustí raz (coalesce,
+    v rámci misfire_grace_time); job, ktorý predchádzajúci líder už stihol,
+    sa nezopakuje. Job bez histórie začne až od najbližšieho termínu.
+    """
+    jobs = sched.get_jobs()
+    try:
+        last = last_starts([j.id for j in jobs])
+    except Exception as e:
+        log.warning("Scheduler: história behov nedostupná (%s) – bez dobehnutia.", e)
+        last = {}
+    now = datetime.now(sched.timezone)
+    caught_up = []
+    for job in jobs:
+        prev = last.get(job.id)
+        if prev is None:
+            base = now
+        else:
+            grace = job.misfire_grace_time or 0
+            base = max(prev.astimezone(sched.timezone) + timedelta(microseconds=1),
+                       now - timedelta(seconds=min(grace, 86400)))
+        nxt = job.trigger.get_next_fire_time(None, base)
+        if nxt is None:
+            continue
+        job.modify(next_run_time=nxt)
+        if nxt <= now:
+            caught_up.append(job.id)
+    if caught_up:
+        log.info("Scheduler: dobehnú sa zmeškané joby: %s", ", ".join(sorted(caught_up)))
+    return {"jobs": len(jobs), "caught_up": caught_up}
+
+
+def cleanup() -> Dict[str, Any]:
+    ensure_schema()
+    db_connector.execute_query(
+        "DELETE FROM job_runs WHERE started_at < %s",
+        (_utcnow() - timedelta(days=RETENTION_DAYS),), fetch='none')
+    return {"retention_days": RETENTION_DAYS}
+
+
+def _percentile(sorted_vals: List[int], q: float) -> Optional[int]:
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def metrics(hours: int = 24) -> Dict[str, Any]:
+    """Latencie a výsledky jobov za posledných `hours` hodín + stav lease."""
+    ensure_schema()
+    try:
+        hours = max(1, min(24 * RETENTION_DAYS, int(hours or 24)))
+    except (TypeError, ValueError):
+        hours = 24
+    rows = db_connector.execute_query("""
+        SELECT job_id, node, started_at, duration_ms, status, error
+          FROM job_runs
+         WHERE started_at >= %s
+         ORDER BY job_id, started_at
+    """, (_utcnow() - timedelta(hours=hours),), fetch='all') or []
+
+    per_job: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        j = per_job.setdefault(r["job_id"], {"durations": [], "runs": 0, "errors": 0, "skipped": 0,
+                                             "running": 0, "last": None, "nodes": set()})
+        status = r.get("status")
+        if status == "skipped":
+            j["skipped"] += 1
+            continue
+        j["runs"] += 1
+        j["nodes"].add(r.get("node"))
+        if status == "error":
+            j["errors"] += 1
+        elif status == "running":
+            j["running"] += 1
+        if r.get("duration_ms") is not None and status != "running":
+            j["durations"].append(int(r["duration_ms"]))
+        j["last"] = r
+
+    jobs = []
+    for job_id, j in sorted(per_job.items()):
+        d = sorted(j["durations"])
+        last = j["last"] or {}
+        jobs.append({
+            "job_id": job_id,
+            "runs": j["runs"],
+            "errors": j["errors"],
+            "skipped": j["skipped"],
+            "running": j["running"],
+            "avg_ms": round(sum(d) / len(d)) if d else None,
+            "p50_ms": _percentile(d, 0.50),
+            "p95_ms": _percentile(d, 0.95),
+            "max_ms": d[-1] if d else None,
+            "last_started_at": last.get("started_at"),
+            "last_status": last.get("status"),
+            "last_error": last.get("error"),
+            "nodes": sorted(n for n in j["nodes"] if n),
+        })
+    return {"node": NODE_ID, "is_leader": is_leader(), "lease": lease_status(),
+            "hours": hours, "jobs": jobs}
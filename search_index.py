@@ -0,0 +1,357 @@
+# =================================================================
+# === TYPEAHEAD: PAMÄŤOVÝ INDEX PRODUKTOV, ZÁKAZNÍKOV, DODÁVATEĽOV ===
+# =================================================================
+#
+# Každý worker drží vlastný index; vyhľadávanie (search) nesiahne na DB.
+#   - text sa skladá bez diakritiky a veľkých písmen (ako office_handler._norm_key),
+#     "Šunka" = "sunka", "ČAJKA" = "cajka"
+#   - trigramy -> kandidáti pre výrazy od 3 znakov (LIKE '%x%' sémantika),
+#     prefixy slov pre 1–2 znakové výrazy; viac slov v dotaze = AND
+#   - poradie: presná zhoda kódu (EAN, zákaznícke číslo) > celý názov >
+#     začiatok názvu > začiatok slova > podreťazec, potom kratší názov
+#
+# Druhy (kind): product, stock (sklad), b2b, b2c, manual, supplier.
+# Skupiny pre verzie v data_versions (http_cache.bump):
+#   catalog -> product, stock; customers -> b2b, b2c, manual; suppliers -> supplier
+#
+# Aktualizácia:
+#   - refresh(kind, keys) po uložení/zmazaní: znovu načíta len tieto záznamy
+#     v tomto workeri a zvýši verziu skupiny pre ostatné workery,
+#   - pri vyhľadávaní sa najviac raz za SEARCH_INDEX_SYNC_S na pozadí
+#     skontrolujú verzie a zmenené skupiny sa načítajú znova; celý index sa
+#     obnoví aj po SEARCH_INDEX_REFRESH_S (zápisy mimo hookov).
+# =================================================================
+import heapq
+import os
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import db_connector
+import http_cache
+
+SYNC_S = int(os.getenv("SEARCH_INDEX_SYNC_S", "15"))
+REFRESH_S = int(os.getenv("SEARCH_INDEX_REFRESH_S", "900"))
+
+GROUPS = {
+    "catalog": ("product", "stock"),
+    "customers": ("b2b", "b2c", "manual"),
+    "suppliers": ("supplier",),
+}
+_GROUP_OF = {k: g for g, kinds in GROUPS.items() for k in kinds}
+
+DocId = Tuple[str, str]
+
+
+def fold(s: Any) -> str:
+    """Text bez diakritiky, malými písmenami, interpunkcia -> medzera."""
+    if s is None:
+        return ""
+    t = unicodedata.normalize("NFKD", str(s))
+    t = "".join(ch for ch in t if not unicodedata.combining(ch)).casefold()
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in t).split())
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _Doc:
+    __slots__ = ("name", "fname", "ftext", "words", "codes", "data")
+
+    def __init__(self, name: str, codes: Sequence[Any], extra: Sequence[Any], data: Dict[str, Any]):
+        self.name = str(name or "").strip()
+        self.fname = fold(self.name)
+        self.codes = {fold(c) for c in codes if c not in (None, "")}
+        self.ftext = " ".join([self.fname, *sorted(self.codes), *(fold(x) for x in extra if x)])
+        self.words = tuple(self.ftext.split())
+        self.data = data
+
+
+# --- zdroje (kind -> načítanie z DB) ------------------------------------------------
+def _in(col: str, keys: Optional[Sequence[str]]) -> Tuple[str, tuple]:
+    if keys is None:
+        return "", ()
+    return f" AND {col} IN ({','.join(['%s'] * len(keys))})", tuple(keys)
+
+
+def _load_product(keys=None) -> Dict[str, _Doc]:
+    cond, params = _in("ean", keys)
+    rows = db_connector.execute_query(
+        "SELECT ean, nazov_vyrobku, mj, COALESCE(nakupna_cena, 0) AS cost, COALESCE(dph, 20.0) AS dph "
+        "FROM produkty WHERE nazov_vyrobku IS NOT NULL AND nazov_vyrobku != ''" + cond, params) or []
+    return {str(r["ean"]): _Doc(r["nazov_vyrobku"], [r["ean"]], [], {
+        "ean": r["ean"], "name": r["nazov_vyrobku"], "mj": r.get("mj") or "kg",
+        "cost": float(r.get("cost") or 0), "dph": float(r.get("dph") or 20.0),
+    }) for r in rows}
+
+
+def _load_stock(keys=None) -> Dict[str, _Doc]:
+    cond, params = _in("nazov", keys)
+    rows = db_connector.execute_query(
+        "SELECT ean, nazov FROM sklad WHERE nazov IS NOT NULL AND nazov != ''" + cond, params) or []
+    return {str(r["nazov"]): _Doc(r["nazov"], [r.get("ean")], [], {
+        "ean": r.get("ean"), "name": r["nazov"], "dph": 20.0,
+    }) for r in rows}
+
+
+def _load_b2b(keys=None) -> Dict[str, _Doc]:
+    cond, params = _in("id", keys)
+    rows = db_connector.execute_query(
+        "SELECT id, zakaznik_id, nazov_firmy, adresa, email, cislo_prevadzky FROM b2b_zakaznici "
+        "WHERE typ='B2B'" + cond, params) or []
+    return {str(r["id"]): _Doc(r["nazov_firmy"], [r.get("zakaznik_id"), r.get("cislo_prevadzky")],
+                               [r.get("adresa")], {
+        "db_id": r["id"], "interne_cislo": r.get("zakaznik_id"), "nazov_firmy": r.get("nazov_firmy"),
+        "adresa": r.get("adresa"), "kontakt": r.get("email"), "is_registered": "1",
+        "cislo_prevadzky": r.get("cislo_prevadzky"),
+    }) for r in rows}
+
+
+def _load_b2c(keys=None) -> Dict[str, _Doc]:
+    # B2C zákazníci nemusia mať profil -> aj mená z objednávok; kľúč = zložené meno
+    rows = db_connector.execute_query(
+        "SELECT nazov_firmy AS name FROM b2b_zakaznici WHERE typ='B2C' AND nazov_firmy IS NOT NULL "
+        "UNION SELECT DISTINCT zakaznik_meno FROM b2c_objednavky WHERE zakaznik_meno IS NOT NULL") or []
+    out: Dict[str, _Doc] = {}
+    for r in rows:
+        k = fold(r["name"])
+        if k and (keys is None or k in keys):
+            out.setdefault(k, _Doc(r["name"], [], [], {"name": str(r["name"]).strip(), "type": "B2C"}))
+    return out
+
+
+def _load_manual(keys=None) -> Dict[str, _Doc]:
+    cond, params = _in("id", keys)
+    rows = db_connector.execute_query(
+        "SELECT id, interne_cislo, nazov_firmy, adresa, kontakt FROM b2b_manual_zakaznici WHERE 1=1" + cond,
+        params) or []
+    return {str(r["id"]): _Doc(r["nazov_firmy"], [r.get("interne_cislo")], [r.get("adresa")], {
+        "db_id": r["id"], "interne_cislo": r.get("interne_cislo"), "nazov_firmy": r.get("nazov_firmy"),
+        "adresa": r.get("adresa"), "kontakt": r.get("kontakt"), "is_registered": "0",
+    }) for r in rows}
+
+
+def _load_supplier(keys=None) -> Dict[str, _Doc]:
+    cond, params = _in("id", keys)
+    rows = db_connector.execute_query(
+        "SELECT id, name, phone, email, address FROM suppliers WHERE is_active=1" + cond, params) or []
+    return {str(r["id"]): _Doc(r["name"], [], [r.get("email")], {
+        "id": r["id"], "name": r["name"], "phone": r.get("phone"),
+        "email": r.get("email"), "address": r.get("address"),
+    }) for r in rows}
+
+
+_LOADERS: Dict[str, Callable[..., Dict[str, _Doc]]] = {
+    "product": _load_product,
+    "stock": _load_stock,
+    "b2b": _load_b2b,
+    "b2c": _load_b2c,
+    "manual": _load_manual,
+    "supplier": _load_supplier,
+}
+
+
+# --- index -------------------------------------------------------------------------
+_lock = threading.RLock()
+_docs: Dict[DocId, _Doc] = {}
+_grams: Dict[str, Set[DocId]] = {}
+_short: Dict[str, Set[DocId]] = {}      # 1–2 znakové prefixy slov
+_order: Dict[str, List[str]] = {k: [] for k in _LOADERS}   # poradie kľúčov z DB (pre all_docs)
+_versions: Dict[str, int] = {}
+_built_at = 0.0
+_last_check = 0.0
+_sync_running = False
+
+
+def _short_keys(doc: _Doc) -> Set[str]:
+    return {w[:n] for w in doc.words for n in (1, 2) if len(w) >= n}
+
+
+def _add(did: DocId, doc: _Doc) -> None:
+    _remove(did)
+    _docs[did] = doc
+    for g in _trigrams(doc.ftext):
+        _grams.setdefault(g, set()).add(did)
+    for p in _short_keys(doc):
+        _short.setdefault(p, set()).add(did)
+
+
+def _remove(did: DocId) -> None:
+    doc = _docs.pop(did, None)
+    if doc is None:
+        return
+    for g in _trigrams(doc.ftext):
+        s = _grams.get(g)
+        if s is not None:
+            s.discard(did)
+            if not s:
+                del _grams[g]
+    for p in _short_keys(doc):
+        s = _short.get(p)
+        if s is not None:
+            s.discard(did)
+            if not s:
+                del _short[p]
+
+
+def _load_kind(kind: str) -> None:
+    try:
+        loaded = _LOADERS[kind]()
+    except Exception as e:
+        print(f"[SEARCH INDEX] načítanie {kind}: {e}")
+        return
+    with _lock:
+        for did in [d for d in _docs if d[0] == kind and d[1] not in loaded]:
+            _remove(did)
+        for key, doc in loaded.items():
+            _add((kind, key), doc)
+        _order[kind] = list(loaded)
+
+
+def _read_versions() -> Dict[str, int]:
+    try:
+        rows = db_connector.execute_query(
+            f"SELECT name, version FROM data_versions WHERE name IN ({','.join(['%s'] * len(GROUPS))})",
+            tuple(GROUPS)) or []
+    except Exception:
+        rows = []
+    return {r["name"]: int(r["version"] or 0) for r in rows}
+
+
+def _build() -> None:
+    global _built_at, _versions
+    versions = _read_versions()
+    for kind in _LOADERS:
+        _load_kind(kind)
+    with _lock:
+        _versions = versions
+        _built_at = time.time()
+
+
+def _sync() -> None:
+    global _sync_running, _versions
+    try:
+        if time.time() - _built_at > REFRESH_S:
+            _build()
+            return
+        versions = _read_versions()
+        for group, kinds in GROUPS.items():
+            if versions.get(group, 0) != _versions.get(group, 0):
+                for kind in kinds:
+                    _load_kind(kind)
+        with _lock:
+            _versions = versions
+    finally:
+        _sync_running = False
+
+
+def _ensure_fresh() -> None:
+    global _last_check, _sync_running
+    if not _built_at:
+        with _lock:
+            if not _built_at:
+                _build()
+        _last_check = time.time()
+        return
+    now = time.time()
+    if now - _last_check < SYNC_S or _sync_running:
+        return
+    _last_check = now
+    _sync_running = True
+    threading.Thread(target=_sync, name="search-index-sync", daemon=True).start()
+
+
+def warm() -> None:
+    """Pri štarte aplikácie: index sa postaví na pozadí, prvé hľadanie nečaká."""
+    if not _built_at:
+        threading.Thread(target=_ensure_fresh, name="search-index-warm", daemon=True).start()
+
+
+# --- zápisy ----------------------------------------------------------------------------
+def refresh(kind: str, keys: Iterable[Any]) -> None:
+    """Po uložení/zmazaní: znovu načíta dané záznamy (chýbajúce sa vyhodia). Nikdy nevyhodí chybu."""
+    keys = [str(k) for k in keys if k not in (None, "")]
+    if not keys or kind not in _LOADERS:
+        return
+    try:
+        if _built_at:
+            loaded = _LOADERS[kind](keys)
+            with _lock:
+                for key in keys:
+                    doc = loaded.get(key)
+                    if doc is None:
+                        _remove((kind, key))
+                        if key in _order[kind]:
+                            _order[kind].remove(key)
+                    else:
+                        _add((kind, key), doc)
+                        if key not in _order[kind]:
+                            _order[kind].append(key)
+        http_cache.bump(_GROUP_OF[kind])
+    except Exception as e:
+        print(f"[SEARCH INDEX] refresh {kind} {keys[:5]}: {e}")
+
+
+def invalidate(group: str) -> None:
+    """Hromadná zmena (import, schválenie registrácie…): skupina sa načíta znova všade."""
+    global _last_check
+    http_cache.bump(group)
+    _last_check = 0.0
+
+
+# --- vyhľadávanie -------------------------------------------------------------------------
+def _candidates(term: str) -> Set[DocId]:
+    if len(term) < 3:
+        return set(_short.get(term, ()))
+    postings = sorted((_grams.get(g, set()) for g in _trigrams(term)), key=len)
+    if not postings or not postings[0]:
+        return set()
+    out = set(postings[0])
+    for p in postings[1:]:
+        out &= p
+        if not out:
+            break
+    return {d for d in out if term in _docs[d].ftext}
+
+
+def _rank(doc: _Doc, fq: str, terms: List[str]) -> tuple:
+    if fq in doc.codes:
+        tier = 0
+    elif doc.fname == fq:
+        tier = 1
+    elif doc.fname.startswith(fq):
+        tier = 2
+    elif all(any(w.startswith(t) for w in doc.words) for t in terms):
+        tier = 3
+    else:
+        tier = 4
+    return (tier, len(doc.name), doc.fname)
+
+
+def search(q: str, kinds: Sequence[str], limit: int = 20) -> List[Dict[str, Any]]:
+    """Zoradené výsledky (payload + 'kind') pre dotaz; prázdny dotaz -> []."""
+    fq = fold(q)
+    terms = fq.split()
+    if not terms:
+        return []
+    _ensure_fresh()
+    kinds = set(kinds)
+    with _lock:
+        hits: Optional[Set[DocId]] = None
+        for t in sorted(terms, key=len, reverse=True):
+            c = _candidates(t)
+            hits = c if hits is None else hits & c
+            if not hits:
+                return []
+        ranked = heapq.nsmallest(max(int(limit), 0),
+                                 ((_rank(_docs[d], fq, terms), d) for d in hits if d[0] in kinds))
+        return [dict(_docs[d].data, kind=d[0]) for _, d in ranked]
+
+
+def all_docs(kind: str) -> List[Dict[str, Any]]:
+    """Všetky záznamy druhu v poradí z DB (napr. celý zoznam pre klientsky autocomplete)."""
+    _ensure_fresh()
+    with _lock:
+        return [dict(_docs[(kind, k)].data) for k in _order.get(kind, []) if (kind, k) in _docs]
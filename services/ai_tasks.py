@@ -234,6 +234,22 @@ def run_task(task_id: int, *, idempotency_key: str | None = None, throttle_secon
         rows = []
         row_count = 0
 
+        # === 0. Skompilované SQL z predošlého behu (bez volania LLM) ===
+        res = None
+        if question and not sql_text:
+            import ai_query_governor
+            from nastroje_ai import get_schema_prompt, vykonaj_bezpecny_sql_prikaz
+            schema_ctx = get_schema_prompt()
+            cached_sql = ai_query_governor.compiled_sql(question, schema_ctx)
+            if cached_sql:
+                res = vykonaj_bezpecny_sql_prikaz(cached_sql)
+                if res.get("error"):
+                    # schéma/dáta sa zmenili -> nech SQL znova vygeneruje AI
+                    ai_query_governor.forget_sql(question, schema_ctx)
+                    res = None
+                else:
+                    sql_text = cached_sql
+
         # === 1. AI Logic ===
         if question and not sql_text:
             try:
@@ -254,8 +270,9 @@ def run_task(task_id: int, *, idempotency_key: str | None = None, throttle_secon
         # === 2. Legacy SQL Logic ===
         elif sql_text:
             try:
-                from nastroje_ai import vykonaj_bezpecny_sql_prikaz
-                res = vykonaj_bezpecny_sql_prikaz(sql_text)
+                if res is None:
+                    from nastroje_ai import vykonaj_bezpecny_sql_prikaz
+                    res = vykonaj_bezpecny_sql_prikaz(sql_text)
                 if res.get("error"):
                     sql_err = res["error"]
                 else:
@@ -129,6 +129,23 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // GET – prehliadač si odpoveď podrží a pri ďalšom načítaní ju len overí (ETag / 304)
+  async function apiGet(url) {
+    showLoader();
+    try {
+      const res = await fetch(url, { credentials: 'same-origin' });
+      const ct = res.headers.get('Content-Type') || '';
+      const out = ct.includes('application/json') ? await res.json() : { error: await res.text() };
+      if (!res.ok || out.error) throw new Error(out.error || `HTTP ${res.status}`);
+      return out;
+    } catch (e) {
+      showNotification(e.message || 'Neznáma chyba servera.', 'error');
+      return null;
+    } finally {
+      hideLoader();
+    }
+  }
+
   function showAuthView(viewId) {
     document.querySelectorAll('#auth-views > div').forEach(v => v.classList.add('hidden'));
     document.getElementById(viewId)?.classList.remove('hidden');
@@ -390,7 +407,7 @@ document.addEventListener('DOMContentLoaded', () => {
             appState.products = {};
             return;
         }
-        const res = await apiCall('/api/b2b/get-products', { pricelist_id: id });
+        const res = await apiGet('/api/b2b/get-products?pricelist_id=' + encodeURIComponent(id));
         if (!res) return;
         appState.products = res.productsByCategory || {};
         renderProducts();
@@ -831,19 +848,28 @@ function setMinDeliveryDate() {
   // História objednávok
   // =========================
 
-  window.loadB2BOrderHistory = async function () {
+  // história ide po stránkach (kurzor zo servera), položky sa dočítajú až po rozkliknutí
+  let historyCursor = null;
+
+  window.loadB2BOrderHistory = async function (append) {
     const cont = document.getElementById('history-container');
-    cont.innerHTML = '<p>Načítavam históriu objednávok...</p>';
+    const uRaw = sessionStorage.getItem('b2bUser');
+    const u = uRaw ? JSON.parse(uRaw) : null;
+    if (!append) {
+      historyCursor = null;
+      cont.innerHTML = '<p>Načítavam históriu objednávok...</p>';
+    }
+    const moreBtn = document.getElementById('history-more');
+    if (moreBtn) moreBtn.remove();
     try {
-      const uRaw = sessionStorage.getItem('b2bUser');
-      const u = uRaw ? JSON.parse(uRaw) : null;
       if (!u || !u.id) {
         cont.innerHTML = '<p class="error">Nie ste prihlásený.</p>';
         return;
       }
-      const resp = await apiCall('/api/b2b/get-order-history', { userId: u.id });
+      const resp = await apiCall('/api/b2b/get-order-history', { userId: u.id, cursor: append ? historyCursor : null });
       const rows = (resp && resp.orders) || [];
-      if (!rows.length) {
+      historyCursor = (resp && resp.next_cursor) || null;
+      if (!rows.length && !append) {
         cont.innerHTML = '<p>Zatiaľ nemáte žiadne B2B objednávky.</p>';
         return;
       }
@@ -863,17 +889,63 @@ function setMinDeliveryDate() {
             <div style="flex:0 0 180px;min-width:180px;text-align:right;">
               <div class="history-total" style="font-weight:600;">Spolu: ${total}</div>
               <div class="history-actions" style="margin-top:6px;display:flex;flex-direction:column;gap:4px;">
+                <button class="button secondary" style="width:100%;" onclick="toggleB2BHistoryItems(${o.id}, ${Number(u.id)})">Položky</button>
                 <a class="button" style="width:100%;text-align:center;" href="${pdf}" target="_blank" rel="noopener">Zobraziť PDF</a>
                 <a class="button secondary" style="width:100%;text-align:center;" href="${pdfDl}" download>Stiahnuť PDF</a>
               </div>
             </div>
           </div>
+          <div id="history-items-${o.id}" class="hidden" style="margin-top:8px;"></div>
         </div>`;
       });
-      cont.innerHTML = html;
+      if (append) {
+        cont.insertAdjacentHTML('beforeend', html);
+      } else {
+        cont.innerHTML = html;
+      }
+      if (historyCursor) {
+        cont.insertAdjacentHTML('beforeend',
+          '<button id="history-more" class="button secondary" style="width:100%;" onclick="loadB2BOrderHistory(true)">Načítať staršie</button>');
+      }
     } catch (e) {
       console.error(e);
-      cont.innerHTML = '<p class="error">Nepodarilo sa načítať históriu.</p>';
+      if (append) {
+        showNotification('Nepodarilo sa načítať ďalšie objednávky.', 'error');
+      } else {
+        cont.innerHTML = '<p class="error">Nepodarilo sa načítať históriu.</p>';
+      }
+    }
+  };
+
+  window.toggleB2BHistoryItems = async function (orderId, userId) {
+    const box = document.getElementById(`history-items-${orderId}`);
+    if (!box) return;
+    if (!box.classList.contains('hidden')) {
+      box.classList.add('hidden');
+      return;
+    }
+    box.classList.remove('hidden');
+    if (box.dataset.loaded) return;
+    box.innerHTML = '<p>Načítavam položky...</p>';
+    try {
+      const resp = await apiCall('/api/b2b/get-order-items', { userId, orderId });
+      const items = (resp && resp.items) || [];
+      if (!items.length) {
+        box.innerHTML = '<p>Objednávka nemá položky.</p>';
+      } else {
+        let rowsHtml = '';
+        items.forEach(it => {
+          const qty = (it.delivered != null) ? it.delivered : it.quantity;
+          const price = (it.price != null) ? Number(it.price).toFixed(2) + ' €' : '';
+          rowsHtml += `<tr><td>${it.name || it.ean || ''}</td><td style="text-align:right;">${qty ?? ''} ${it.unit || ''}</td><td style="text-align:right;">${price}</td></tr>`;
+          if (it.item_note) rowsHtml += `<tr><td colspan="3" style="font-size:.8rem;color:#6b7280;">📌 ${it.item_note}</td></tr>`;
+        });
+        box.innerHTML = `<table class="table" style="width:100%;font-size:.85rem;"><thead><tr><th>Produkt</th><th style="text-align:right;">Množstvo</th><th style="text-align:right;">Cena bez DPH</th></tr></thead><tbody>${rowsHtml}</tbody></table>`;
+      }
+      box.dataset.loaded = '1';
+    } catch (e) {
+      console.error(e);
+      box.innerHTML = '<p class="error">Nepodarilo sa načítať položky.</p>';
     }
   };
 
@@ -951,13 +1023,21 @@ function setMinDeliveryDate() {
   }
   window.openAttachment = openAttachment;
 
-  async function loadCommunicationList() {
+  let commCursor = null;
+
+  async function loadCommunicationList(append) {
     const list = document.getElementById('comm-list');
-    list.innerHTML = '<p>Načítavam správy...</p>';
+    if (!append) {
+      commCursor = null;
+      list.innerHTML = '<p>Načítavam správy...</p>';
+    }
+    const moreBtn = document.getElementById('comm-more');
+    if (moreBtn) moreBtn.remove();
     try {
-      const resp = await apiCall('/api/b2b/messages/my', { userId: appState.currentUser.id, page: 1, page_size: 50 });
+      const resp = await apiCall('/api/b2b/messages/my', { userId: appState.currentUser.id, page_size: 50, cursor: append ? commCursor : null });
       const rows = (resp && resp.messages) || [];
-      if (!rows.length) {
+      commCursor = (resp && resp.next_cursor) || null;
+      if (!rows.length && !append) {
         list.innerHTML = '<p>Zatiaľ nemáte žiadne správy.</p>';
         return;
       }
@@ -990,12 +1070,21 @@ function setMinDeliveryDate() {
           </div>` : ''}
         </div>`;
       });
-      list.innerHTML = html;
+      if (append) {
+        list.insertAdjacentHTML('beforeend', html);
+      } else {
+        list.innerHTML = html;
+      }
+      if (commCursor) {
+        list.insertAdjacentHTML('beforeend',
+          '<button id="comm-more" class="button secondary" style="width:100%;" onclick="loadB2BCommunicationMore()">Načítať staršie</button>');
+      }
     } catch (e) {
       console.error(e);
       list.innerHTML = '<p class="error">Nepodarilo sa načítať správy.</p>';
     }
   }
+  window.loadB2BCommunicationMore = () => loadCommunicationList(true);
 
   // =========================
   // POMOC / NÁVOD
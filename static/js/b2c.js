@@ -733,32 +733,28 @@ async function handleOrderSubmit(event) {
 // -----------------------------------------------------------------
 // História objednávok
 // -----------------------------------------------------------------
-async function loadOrderHistory() {
+// história ide po stránkach (kurzor zo servera), položky sa dočítajú až po rozkliknutí
+let historyCursor = null;
+
+async function loadOrderHistory(append) {
   const container = document.getElementById('history-container');
   if (!container) return;
-  container.innerHTML = '<p>Načítavam históriu objednávok...</p>';
+  if (!append) {
+    historyCursor = null;
+    container.innerHTML = '<p>Načítavam históriu objednávok...</p>';
+  }
+  document.getElementById('history-more')?.remove();
   try {
-    const data = await apiRequest('/api/b2c/get-history');
+    const qs = append && historyCursor ? `?cursor=${encodeURIComponent(historyCursor)}` : '';
+    const data = await apiRequest('/api/b2c/get-history' + qs);
+    historyCursor = data.next_cursor || null;
     if (data.orders && data.orders.length > 0) {
       let html = '';
       data.orders.forEach(order => {
         const orderDate    = order.datum_objednavky ? new Date(order.datum_objednavky).toLocaleDateString('sk-SK') : '';
         const deliveryDate = order.pozadovany_datum_dodania ? new Date(order.pozadovany_datum_dodania).toLocaleDateString('sk-SK') : '';
 
-        let items = Array.isArray(order.items) ? order.items : [];
-        if (!items.length && typeof order.polozky === 'string') {
-          try { items = JSON.parse(order.polozky || '[]'); } catch { items = []; }
-        }
-
-        let itemsHtml = '<ul>' + items.map(item => {
-          const nm  = item.name || item.nazov || item.nazov_vyrobku || '—';
-          const qty = item.quantity ?? item.mnozstvo ?? '';
-          const un  = item.unit || item.mj || '';
-          const nt  = item.item_note || item.poznamka_k_polozke || '';
-          return `<li>${escapeHtml(nm)} - ${escapeHtml(String(qty))} ${escapeHtml(un)} ${nt ? `<i>(${escapeHtml(nt)})</i>` : ''}</li>`;
-        }).join('') + '</ul>';
-
-        const finalPrice = (order.finalna_suma_s_dph != null)
+        const finalPrice = (order.finalna_suma_s_dph != null && parseFloat(order.finalna_suma_s_dph) > 0)
           ? `${parseFloat(order.finalna_suma_s_dph).toFixed(2)} €`
           : `(čaká na preváženie)`;
         const stav = order.stav || '';
@@ -770,18 +766,57 @@ async function loadOrderHistory() {
             </div>
             <div class="history-body">
               ${deliveryDate ? `<p><strong>Požadované vyzdvihnutie:</strong> ${deliveryDate}</p>` : ''}
-              <p><strong>Položky:</strong></p>
-              ${itemsHtml}
-              <p><strong>Finálna suma:</strong> ${finalPrice}</p>
+              <p><button class="button button-small" onclick="toggleOrderItems(${Number(order.id)})">Položky</button></p>
+              <div id="history-items-${Number(order.id)}" class="hidden"></div>
+              <p><strong>Finálna suma:</strong> <span id="history-total-${Number(order.id)}">${finalPrice}</span></p>
             </div>
           </div>`;
       });
-      container.innerHTML = html;
-    } else {
+      if (append) {
+        container.insertAdjacentHTML('beforeend', html);
+      } else {
+        container.innerHTML = html;
+      }
+      if (historyCursor) {
+        container.insertAdjacentHTML('beforeend',
+          '<button id="history-more" class="button" onclick="loadOrderHistory(true)">Načítať staršie</button>');
+      }
+    } else if (!append) {
       container.innerHTML = '<p>Zatiaľ nemáte žiadne objednávky.</p>';
     }
   } catch (error) {
-    container.innerHTML = `<p class="error">Nepodarilo sa načítať históriu objednávok.</p>`;
+    if (!append) container.innerHTML = `<p class="error">Nepodarilo sa načítať históriu objednávok.</p>`;
+  }
+}
+
+async function toggleOrderItems(orderId) {
+  const box = document.getElementById(`history-items-${orderId}`);
+  if (!box) return;
+  if (!box.classList.contains('hidden')) {
+    box.classList.add('hidden');
+    return;
+  }
+  box.classList.remove('hidden');
+  if (box.dataset.loaded) return;
+  box.innerHTML = '<p>Načítavam položky...</p>';
+  try {
+    const data = await apiRequest(`/api/b2c/order-items/${orderId}`);
+    const order = data.order || {};
+    const items = Array.isArray(order.items) ? order.items : [];
+    box.innerHTML = '<ul>' + items.map(item => {
+      const nm  = item.name || item.nazov || item.nazov_vyrobku || '—';
+      const qty = item.quantity ?? item.mnozstvo ?? '';
+      const un  = item.unit || item.mj || '';
+      const nt  = item.item_note || item.poznamka_k_polozke || '';
+      return `<li>${escapeHtml(nm)} - ${escapeHtml(String(qty))} ${escapeHtml(un)} ${nt ? `<i>(${escapeHtml(nt)})</i>` : ''}</li>`;
+    }).join('') + '</ul>';
+    if (order.finalna_suma_s_dph != null && parseFloat(order.finalna_suma_s_dph) > 0) {
+      const total = document.getElementById(`history-total-${orderId}`);
+      if (total) total.textContent = `${parseFloat(order.finalna_suma_s_dph).toFixed(2)} €`;
+    }
+    box.dataset.loaded = '1';
+  } catch (_) {
+    box.innerHTML = '<p class="error">Nepodarilo sa načítať položky.</p>';
   }
 }
 
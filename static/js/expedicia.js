@@ -510,7 +510,7 @@ async function loadProductionsByDate(dateStr) {
           // ZMENA: Obrovské políčko pre tablet
           realityDisplay = `
               <div style="display:flex; align-items:center; justify-content:center; gap:8px;">
-                  <input type="number" step="${p.mj==='ks' ? 1 : 0.01}" id="actual_${p.batchId}" value="${defaultVal}" 
+                  <input type="number" step="${p.mj==='ks' ? 1 : 0.01}" id="actual_${p.batchId}" data-unit="${p.mj}" value="${defaultVal}" 
                          style="width:130px; height:50px; font-size:22px; font-weight:bold; text-align:center; border:2px solid #3b82f6; border-radius:8px; background:#f0f9ff; color:#0f172a; box-shadow:inset 0 2px 4px rgba(0,0,0,0.05);"
                          onclick="this.select();">
                   <span style="font-size:18px; font-weight:bold; color:#475569;">${p.mj}</span>
@@ -536,18 +536,56 @@ async function loadProductionsByDate(dateStr) {
     });
     html += `</tbody></table>`;
     document.getElementById('expedition-batch-table').innerHTML = html;
-    renderActionButtons(false, hasAcceptedItems);
+    renderActionButtons(false, hasAcceptedItems, data.some(p => p.status !== 'Prijaté, čaká na tlač'));
   } catch(e) { console.error(e); showStatus("Chyba pri načítaní položiek.", true); }
 }
 
-function renderActionButtons(isEmpty, showFinishButton = false) {
+function renderActionButtons(isEmpty, showFinishButton = false, showAcceptAllButton = false) {
     const actions = document.getElementById('expedition-action-buttons');
     let finishBtn = '';
+    let acceptAllBtn = '';
+    if (showAcceptAllButton) {
+        acceptAllBtn = `<button class="btn-success" style="padding:12px 20px; font-size:1.1em;" onclick="acceptAllProductions(this)"><i class="fas fa-check-double"></i> Prijať všetky</button>`;
+    }
     let printReportBtn = `<button class="btn-info" style="padding:12px 20px; font-size:1.1em;" onclick="printDailyReport()"><i class="fas fa-print"></i> Denný Protokol</button>`;
     if (showFinishButton) {
         finishBtn = `<button class="btn-success" style="padding:12px 20px; font-size:1.1em;" onclick="finishDailyReception()"><i class="fas fa-flag-checkered"></i> UKONČIŤ DENNÝ PRÍJEM</button>`;
     }
-    actions.innerHTML = `<div style="display:flex; justify-content:space-between; align-items:center; margin-top:20px; border-top:1px solid #ddd; padding-top:15px;"><div class="btn-grid" style="gap:10px;"><button class="btn-secondary" onclick="loadProductionDates()"><i class="fas fa-arrow-left"></i> Späť</button><button class="btn-primary" onclick="openAcceptanceDays()"><i class="fas fa-folder-open"></i> Archív</button></div><div style="display:flex; gap:10px;">${printReportBtn}${finishBtn}</div></div>`;
+    actions.innerHTML = `<div style="display:flex; justify-content:space-between; align-items:center; margin-top:20px; border-top:1px solid #ddd; padding-top:15px;"><div class="btn-grid" style="gap:10px;"><button class="btn-secondary" onclick="loadProductionDates()"><i class="fas fa-arrow-left"></i> Späť</button><button class="btn-primary" onclick="openAcceptanceDays()"><i class="fas fa-folder-open"></i> Archív</button></div><div style="display:flex; gap:10px;">${acceptAllBtn}${printReportBtn}${finishBtn}</div></div>`;
+}
+
+// Hromadný príjem: všetky nevybavené riadky s vyplneným množstvom v jednej požiadavke
+async function acceptAllProductions(btnEl) {
+  if (isSubmitting) return;
+  const workerName = document.getElementById('expedition-worker-name').value;
+  const currentDate = document.getElementById('view-expedition-batch-list').dataset.currentDate;
+  const acceptDate = document.getElementById('expedition-accept-date').value || new Date().toISOString().slice(0,10);
+  if (!workerName) { showStatus("Zadajte meno preberajúceho pracovníka (hore).", true); document.getElementById('expedition-worker-name').focus(); return; }
+
+  const items = [];
+  document.querySelectorAll('#expedition-batch-table tr[data-batch-id]').forEach(tr => {
+    const batchId = tr.dataset.batchId;
+    const input = document.getElementById(`actual_${batchId}`);
+    if (!input) return;
+    const valNorm = String(input.value || '').trim().replace(',', '.');
+    if (!valNorm || Number(valNorm) <= 0) return;
+    const unit = input.dataset.unit;
+    items.push({ batchId, unit, actualValue: valNorm, note: document.getElementById(`note_${batchId}`)?.value || '' });
+  });
+  if (!items.length) { showStatus("Nie je čo prijať – zadajte reálne množstvá.", true); return; }
+  if (!confirm(`Prijať ${items.length} položiek naraz?`)) return;
+  const finishDay = confirm("Ukončiť zároveň aj denný príjem (archivovať a vygenerovať export)?");
+
+  isSubmitting = true; btnEl.disabled = true; btnEl.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
+  try {
+    const res = await apiRequest('/api/expedicia/acceptProductionItems', { method:'POST', body: { items, workerName, acceptDate, date: currentDate, finishDay } });
+    const failed = (res.results || []).filter(r => !r.ok);
+    let msg = res.message || '';
+    if (failed.length) msg += ' Chyby: ' + failed.map(r => `${r.batchId}: ${r.error}`).join('; ');
+    else if (res.finish && res.finish.message) msg += ' ' + res.finish.message;
+    showStatus(msg, failed.length > 0);
+    loadProductionsByDate(currentDate);
+  } catch(e) { showStatus("Chyba: " + e.message, true); btnEl.disabled = false; btnEl.innerHTML = '<i class="fas fa-check-double"></i> Prijať všetky'; } finally { isSubmitting = false; }
 }
 
 async function acceptSingleProduction(batchId, unit, btnEl, currentDate) {
@@ -136,8 +136,42 @@ async function nacitajLiveKPI() {
     try {
         const res = await fetch('/api/leader/tv_board/live_kpi');
         if (!res.ok) return;
-        const kpi = await res.json();
-        
+        vykresliLiveKPI(await res.json());
+    } catch (e) { console.error("Chyba pri načítaní KPI:", e); }
+}
+
+// KPI krátkym pollom: server vráti snapshot z pamäte hneď, pri nezmenenom
+// etagu prázdnu 304. Keď je tabuľa skrytá alebo sa zatvára, poll stojí.
+const KPI_POLL_MS = 10000;
+let kpiEtag = '';
+let kpiTimer = null;
+
+async function pripojLiveKPIStream() {
+    clearTimeout(kpiTimer);
+    kpiTimer = null;
+    if (document.hidden) return;
+    try {
+        const res = await fetch('/api/leader/kpi/poll' + (kpiEtag ? '?since=' + encodeURIComponent(kpiEtag) : ''),
+                                { credentials: 'same-origin', cache: 'no-store' });
+        if (res.status === 200) {
+            const snap = await res.json();
+            kpiEtag = snap.etag || '';
+            vykresliLiveKPI(Object.assign({}, snap.tv || {}, { target_date: snap.target_date }));
+        }
+    } catch (e) {
+        console.error("Chyba pri načítaní KPI:", e);
+    }
+    if (!document.hidden && kpiTimer === null) kpiTimer = setTimeout(pripojLiveKPIStream, KPI_POLL_MS);
+}
+
+document.addEventListener('visibilitychange', () => {
+    if (document.hidden) { clearTimeout(kpiTimer); kpiTimer = null; }
+    else pripojLiveKPIStream();
+});
+window.addEventListener('pagehide', () => { clearTimeout(kpiTimer); kpiTimer = null; });
+
+function vykresliLiveKPI(kpi) {
+    try {
         let kpiContainer = document.getElementById('tv-live-kpi-banner');
         if (!kpiContainer) {
             kpiContainer = document.createElement('div');
@@ -180,7 +214,7 @@ async function nacitajLiveKPI() {
                 </div>
             </div>
         `;
-    } catch (e) { console.error("Chyba pri načítaní KPI:", e); }
+    } catch (e) { console.error("Chyba pri vykreslení KPI:", e); }
 }
 
 // =======================================================================
@@ -566,8 +600,7 @@ document.addEventListener("DOMContentLoaded", function() {
     nacitajPoznamkyNaTabulu();
     setInterval(nacitajPoznamkyNaTabulu, 15000); 
     
-    nacitajLiveKPI();
-    setInterval(nacitajLiveKPI, 25000);
+    pripojLiveKPIStream();
 
     // Overovanie focusu veľmi rýchlo (každú 1.5 sekundu)
     setInterval(kontrolujFocus, 1500); 
@@ -234,19 +234,29 @@ function initMobileMenu() {
 // === NÁRADIE NA DYNAMICKÝ IMPORT (ERP, MAIL, SMS) =================
 // =================================================================
 
+// '/static/js/x.js' alebo 'js/x.js' -> URL z asset_url() (window.ASSET_URLS v šablóne),
+// bez buildu pôvodná /static/ cesta
+function assetUrl(path) {
+  const key = String(path || '').replace(/^\/?static\//, '').replace(/^\//, '').split('?')[0];
+  const url = (window.ASSET_URLS && window.ASSET_URLS[key]) || ('/static/' + key);
+  return new URL(url, document.baseURI).href;
+}
+
 function loadScriptOnce(src, dataAttr) {
+  const url = assetUrl(src);
   return new Promise((resolve, reject) => {
     const existing = Array.from(document.scripts).find(s =>
-      s.getAttribute(dataAttr) === '1' || (s.src && s.src.indexOf(src) !== -1)
+      s.getAttribute(dataAttr) === '1' || (s.src && assetUrl(new URL(s.src).pathname) === url) || s.src === url
     );
     if (existing) {
-      if (existing.dataset.loaded === '1') return resolve();
+      // skript zo šablóny (bez dataAttr) už pred kancelaria.js zbehol
+      if (existing.dataset.loaded === '1' || existing.getAttribute(dataAttr) !== '1') return resolve();
       existing.addEventListener('load', () => resolve());
       existing.addEventListener('error', () => reject(new Error('Načítanie skriptu zlyhalo: ' + src)));
       return;
     }
     const s = document.createElement('script');
-    s.src = src + (src.indexOf('?') === -1 ? '?' : '&') + 'v=' + Date.now();
+    s.src = url;
     s.defer = true;
     s.setAttribute(dataAttr, '1');
     s.onload  = () => { s.dataset.loaded = '1'; resolve(); };
@@ -741,13 +741,16 @@
           let sDate = todayStr, eDate = todayStr;
           let sTime = '08:00', eTime = '09:00';
           
-          if(ev.start) {
-              const parts = ev.start.split('T');
+          // opakovaná udalosť: výskyt != séria – ukladáme začiatok/koniec série
+          const evStart = (ev.recurring && ev.series_start) || ev.start;
+          const evEnd   = (ev.recurring && ev.series_end) || ev.end;
+          if(evStart) {
+              const parts = evStart.split('T');
               sDate = parts[0] || todayStr;
               if(parts[1]) sTime = parts[1].substring(0, 5);
           }
-          if(ev.end) {
-              const parts = ev.end.split('T');
+          if(evEnd) {
+              const parts = evEnd.split('T');
               eDate = parts[0] || sDate;
               if(parts[1]) eTime = parts[1].substring(0, 5);
           }
@@ -795,7 +798,8 @@
         f.status.value = (ev.status || 'OPEN').toString().toUpperCase();
       }
 
-      const d = new Date(ev.start || ev.start_at);
+      // pri opakovanej udalosti sa edituje celá séria – nie kliknutý výskyt
+      const d = new Date((ev.recurring && ev.series_start) || ev.start || ev.start_at);
       if (!isNaN(d)){
         f.start_date.value = calDateKey(d);
         const hh = calPad(d.getHours());
@@ -805,7 +809,7 @@
         f.start_date.value = dateKey;
       }
 
-      const d2 = new Date(ev.end || ev.end_at || d);
+      const d2 = new Date((ev.recurring && ev.series_end) || ev.end || ev.end_at || d);
       if (!isNaN(d2)){
         f.end_date.value = calDateKey(d2);
         const hh = calPad(d2.getHours());
@@ -191,7 +191,7 @@
       </div>
     `;
 
-    const state   = { folder: 'INBOX', page: 1, pageSize: 20, query: '', customerId: '' };
+    const state   = { folder: 'INBOX', page: 1, pageSize: 20, query: '', customerId: '', cursors: [null] };
     const elTbody = container.querySelector('#mail-table tbody');
     const elInfo  = container.querySelector('#mail-page-info');
 
@@ -269,12 +269,12 @@
       }
     }
 
-    function updatePager(total) {
+    function updatePager(total, hasMore, approximate) {
       const start = total === 0 ? 0 : (state.page - 1) * state.pageSize + 1;
       const end   = Math.min(state.page * state.pageSize, total);
-      elInfo.textContent = `${start}–${end} z ${total}`;
+      elInfo.textContent = `${start}–${end} z ${approximate ? 'viac ako ' : ''}${total}`;
       container.querySelector('#btn-prev').disabled = state.page <= 1;
-      container.querySelector('#btn-next').disabled = end >= total;
+      container.querySelector('#btn-next').disabled = hasMore === undefined ? end >= total : !hasMore;
     }
 
     async function loadList() {
@@ -288,11 +288,15 @@
       });
       if (state.query && state.query.trim()) params.set('query', state.query.trim());
       if (state.customerId) params.set('customer_id', state.customerId);
+      // stránkovanie kurzorom: cursors[i] = kurzor, ktorým začína strana i+1
+      if (state.page === 1) state.cursors = [null];
+      const cursor = state.cursors[state.page - 1];
+      if (cursor) params.set('cursor', cursor);
 
       const res = await apiRequest('/api/mail/messages?' + params.toString());
       if (res && res.error) {
         elTbody.innerHTML = `<tr><td colspan="4" class="text-danger" style="padding:1rem;">${escapeHtml(res.error)}</td></tr>`;
-        updatePager(0);
+        updatePager(0, false);
         return;
       }
 
@@ -315,7 +319,8 @@
         });
       }
 
-      updatePager(Number(res.total || 0));
+      state.cursors[state.page] = res.next_cursor || null;
+      updatePager(Number(res.total || 0), res.has_more, res.total_approximate);
       loadSummary();
     }
 
@@ -786,6 +791,7 @@
       }
     };
     container.querySelector('#btn-next').onclick = () => {
+      if (!state.cursors[state.page]) return;
       state.page++;
       loadList();
     };
@@ -114,6 +114,47 @@
   var __pickedCustomer = null; var __pickedPricelist = null; var __pricelistMapByEAN = Object.create(null);
 
   // ============================== DASHBOARD ================================
+  function applyDashboardKpi(kpi){
+    const $id = (s)=>document.getElementById(s);
+    const k = kpi || {};
+    if($id('kpi-b2c')) $id('kpi-b2c').textContent    = (k.b2c_count!=null)    ? k.b2c_count    : '—';
+    if($id('kpi-b2b')) $id('kpi-b2b').textContent    = (k.b2b_count!=null)    ? k.b2b_count    : '—';
+    if($id('kpi-items')) $id('kpi-items').textContent = (k.items_total!=null) ? k.items_total : '—';
+    if($id('kpi-sum')) $id('kpi-sum').textContent    = (k.sum_total!=null)    ? `${fmt2(k.sum_total)} €` : '—';
+    if($id('kpi-zostava')) $id('kpi-zostava').textContent = (k.zostava_chystat != null) ? k.zostava_chystat + ' obj.' : '0 obj.';
+    if($id('kpi-tempo')) $id('kpi-tempo').textContent = (k.tempo_minuty > 0) ? k.tempo_minuty + ' min/obj' : '—';
+    if($id('kpi-odhad')) $id('kpi-odhad').textContent = (k.odhad_konca) ? k.odhad_konca : '—';
+  }
+
+  // Živé KPI zo servera (krátky poll, 304 pri nezmenenom etagu) – jeden časovač na tab,
+  // beží len kým je dashboard zobrazený a tab viditeľný; aktualizuje len zvolený deň
+  const KPI_POLL_MS = 10000;
+  var __kpiEtag = '';
+  var __kpiTimer = null;
+  function kpiPollActive(){
+    const sec = document.getElementById('leader-dashboard');
+    return !document.hidden && !!sec && sec.classList.contains('active');
+  }
+  function stopKpiPoll(){ clearTimeout(__kpiTimer); __kpiTimer = null; }
+  async function subscribeKpiStream(){
+    stopKpiPoll();
+    if (!kpiPollActive()) return;
+    try{
+      const res = await fetch('/api/leader/kpi/poll' + (__kpiEtag ? '?since=' + encodeURIComponent(__kpiEtag) : ''),
+                              { credentials: 'same-origin', cache: 'no-store' });
+      if (res.status === 200){
+        const snap = await res.json();
+        __kpiEtag = snap.etag || '';
+        const el = document.getElementById('ldr-date');
+        const d = (el && el.value) || todayISO();
+        if (snap.days && snap.days[d]) applyDashboardKpi(snap.days[d]);
+      }
+    }catch(_){}
+    if (kpiPollActive() && __kpiTimer === null) __kpiTimer = setTimeout(subscribeKpiStream, KPI_POLL_MS);
+  }
+  document.addEventListener('visibilitychange', () => { if (document.hidden) stopKpiPoll(); else subscribeKpiStream(); });
+  window.addEventListener('pagehide', stopKpiPoll);
+
   async function loadDashboard(){
     const $id = (s)=>document.getElementById(s);
     const d = ($id('ldr-date') && $id('ldr-date').value) || todayISO();
@@ -122,14 +163,9 @@
 
     try{
       const r = await apiRequest(`/api/leader/dashboard?date=${encodeURIComponent(d)}`);
-      if($id('kpi-b2c')) $id('kpi-b2c').textContent    = (r.kpi && r.kpi.b2c_count!=null)    ? r.kpi.b2c_count    : '—';
-      if($id('kpi-b2b')) $id('kpi-b2b').textContent    = (r.kpi && r.kpi.b2b_count!=null)    ? r.kpi.b2b_count    : '—';
-      if($id('kpi-items')) $id('kpi-items').textContent = (r.kpi && r.kpi.items_total!=null) ? r.kpi.items_total : '—';
-      if($id('kpi-sum')) $id('kpi-sum').textContent    = (r.kpi && r.kpi.sum_total!=null)    ? `${fmt2(r.kpi.sum_total)} €` : '—';
-      if($id('kpi-zostava')) $id('kpi-zostava').textContent = (r.kpi && r.kpi.zostava_chystat != null) ? r.kpi.zostava_chystat + ' obj.' : '0 obj.';
-      if($id('kpi-tempo')) $id('kpi-tempo').textContent = (r.kpi && r.kpi.tempo_minuty > 0) ? r.kpi.tempo_minuty + ' min/obj' : '—';
-      if($id('kpi-odhad')) $id('kpi-odhad').textContent = (r.kpi && r.kpi.odhad_konca) ? r.kpi.odhad_konca : '—';
-     
+      applyDashboardKpi(r.kpi);
+      subscribeKpiStream();
+
 
       const planHost = $id('plan-preview');
       if (planHost) {
@@ -4330,7 +4366,7 @@ window.printLeaderNegativeInventoryPDF = function(head, groups) {
               <td style="font-family:monospace; font-weight:bold; color:#0369a1;">${escapeHtml(p.ean)}</td>
               <td style="font-weight:600; color:#0f172a;">${escapeHtml(p.nazov_vyrobku)}</td>
               <td><span style="background:#e2e8f0; padding:2px 6px; border-radius:4px; font-size:0.85rem; color:#475569;">${escapeHtml(p.predajna_kategoria || 'Nezaradené')}</span></td>
-              <td style="text-align:right; font-weight:bold; color:${p.stock <= 0 ? '#ef4444' : '#10b981'};">${Number(p.stock || 0).toFixed(2)}</td>
+              <td style="text-align:right; font-weight:bold; color:${p.stock <= 0 ? '#ef4444' : '#10b981'};" title="Rezervované: ${Number(p.reserved || 0).toFixed(2)}">${Number(p.stock || 0).toFixed(2)}${p.reserved ? `<div style="font-size:0.75rem; font-weight:normal; color:${p.available < 0 ? '#ef4444' : '#64748b'};">voľné ${Number(p.available || 0).toFixed(2)}</div>` : ''}</td>
               <td style="text-align:right; font-weight:bold; color:#d97706;" title="Priemerná B2B predajná cena bez DPH">${Number(p.avg_price || 0).toFixed(2)} €</td>
               <td>${escapeHtml(p.mj)}</td>
               <td>${p.dph}%</td>
@@ -4614,6 +4650,7 @@ window._se_render_table = function() {
                   <div style="background:#f0f9ff; border:1px solid #bae6fd; padding:10px 20px; border-radius:8px; text-align:center; box-shadow: 0 2px 4px rgba(0,0,0,0.05);">
                       <div style="font-size:0.8rem; font-weight:bold; color:#0369a1; text-transform:uppercase;">Stav na sklade</div>
                       <div style="font-size:2rem; font-weight:900; color:#0c4a6e; line-height:1;">${prod.stock.toFixed(2)} <span style="font-size:1rem;">${escapeHtml(prod.mj)}</span></div>
+                      <div style="font-size:0.8rem; color:#64748b; margin-top:6px;">Rezervované: <b>${Number(prod.reserved || 0).toFixed(2)}</b> · Voľné: <b style="color:${Number(prod.available || 0) < 0 ? '#ef4444' : '#16a34a'};">${Number(prod.available || 0).toFixed(2)}</b></div>
                   </div>
               </div>
 
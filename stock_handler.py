@@ -5,6 +5,8 @@ from typing import Any, Dict, Optional, List
 import re
 
 import db_connector
+import product_cost_index
+import search_index
 
 stock_bp = Blueprint("stock", __name__)
 
@@ -668,6 +670,7 @@ def receive_production():
             """, (when, name, qty, price if price is not None else None, prijem_typ, note))
 
         conn.commit()
+        product_cost_index.refresh_stock_items(it.get('name') for it in items)
         return jsonify({"message": f"Príjem uložený ({len(items)} riadkov)."})
     except Exception as e:
         if conn: conn.rollback()
@@ -1239,6 +1242,11 @@ def stock_under_min():
 def suppliers_list():
     _ensure_suppliers_schema()
     cat = (request.args.get("category") or "").strip().lower() or None
+    q = (request.args.get("q") or "").strip()
+    if q and not cat:
+        # typeahead: pamäťový index (bez kategórií)
+        hits = search_index.search(q, ("supplier",), limit=request.args.get("limit", 20, type=int))
+        return jsonify({"items": [{k: v for k, v in h.items() if k != "kind"} for h in hits]})
     rows = db_connector.execute_query("SELECT id, name, phone, email, address FROM suppliers WHERE is_active=1 ORDER BY name") or []
     cats = db_connector.execute_query("SELECT supplier_id, category FROM supplier_categories", fetch='all') or []
     by = {}
@@ -1266,6 +1274,7 @@ def supplier_create():
     if cats:
         db_connector.execute_query("INSERT INTO supplier_categories (supplier_id, category) VALUES (%s,%s)",
                                    [(new_id, c) for c in cats], multi=True, fetch='none')
+    search_index.refresh("supplier", [new_id])
     return jsonify({"message":"Dodávateľ pridaný.", "id": new_id})
 
 @stock_bp.put("/api/kancelaria/suppliers/<int:sup_id>")
@@ -1282,12 +1291,14 @@ def supplier_update(sup_id: int):
     if cats:
         db_connector.execute_query("INSERT INTO supplier_categories (supplier_id, category) VALUES (%s,%s)",
                                    [(sup_id, c) for c in cats], multi=True, fetch='none')
+    search_index.refresh("supplier", [sup_id])
     return jsonify({"message":"Dodávateľ upravený."})
 
 @stock_bp.delete("/api/kancelaria/suppliers/<int:sup_id>")
 def supplier_delete(sup_id: int):
     _ensure_suppliers_schema()
     db_connector.execute_query("UPDATE suppliers SET is_active=0, updated_at=NOW() WHERE id=%s", (sup_id,), fetch='none')
+    search_index.refresh("supplier", [sup_id])
     return jsonify({"message":"Dodávateľ zmazaný."})
 
 # --- Vložte toto na koniec súboru stock_handler.py ---
@@ -0,0 +1,280 @@
+# =================================================================
+# === REZERVÁCIE SKLADU: UDRŽIAVANÉ POČÍTADLÁ PER EAN =============
+# =================================================================
+#
+# stock_reservations(ean, qty_b2b, qty_b2c) – koľko tovaru viažu otvorené
+# B2B/B2C objednávky. Skladová karta ani katalóg tak nemusia pri každom
+# requeste sčítavať všetky položky otvorených objednávok.
+#
+# Počítadlá sa menia delta-zápisom cez knihu riadkov
+# stock_reservation_lines(kind, order_id, ean, qty) = čo daná objednávka
+# práve rezervuje. refresh_order() prepočíta jednu objednávku (cena ~ počet
+# jej položiek), porovná s knihou a rozdiel pripíše do počítadiel – volá ho
+# order_events.on_orders_changed() po každom zápise objednávky.
+# rebuild_all() (v noci zo schedulera) všetko prepočíta od nuly a zachytí
+# prípadné zápisy, ktoré hook obišli.
+#
+# Tabuľky, indexy nad položkami objednávok a prvý prepočet robí migrate()
+# – plánovač chvíľu po štarte, alebo ručne `python stock_reservations.py`.
+# Webový request DDL nespúšťa: kým migrácia neprebehla, hooky nič nerobia
+# a čitatelia (counters_source / lines_source) počítajú rezervácie priamo
+# z otvorených objednávok.
+# =================================================================
+import argparse
+import json
+import time
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+import db_connector
+
+CLOSED_STATES = ("Hotová", "Expedovaná", "Zrušená", "Vybavená")
+
+_TABLES = {
+    "b2b": ("b2b_objednavky", "b2b_objednavky_polozky", "qty_b2b"),
+    "b2c": ("b2c_objednavky", "b2c_objednavky_polozky", "qty_b2c"),
+}
+
+_schema_ready = False
+_checked_at = 0.0
+_RECHECK_S = 60
+
+
+def _table_exists(table: str) -> bool:
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.TABLES
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s
+         LIMIT 1
+    """, (table,), fetch='one')
+    return bool(r)
+
+
+def _index_exists(table: str, idx: str) -> bool:
+    r = db_connector.execute_query("""
+        SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+         WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s
+         LIMIT 1
+    """, (table, idx), fetch='one')
+    return bool(r)
+
+
+def ready() -> bool:
+    """Prebehla migrácia (obe tabuľky existujú)? Kým nie, overí sa znova po chvíli."""
+    global _schema_ready, _checked_at
+    if _schema_ready or time.time() - _checked_at < _RECHECK_S:
+        return _schema_ready
+    _checked_at = time.time()
+    _schema_ready = _table_exists("stock_reservations") and _table_exists("stock_reservation_lines")
+    return _schema_ready
+
+
+def migrate() -> Dict[str, Any]:
+    """Tabuľky + indexy nad položkami objednávok; pri novej tabuľke aj prvý prepočet (migrácia, nie request)."""
+    global _schema_ready
+    fresh = not (_table_exists("stock_reservations") and _table_exists("stock_reservation_lines"))
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            ean        VARCHAR(64)   NOT NULL PRIMARY KEY,
+            qty_b2b    DECIMAL(14,3) NOT NULL DEFAULT 0,
+            qty_b2c    DECIMAL(14,3) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS stock_reservation_lines (
+            kind     VARCHAR(3)    NOT NULL,
+            order_id INT           NOT NULL,
+            ean      VARCHAR(64)   NOT NULL,
+            qty      DECIMAL(14,3) NOT NULL,
+            PRIMARY KEY (kind, order_id, ean),
+            INDEX idx_srl_ean (ean)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch='none')
+    for _, items, _ in _TABLES.values():
+        if not _index_exists(items, "idx_res_order"):
+            db_connector.execute_query(
+                f"CREATE INDEX idx_res_order ON {items}(objednavka_id, ean_produktu)", fetch='none')
+    _schema_ready = _table_exists("stock_reservations") and _table_exists("stock_reservation_lines")
+    if not _schema_ready:
+        return {"fresh": fresh, "error": "Tabuľky rezervácií sa nepodarilo vytvoriť."}
+    return {"fresh": fresh, **(rebuild_all() if fresh else {})}
+
+
+def _open_lines_sql(kind: str, where: str) -> str:
+    orders, items, _ = _TABLES[kind]
+    ph = ",".join(["%s"] * len(CLOSED_STATES))
+    return f"""
+        SELECT o.id AS order_id, p.ean_produktu AS ean, SUM(p.mnozstvo) AS qty
+          FROM {orders} o
+          JOIN {items} p ON p.objednavka_id = o.id
+         WHERE {where}
+           AND COALESCE(o.stav, '') NOT IN ({ph})
+           AND p.ean_produktu IS NOT NULL AND p.ean_produktu <> ''
+         GROUP BY o.id, p.ean_produktu
+    """
+
+
+def _live_lines_sql() -> Tuple[str, tuple]:
+    """Kniha riadkov počítaná priamo z otvorených objednávok (kým neprebehla migrácia)."""
+    parts, params = [], []
+    for kind in _TABLES:
+        parts.append(f"SELECT '{kind}' AS kind, x.order_id, x.ean, x.qty FROM ({_open_lines_sql(kind, '1=1')}) x")
+        params.extend(CLOSED_STATES)
+    return "(" + " UNION ALL ".join(parts) + ")", tuple(params)
+
+
+def lines_source() -> Tuple[str, tuple]:
+    """(tabuľka alebo poddotaz so stĺpcami kind, order_id, ean, qty; parametre) pre FROM."""
+    if ready():
+        return "stock_reservation_lines", ()
+    return _live_lines_sql()
+
+
+def counters_source() -> Tuple[str, tuple]:
+    """(tabuľka alebo poddotaz so stĺpcami ean, qty_b2b, qty_b2c; parametre) pre LEFT JOIN."""
+    if ready():
+        return "stock_reservations", ()
+    lines, params = _live_lines_sql()
+    return f"""(SELECT ean,
+                       SUM(CASE WHEN kind='b2b' THEN qty ELSE 0 END) AS qty_b2b,
+                       SUM(CASE WHEN kind='b2c' THEN qty ELSE 0 END) AS qty_b2c
+                  FROM {lines} l GROUP BY ean)""", params
+
+
+def refresh_order(kind: str, order_id) -> None:
+    """Prepočíta rezervácie jednej objednávky (kind = 'b2b' | 'b2c'). Chybu len zaloguje."""
+    if kind not in _TABLES or not order_id:
+        return
+    if not ready():
+        return  # prvý prepočet v migrate() ju zachytí
+    try:
+        _refresh(kind, int(order_id))
+    except Exception as e:
+        print(f"[REZERVÁCIE] {kind} #{order_id}: {e}")
+
+
+def refresh_orders(kind: str, order_ids: Iterable) -> None:
+    for oid in {int(x) for x in order_ids if x}:
+        refresh_order(kind, oid)
+
+
+def _refresh(kind: str, order_id: int) -> None:
+    qty_col = _TABLES[kind][2]
+
+    def work(conn):
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            "SELECT ean, qty FROM stock_reservation_lines WHERE kind=%s AND order_id=%s FOR UPDATE",
+            (kind, order_id)
+        )
+        old = {r["ean"]: Decimal(r["qty"] or 0) for r in cur.fetchall()}
+        cur.execute(_open_lines_sql(kind, "o.id = %s"), (order_id, *CLOSED_STATES))
+        new: Dict[str, Decimal] = {}
+        for r in cur.fetchall():
+            ean = str(r["ean"])[:64]
+            new[ean] = new.get(ean, Decimal(0)) + Decimal(r["qty"] or 0)
+
+        deltas = []
+        for ean in sorted(set(old) | set(new)):  # pevné poradie zámkov
+            d = new.get(ean, Decimal(0)) - old.get(ean, Decimal(0))
+            if d:
+                deltas.append((ean, d))
+        if not deltas:
+            cur.close()
+            return
+        cur.executemany(
+            f"INSERT INTO stock_reservations (ean, {qty_col}) VALUES (%s, %s) "
+            f"ON DUPLICATE KEY UPDATE {qty_col} = {qty_col} + VALUES({qty_col})",
+            deltas
+        )
+        cur.execute("DELETE FROM stock_reservation_lines WHERE kind=%s AND order_id=%s", (kind, order_id))
+        if new:
+            cur.executemany(
+                "INSERT INTO stock_reservation_lines (kind, order_id, ean, qty) VALUES (%s,%s,%s,%s)",
+                [(kind, order_id, ean, q) for ean, q in new.items()]
+            )
+        cur.close()
+
+    db_connector.with_transaction(work)
+
+
+def rebuild_all() -> Dict[str, Any]:
+    """Kompletný prepočet knihy aj počítadiel z otvorených objednávok."""
+    if not ready():
+        return {"error": "Migrácia rezervácií ešte neprebehla (plánovač / python stock_reservations.py)."}
+
+    def work(conn):
+        cur = conn.cursor()
+        cur.execute("DELETE FROM stock_reservation_lines")
+        for kind in _TABLES:
+            cur.execute(
+                "INSERT INTO stock_reservation_lines (kind, order_id, ean, qty) "
+                f"SELECT %s, x.order_id, LEFT(x.ean, 64) AS e, SUM(x.qty) FROM ({_open_lines_sql(kind, '1=1')}) x "
+                "WHERE x.qty IS NOT NULL GROUP BY x.order_id, e",
+                (kind, *CLOSED_STATES)
+            )
+        cur.execute("DELETE FROM stock_reservations")
+        cur.execute("""
+            INSERT INTO stock_reservations (ean, qty_b2b, qty_b2c)
+            SELECT ean,
+                   SUM(CASE WHEN kind='b2b' THEN qty ELSE 0 END),
+                   SUM(CASE WHEN kind='b2c' THEN qty ELSE 0 END)
+              FROM stock_reservation_lines
+             GROUP BY ean
+        """)
+        cur.execute("SELECT COUNT(*) FROM stock_reservations")
+        n = cur.fetchone()[0]
+        cur.close()
+        return n
+
+    return {"eans": db_connector.with_transaction(work)}
+
+
+def availability(eans: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Hromadná dostupnosť: {ean: {stock, reserved_b2b, reserved_b2c, reserved, available}}
+    jedným dotazom na 500 EAN (produkty LEFT JOIN stock_reservations).
+    """
+    src, src_params = counters_source()
+    wanted: List[str] = []
+    seen = set()
+    for e in eans or []:
+        e = str(e or "").strip()
+        if e and e not in seen:
+            seen.add(e)
+            wanted.append(e)
+    out: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(wanted), 500):
+        chunk = wanted[i:i + 500]
+        rows = db_connector.execute_query(f"""
+            SELECT p.ean, p.mj,
+                   COALESCE(p.aktualny_sklad_finalny_kg, 0) AS stock,
+                   COALESCE(r.qty_b2b, 0) AS qty_b2b,
+                   COALESCE(r.qty_b2c, 0) AS qty_b2c
+              FROM produkty p
+              LEFT JOIN {src} r ON r.ean = p.ean
+             WHERE p.ean IN ({','.join(['%s'] * len(chunk))})
+        """, (*src_params, *chunk)) or []
+        for r in rows:
+            stock = float(r.get("stock") or 0)
+            b2b = float(r.get("qty_b2b") or 0)
+            b2c = float(r.get("qty_b2c") or 0)
+            out[r["ean"]] = {
+                "mj": r.get("mj"),
+                "stock": stock,
+                "reserved_b2b": b2b,
+                "reserved_b2c": b2c,
+                "reserved": b2b + b2c,
+                "available": round(stock - b2b - b2c, 3),
+            }
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Rezervácie skladu (stock_reservations)")
+    ap.add_argument("--rebuild", action="store_true", help="kompletný prepočet, aj keď migrácia už prebehla")
+    args = ap.parse_args()
+    res = migrate()
+    if args.rebuild and not res.get("fresh") and not res.get("error"):
+        res = rebuild_all()
+    print(json.dumps(res, ensure_ascii=False, default=str))
@@ -302,6 +302,28 @@ def vykonaj_db_ulohu(task_id: int) -> str:
 # === ENTERPRISE KALENDÁR – NOTIFIKÁCIE (EMAIL / SMS) ====================
 # ========================================================================
 
+_CAL_REMINDER_SELECT = """
+    SELECT 
+        n.id,
+        n.event_id,
+        n.event_title,
+        n.event_type,
+        n.event_start,
+        n.event_end,
+        n.channel,
+        n.contact_id,
+        n.target_email,
+        n.target_phone,
+        n.minutes_before,
+        n.planned_at,
+        c.name  AS contact_name,
+        c.email AS contact_email,
+        c.phone AS contact_phone
+    FROM calendar_event_notifications n
+    LEFT JOIN calendar_contacts c ON c.id = n.contact_id
+"""
+
+
 def _load_calendar_reminders(now: datetime) -> List[Dict[str, Any]]:
     """
     Načíta pending notifikácie z tabuľky calendar_event_notifications,
@@ -312,25 +334,7 @@ def _load_calendar_reminders(now: datetime) -> List[Dict[str, Any]]:
     end   = now + window
 
     rows = db_connector.execute_query(
-        """
-        SELECT 
-            n.id,
-            n.event_id,
-            n.event_title,
-            n.event_type,
-            n.event_start,
-            n.event_end,
-            n.channel,
-            n.contact_id,
-            n.target_email,
-            n.target_phone,
-            n.minutes_before,
-            n.planned_at,
-            c.name  AS contact_name,
-            c.email AS contact_email,
-            c.phone AS contact_phone
-        FROM calendar_event_notifications n
-        LEFT JOIN calendar_contacts c ON c.id = n.contact_id
+        _CAL_REMINDER_SELECT + """
         WHERE n.status = 'PENDING'
           AND n.planned_at BETWEEN %s AND %s
         ORDER BY n.planned_at ASC, n.id ASC
@@ -341,12 +345,26 @@ def _load_calendar_reminders(now: datetime) -> List[Dict[str, Any]]:
     return rows
 
 
-def _send_calendar_notification_row(row: Dict[str, Any], now: datetime) -> bool:
+def _load_calendar_reminders_by_ids(ids: List[int]) -> List[Dict[str, Any]]:
+    """Pending notifikácie podľa id – kontakty príjemcov sa načítajú tým istým dotazom."""
+    if not ids:
+        return []
+    ph = ",".join(["%s"] * len(ids))
+    return db_connector.execute_query(
+        _CAL_REMINDER_SELECT + f"""
+        WHERE n.id IN ({ph}) AND n.status = 'PENDING'
+        ORDER BY n.planned_at ASC, n.id ASC
+        """,
+        tuple(ids),
+        fetch="all"
+    ) or []
+
+
+def _deliver_calendar_notification(row: Dict[str, Any]) -> tuple:
     """
-    Odošle jednu notifikáciu (EMAIL alebo SMS) a aktualizuje status v DB.
-    Vráti True pri úspechu, False pri chybe.
+    Odošle jednu notifikáciu (EMAIL alebo SMS), DB nemení.
+    Vráti (ok, chybová správa).
     """
-    notif_id = row.get("id")
     channel  = (row.get("channel") or "").upper().strip() or "EMAIL"
 
     event_title = (row.get("event_title") or "Udalosť").strip()
@@ -395,35 +413,87 @@ def _send_calendar_notification_row(row: Dict[str, Any], now: datetime) -> bool:
     except Exception as e:
         error_msg = f"send_error: {e}"
 
-    status = "SENT" if ok else "FAILED"
+    return ok, error_msg
+
+
+def _store_calendar_results(results: List[tuple]) -> None:
+    """Hromadný zápis stavov [(id, ok, chyba)] – jedna transakcia pre celú dávku."""
+    if not results:
+        return
+    params = []
+    for notif_id, ok, error_msg in results:
+        status = "SENT" if ok else "FAILED"
+        params.append((status, status, error_msg, notif_id))
+
+    def _update(conn):
+        cur = conn.cursor()
+        try:
+            cur.executemany(
+                """
+                UPDATE calendar_event_notifications
+                   SET status=%s,
+                       sent_at = CASE WHEN %s='SENT' THEN NOW() ELSE sent_at END,
+                       error_message = %s
+                 WHERE id=%s
+                """,
+                params,
+            )
+        finally:
+            cur.close()
 
-    # update v DB
     try:
-        db_connector.execute_query(
-            """
-            UPDATE calendar_event_notifications
-               SET status=%s,
-                   sent_at = CASE WHEN %s='SENT' THEN NOW() ELSE sent_at END,
-                   error_message = %s
-             WHERE id=%s
-            """,
-            (status, status, error_msg, notif_id),
-            fetch=None
-        )
+        db_connector.with_transaction(_update)
     except Exception as e:
         print("[calendar] Nepodarilo sa update-notification:", e)
 
-    if ok:
-        print(f"[calendar] Notifikácia #{notif_id} odoslaná ({channel}).")
-    else:
-        print(f"[calendar] Notifikácia #{notif_id} zlyhala: {error_msg}")
 
-    return ok
+def _send_calendar_notification_row(row: Dict[str, Any], now: datetime) -> bool:
+    """
+    Odošle jednu notifikáciu (EMAIL alebo SMS) a aktualizuje status v DB.
+    Vráti True pri úspechu, False pri chybe.
+    """
+    return _dispatch_calendar_rows([row]) == 1
+
+
+def _dispatch_calendar_rows(rows: List[Dict[str, Any]]) -> int:
+    """Odošle dávku notifikácií a stavy zapíše naraz. Vráti počet úspešných."""
+    results = []
+    sent_count = 0
+    for r in rows:
+        key = f"{r.get('id')}"
+        if key in _CAL_SENT_CACHE:
+            # v tomto behu scheduleru už odoslaná
+            continue
+
+        ok, error_msg = _deliver_calendar_notification(r)
+        results.append((r.get("id"), ok, error_msg))
+        channel = (r.get("channel") or "").upper().strip() or "EMAIL"
+        if ok:
+            _CAL_SENT_CACHE.add(key)
+            sent_count += 1
+            print(f"[calendar] Notifikácia #{r.get('id')} odoslaná ({channel}).")
+        else:
+            print(f"[calendar] Notifikácia #{r.get('id')} zlyhala: {error_msg}")
+
+    _store_calendar_results(results)
+    return sent_count
+
+
+def send_calendar_reminders(ids: List[int]) -> int:
+    """
+    Pre reminder_timer: odošle notifikácie s danými id, ktoré sú ešte PENDING
+    (zrušené / už odoslané sa preskočia). Vráti počet úspešne odoslaných.
+    """
+    rows = _load_calendar_reminders_by_ids(ids)
+    sent_count = _dispatch_calendar_rows(rows)
+    if sent_count:
+        print(f"[calendar] Odoslaných notifikácií: {sent_count}")
+    return sent_count
 
 
 def check_calendar_notifications() -> int:
     """
-    Hlavná funkcia pre scheduler:
+    Hlavná funkcia pre scheduler (minútový job, keď nebeží reminder_timer):
     - nájde pending notifikácie v aktuálnom časovom okne,
     - odošle email/SMS podľa konfigurácie,
     - aktualizuje stav v DB,
@@ -435,17 +505,7 @@ def check_calendar_notifications() -> int:
     if not rows:
         return 0
 
-    sent_count = 0
-    for r in rows:
-        key = f"{r.get('id')}"
-        if key in _CAL_SENT_CACHE:
-            # v tomto behu scheduleru už odoslaná
-            continue
-
-        if _send_calendar_notification_row(r, now):
-            _CAL_SENT_CACHE.add(key)
-            sent_count += 1
-
+    sent_count = _dispatch_calendar_rows(rows)
     if sent_count:
         print(f"[calendar] Odoslaných notifikácií: {sent_count}")
     return sent_count
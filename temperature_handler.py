@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any
 
 import db_connector
+import temps_rollup
 from flask import jsonify, make_response, render_template
 
 # Konštanty pre typy zariadení
@@ -180,22 +181,22 @@ def get_readings_for_date(device_id: int|None, date_str: str, to_now: bool=False
         if now.date() == day:
             end = now
 
+    # staršie dni môžu byť už archivované (temps_rollup) – čítame cez fetch_raw
     if device_id:
-        q = """SELECT r.*, d.name, d.code, d.location, d.device_type
-               FROM temps_readings r
-               JOIN temps_devices d ON d.id=r.device_id
-               WHERE r.device_id=%s AND r.ts >= %s AND r.ts <= %s
-               ORDER BY r.ts"""
-        rows = db_connector.execute_query(q, (int(device_id), start, end)) or []
-        return jsonify(rows)
+        devs = db_connector.execute_query(
+            "SELECT id, name, code, location, device_type FROM temps_devices WHERE id=%s",
+            (int(device_id),)) or []
     else:
-        q = """SELECT r.*, d.name, d.code, d.location, d.device_type
-               FROM temps_readings r
-               JOIN temps_devices d ON d.id=r.device_id
-               WHERE r.ts >= %s AND r.ts <= %s
-               ORDER BY d.id, r.ts"""
-        rows = db_connector.execute_query(q, (start, end)) or []
-        return jsonify(rows)
+        devs = db_connector.execute_query(
+            "SELECT id, name, code, location, device_type FROM temps_devices ORDER BY id") or []
+    dev_map = {d['id']: d for d in devs}
+    rows = temps_rollup.fetch_raw(list(dev_map.keys()), start, end)
+    out = []
+    for r in rows:
+        d = dev_map[r['device_id']]
+        out.append({**r, 'name': d['name'], 'code': d['code'],
+                    'location': d['location'], 'device_type': d['device_type']})
+    return jsonify(out)
 def _build_summary_grid(device_rows, start: datetime, end: datetime):
     """
     Vytvorí maticu:
@@ -223,12 +224,7 @@ def _build_summary_grid(device_rows, start: datetime, end: datetime):
     if not ids:
         return slots, device_rows, {}
 
-    placeholders = ",".join(["%s"]*len(ids))
-    q = f"""SELECT r.* FROM temps_readings r
-            WHERE r.device_id IN ({placeholders})
-              AND r.ts >= %s AND r.ts <= %s
-            ORDER BY r.device_id, r.ts"""
-    rows = db_connector.execute_query(q, tuple(ids)+ (start, end)) or []
+    rows = temps_rollup.fetch_raw(ids, start, end)
 
     # indexuj podľa (device_id, ts)
     by_key = {}
@@ -278,19 +274,46 @@ def report_html(date_str: str, device_id: int|None, to_now: bool=False, layout:
                                              range_end_label=range_end_label,
                                              slots=slots, headers=headers, cells=cells))
     # default: detail (pôvodné)
-    result = []
-    for d in devs:
-        rows = db_connector.execute_query(
-            "SELECT * FROM temps_readings WHERE device_id=%s AND ts>=%s AND ts<=%s ORDER BY ts",
-            (d['id'], start, end)
-        ) or []
-        result.append({"device": d, "rows": rows})
+    by_dev = {}
+    for r in temps_rollup.fetch_raw([d['id'] for d in devs], start, end):
+        by_dev.setdefault(r['device_id'], []).append(r)
+    result = [{"device": d, "rows": by_dev.get(d['id'], [])} for d in devs]
 
     return make_response(render_template("temps_report_template.html",
                                          date=day,
                                          buckets=result,
                                          range_end_label=range_end_label))
 
+def get_series(device_id: int|None, date_from: str, date_to: str, resolution: str='auto'):
+    """Časový rad za ľubovoľný rozsah – rozlíšenie sa volí podľa dĺžky (raw/hour/day)."""
+    try:
+        d_from = datetime.strptime(date_from, "%Y-%m-%d")
+        d_to = datetime.strptime(date_to, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+    except Exception:
+        return make_response("Neplatný dátum.", 400)
+    if resolution not in ('auto', temps_rollup.RES_RAW, temps_rollup.RES_HOUR, temps_rollup.RES_DAY):
+        return make_response("Neplatné rozlíšenie.", 400)
+    if device_id:
+        ids = [int(device_id)]
+    else:
+        ids = [d['id'] for d in (db_connector.execute_query("SELECT id FROM temps_devices ORDER BY id") or [])]
+    return jsonify(temps_rollup.get_series(ids, d_from, d_to, resolution))
+
+def haccp_export(date_from: str, date_to: str, device_id: int|None = None):
+    """CSV export pre HACCP audit – denné min/max/priemer z agregácií."""
+    try:
+        d_from = datetime.strptime(date_from, "%Y-%m-%d").date()
+        d_to = datetime.strptime(date_to, "%Y-%m-%d").date()
+    except Exception:
+        return make_response("Neplatný dátum.", 400)
+    if d_to < d_from:
+        return make_response("Dátum do je pred dátumom od.", 400)
+    data = temps_rollup.haccp_audit_csv(d_from, d_to, device_id)
+    resp = make_response(data)
+    resp.headers["Content-Type"] = "text/csv; charset=utf-8"
+    resp.headers["Content-Disposition"] = f"attachment; filename=haccp_teploty_{d_from}_{d_to}.csv"
+    return resp
+
 # --- GENERÁTOR ----------------------------------------------------------------
 class _TempGenerator(threading.Thread):
     def __init__(self):
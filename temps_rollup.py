@@ -0,0 +1,452 @@
+# =================================================================
+# === TEPLOTY: AGREGÁCIE (HOD/DEŇ) + RETENCIA SUROVÝCH DÁT =========
+# =================================================================
+#
+# temps_readings rastie o 1 riadok / zariadenie / 15 min. Tento modul:
+#   - inkrementálne udržiava temps_readings_hourly a temps_readings_daily
+#     (min / max / súčet / počty OK a OFF), watermark v temps_rollup_state,
+#   - surové riadky staršie ako TEMPS_RAW_RETENTION_DAYS exportuje do
+#     storage/temps_archive/YYYY/MM/YYYY-MM-DD.csv.gz a zmaže z DB,
+#   - pri čítaní vyberie najhrubšie rozlíšenie, ktoré na otázku stačí.
+#
+# Spúšťa sa zo scheduler.py (rollup každú hodinu, archív raz denne).
+# =================================================================
+import csv
+import gzip
+import io
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import db_connector
+
+RAW_RETENTION_DAYS = int(os.getenv("TEMPS_RAW_RETENTION_DAYS", "90"))
+ARCHIVE_DIR = os.getenv(
+    "TEMPS_ARCHIVE_DIR",
+    os.path.join(os.getcwd(), "storage", "temps_archive"),
+)
+
+RES_RAW = "raw"
+RES_HOUR = "hour"
+RES_DAY = "day"
+
+_schema_ready = False
+
+
+# --- SCHÉMA -------------------------------------------------------------------
+def _ensure_rollup_schema() -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS temps_readings_hourly (
+            device_id   INT NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            n_ok        INT NOT NULL DEFAULT 0,
+            n_off       INT NOT NULL DEFAULT 0,
+            t_min       DECIMAL(6,2) NULL,
+            t_max       DECIMAL(6,2) NULL,
+            t_sum       DECIMAL(12,2) NULL,
+            PRIMARY KEY (device_id, bucket_start),
+            INDEX idx_trh_bucket (bucket_start)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch="none")
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS temps_readings_daily (
+            device_id   INT NOT NULL,
+            day         DATE NOT NULL,
+            n_ok        INT NOT NULL DEFAULT 0,
+            n_off       INT NOT NULL DEFAULT 0,
+            t_min       DECIMAL(6,2) NULL,
+            t_max       DECIMAL(6,2) NULL,
+            t_sum       DECIMAL(14,2) NULL,
+            PRIMARY KEY (device_id, day),
+            INDEX idx_trd_day (day)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch="none")
+    db_connector.execute_query("""
+        CREATE TABLE IF NOT EXISTS temps_rollup_state (
+            name        VARCHAR(64) PRIMARY KEY,
+            watermark   DATETIME NULL,
+            updated_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """, fetch="none")
+    _schema_ready = True
+
+
+def _get_watermark(name: str) -> Optional[datetime]:
+    row = db_connector.execute_query(
+        "SELECT watermark FROM temps_rollup_state WHERE name=%s", (name,), fetch="one"
+    )
+    return row.get("watermark") if row else None
+
+
+def _set_watermark(name: str, ts: datetime) -> None:
+    db_connector.execute_query(
+        """INSERT INTO temps_rollup_state (name, watermark) VALUES (%s,%s)
+           ON DUPLICATE KEY UPDATE watermark=VALUES(watermark)""",
+        (name, ts), fetch="none"
+    )
+
+
+def _hour_floor(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+# --- ROLLUP -------------------------------------------------------------------
+def _rollup_hours(start: datetime, end: datetime) -> None:
+    """Prepočíta hodinové buckety v intervale [start, end) zo surových dát."""
+    db_connector.execute_query("""
+        INSERT INTO temps_readings_hourly
+            (device_id, bucket_start, n_ok, n_off, t_min, t_max, t_sum)
+        SELECT r.device_id,
+               TIMESTAMP(DATE(r.ts), MAKETIME(HOUR(r.ts), 0, 0)) AS bucket_start,
+               SUM(r.status='OK'), SUM(r.status='OFF'),
+               MIN(CASE WHEN r.status='OK' THEN r.temperature END),
+               MAX(CASE WHEN r.status='OK' THEN r.temperature END),
+               SUM(CASE WHEN r.status='OK' THEN r.temperature END)
+        FROM temps_readings r
+        WHERE r.ts >= %s AND r.ts < %s
+        GROUP BY r.device_id, bucket_start
+        ON DUPLICATE KEY UPDATE
+            n_ok=VALUES(n_ok), n_off=VALUES(n_off),
+            t_min=VALUES(t_min), t_max=VALUES(t_max), t_sum=VALUES(t_sum)
+    """, (start, end), fetch="none")
+
+
+def _rollup_days(day_from: date, day_to: date) -> None:
+    """Prepočíta denné buckety [day_from, day_to] z hodinovej tabuľky."""
+    db_connector.execute_query("""
+        INSERT INTO temps_readings_daily
+            (device_id, day, n_ok, n_off, t_min, t_max, t_sum)
+        SELECT h.device_id, DATE(h.bucket_start) AS d,
+               SUM(h.n_ok), SUM(h.n_off), MIN(h.t_min), MAX(h.t_max), SUM(h.t_sum)
+        FROM temps_readings_hourly h
+        WHERE h.bucket_start >= %s AND h.bucket_start < %s
+        GROUP BY h.device_id, d
+        ON DUPLICATE KEY UPDATE
+            n_ok=VALUES(n_ok), n_off=VALUES(n_off),
+            t_min=VALUES(t_min), t_max=VALUES(t_max), t_sum=VALUES(t_sum)
+    """, (datetime.combine(day_from, datetime.min.time()),
+          datetime.combine(day_to + timedelta(days=1), datetime.min.time())), fetch="none")
+
+
+def run_rollup(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Inkrementálny rollup: spracuje uzavreté hodiny od posledného watermarku
+    po aktuálnu hodinu (bez nej). Posledná spracovaná hodina sa prepočíta
+    znova, keby generátor dopísal oneskorený záznam (upsert v temps_readings).
+    """
+    _ensure_rollup_schema()
+    now = now or datetime.now()
+    upto = _hour_floor(now)
+
+    wm = _get_watermark("hourly")
+    if wm is None:
+        first = db_connector.execute_query(
+            "SELECT MIN(ts) AS ts FROM temps_readings", fetch="one"
+        ) or {}
+        if not first.get("ts"):
+            return {"hours": 0, "message": "Žiadne dáta."}
+        start = _hour_floor(first["ts"])
+    else:
+        start = wm - timedelta(hours=1)
+
+    if start >= upto:
+        return {"hours": 0, "from": start, "to": upto}
+
+    # po dňoch, nech jeden INSERT...SELECT neskenuje celý rok naraz
+    cur = start
+    while cur < upto:
+        nxt = min(datetime.combine(cur.date() + timedelta(days=1), datetime.min.time()), upto)
+        _rollup_hours(cur, nxt)
+        cur = nxt
+
+    _rollup_days(start.date(), (upto - timedelta(seconds=1)).date())
+    _set_watermark("hourly", upto)
+    return {"hours": int((upto - start).total_seconds() // 3600), "from": start, "to": upto}
+
+
+def rebuild_rollups() -> Dict[str, Any]:
+    """Kompletný prepočet (napr. po ručnom zásahu do temps_readings)."""
+    _ensure_rollup_schema()
+    db_connector.execute_query("DELETE FROM temps_rollup_state WHERE name='hourly'", fetch="none")
+    return run_rollup()
+
+
+# --- ARCHÍV SUROVÝCH DÁT ------------------------------------------------------
+def _archive_path(day: date) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{day:%Y}", f"{day:%m}", f"{day:%Y-%m-%d}.csv.gz")
+
+
+def archive_raw(retention_days: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Surové merania staršie ako retention_days (a už zahrnuté v rollupe)
+    zapíše po dňoch do .csv.gz a zmaže ich z temps_readings.
+    """
+    _ensure_rollup_schema()
+    retention_days = RAW_RETENTION_DAYS if retention_days is None else int(retention_days)
+    if retention_days <= 0:
+        return {"archived_days": 0, "message": "Retencia je vypnutá."}
+
+    now = now or datetime.now()
+    cutoff = datetime.combine(now.date() - timedelta(days=retention_days), datetime.min.time())
+    wm = _get_watermark("hourly")
+    if wm is None:
+        return {"archived_days": 0, "message": "Rollup ešte nebežal."}
+    cutoff = min(cutoff, datetime.combine(wm.date(), datetime.min.time()))
+
+    days = db_connector.execute_query(
+        "SELECT DISTINCT DATE(ts) AS d FROM temps_readings WHERE ts < %s ORDER BY d",
+        (cutoff,)
+    ) or []
+
+    archived, rows_total = [], 0
+    for r in days:
+        d = r["d"]
+        start = datetime.combine(d, datetime.min.time())
+        end = start + timedelta(days=1)
+        rows = db_connector.execute_query(
+            "SELECT device_id, ts, temperature, status FROM temps_readings "
+            "WHERE ts >= %s AND ts < %s ORDER BY device_id, ts",
+            (start, end)
+        ) or []
+        if not rows:
+            continue
+        path = _archive_path(d)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # ak už archív pre deň existuje (opakovaný beh), doplníme ho
+        existing = _read_archive_day(d) if os.path.exists(path) else []
+        seen = {(e["device_id"], e["ts"]) for e in existing}
+        merged = existing + [x for x in rows if (x["device_id"], x["ts"]) not in seen]
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", newline="") as fh:
+            w = csv.writer(fh)
+            w.writerow(["device_id", "ts", "temperature", "status"])
+            for x in merged:
+                w.writerow([
+                    x["device_id"],
+                    x["ts"].strftime("%Y-%m-%d %H:%M:%S"),
+                    "" if x["temperature"] is None else x["temperature"],
+                    x["status"],
+                ])
+        os.replace(tmp, path)
+        db_connector.execute_query(
+            "DELETE FROM temps_readings WHERE ts >= %s AND ts < %s", (start, end), fetch="none"
+        )
+        archived.append(d.isoformat())
+        rows_total += len(rows)
+
+    return {"archived_days": len(archived), "rows": rows_total, "days": archived}
+
+
+def _read_archive_day(day: date) -> List[Dict[str, Any]]:
+    path = _archive_path(day)
+    if not os.path.exists(path):
+        return []
+    out: List[Dict[str, Any]] = []
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as fh:
+        for rec in csv.DictReader(fh):
+            temp = rec.get("temperature")
+            out.append({
+                "device_id": int(rec["device_id"]),
+                "ts": datetime.strptime(rec["ts"], "%Y-%m-%d %H:%M:%S"),
+                "temperature": float(temp) if temp not in (None, "") else None,
+                "status": rec.get("status") or "OK",
+            })
+    return out
+
+
+def _raw_cutoff() -> Optional[datetime]:
+    """Najstarší surový záznam v DB – všetko pred ním je už len v archíve."""
+    row = db_connector.execute_query("SELECT MIN(ts) AS ts FROM temps_readings", fetch="one") or {}
+    return row.get("ts")
+
+
+def fetch_raw(device_ids: Iterable[int], start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """
+    Surové 15-min záznamy pre zariadenia v intervale [start, end].
+    Dni, ktoré už boli archivované, sa dočítajú z .csv.gz.
+    """
+    ids = [int(i) for i in device_ids]
+    if not ids:
+        return []
+    id_set = set(ids)
+    rows: List[Dict[str, Any]] = []
+
+    cutoff = _raw_cutoff()
+    if cutoff is None or start < cutoff:
+        d = start.date()
+        last = end.date() if cutoff is None else min(end.date(), cutoff.date())
+        while d <= last:
+            for rec in _read_archive_day(d):
+                if rec["device_id"] in id_set and start <= rec["ts"] <= end:
+                    rows.append(rec)
+            d += timedelta(days=1)
+
+    placeholders = ",".join(["%s"] * len(ids))
+    db_rows = db_connector.execute_query(
+        f"""SELECT device_id, ts, temperature, status FROM temps_readings
+            WHERE device_id IN ({placeholders}) AND ts >= %s AND ts <= %s
+            ORDER BY device_id, ts""",
+        tuple(ids) + (start, end)
+    ) or []
+    seen = {(r["device_id"], r["ts"]) for r in db_rows}
+    rows = [r for r in rows if (r["device_id"], r["ts"]) not in seen] + db_rows
+    rows.sort(key=lambda r: (r["device_id"], r["ts"]))
+    return rows
+
+
+# --- ČÍTANIE ------------------------------------------------------------------
+def choose_resolution(start: datetime, end: datetime, max_points: int = 500) -> str:
+    """Najhrubšie rozlíšenie, pri ktorom ešte máme aspoň ~max_points/4 bodov."""
+    span_h = max(1.0, (end - start).total_seconds() / 3600.0)
+    if span_h * 4 <= max_points:
+        return RES_RAW
+    if span_h <= max_points:
+        return RES_HOUR
+    return RES_DAY
+
+
+def _agg_row(r: Dict[str, Any], key: str) -> Dict[str, Any]:
+    n_ok = int(r.get("n_ok") or 0)
+    t_sum = r.get("t_sum")
+    return {
+        "device_id": r["device_id"],
+        "bucket": r[key],
+        "n_ok": n_ok,
+        "n_off": int(r.get("n_off") or 0),
+        "t_min": float(r["t_min"]) if r.get("t_min") is not None else None,
+        "t_max": float(r["t_max"]) if r.get("t_max") is not None else None,
+        "t_avg": round(float(t_sum) / n_ok, 2) if (t_sum is not None and n_ok) else None,
+    }
+
+
+def get_series(device_ids: List[int], start: datetime, end: datetime,
+               resolution: str = "auto") -> Dict[str, Any]:
+    """
+    Časový rad pre zariadenia. resolution: auto | raw | hour | day.
+    Pre hour/day vracia min/max/avg za bucket; dnešok (ešte neuzavretý
+    v rollupe) sa doplní zo surových dát.
+    """
+    _ensure_rollup_schema()
+    if resolution == "auto":
+        resolution = choose_resolution(start, end)
+    ids = [int(i) for i in device_ids]
+    if not ids:
+        return {"resolution": resolution, "rows": []}
+
+    if resolution == RES_RAW:
+        return {"resolution": RES_RAW, "rows": fetch_raw(ids, start, end)}
+
+    placeholders = ",".join(["%s"] * len(ids))
+    if resolution == RES_HOUR:
+        rows = db_connector.execute_query(
+            f"""SELECT * FROM temps_readings_hourly
+                WHERE device_id IN ({placeholders}) AND bucket_start >= %s AND bucket_start <= %s
+                ORDER BY device_id, bucket_start""",
+            tuple(ids) + (_hour_floor(start), end)
+        ) or []
+        out = [_agg_row(r, "bucket_start") for r in rows]
+    else:
+        rows = db_connector.execute_query(
+            f"""SELECT * FROM temps_readings_daily
+                WHERE device_id IN ({placeholders}) AND day >= %s AND day <= %s
+                ORDER BY device_id, day""",
+            tuple(ids) + (start.date(), end.date())
+        ) or []
+        out = [_agg_row(r, "day") for r in rows]
+
+    # chvost za watermarkom dopočítame zo surových dát
+    wm = _get_watermark("hourly")
+    if wm is not None and end >= wm:
+        tail = fetch_raw(ids, max(start, wm), end)
+        out = _merge_buckets(out, _aggregate_in_python(tail, resolution))
+    return {"resolution": resolution, "rows": out}
+
+
+def _merge_buckets(a: List[Dict[str, Any]], b: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Spojí dva zoznamy bucketov (rovnaký device+bucket sa zlúči, avg váhovaný)."""
+    acc: Dict[Any, Dict[str, Any]] = {}
+    for r in a + b:
+        key = (r["device_id"], r["bucket"])
+        cur = acc.get(key)
+        if cur is None:
+            acc[key] = dict(r)
+            continue
+        n1, n2 = cur["n_ok"], r["n_ok"]
+        s1 = (cur["t_avg"] or 0.0) * n1
+        s2 = (r["t_avg"] or 0.0) * n2
+        cur["n_ok"] = n1 + n2
+        cur["n_off"] += r["n_off"]
+        mins = [x for x in (cur["t_min"], r["t_min"]) if x is not None]
+        maxs = [x for x in (cur["t_max"], r["t_max"]) if x is not None]
+        cur["t_min"] = min(mins) if mins else None
+        cur["t_max"] = max(maxs) if maxs else None
+        cur["t_avg"] = round((s1 + s2) / cur["n_ok"], 2) if cur["n_ok"] else None
+    return sorted(acc.values(), key=lambda r: (r["device_id"], str(r["bucket"])))
+
+
+def _aggregate_in_python(rows: List[Dict[str, Any]], resolution: str) -> List[Dict[str, Any]]:
+    acc: Dict[Any, Dict[str, Any]] = {}
+    for r in rows:
+        bucket = _hour_floor(r["ts"]) if resolution == RES_HOUR else r["ts"].date()
+        a = acc.setdefault((r["device_id"], bucket), {
+            "device_id": r["device_id"], "bucket": bucket,
+            "n_ok": 0, "n_off": 0, "t_min": None, "t_max": None, "t_sum": 0.0,
+        })
+        if r["status"] == "OFF" or r["temperature"] is None:
+            a["n_off"] += 1
+            continue
+        t = float(r["temperature"])
+        a["n_ok"] += 1
+        a["t_sum"] += t
+        a["t_min"] = t if a["t_min"] is None else min(a["t_min"], t)
+        a["t_max"] = t if a["t_max"] is None else max(a["t_max"], t)
+    return [_agg_row(a, "bucket") for a in acc.values()]
+
+
+def haccp_audit_summary(date_from: date, date_to: date,
+                        device_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Ročný/mesačný HACCP prehľad: za každé zariadenie a deň min/max/avg
+    a počty OK/OFF. Číta len z temps_readings_daily (+ dnešok zo surových).
+    """
+    if device_id:
+        devs = db_connector.execute_query(
+            "SELECT id, code, name, location, device_type FROM temps_devices WHERE id=%s",
+            (int(device_id),)
+        ) or []
+    else:
+        devs = db_connector.execute_query(
+            "SELECT id, code, name, location, device_type FROM temps_devices ORDER BY id"
+        ) or []
+    dev_map = {d["id"]: d for d in devs}
+    start = datetime.combine(date_from, datetime.min.time())
+    end = datetime.combine(date_to, datetime.max.time())
+    series = get_series(list(dev_map.keys()), start, end, resolution=RES_DAY)
+    out = []
+    for r in series["rows"]:
+        d = dev_map.get(r["device_id"]) or {}
+        out.append({
+            **r,
+            "day": r["bucket"].isoformat() if hasattr(r["bucket"], "isoformat") else r["bucket"],
+            "name": d.get("name"),
+            "code": d.get("code"),
+            "location": d.get("location"),
+            "device_type": d.get("device_type"),
+        })
+    out.sort(key=lambda x: (x["device_id"], x["day"]))
+    return out
+
+
+def haccp_audit_csv(date_from: date, date_to: date, device_id: Optional[int] = None) -> bytes:
+    rows = haccp_audit_summary(date_from, date_to, device_id)
+    buf = io.StringIO()
+    w = csv.writer(buf, delimiter=";")
+    w.writerow(["Dátum", "Kód", "Zariadenie", "Umiestnenie", "Typ",
+                "Min °C", "Max °C", "Priemer °C", "Meraní OK", "Meraní OFF"])
+    for r in rows:
+        w.writerow([r["day"], r["code"], r["name"], r["location"], r["device_type"],
+                    r["t_min"], r["t_max"], r["t_avg"], r["n_ok"], r["n_off"]])
+    return buf.getvalue().encode("utf-8-sig")
@@ -1,10 +1,12 @@
 import os
-import glob
-import shutil
+import re
+import threading
+import time
 from datetime import datetime
 from flask import Blueprint
 import db_connector
-import time
+import order_events
+import file_ingest
 
 terminal_bp = Blueprint("terminal", __name__)
 
@@ -18,234 +20,254 @@ def ensure_directories():
     os.makedirs(TERMINAL_PROCESSED_DIR, exist_ok=True)
     os.makedirs(TERMINAL_ERROR_DIR, exist_ok=True)
 
-def process_terminal_files():
-    ensure_directories()
-    csv_files = glob.glob(os.path.join(TERMINAL_IMPORT_DIR, "*.[cC][sS][vV]"))
-    
-    if not csv_files:
-        return
-        
-    for file_path in csv_files:
-        filename = os.path.basename(file_path)
-        base_name = os.path.splitext(filename)[0]
-        
-        # --- OCHRANA PRED NEKOMPLETNÝMI SÚBORMI ---
-        try:
-            velkost_pred = os.path.getsize(file_path)
-            time.sleep(1.5) # Počká 1.5 sekundy
-            velkost_po = os.path.getsize(file_path)
-            if velkost_pred != velkost_po or velkost_po == 0:
-                print(f"Súbor {filename} sa ešte nahráva z terminálu, preskakujem ho pre ďalšie kolo.")
-                continue
-        except Exception:
-            continue
+# -----------------------------------------------------------------
+# Párovanie lístka z váhy s objednávkou
+# -----------------------------------------------------------------
+# Mapovacie tabuľky (edi_produkty_mapovanie, b2b_ean_mapovanie) sa načítajú
+# raz za prechod (a najviac každých TERMINAL_EAN_MAP_TTL_S pri trvalom
+# sledovaní) do slovníkov kód -> interný EAN; položky všetkých kandidátskych
+# objednávok sa načítajú jedným dotazom a dodané váhy sa zapíšu jedným
+# UPDATE-om na objednávku.
+EAN_MAP_TTL_S = int(os.getenv("TERMINAL_EAN_MAP_TTL_S", "60"))
+
+_ean_maps = None          # (nacitane_o, edi_map, b2b_map)
+_ean_maps_lock = threading.Lock()
+
 
-        base_name = os.path.splitext(filename)[0]
-        print(f">>> [TERMINAL] Začínam spracovávať: {filename}")
-        
-        try:
-            # 1. POKUS: Hľadáme podľa názvu súboru (funguje pre štandardné B2B)
-            search_pattern = "%" + base_name.replace('_', '-') + "%"
-            order_db = db_connector.execute_query(
-                "SELECT id, cislo_objednavky FROM b2b_objednavky WHERE cislo_objednavky LIKE %s LIMIT 1", 
-                (search_pattern,), fetch="one"
+def _strip_ean(ean):
+    return ean.lstrip('0') or ean
+
+
+def _load_map(sql):
+    """{kód: interný EAN} – kľúč presne aj bez úvodných núl (presná zhoda má prednosť)."""
+    exact, stripped = {}, {}
+    for row in db_connector.execute_query(sql, fetch="all") or []:
+        code = str(row.get("kod") or "").strip()
+        interny = str(row.get("interny_ean") or "").strip()
+        if code and interny:
+            exact.setdefault(code, interny)
+            stripped.setdefault(_strip_ean(code), interny)
+    stripped.update(exact)
+    return stripped
+
+
+def invalidate_ean_maps():
+    global _ean_maps
+    _ean_maps = None
+
+
+def _get_ean_maps():
+    global _ean_maps
+    with _ean_maps_lock:
+        if _ean_maps is None or time.time() - _ean_maps[0] > EAN_MAP_TTL_S:
+            _ean_maps = (
+                time.time(),
+                _load_map("SELECT edi_ean AS kod, interny_ean FROM edi_produkty_mapovanie ORDER BY id"),
+                _load_map("SELECT objednavkovy_kod AS kod, interny_ean FROM b2b_ean_mapovanie ORDER BY id"),
             )
-            
-            # 2. POKUS: Ak ide o COOP/EDI formát (XXX_YYYYYYYY.csv)
-            if not order_db:
-                with open(file_path, mode='r', encoding='cp1250', errors='replace') as f:
-                    lines = f.readlines()
-                    
-                first_line = lines[0] if lines else ""
-                
-                if first_line and not first_line.startswith("  ") and ";" in first_line:
-                    parts = [p.strip() for p in first_line.split(";")]
-                    cust_id = next((p for p in reversed(parts) if p), "")
-                    
-                    # Extrakcia kódu pobočky z názvu súboru (napr. '022' z '022_43489684.csv')
-                    branch_code = base_name.split('_')[0] if '_' in base_name else ""
-                    
-                    # Získanie všetkých EAN kódov z lístka
-                    vsetky_eany = set()
-                    for line in lines:
-                        if line.startswith("  ") and len(line) >= 127:
-                            ean_kand = line[2:15].strip()
-                            if ean_kand:
-                                vsetky_eany.add(ean_kand)
-                    
-                    # HLAVNÁ OPRAVA: Prepojíme si tabuľku zákazníkov a pýtame sa priamo na 'cislo_prevadzky'
-                    kandidati_objednavky = db_connector.execute_query(
-                        """
-                        SELECT o.id, o.cislo_objednavky 
-                        FROM b2b_objednavky o
-                        LEFT JOIN b2b_zakaznici z ON o.zakaznik_id = z.zakaznik_id
-                        WHERE (o.zakaznik_id = %s OR o.zakaznik_id = %s OR z.cislo_prevadzky = %s)
-                          AND (
-                              o.stav IN ('Nová', 'Prijatá') 
-                              OR (o.stav = 'Hotová' AND DATE(o.pozadovany_datum_dodania) >= CURDATE() - INTERVAL 2 DAY)
-                          )
-                        ORDER BY o.id DESC
-                        """,
-                        (cust_id, branch_code, branch_code), 
-                        fetch="all"
-                    ) or []
-                    
-                    # SMART MATCHING: Prejdeme všetky nájdené objednávky a vyberieme tú, 
-                    # v ktorej sa nachádza aspoň jeden tovar z tohto lístka. 
-                    for o in kandidati_objednavky:
-                        polozky_db = db_connector.execute_query(
-                            "SELECT ean_produktu FROM b2b_objednavky_polozky WHERE objednavka_id = %s",
-                            (o["id"],), fetch="all"
-                        ) or []
-                        
-                        db_eans = [str(p["ean_produktu"]).strip() for p in polozky_db if p.get("ean_produktu")]
-                        db_eans_clean = [e.lstrip('0') for e in db_eans]
-                        
-                        zhoda = False
-                        for f_ean in vsetky_eany:
-                            f_ean_clean = f_ean.lstrip('0')
-                            
-                            mapped_ean = None
-                            try:
-                                map_db = db_connector.execute_query(
-                                    "SELECT interny_ean FROM edi_produkty_mapovanie WHERE edi_ean = %s OR edi_ean = %s LIMIT 1",
-                                    (f_ean, f_ean_clean), fetch="one"
-                                )
-                                if map_db: mapped_ean = str(map_db["interny_ean"]).strip()
-                            except:
-                                pass
-                                
-                            check_list = [f_ean, f_ean_clean]
-                            if mapped_ean:
-                                check_list.extend([mapped_ean, mapped_ean.lstrip('0')])
-                                
-                            for c in check_list:
-                                if c in db_eans or c in db_eans_clean:
-                                    zhoda = True
-                                    break
-                            
-                            if zhoda: break
-                            
-                        if zhoda:
-                            order_db = o
-                            break
-                            
-                    # Záchranné koleso
-                    if not order_db and kandidati_objednavky:
-                        order_db = kandidati_objednavky[0]
-            
-            if not order_db:
-                print(f"Chyba: Objednávka pre súbor '{filename}' nenájdená ani podľa názvu, ani podľa zákazníka a EAN!")
-                dest_path = os.path.join(TERMINAL_ERROR_DIR, filename)
-                if os.path.exists(dest_path):
-                    dest_path = os.path.join(TERMINAL_ERROR_DIR, f"{base_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv")
-                shutil.move(file_path, dest_path)
-                continue
-                
-            order_id = order_db["id"]
-            db_cislo = order_db["cislo_objednavky"]
-            print(f"Nájdená objednávka: ID {order_id} (Číslo v DB: {db_cislo})")
-            
-            with open(file_path, mode='r', encoding='cp1250', errors='replace') as f:
-                lines = f.readlines()
-            
-            for line in lines:
-                if not line.startswith("  ") or len(line) < 120:  # Znížené na 120, aby sme neprišli o riadky
-                    continue
-                    
-                ean = line[2:15].strip()
-                if not ean:
-                    continue
-                    
-                ean_clean = ean.lstrip('0') if ean.lstrip('0') != '' else ean
-                
-                interny_ean = None
-                try:
-                    # 1. Skúsime nájsť v EDI tabuľke
-                    map_db = db_connector.execute_query("""
-                        SELECT interny_ean FROM edi_produkty_mapovanie 
-                        WHERE edi_ean = %s OR edi_ean = %s LIMIT 1
-                    """, (ean, ean_clean), fetch="one")
-                    
-                    # 2. Ak sa nenašlo, skúsime nájsť v B2B tabuľke
-                    if not map_db:
-                        map_db = db_connector.execute_query("""
-                            SELECT interny_ean FROM b2b_ean_mapovanie 
-                            WHERE objednavkovy_kod = %s OR objednavkovy_kod = %s LIMIT 1
-                        """, (ean, ean_clean), fetch="one")
-                        
-                    if map_db: 
-                        interny_ean = str(map_db["interny_ean"]).strip()
-                except Exception as err:
-                    print(f"Chyba pri EAN mapovaní: {err}")
-                    
-                hladany_ean = interny_ean if interny_ean else ean
-                hladany_clean = interny_ean.lstrip('0') if interny_ean and interny_ean.lstrip('0') != '' else ean_clean
-                
-                # OPRAVA EXTRAKCIE VÁHY (Zabráni orezaniu desiatok, napr. 15.55 -> 5.55):
-                # Zoberieme celú voľnú zónu (od indexu 102 po 127) a nájdeme posledné platné číslo.
-                free_zone = line[102:127].strip()
-                
-                import re
-                real_weight = 0.0
-                parts = free_zone.split()
-                
-                for part in reversed(parts):
-                    clean_part = re.sub(r'[^\d,\.]', '', part).replace(',', '.')
-                    if clean_part and clean_part.count('.') <= 1:
-                        try:
-                            real_weight = float(clean_part)
-                            break  # Váha úspešne nájdená
-                        except ValueError:
-                            pass
-                
-                if real_weight == 0.0 and free_zone:
-                    print(f"Upozornenie: Nenašla sa validná váha pre EAN {ean} v zóne: '{free_zone}'")
-                
-                if real_weight > 0:
-                    db_connector.execute_query("""
-                        UPDATE b2b_objednavky_polozky 
-                        SET dodane_mnozstvo = %s 
-                        WHERE objednavka_id = %s AND (
-                            ean_produktu = %s OR 
-                            ean_produktu = %s OR
-                            ean_produktu LIKE %s
-                        )
-                    """, (real_weight, order_id, hladany_ean, hladany_clean, f"%{hladany_clean}%"), fetch="none")
-            
-            # Prepočet finálnej sumy po aktualizácii všetkých dodaných množstiev
-            sum_db = db_connector.execute_query("""
-                SELECT SUM(
-                    COALESCE(pol.dodane_mnozstvo, pol.mnozstvo) * pol.cena_bez_dph * (1 + COALESCE(p.dph, pol.dph, 20) / 100.0)
-                ) as suma_s_dph 
-                FROM b2b_objednavky_polozky pol
-                LEFT JOIN produkty p ON p.ean = pol.ean_produktu
-                WHERE pol.objednavka_id = %s
-            """, (order_id,), fetch="one")
-            
-            finalna_suma_s_dph = float(sum_db.get("suma_s_dph") or 0) if sum_db else 0.0
-            now_str = datetime.now() # Python už vie, koľko je reálne hodín
-            
-            db_connector.execute_query("""
-                UPDATE b2b_objednavky 
-                SET stav = 'Hotová', 
-                    datum_vypracovania = %s,
-                    finalna_suma = %s,
-                    vazenie_end = %s,          -- ZÁPIS KONCOVÉHO ČASU
-                    aktualne_na_vahe = 0       -- POISTKA NA VYPNUTIE BLIKANIA
-                WHERE id = %s
-            """, (now_str, finalna_suma_s_dph, now_str, order_id), fetch="none")
-            
-            dest_path = os.path.join(TERMINAL_PROCESSED_DIR, filename)
-            if os.path.exists(dest_path):
-                dest_path = os.path.join(TERMINAL_PROCESSED_DIR, f"{base_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv")
-            shutil.move(file_path, dest_path)
-            print(f">>> [TERMINAL] Objednávka '{db_cislo}' úspešne nastavená na Hotová s prepočítanou sumou {finalna_suma_s_dph:.2f} €!")
-            
-        except Exception as e:
-            print(f">>> [TERMINAL] CHYBA pri súbore {filename}: {e}")
-            base_name = os.path.splitext(filename)[0]
-            dest_path = os.path.join(TERMINAL_ERROR_DIR, filename)
-            if os.path.exists(dest_path):
-                dest_path = os.path.join(TERMINAL_ERROR_DIR, f"{base_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv")
-            shutil.move(file_path, dest_path)
\ No newline at end of file
+        return _ean_maps[1], _ean_maps[2]
+
+
+def _lookup(mapping, ean):
+    return mapping.get(ean) or mapping.get(_strip_ean(ean))
+
+
+def _parse_weight(line):
+    # OPRAVA EXTRAKCIE VÁHY (Zabráni orezaniu desiatok, napr. 15.55 -> 5.55):
+    # Zoberieme celú voľnú zónu (od indexu 102 po 127) a nájdeme posledné platné číslo.
+    free_zone = line[102:127].strip()
+    for part in reversed(free_zone.split()):
+        clean_part = re.sub(r'[^\d,\.]', '', part).replace(',', '.')
+        if clean_part and clean_part.count('.') <= 1:
+            try:
+                return float(clean_part), free_zone
+            except ValueError:
+                pass
+    return 0.0, free_zone
+
+
+def _ticket_eans(lines):
+    return {line[2:15].strip() for line in lines
+            if line.startswith("  ") and len(line) >= 127 and line[2:15].strip()}
+
+
+def _order_items(order_ids):
+    """{objednavka_id: [(id položky, ean), ...]} jedným dotazom."""
+    if not order_ids:
+        return {}
+    ph = ",".join(["%s"] * len(order_ids))
+    rows = db_connector.execute_query(
+        f"SELECT id, objednavka_id, ean_produktu FROM b2b_objednavky_polozky WHERE objednavka_id IN ({ph})",
+        tuple(order_ids), fetch="all"
+    ) or []
+    items = {oid: [] for oid in order_ids}
+    for r in rows:
+        ean = str(r.get("ean_produktu") or "").strip()
+        if ean:
+            items.setdefault(r["objednavka_id"], []).append((r["id"], ean))
+    return items
+
+
+def _best_candidate(candidates, items_by_order, ticket_eans, edi_map):
+    """
+    SMART MATCHING: objednávka s najväčším počtom tovarov z lístka (pri zhode
+    novšia). Ak sa nezhoduje žiadna, záchranné koleso = najnovšia kandidátka.
+    """
+    codes = []
+    for f_ean in ticket_eans:
+        forms = {f_ean, _strip_ean(f_ean)}
+        mapped = _lookup(edi_map, f_ean)
+        if mapped:
+            forms.update({mapped, _strip_ean(mapped)})
+        codes.append(forms)
+
+    best, best_score = None, 0
+    for o in candidates:
+        db_eans = set()
+        for _item_id, ean in items_by_order.get(o["id"], []):
+            db_eans.update((ean, ean.lstrip('0')))
+        score = sum(1 for forms in codes if forms & db_eans)
+        if score > best_score:
+            best, best_score = o, score
+    return best or (candidates[0] if candidates else None)
+
+
+def process_terminal_file(file_path):
+    """
+    Spracuje jeden dopísaný CSV z terminálu (váženie). Presun do spracovane/
+    alebo chyby/ a ochranu pred duplicitou rieši file_ingest.
+    """
+    filename = os.path.basename(file_path)
+    base_name = os.path.splitext(filename)[0]
+    print(f">>> [TERMINAL] Začínam spracovávať: {filename}")
+
+    with open(file_path, mode='r', encoding='cp1250', errors='replace') as f:
+        lines = f.readlines()
+    edi_map, b2b_map = _get_ean_maps()
+
+    # 1. POKUS: Hľadáme podľa názvu súboru (funguje pre štandardné B2B)
+    search_pattern = "%" + base_name.replace('_', '-') + "%"
+    order_db = db_connector.execute_query(
+        "SELECT id, cislo_objednavky FROM b2b_objednavky WHERE cislo_objednavky LIKE %s LIMIT 1", 
+        (search_pattern,), fetch="one"
+    )
+    items_by_order = {}
+
+    # 2. POKUS: Ak ide o COOP/EDI formát (XXX_YYYYYYYY.csv)
+    if not order_db:
+        first_line = lines[0] if lines else ""
+
+        if first_line and not first_line.startswith("  ") and ";" in first_line:
+            parts = [p.strip() for p in first_line.split(";")]
+            cust_id = next((p for p in reversed(parts) if p), "")
+
+            # Extrakcia kódu pobočky z názvu súboru (napr. '022' z '022_43489684.csv')
+            branch_code = base_name.split('_')[0] if '_' in base_name else ""
+
+            # HLAVNÁ OPRAVA: Prepojíme si tabuľku zákazníkov a pýtame sa priamo na 'cislo_prevadzky'
+            kandidati_objednavky = db_connector.execute_query(
+                """
+                SELECT o.id, o.cislo_objednavky 
+                FROM b2b_objednavky o
+                LEFT JOIN b2b_zakaznici z ON o.zakaznik_id = z.zakaznik_id
+                WHERE (o.zakaznik_id = %s OR o.zakaznik_id = %s OR z.cislo_prevadzky = %s)
+                  AND (
+                      o.stav IN ('Nová', 'Prijatá') 
+                      OR (o.stav = 'Hotová' AND DATE(o.pozadovany_datum_dodania) >= CURDATE() - INTERVAL 2 DAY)
+                  )
+                ORDER BY o.id DESC
+                """,
+                (cust_id, branch_code, branch_code), 
+                fetch="all"
+            ) or []
+
+            items_by_order = _order_items([o["id"] for o in kandidati_objednavky])
+            order_db = _best_candidate(kandidati_objednavky, items_by_order, _ticket_eans(lines), edi_map)
+
+    if not order_db:
+        raise ValueError(f"Objednávka pre súbor '{filename}' nenájdená ani podľa názvu, ani podľa zákazníka a EAN")
+
+    order_id = order_db["id"]
+    db_cislo = order_db["cislo_objednavky"]
+    print(f"Nájdená objednávka: ID {order_id} (Číslo v DB: {db_cislo})")
+
+    if order_id not in items_by_order:
+        items_by_order = _order_items([order_id])
+    order_items = items_by_order.get(order_id, [])
+
+    # Dodané váhy: položka -> váha (neskorší riadok lístka má prednosť, ako pri postupných UPDATE-och)
+    weights = {}
+    for line in lines:
+        if not line.startswith("  ") or len(line) < 120:  # Znížené na 120, aby sme neprišli o riadky
+            continue
+
+        ean = line[2:15].strip()
+        if not ean:
+            continue
+
+        ean_clean = _strip_ean(ean)
+        # 1. EDI tabuľka, 2. B2B tabuľka
+        interny_ean = _lookup(edi_map, ean) or _lookup(b2b_map, ean)
+        hladany_ean = interny_ean if interny_ean else ean
+        hladany_clean = _strip_ean(interny_ean) if interny_ean else ean_clean
+
+        real_weight, free_zone = _parse_weight(line)
+        if real_weight == 0.0 and free_zone:
+            print(f"Upozornenie: Nenašla sa validná váha pre EAN {ean} v zóne: '{free_zone}'")
+
+        if real_weight > 0:
+            for item_id, item_ean in order_items:
+                if item_ean in (hladany_ean, hladany_clean) or hladany_clean in item_ean:
+                    weights[item_id] = real_weight
+
+    if weights:
+        cases = " ".join(["WHEN %s THEN %s"] * len(weights))
+        ph = ",".join(["%s"] * len(weights))
+        params = [v for pair in weights.items() for v in pair] + list(weights) + [order_id]
+        db_connector.execute_query(f"""
+            UPDATE b2b_objednavky_polozky 
+            SET dodane_mnozstvo = CASE id {cases} END 
+            WHERE id IN ({ph}) AND objednavka_id = %s
+        """, tuple(params), fetch="none")
+
+    # Prepočet finálnej sumy po aktualizácii všetkých dodaných množstiev
+    sum_db = db_connector.execute_query("""
+        SELECT SUM(
+            COALESCE(pol.dodane_mnozstvo, pol.mnozstvo) * pol.cena_bez_dph * (1 + COALESCE(p.dph, pol.dph, 20) / 100.0)
+        ) as suma_s_dph 
+        FROM b2b_objednavky_polozky pol
+        LEFT JOIN produkty p ON p.ean = pol.ean_produktu
+        WHERE pol.objednavka_id = %s
+    """, (order_id,), fetch="one")
+
+    finalna_suma_s_dph = float(sum_db.get("suma_s_dph") or 0) if sum_db else 0.0
+    now_str = datetime.now() # Python už vie, koľko je reálne hodín
+
+    db_connector.execute_query("""
+        UPDATE b2b_objednavky 
+        SET stav = 'Hotová', 
+            datum_vypracovania = %s,
+            finalna_suma = %s,
+            vazenie_end = %s,          -- ZÁPIS KONCOVÉHO ČASU
+            aktualne_na_vahe = 0       -- POISTKA NA VYPNUTIE BLIKANIA
+        WHERE id = %s
+    """, (now_str, finalna_suma_s_dph, now_str, order_id), fetch="none")
+    order_events.on_orders_changed("b2b", order_id)
+
+    print(f">>> [TERMINAL] Objednávka '{db_cislo}' úspešne nastavená na Hotová s prepočítanou sumou {finalna_suma_s_dph:.2f} €!")
+    return db_cislo
+
+
+file_ingest.register(file_ingest.Channel(
+    "terminal", TERMINAL_IMPORT_DIR, process_terminal_file,
+    accept=lambda name: name.lower().endswith(".csv"),
+    archive_dir=TERMINAL_PROCESSED_DIR,
+    error_dir=TERMINAL_ERROR_DIR,
+))
+
+
+def process_terminal_files():
+    """Jednorazový prechod adresára (trvalé sledovanie spúšťa scheduler cez file_ingest.start)."""
+    ensure_directories()
+    invalidate_ean_maps()
+    return file_ingest.sweep(["terminal"])